@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 '''
-The high-level capsul.api module pre-imports the main objects from several sub-modules:
+The high-level capsul.api module gives access to the main objects from several
+sub-modules, which are imported on first use:
 
 Classes
 -------
@@ -29,17 +30,51 @@ Functions
 '''
 
 from __future__ import absolute_import
-from capsul.process.process import (Process, NipypeProcess, ProcessResult,
-                                    FileCopyProcess, InteractiveProcess)
-from capsul.pipeline.pipeline import Pipeline
-from capsul.pipeline.pipeline_nodes import Plug
-from capsul.pipeline.pipeline_nodes import Node
-from capsul.pipeline.pipeline_nodes import ProcessNode
-from capsul.pipeline.pipeline_nodes import PipelineNode
-from capsul.pipeline.pipeline_nodes import Switch
-from capsul.pipeline.pipeline_nodes import OptionalOutputSwitch
-from capsul.engine import capsul_engine
-from capsul.engine import activate_configuration
-from capsul.study_config.process_instance import get_process_instance
-from capsul.study_config.study_config import StudyConfig
-from capsul.utils.finder import find_processes
+import importlib
+import sys
+
+# objects are imported from their module on first access, in order to keep
+# the startup of commandline tools (and of jobs) fast.
+_api_objects = {
+    'Process': 'capsul.process.process',
+    'NipypeProcess': 'capsul.process.process',
+    'ProcessResult': 'capsul.process.process',
+    'FileCopyProcess': 'capsul.process.process',
+    'InteractiveProcess': 'capsul.process.process',
+    'Pipeline': 'capsul.pipeline.pipeline',
+    'Plug': 'capsul.pipeline.pipeline_nodes',
+    'Node': 'capsul.pipeline.pipeline_nodes',
+    'ProcessNode': 'capsul.pipeline.pipeline_nodes',
+    'PipelineNode': 'capsul.pipeline.pipeline_nodes',
+    'Switch': 'capsul.pipeline.pipeline_nodes',
+    'OptionalOutputSwitch': 'capsul.pipeline.pipeline_nodes',
+    'capsul_engine': 'capsul.engine',
+    'activate_configuration': 'capsul.engine',
+    'get_process_instance': 'capsul.study_config.process_instance',
+    'StudyConfig': 'capsul.study_config.study_config',
+    'find_processes': 'capsul.utils.finder',
+}
+
+__all__ = sorted(_api_objects)
+
+
+def _import_object(name):
+    value = getattr(importlib.import_module(_api_objects[name]), name)
+    globals()[name] = value
+    return value
+
+
+if sys.version_info[:2] >= (3, 7):
+    def __getattr__(name):
+        if name not in _api_objects:
+            raise AttributeError(
+                "module '{0}' has no attribute '{1}'".format(__name__, name))
+        return _import_object(name)
+
+    def __dir__():
+        return sorted(set(globals()) | set(__all__))
+
+else:
+    # no module __getattr__ (PEP 562): import everything now
+    for _name in __all__:
+        _import_object(_name)
@@ -955,6 +955,35 @@ class PathCompletionEngine(object):
         '''
         return None
 
+    def attributes_to_paths(self, process, parameter, attributes, rows):
+        ''' Build paths from several sets of attributes values, for instance
+        for the iterations of a process.
+
+        The default implementation calls attributes_to_path() for each row,
+        on a copy of attributes. Subclasses may resolve them in bulk.
+
+        Parameters
+        ----------
+        process: Node or Process instance
+        parameter: str
+        attributes: ProcessAttributes instance (Controller)
+        rows: list of dict
+            attributes values, which replace those of attributes
+
+        Returns
+        -------
+        paths: list
+            a path (or None) for each row
+        '''
+        row_attributes = attributes.copy(with_values=True)
+        paths = []
+        for row in rows:
+            for attribute, value in six.iteritems(row):
+                setattr(row_attributes, attribute, value)
+            paths.append(self.attributes_to_path(process, parameter,
+                                                 row_attributes))
+        return paths
+
     def allowed_formats(self, process, parameter):
         ''' List of possible formats names associated with a parameter
         '''
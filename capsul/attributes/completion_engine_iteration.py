@@ -13,6 +13,7 @@ from __future__ import print_function
 
 from __future__ import absolute_import
 from capsul.pipeline.process_iteration import ProcessIteration
+from capsul.pipeline.pipeline import Pipeline
 from capsul.attributes.completion_engine import ProcessCompletionEngine, \
     ProcessCompletionEngineFactory
 from capsul.pipeline.pipeline_nodes import ProcessNode
@@ -176,6 +177,91 @@ class ProcessCompletionEngineIteration(ProcessCompletionEngine):
 
         return size
 
+    def complete_iterations(self, attributes_table=None):
+        ''' Batch completion of the iterated parameters.
+
+        Paths of all iterations are built from a table of attributes values,
+        without setting them on the iterated process: the path completion
+        engine resolves them in bulk (see
+        :meth:`~capsul.attributes.completion_engine.PathCompletionEngine.attributes_to_paths`).
+
+        Only iterated single processes with a standard completion engine are
+        supported: None is returned otherwise (iterated pipelines, list
+        parameters or attributes, or specialized completion), and completion
+        has to be performed step by step.
+
+        Parameters
+        ----------
+        attributes_table: dict (optional)
+            {attribute: values list}, replacing the values of the iterated
+            attributes. Lists shorter than the number of iterations are
+            completed with their last value.
+
+        Returns
+        -------
+        paths: dict
+            {parameter: paths list}, with a path (or None) for each
+            iteration, for the completed iterative parameters.
+        '''
+        process = self.process
+        if isinstance(process, ProcessNode):
+            process = process.process
+        if isinstance(process.process, Pipeline):
+            return None
+        try:
+            attributes_set = self.get_attribute_values()
+            completion_engine = ProcessCompletionEngine.get_completion_engine(
+                process.process, self.name)
+            step_attributes = completion_engine.get_attribute_values()
+        except AttributeError:
+            return None
+        if attributes_set is None or step_attributes is None:
+            return None
+        engine_type = type(completion_engine)
+        if engine_type.complete_parameters \
+                is not ProcessCompletionEngine.complete_parameters \
+                or engine_type.attributes_to_path \
+                is not ProcessCompletionEngine.attributes_to_path:
+            return None
+        if any(isinstance(trait.trait_type, traits.List)
+               for trait in step_attributes.user_traits().values()):
+            return None
+
+        iterated_attributes = self.get_iterated_attributes()
+        table = dict((attribute, getattr(attributes_set, attribute))
+                     for attribute in iterated_attributes)
+        if attributes_table is not None:
+            table.update(attributes_table)
+        attributes_table = table
+        for attribute in attributes_set.user_traits():
+            if attribute not in iterated_attributes:
+                setattr(step_attributes, attribute,
+                        getattr(attributes_set, attribute))
+        size = max([len(values) for values in attributes_table.values()]
+                   + [0])
+        rows = [dict((attribute, values[min(len(values) - 1, step)])
+                     for attribute, values in six.iteritems(attributes_table)
+                     if len(values) != 0)
+                for step in range(size)]
+
+        path_completion = completion_engine.get_path_completion_engine()
+        paths = {}
+        for parameter in process.iterative_parameters:
+            trait = process.process.trait(parameter)
+            if process.trait(parameter).forbid_completion \
+                    or trait.forbid_completion \
+                    or process.process.is_parameter_protected(parameter) \
+                    or parameter not in step_attributes.parameter_attributes:
+                continue
+            if isinstance(trait.trait_type, traits.List):
+                return None
+            try:
+                paths[parameter] = path_completion.attributes_to_paths(
+                    process.process, parameter, step_attributes, rows)
+            except Exception:
+                paths[parameter] = [None] * size
+        return paths
+
     def complete_parameters(self, process_inputs={},
                             complete_iterations=True):
 
@@ -228,7 +314,16 @@ class ProcessCompletionEngineIteration(ProcessCompletionEngine):
                     process.process.trait(param).forbid_completion = True
 
         self.completion_progress_total = size
-        for it_step in range(size):
+        # iterated paths are built in bulk when possible: then only the
+        # first step is completed on the iterated process, for the other
+        # parameters
+        batch_paths = None
+        if size > 1:
+            batch_paths = self.complete_iterations()
+        steps = size
+        if batch_paths is not None:
+            steps = 1
+        for it_step in range(steps):
             self.capsul_iteration_step = it_step
             for attribute in iterated_attributes:
                 iterated_values = getattr(attributes_set, attribute)
@@ -245,6 +340,23 @@ class ProcessCompletionEngineIteration(ProcessCompletionEngine):
                 value = getattr(process.process, parameter)
                 iterative_parameters[parameter].append(value)
             self.completion_progress = it_step + 1
+        if batch_paths is not None:
+            for parameter, values in iterative_parameters.items():
+                # not completed values are the given ones, as in step by
+                # step completion
+                given = getattr(process, parameter)
+                if not isinstance(given, list):
+                    given = []
+                for it_step in range(1, size):
+                    if len(given) > it_step:
+                        values.append(given[it_step])
+                    else:
+                        values.append(values[-1])
+                for it_step, path in enumerate(batch_paths.get(parameter,
+                                                               ())):
+                    if path is not None:
+                        values[it_step] = path
+            self.completion_progress = size
         for parameter, values in iterative_parameters.items():
             try:
                 setattr(process, parameter, values)
@@ -163,6 +163,9 @@ class FomProcessCompletionEngine(ProcessCompletionEngine):
             if fom is None:
                 fom, atp, pta \
                     = study_config.modules['FomConfig'].load_fom(schema)
+                if fom is None:
+                    # listed, but not found anymore in the FOM path
+                    continue
                 foms[schema] = fom
 
             if schema not in ('input', 'output', 'shared'):
@@ -387,6 +390,15 @@ class FomProcessCompletionEngine(ProcessCompletionEngine):
 
 
 class FomPathCompletionEngine(PathCompletionEngine):
+    '''
+    Path completion using FOMs.
+
+    Resolved paths are cached, for a given FOM, process name, parameter and
+    discriminant attributes values, until the FOM configuration changes (see
+    :func:`capsul.engine.module.fom.clear_path_cache`). Cache hits and misses
+    are counted in the ``fom_path_cache_stats`` dict of the StudyConfig
+    ``modules_data``.
+    '''
 
     def attributes_to_path(self, process, parameter, attributes):
         ''' Build a path from attributes
@@ -397,6 +409,24 @@ class FomPathCompletionEngine(PathCompletionEngine):
         parameter: str
         attributes: ProcessAttributes instance (Controller)
         '''
+        return self.attributes_to_paths(process, parameter, attributes,
+                                        [{}])[0]
+
+
+    def attributes_to_paths(self, process, parameter, attributes, rows):
+        ''' Build paths from several sets of attributes values.
+
+        The FOM rule of the parameter is looked up once, and each distinct
+        set of discriminant attributes values is resolved once.
+
+        Parameters
+        ----------
+        process: Process instance
+        parameter: str
+        attributes: ProcessAttributes instance (Controller)
+        rows: list of dict
+            attributes values, which replace those of attributes
+        '''
         FomProcessCompletionEngine.setup_fom(process)
 
         input_fom = process.study_config.modules_data.foms['input']
@@ -443,30 +473,64 @@ class FomPathCompletionEngine(PathCompletionEngine):
         #allowed_attributes.discard('generated_by_parameter')
         #allowed_attributes.discard('generated_by_process')
 
+        modules_data = process.study_config.modules_data
+        cache = getattr(modules_data, 'fom_path_cache', None)
+        if cache is None:
+            cache = {}
+        stats = getattr(modules_data, 'fom_path_cache_stats', {})
+
         # Select only the attributes that are discriminant for this
         # parameter otherwise other attributes can prevent the appropriate
         # rule to match
-        parameter_attributes = atp.find_discriminant_attributes(
-            fom_parameter=parameter, fom_process=name)
-        d = {i: getattr(attributes, i)
-             for i in parameter_attributes
-             if i in allowed_attributes
-             and getattr(attributes, i) not in (None, Undefined)}
-        d['fom_process'] = name
-        d['fom_parameter'] = parameter
-        d['fom_format'] = 'fom_preferred'
-        path_value = None
-        #path_values = []
-        #debug = getattr(self, 'debug', None)
-        for h in atp.find_paths(d):  # , debug=debug):
-            path_value = h[0]
-            # find_paths() is a generator which can sometimes generate
-            # several values (formats). We are only interested in the
-            # first one.
-            #path_values.append(h[0])
-            break
+        key = (atp, name, parameter)
+        parameter_attributes = cache.get(key)
+        if parameter_attributes is None:
+            parameter_attributes = atp.find_discriminant_attributes(
+                fom_parameter=parameter, fom_process=name)
+            cache[key] = parameter_attributes
+        parameter_attributes = [i for i in parameter_attributes
+                                if i in allowed_attributes]
+        values = dict((i, getattr(attributes, i))
+                      for i in parameter_attributes)
+
+        paths = []
+        for row in rows:
+            d = {}
+            for i in parameter_attributes:
+                value = row.get(i, values[i])
+                if value not in (None, Undefined):
+                    d[i] = value
+            try:
+                key = (atp, name, parameter, frozenset(six.iteritems(d)))
+                hash(key)
+            except TypeError:
+                # unhashable attribute value (list...): not cached
+                key = None
+            if key is not None and key in cache:
+                stats['hits'] = stats.get('hits', 0) + 1
+                paths.append(cache[key])
+                continue
+            stats['misses'] = stats.get('misses', 0) + 1
+
+            d['fom_process'] = name
+            d['fom_parameter'] = parameter
+            d['fom_format'] = 'fom_preferred'
+            path_value = None
+            #path_values = []
+            #debug = getattr(self, 'debug', None)
+            for h in atp.find_paths(d):  # , debug=debug):
+                path_value = h[0]
+                # find_paths() is a generator which can sometimes generate
+                # several values (formats). We are only interested in the
+                # first one.
+                #path_values.append(h[0])
+                break
+
+            if key is not None:
+                cache[key] = path_value
+            paths.append(path_value)
 
-        return path_value
+        return paths
 
 
     def open_values_attributes(self, process, parameter):
@@ -149,6 +149,52 @@ class TestCompletion(unittest.TestCase):
                          os.path.normpath('/tmp/out/DummyProcess_bidule_jojo_barbapapa.txt'))
 
 
+    def test_missing_fom(self):
+        study_config = self.study_config
+        self.assertTrue(study_config.auto_fom)
+        # a FOM listed in the FOM path, but which cannot be loaded (its
+        # directory has been removed for instance)
+        study_config.modules_data.all_foms['missing_fom-1.0'] = None
+        process = study_config.get_process_instance(
+            'capsul.attributes.test.test_attributed_process.DummyProcess')
+        patt = ProcessCompletionEngine.get_completion_engine(process)
+        atts = patt.get_attribute_values()
+        atts.center = 'jojo'
+        atts.subject = 'barbapapa'
+        patt.complete_parameters()
+        self.assertEqual(os.path.normpath(process.truc),
+                         os.path.normpath('/tmp/in/DummyProcess_truc_jojo_barbapapa.txt'))
+
+    def test_path_cache(self):
+        study_config = self.study_config
+        stats = study_config.modules_data.fom_path_cache_stats
+        process = study_config.get_process_instance(
+            'capsul.attributes.test.test_attributed_process.DummyProcess')
+        patt = ProcessCompletionEngine.get_completion_engine(process)
+        atts = patt.get_attribute_values()
+        atts.center = 'jojo'
+        atts.subject = 'barbapapa'
+        patt.complete_parameters()
+        hits, misses = stats['hits'], stats['misses']
+        process.truc = Undefined
+        patt.complete_parameters()
+        self.assertEqual(stats['misses'], misses)
+        self.assertTrue(stats['hits'] > hits)
+        self.assertEqual(os.path.normpath(process.truc),
+                         os.path.normpath('/tmp/in/DummyProcess_truc_jojo_barbapapa.txt'))
+        # other attributes values are resolved separately
+        atts.subject = 'barbatruc'
+        patt.complete_parameters()
+        self.assertTrue(stats['misses'] > misses)
+        self.assertEqual(os.path.normpath(process.truc),
+                         os.path.normpath('/tmp/in/DummyProcess_truc_jojo_barbatruc.txt'))
+        # changing the FOM configuration invalidates the cache
+        study_config.input_directory = '/tmp/in2'
+        self.assertEqual(len(study_config.modules_data.fom_path_cache), 0)
+        patt.complete_parameters()
+        self.assertEqual(os.path.normpath(process.truc),
+                         os.path.normpath('/tmp/in2/DummyProcess_truc_jojo_barbatruc.txt'))
+
     def test_iteration(self):
         study_config = self.study_config
         pipeline = study_config.get_iteration_pipeline(
@@ -175,6 +221,34 @@ class TestCompletion(unittest.TestCase):
                 '/tmp/out/DummyProcess_bidule_muppets_stalter.txt',
                 '/tmp/out/DummyProcess_bidule_muppets_waldorf.txt']])
 
+    def test_batch_iteration(self):
+        study_config = self.study_config
+        pipeline = study_config.get_iteration_pipeline(
+            'iter',
+            'dummy',
+            'capsul.attributes.test.test_attributed_process.DummyProcess',
+            ['truc', 'bidule'])
+        cm = ProcessCompletionEngine.get_completion_engine(
+            pipeline.nodes['dummy'])
+        atts = cm.get_attribute_values()
+        atts.center = ['muppets']
+        subjects = ['subject%d' % i for i in range(100)]
+        stats = study_config.modules_data.fom_path_cache_stats
+        misses = stats['misses']
+        truc = pipeline.nodes['dummy'].process.process.truc
+        paths = cm.complete_iterations({'subject': subjects})
+        self.assertEqual(stats['misses'] - misses, 200)
+        self.assertEqual(
+            [os.path.normpath(p) for p in paths['truc']],
+            [os.path.normpath('/tmp/in/DummyProcess_truc_muppets_%s.txt' % s)
+             for s in subjects])
+        self.assertEqual(
+            [os.path.normpath(p) for p in paths['bidule']],
+            [os.path.normpath('/tmp/out/DummyProcess_bidule_muppets_%s.txt'
+                              % s) for s in subjects])
+        # iterated process parameters are left untouched
+        self.assertEqual(pipeline.nodes['dummy'].process.process.truc, truc)
+
     def test_list_completion(self):
         study_config = self.study_config
         process = study_config.get_process_instance(
@@ -34,9 +34,8 @@ from soma.serialization import to_json, from_json
 from soma.sorted_dictionary import SortedDictionary
 from soma.utils.weak_proxy import get_ref
 
-from .database_populse import PopulseDBEngine
-
 from .settings import Settings
+from .controller_pool import WorkflowControllerPool
 from .module import default_modules
 from . import run
 from .run import WorkflowExecutionError
@@ -204,6 +203,9 @@ class CapsulEngine(Controller):
         self._metadata_engine = from_json(database.json_value("metadata_engine"))
 
         self._connected_resource = ""
+        self._controller_pool = WorkflowControllerPool(self)
+        # asyncio execution monitors, per event loop
+        self._execution_monitors = weakref.WeakKeyDictionary()
 
     @property
     def settings(self):
@@ -211,6 +213,14 @@ class CapsulEngine(Controller):
             self._settings = Settings(self.database.storage)
         return self._settings
 
+    @property
+    def controller_pool(self):
+        """
+        :class:`~capsul.engine.controller_pool.WorkflowControllerPool` of
+        soma-workflow controllers used to run processes.
+        """
+        return self._controller_pool
+
     @property
     def database(self):
         return self._database
@@ -429,6 +439,7 @@ class CapsulEngine(Controller):
         Disconnect from a computing resource.
         """
         self._connected_resource = None
+        self._controller_pool.clear()
 
     def executions(self):
         """
@@ -470,6 +481,53 @@ class CapsulEngine(Controller):
         """
         return run.status(self, execution_id)
 
+    def astart(self, process, workflow=None, history=True,
+               get_pipeline=False, **kwargs):
+        """
+        Coroutine version of :meth:`start`::
+
+            execution_id = await engine.astart(process)
+        """
+        from . import async_run
+
+        return async_run.astart(self, process, workflow, history,
+                                get_pipeline, **kwargs)
+
+    def await_execution(self, execution_id, timeout=-1, pipeline=None):
+        """
+        Coroutine version of :meth:`wait`::
+
+            status = await engine.await_execution(execution_id)
+
+        Executions are polled by a single task for all the coroutines of
+        an event loop (see :mod:`capsul.engine.async_run`), instead of
+        blocking a thread each.
+        """
+        from . import async_run
+
+        return async_run.await_execution(self, execution_id, timeout=timeout,
+                                         pipeline=pipeline)
+
+    def astatus(self, execution_id):
+        """
+        Coroutine version of :meth:`status`.
+        """
+        from . import async_run
+
+        return async_run.astatus(self, execution_id)
+
+    def execution_events(self, execution_id):
+        """
+        Asynchronous iterator of the status changes and job completions of
+        an execution (see :class:`~capsul.engine.async_run.ExecutionEvent`)::
+
+            async for event in engine.execution_events(execution_id):
+                print(event.kind, event.status, event.job_id)
+        """
+        from . import async_run
+
+        return async_run.execution_events(self, execution_id)
+
     def detailed_information(self, execution_id):
         """
         Return complete (and possibly big) information about a process
@@ -477,6 +535,14 @@ class CapsulEngine(Controller):
         """
         return run.detailed_information(self, execution_id)
 
+    def execution_profile(self, execution_id):
+        """
+        Return the profile of the jobs of a process execution, as an
+        :class:`~capsul.utils.profiling.ExecutionProfile` which can be
+        summarized or exported as a Chrome trace or CSV table.
+        """
+        return run.execution_profile(self, execution_id)
+
     def call(self, process, history=True, *kwargs):
         return run.call(self, process, history=history, **kwargs)
 
@@ -578,6 +644,9 @@ def database_factory(database_location):
     else:
         raise ValueError("Invalid database location: %s" % database_location)
 
+    # populse_db takes a significant time to import
+    from .database_populse import PopulseDBEngine
+
     engine = PopulseDBEngine(populse_db)
 
     if isinstance(database_location, AutoDeleteFileName):
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+'''
+`asyncio <https://docs.python.org/3/library/asyncio.html>`_ counterparts of
+the :class:`~capsul.engine.CapsulEngine` processing methods implemented in
+:mod:`capsul.engine.run`.
+
+Blocking calls to soma-workflow are done in the default executor of the
+event loop. Executions are supervised by a single polling task per engine
+and event loop (see :class:`ExecutionMonitor`), so waiting for thousands of
+executions does not need one thread per execution: at each polling
+interval, the status of all the supervised executions are queried at once,
+in one executor job.
+
+Classes
+=======
+:class:`ExecutionEvent`
+-----------------------
+:class:`ExecutionMonitor`
+-------------------------
+
+Functions
+=========
+:func:`execution_monitor`
+-------------------------
+:func:`astart`
+--------------
+:func:`astatus`
+---------------
+:func:`await_execution`
+-----------------------
+:func:`execution_events`
+------------------------
+'''
+
+from __future__ import absolute_import
+import asyncio
+import collections
+import functools
+import time
+import weakref
+
+from . import run
+
+
+ExecutionEvent = collections.namedtuple(
+    'ExecutionEvent', ['execution_id', 'kind', 'status', 'job_id',
+                       'exit_info'])
+ExecutionEvent.__doc__ = '''
+Event of an execution, produced by :func:`execution_events`.
+
+``kind`` is ``'status'`` when the workflow status changes (``job_id`` and
+``exit_info`` are then None), or ``'job'`` when a job has completed: then
+``status`` is the job status (``'done'`` or ``'failed'``), and
+``exit_info`` is the soma-workflow job exit information
+``(exit_status, exit_value, term_signal, resource_usage)``.
+'''
+
+
+def _final(status):
+    from soma_workflow import constants
+
+    return status is None or status == constants.WORKFLOW_DONE
+
+
+class ExecutionMonitor(object):
+    '''
+    Polls the status of the executions of an engine, on behalf of the
+    coroutines of an event loop waiting for them.
+
+    Coroutines subscribe to an execution with :meth:`watch`: they get an
+    :class:`asyncio.Queue` which receives ``(status, elements_status)``
+    tuples after each polling round (or the exception raised by the
+    query). ``elements_status`` is the result of
+    ``WorkflowController.workflow_elements_status()`` if ``detailed`` was
+    requested, None otherwise. The polling task runs while there are
+    subscribers.
+
+    Use :func:`execution_monitor` to get the monitor of an engine in the
+    running event loop.
+
+    Attributes
+    ----------
+    poll_interval: float
+        delay, in seconds, between polling rounds
+    rounds: int
+        number of polling rounds done
+    '''
+
+    def __init__(self, engine, poll_interval=1.):
+        self.engine = weakref.proxy(engine)
+        self.poll_interval = poll_interval
+        self.rounds = 0
+        self._queues = {}
+        self._detailed = collections.Counter()
+        self._task = None
+
+    def watch(self, execution_id, detailed=False):
+        '''
+        Subscribe to the status of an execution. Returns the queue
+        receiving it.
+        '''
+        queue = asyncio.Queue()
+        self._queues.setdefault(execution_id, []).append(queue)
+        if detailed:
+            self._detailed[execution_id] += 1
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        return queue
+
+    def unwatch(self, execution_id, queue, detailed=False):
+        '''
+        Unsubscribe a queue returned by :meth:`watch`.
+        '''
+        queues = self._queues.get(execution_id, [])
+        if queue in queues:
+            queues.remove(queue)
+            if not queues:
+                del self._queues[execution_id]
+        if detailed:
+            self._detailed[execution_id] -= 1
+            if self._detailed[execution_id] <= 0:
+                del self._detailed[execution_id]
+        if not self._queues and self._task is not None:
+            # stop polling
+            self._task.cancel()
+            self._task = None
+
+    def _poll(self, execution_ids, detailed):
+        # executor job: query all the executions with one controller
+        results = {}
+        with self.engine.controller_pool.controller() as controller:
+            for execution_id in execution_ids:
+                try:
+                    status = controller.workflow_status(execution_id)
+                    elements = None
+                    if execution_id in detailed:
+                        elements = controller.workflow_elements_status(
+                            execution_id)
+                    results[execution_id] = (status, elements)
+                except Exception as e:
+                    results[execution_id] = e
+        return results
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        task = asyncio.current_task()
+        try:
+            while self._queues:
+                results = await loop.run_in_executor(
+                    None, self._poll, list(self._queues),
+                    set(self._detailed))
+                self.rounds += 1
+                for execution_id, result in results.items():
+                    for queue in self._queues.get(execution_id, ()):
+                        queue.put_nowait(result)
+                if self._queues:
+                    await asyncio.sleep(self.poll_interval)
+        except Exception as e:
+            # report the error to all subscribers
+            for queues in self._queues.values():
+                for queue in queues:
+                    queue.put_nowait(e)
+        finally:
+            if self._task is task:
+                self._task = None
+
+    async def get(self, queue, timeout=None):
+        '''
+        Get the next result from a queue returned by :meth:`watch`, and
+        raise it if it is an exception. Raises asyncio.TimeoutError after
+        the given timeout (in seconds) if it is not None.
+        '''
+        if timeout is None:
+            result = await queue.get()
+        else:
+            result = await asyncio.wait_for(queue.get(), timeout)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def execution_monitor(engine):
+    '''
+    Get the :class:`ExecutionMonitor` of an engine for the running event
+    loop (it is created if needed).
+    '''
+    loop = asyncio.get_event_loop()
+    monitors = engine._execution_monitors
+    monitor = monitors.get(loop)
+    if monitor is None:
+        monitor = ExecutionMonitor(engine)
+        monitors[loop] = monitor
+    return monitor
+
+
+async def _in_executor(func, *args, **kwargs):
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        None, functools.partial(func, *args, **kwargs))
+
+
+async def astart(engine, process, workflow=None, history=True,
+                 get_pipeline=False, **kwargs):
+    '''
+    Coroutine version of :func:`capsul.engine.run.start`.
+    '''
+    return await _in_executor(run.start, engine, process, workflow, history,
+                              get_pipeline, **kwargs)
+
+
+async def astatus(engine, execution_id):
+    '''
+    Coroutine version of :func:`capsul.engine.run.status`.
+    '''
+    return await _in_executor(run.status, engine, execution_id)
+
+
+async def await_execution(engine, execution_id, timeout=-1, pipeline=None):
+    '''
+    Coroutine version of :func:`capsul.engine.run.wait`: wait for the end
+    of a process execution, and set its output values on the pipeline if
+    given.
+
+    The execution is polled by the :class:`ExecutionMonitor` of the engine.
+
+    Returns
+    -------
+    status: str
+        the execution status, as returned by
+        :func:`capsul.engine.run.wait`
+    '''
+    from soma_workflow import constants
+
+    monitor = execution_monitor(engine)
+    queue = monitor.watch(execution_id)
+    start_time = time.time()
+    polled = False
+    try:
+        while True:
+            remaining = None
+            if timeout >= 0:
+                remaining = max(0, timeout - (time.time() - start_time))
+            try:
+                status, elements = await monitor.get(queue, remaining)
+            except asyncio.TimeoutError:
+                break
+            polled = True
+            if _final(status):
+                break
+    finally:
+        monitor.unwatch(execution_id, queue)
+    if not polled:
+        # timeout before the first polling round
+        return await astatus(engine, execution_id)
+    if status != constants.WORKFLOW_DONE:
+        # timeout, or unknown workflow
+        return status
+    # finished: get outputs, transfer files and check job failures
+    return await _in_executor(run.wait, engine, execution_id, 0, pipeline)
+
+
+async def execution_events(engine, execution_id):
+    '''
+    Asynchronous iterator of the :class:`ExecutionEvent` events of an
+    execution: workflow status changes, and job completions. The iteration
+    ends when the workflow is done.
+
+    Example
+    -------
+    ::
+
+        async for event in execution_events(engine, execution_id):
+            if event.kind == 'job':
+                print('job', event.job_id, event.status)
+    '''
+    from soma_workflow import constants
+
+    monitor = execution_monitor(engine)
+    queue = monitor.watch(execution_id, detailed=True)
+    last_status = None
+    completed = set()
+    try:
+        while True:
+            status, elements = await monitor.get(queue)
+            if elements:
+                for element in elements[0]:
+                    job_id, job_status = element[0], element[1]
+                    if job_status in (constants.DONE, constants.FAILED) \
+                            and job_id not in completed:
+                        completed.add(job_id)
+                        yield ExecutionEvent(execution_id, 'job',
+                                             job_status, job_id, element[3])
+            if status != last_status:
+                last_status = status
+                yield ExecutionEvent(execution_id, 'status', status, None,
+                                     None)
+            if _final(status):
+                return
+    finally:
+        monitor.unwatch(execution_id, queue, detailed=True)
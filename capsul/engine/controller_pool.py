@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+'''
+Pool of `Soma-Workflow <https://github.com/populse/soma-workflow/>`_
+controllers used by the execution methods of
+:class:`~capsul.engine.CapsulEngine`.
+
+Classes
+=======
+:class:`WorkflowControllerPool`
+-------------------------------
+'''
+
+from __future__ import absolute_import
+import collections
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+
+class _ResourceControllers(object):
+    '''
+    Controllers of one computing resource.
+    '''
+    def __init__(self):
+        # idle controllers: [controller, last successful use or check time]
+        self.idle = collections.deque()
+        # number of exclusive controllers, idle or checked out
+        self.count = 0
+        # True if the resource uses an engine embedded in the client process
+        # (soma-workflow light mode), None until the first connection
+        self.light = None
+        # controller shared by all threads in light mode
+        self.shared = None
+        self.shared_check = 0.
+
+
+class WorkflowControllerPool(object):
+    '''
+    Thread-safe pool of soma-workflow controllers, per computing resource.
+
+    Controllers are checked out by :meth:`controller`, which is a context
+    manager: a controller is used by one thread at a time, and up to
+    :attr:`size` controllers are connected to each resource, so that
+    several threads may submit or monitor workflows at the same time. When
+    all of them are in use, threads wait for one to be checked in.
+
+    Health checks are lazy: a controller which has not been used
+    successfully for :attr:`check_interval` seconds, or whose last use
+    raised an exception, is checked before being handed out. A controller
+    failing the check is replaced by a new connection.
+
+    In soma-workflow "light" mode, the workflow engine runs inside the
+    client process and is itself thread-safe: a single controller (the one
+    of the ``SomaWorkflowConfig`` module of the study config) is then shared
+    by all threads, since several controllers would start several engines
+    on the same database.
+
+    Parameters
+    ----------
+    engine: CapsulEngine
+    size: int (optional)
+        maximum number of controllers connected to each resource.
+    check_interval: float (optional)
+        delay, in seconds, after which an idle controller is checked.
+    '''
+
+    def __init__(self, engine, size=4, check_interval=30.):
+        self.engine = weakref.proxy(engine)
+        self.size = size
+        self.check_interval = check_interval
+        self.stats = {'checkouts': 0, 'waits': 0, 'connections': 0,
+                      'reconnections': 0}
+        self._resources = {}
+        self._condition = threading.Condition()
+        self._settings_lock = threading.Lock()
+
+    def _module(self):
+        return self.engine.study_config.modules['SomaWorkflowConfig']
+
+    def resource_id(self):
+        '''
+        Identifier of the computing resource the engine is connected to.
+        '''
+        with self._condition:
+            return self._module().get_resource_id(self.engine.connected_to(),
+                                                  True)
+
+    def resource_settings(self, resource_id):
+        '''
+        Somaworkflow settings of a computing resource.
+
+        Selections are cached by the engine
+        :class:`~capsul.engine.settings.Settings`, and done one thread at a
+        time.
+
+        Returns
+        -------
+        environment: str
+            the resource id if it has its own settings, otherwise
+            ``'global'``
+        resource_config: dict
+            somaworkflow module settings of the resource
+        '''
+        query = 'config_id=="somaworkflow"'
+        if resource_id is not None:
+            query = 'computing_resource == "%s"' % resource_id
+        with self._settings_lock:
+            configurations = self.engine.settings.select_configurations(
+                'global', {'somaworkflow': query})
+        module = 'capsul.engine.module.somaworkflow'
+        if module in configurations:
+            return resource_id, configurations[module]
+        return 'global', {}
+
+    @staticmethod
+    def _is_alive(controller):
+        try:
+            # round trip to the workflow engine configuration
+            controller.get_scheduler_type()
+        except Exception:
+            return False
+        return True
+
+    @staticmethod
+    def _drop(controller):
+        try:
+            controller.disconnect()
+        except Exception:
+            pass
+
+    def _connect(self, resource_id, first):
+        with self._condition:
+            self.stats['connections'] += 1
+        if first:
+            # the module controller, also used by StudyConfig
+            return self._module().connect_resource(resource_id)
+        return self._module().new_workflow_controller(resource_id)
+
+    def _reconnect(self, resource_id, controller):
+        with self._condition:
+            self.stats['reconnections'] += 1
+        module = self._module()
+        if controller is module.get_workflow_controller(resource_id):
+            return module.connect_resource(resource_id, force_reconnect=True)
+        self._drop(controller)
+        return module.new_workflow_controller(resource_id)
+
+    @contextmanager
+    def controller(self, resource_id=None):
+        '''
+        Check out a connected controller for a computing resource (by
+        default the one the engine is connected to).
+
+        Example
+        -------
+        ::
+
+            with engine.controller_pool.controller() as controller:
+                status = controller.workflow_status(workflow_id)
+        '''
+        if resource_id is None:
+            resource_id = self.resource_id()
+        resource, item = self._checkout(resource_id)
+        success = False
+        try:
+            yield item[0]
+            success = True
+        finally:
+            self._checkin(resource_id, resource, item, success)
+
+    def _checkout(self, resource_id):
+        with self._condition:
+            self.stats['checkouts'] += 1
+            resource = self._resources.get(resource_id)
+            if resource is None:
+                resource = _ResourceControllers()
+                self._resources[resource_id] = resource
+            while True:
+                if resource.light:
+                    return resource, self._shared_controller(resource_id,
+                                                             resource)
+                if resource.idle:
+                    # the most recently used one is the most likely alive
+                    item = resource.idle.pop()
+                    break
+                if resource.count == 0 or (resource.light is False
+                                           and resource.count < self.size):
+                    resource.count += 1
+                    item = None
+                    break
+                # wait for a controller, or for the first connection
+                self.stats['waits'] += 1
+                self._condition.wait()
+
+        try:
+            if item is None:
+                controller = self._connect(resource_id, resource.light is None)
+                item = [controller, time.time()]
+                if resource.light is None:
+                    from soma_workflow import configuration
+
+                    light = (controller.config.get_mode()
+                             == configuration.LIGHT_MODE)
+                    with self._condition:
+                        resource.light = light
+                        if light:
+                            resource.count = 0
+                            resource.shared = controller
+                            resource.shared_check = item[1]
+                        self._condition.notify_all()
+            elif time.time() - item[1] > self.check_interval:
+                if not self._is_alive(item[0]):
+                    item[0] = self._reconnect(resource_id, item[0])
+                item[1] = time.time()
+        except Exception:
+            with self._condition:
+                if not resource.light:
+                    resource.count -= 1
+                self._condition.notify_all()
+            raise
+        if resource.light:
+            # shared: not checked out
+            return resource, [item[0], None]
+        return resource, item
+
+    def _shared_controller(self, resource_id, resource):
+        # called with the lock held
+        now = time.time()
+        if now - resource.shared_check > self.check_interval:
+            if not self._is_alive(resource.shared):
+                self.stats['reconnections'] += 1
+                resource.shared = self._module().connect_resource(
+                    resource_id, force_reconnect=True)
+            resource.shared_check = now
+        return [resource.shared, None]
+
+    def _checkin(self, resource_id, resource, item, success):
+        with self._condition:
+            if item[1] is None:
+                # shared controller
+                if not success:
+                    resource.shared_check = 0.
+                return
+            item[1] = time.time() if success else 0.
+            if self._resources.get(resource_id) is resource:
+                resource.idle.append(item)
+                self._condition.notify()
+            elif item[0] is not self._module().get_workflow_controller(
+                    resource_id):
+                # the pool has been cleared in between
+                self._drop(item[0])
+
+    def clear(self):
+        '''
+        Forget all controllers. Idle controllers are disconnected, checked
+        out ones will be when they are checked in. The controller of the
+        ``SomaWorkflowConfig`` module is left unchanged.
+        '''
+        module = self._module()
+        with self._condition:
+            resources = self._resources
+            self._resources = {}
+            for resource_id, resource in resources.items():
+                kept = module.get_workflow_controller(resource_id)
+                for controller, checked in resource.idle:
+                    if controller is not kept:
+                        self._drop(controller)
+            self._condition.notify_all()
@@ -9,15 +9,22 @@ class DatabaseEngine:
     name).
     
     To instantiate a :py:class:`DatabaseEngine` one must use the factory 
-    To date, two concrete :py:class:`DatabaseEngine` implementations exist:
+    To date, three concrete :py:class:`DatabaseEngine` implementations exist:
 
     - :py:class:`capsul.engine.database_json.JSONDBEngine`
+    - :py:class:`capsul.engine.database_sqlite.SQLiteDBEngine`
     - :py:class:`capsul.engine.database_populse.PopulseDBEngine`
     
     '''
     
     def check_path_metadata(self, path, metadata, named_directory=None):
-        named_directory = metadata.get('named_directory')
+        '''
+        Build the document stored for a path metadata. The named_directory
+        argument, if given, takes precedence over the metadata
+        named_directory item.
+        '''
+        if named_directory is None:
+            named_directory = metadata.get('named_directory')
         named_directory, path = self.check_path(path, named_directory)
         
         doc = metadata.copy()
@@ -116,6 +123,15 @@ class DatabaseEngine:
         '''
         raise NotImplementedError()
     
+    def set_paths_metadata(self, paths_metadata, named_directory=None):
+        '''
+        Set metadata associated to several paths at once. paths_metadata is
+        an iterable of (path, metadata) pairs. Engines may store them more
+        efficiently than with successive calls to set_path_metadata().
+        '''
+        for path, metadata in paths_metadata:
+            self.set_path_metadata(path, metadata, named_directory)
+
     def path_metadata(self, path, named_directory=None):
         '''
         Retrieve metadata associated with a path.
@@ -8,6 +8,42 @@ import json
 
 from capsul.engine.database import DatabaseEngine
 
+
+def load_json_database(json_filename):
+    '''
+    Read a JSON database file, as written by :py:func:`save_json_database`.
+    path_metadata are returned in a dict indexed by
+    (named_directory, path) tuples.
+    '''
+    with open(json_filename) as f:
+        json_dict = json.load(f)
+    path_metadata = json_dict.get('path_metadata')
+    if isinstance(path_metadata, list):
+        json_dict['path_metadata'] = dict(
+            ((metadata['named_directory'], metadata['path']), metadata)
+            for metadata in path_metadata)
+    return json_dict
+
+
+def save_json_database(json_dict, json_filename):
+    '''
+    Write a database dict in a JSON file. Since JSON keys are strings,
+    path_metadata are saved as a list (each item contains its path and
+    named_directory). The file is replaced atomically.
+    '''
+    path_metadata = json_dict.get('path_metadata')
+    if isinstance(path_metadata, dict):
+        json_dict = dict(json_dict)
+        json_dict['path_metadata'] = list(path_metadata.values())
+    parent = osp.dirname(json_filename)
+    if not osp.exists(parent):
+        os.makedirs(parent)
+    tmp_filename = '%s.tmp-%d' % (json_filename, os.getpid())
+    with open(tmp_filename, 'w') as f:
+        json.dump(json_dict, f, indent=2)
+    os.rename(tmp_filename, json_filename)
+
+
 class JSONDBEngine(DatabaseEngine):
     '''
     A JSON dictionary implementation of :py:class:`capsul.engine.database.DatabaseEngine`
@@ -21,7 +57,7 @@ class JSONDBEngine(DatabaseEngine):
     
     def read_json(self):
         if self.json_filename is not None and osp.exists(self.json_filename):
-            self.json_dict = json.load(open(self.json_filename))
+            self.json_dict = load_json_database(self.json_filename)
             self.modified = False
         else:
             self.json_dict = {}
@@ -29,10 +65,7 @@ class JSONDBEngine(DatabaseEngine):
             
     def commit(self):
         if self.modified and self.json_filename is not None:
-            parent = osp.dirname(self.json_filename)
-            if not osp.exists(parent):
-                os.makedirs(parent)
-            json.dump(self.json_dict, open(self.json_filename, 'w'), indent=2)
+            save_json_database(self.json_dict, self.json_filename)
             self.modified = False
 
     def rollback(self):
@@ -75,6 +108,15 @@ class JSONDBEngine(DatabaseEngine):
         self.modified = True
             
 
+    def set_paths_metadata(self, paths_metadata, named_directory=None):
+        all_metadata = self.json_dict.setdefault('path_metadata', {})
+        for path, metadata in paths_metadata:
+            metadata = self.check_path_metadata(path, metadata,
+                                                named_directory)
+            all_metadata[(metadata['named_directory'],
+                          metadata['path'])] = metadata
+        self.modified = True
+
     def path_metadata(self, path, named_directory=None):
         named_directory, path = self.check_path(path, named_directory)
         return self.json_dict.get('path_metadata', {}).get((named_directory, path))
@@ -79,8 +79,9 @@ class PopulseDBEngine(DatabaseEngine):
         with self.storage.data(write=True) as db:
             return db["json_value"][name].json_dict.get()
 
-    def set_path_metadata(self, path, metadata):
-        named_directory = metadata.get("named_directory")
+    def set_path_metadata(self, path, metadata, named_directory=None):
+        if named_directory is None:
+            named_directory = metadata.get("named_directory")
         if named_directory:
             base_path = self.named_directory("capsul_engine")
             if base_path:
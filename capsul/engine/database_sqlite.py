@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import os
+import os.path as osp
+import json
+import sqlite3
+import threading
+
+from capsul.engine.database import DatabaseEngine
+from capsul.engine.database_json import load_json_database, \
+    save_json_database
+
+
+class SQLiteDBEngine(DatabaseEngine):
+    '''
+    A SQLite implementation of :py:class:`capsul.engine.database.DatabaseEngine`
+
+    Contrarily to :py:class:`capsul.engine.database_json.JSONDBEngine`,
+    nothing is loaded at startup: values are read from the database file when
+    they are requested, and commit() only writes the entries modified since
+    the last commit. path_metadata are indexed by named directory and path.
+    The JSON format of JSONDBEngine is used to import and export the
+    database contents (see import_json() and export_json()).
+
+    Modifications are grouped in a transaction, which is ended by commit()
+    or rollback().
+    '''
+
+    schema = [
+        'CREATE TABLE IF NOT EXISTS named_directory ('
+        'name TEXT PRIMARY KEY, path TEXT NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS json_value ('
+        'name TEXT PRIMARY KEY, json TEXT)',
+        'CREATE TABLE IF NOT EXISTS path_metadata ('
+        'named_directory TEXT NOT NULL, path TEXT NOT NULL, json TEXT, '
+        'PRIMARY KEY (named_directory, path))',
+        'CREATE INDEX IF NOT EXISTS path_metadata_path '
+        'ON path_metadata (path)',
+    ]
+
+    def __init__(self, sqlite_filename):
+        if sqlite_filename is not None and sqlite_filename != ':memory:':
+            self.sqlite_filename = osp.normpath(osp.abspath(sqlite_filename))
+        else:
+            self.sqlite_filename = ':memory:'
+        self._connection = None
+        self._named_directories = None
+        self._lock = threading.RLock()
+
+    def __del__(self):
+        self.close()
+
+    @property
+    def connection(self):
+        ''' The sqlite3 connection, opened on first use
+        '''
+        with self._lock:
+            if self._connection is None:
+                if self.sqlite_filename != ':memory:':
+                    parent = osp.dirname(self.sqlite_filename)
+                    if not osp.exists(parent):
+                        os.makedirs(parent)
+                connection = sqlite3.connect(self.sqlite_filename,
+                                             check_same_thread=False)
+                if self.sqlite_filename != ':memory:':
+                    # commits append to a log instead of rewriting pages
+                    connection.execute('PRAGMA journal_mode=WAL')
+                    connection.execute('PRAGMA synchronous=NORMAL')
+                for statement in self.schema:
+                    connection.execute(statement)
+                connection.commit()
+                self._connection = connection
+            return self._connection
+
+    @property
+    def modified(self):
+        return self._connection is not None \
+            and self._connection.in_transaction
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def commit(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.commit()
+
+    def rollback(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.rollback()
+            self._named_directories = None
+
+
+    def _get_named_directories(self):
+        # named directories are few and used in each check_path() call: they
+        # are kept in memory.
+        with self._lock:
+            if self._named_directories is None:
+                self._named_directories = dict(self.connection.execute(
+                    'SELECT name, path FROM named_directory'))
+            return self._named_directories
+
+    def set_named_directory(self, name, path):
+        with self._lock:
+            named_directories = self._get_named_directories()
+            if path:
+                path = osp.normpath(osp.abspath(path))
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO named_directory (name, path) '
+                    'VALUES (?, ?)', (name, path))
+                named_directories[name] = path
+            else:
+                self.connection.execute(
+                    'DELETE FROM named_directory WHERE name = ?', (name, ))
+                named_directories.pop(name, None)
+
+    def named_directory(self, name):
+        return self._get_named_directories().get(name)
+
+    def named_directories(self):
+        return [{'name': name, 'path': path}
+                for name, path in self._get_named_directories().items()]
+
+
+    def set_json_value(self, name, json_value):
+        with self._lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO json_value (name, json) '
+                'VALUES (?, ?)', (name, json.dumps(json_value)))
+
+    def json_value(self, name):
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT json FROM json_value WHERE name = ?',
+                (name, )).fetchone()
+        if row is not None:
+            return json.loads(row[0])
+
+
+    def set_path_metadata(self, path, metadata, named_directory=None):
+        self.set_paths_metadata([(path, metadata)], named_directory)
+
+    def set_paths_metadata(self, paths_metadata, named_directory=None):
+        rows = []
+        for path, metadata in paths_metadata:
+            metadata = self.check_path_metadata(path, metadata,
+                                                named_directory)
+            rows.append((metadata['named_directory'], metadata['path'],
+                         json.dumps(metadata)))
+        with self._lock:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO path_metadata '
+                '(named_directory, path, json) VALUES (?, ?, ?)', rows)
+
+    def path_metadata(self, path, named_directory=None):
+        named_directory, path = self.check_path(path, named_directory)
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT json FROM path_metadata '
+                'WHERE named_directory = ? AND path = ?',
+                (named_directory, path)).fetchone()
+        if row is not None:
+            return json.loads(row[0])
+
+
+    def import_json(self, json_filename):
+        '''
+        Import the contents of a JSON database file (as written by
+        :py:class:`capsul.engine.database_json.JSONDBEngine`). Imported
+        values replace existing ones; commit() must be called to save them.
+        '''
+        json_dict = load_json_database(json_filename)
+        for name, named_directory \
+                in json_dict.get('named_directory', {}).items():
+            self.set_named_directory(name, named_directory['path'])
+        for name, json_value in json_dict.get('json_value', {}).items():
+            self.set_json_value(name, json_value)
+        with self._lock:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO path_metadata '
+                '(named_directory, path, json) VALUES (?, ?, ?)',
+                [(named_directory, path, json.dumps(metadata))
+                 for (named_directory, path), metadata
+                 in json_dict.get('path_metadata', {}).items()])
+
+    def export_json(self, json_filename):
+        '''
+        Write the database contents in a JSON database file, which can be
+        read by :py:class:`capsul.engine.database_json.JSONDBEngine`.
+        '''
+        with self._lock:
+            json_dict = {
+                'named_directory': dict(
+                    (name, {'name': name, 'path': path})
+                    for name, path in self._get_named_directories().items()),
+                'json_value': dict(
+                    (name, json.loads(value))
+                    for name, value in self.connection.execute(
+                        'SELECT name, json FROM json_value')),
+                'path_metadata': [
+                    json.loads(value)
+                    for value, in self.connection.execute(
+                        'SELECT json FROM path_metadata '
+                        'ORDER BY named_directory, path')],
+            }
+        save_json_database(json_dict, json_filename)
@@ -90,6 +90,9 @@ def init_settings(capsul_engine):
     store["all_foms"] = SortedDictionary()
     store["fom_atp"] = {"all": {}}
     store["fom_pta"] = {"all": {}}
+    # paths resolved by FomPathCompletionEngine.attributes_to_path()
+    store["path_cache"] = {}
+    store["path_cache_stats"] = {"hits": 0, "misses": 0}
 
     capsul_engine.settings.module_notifiers["capsul.engine.module.fom"] = [
         partial(fom_config_updated, weakref.proxy(capsul_engine), "global")
@@ -123,15 +126,27 @@ def config_dependencies(config):
 
 def config_updated(capsul_engine, environment, param=None, value=None):
     if param in (None, "directory", "shared_directory"):
+        clear_path_cache(capsul_engine)
         update_fom(capsul_engine, environment)
 
 
 def spm_config_updated(capsul_engine, environment, param=None, value=None):
     if param in (None, "directory"):
+        clear_path_cache(capsul_engine)
         update_fom(capsul_engine, environment)
 
 
+def clear_path_cache(capsul_engine):
+    """Forget the paths resolved by FOM completion (see
+    :meth:`~capsul.attributes.fom_completion_engine.FomPathCompletionEngine.attributes_to_path`)
+    """
+    store = getattr(capsul_engine, "_modules_data", {}).get("fom", {})
+    if "path_cache" in store:
+        store["path_cache"].clear()
+
+
 def fom_config_updated(capsul_engine, environment="global", param=None, value=None):
+    clear_path_cache(capsul_engine)
     if param in ("volumes_format", "meshes_format"):
         update_formats(capsul_engine, environment)
         return
@@ -212,6 +227,10 @@ def update_fom(capsul_engine, environment="global", param=None, value=None):
         capsul_engine.study_config.modules_data.all_foms = store["all_foms"]
         capsul_engine.study_config.modules_data.fom_atp = store["fom_atp"]
         capsul_engine.study_config.modules_data.fom_pta = store["fom_pta"]
+        capsul_engine.study_config.modules_data.fom_path_cache \
+            = store["path_cache"]
+        capsul_engine.study_config.modules_data.fom_path_cache_stats \
+            = store["path_cache_stats"]
 
 
 def update_formats(capsul_engine, environment):
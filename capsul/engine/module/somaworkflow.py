@@ -70,6 +70,19 @@ def init_settings(capsul_engine):
                     description="max queued jobs (overrides "
                     "soma-workflow config file settings)"
                 ),
+                dict(
+                    name="batch_jobs",
+                    type="int",
+                    description="group up to this number of small independent "
+                    "jobs into a single batched worker job (0: no batching)"
+                ),
+                dict(
+                    name="array_jobs",
+                    type="int",
+                    description="build iteration nodes as job arrays of up "
+                    "to this number of iterations per job (0: one job per "
+                    "iteration)"
+                ),
             ],
         )
     initialize_callbacks(capsul_engine)
@@ -10,30 +10,47 @@ from __future__ import absolute_import
 from __future__ import print_function
 
 from capsul.pipeline.pipeline import Pipeline
-from capsul.pipeline.pipeline_nodes import ProcessNode
 from traits.api import Undefined
 import six
 import tempfile
 import os
 import io
+import time
+from contextlib import contextmanager
+
+# maximum time a controller is held by wait(), in seconds
+_wait_slice = 5.
 
 
 class WorkflowExecutionError(Exception):
     '''
     Exception class raised when a workflow execution fails.
-    It holds references to the
-    :class:`~soma_workflow.client.WorkflowController` and the workflow id
+    It holds the workflow id, and the means to get a
+    :class:`~soma_workflow.client.WorkflowController` for it (see
+    :meth:`workflow_controller`).
+
+    When a controller pool is given, the controller used to build the error
+    message is only borrowed from it: the error then holds the pool and the
+    resource id instead of the controller, which may be used by other
+    threads once checked in.
     '''
     def __init__(self, controller, workflow_id, status=None,
-                 workflow_kept=True, verbose=True):
+                 workflow_kept=True, verbose=True, controller_pool=None,
+                 resource_id=None):
         wk = ''
         wc = ''
         precisions = ''
         if workflow_kept:
             wk = 'not '
             wc = ' from soma_workflow and must be deleted manually'
+        self.controller = None
+        self.controller_pool = None
+        self.resource_id = resource_id
         if workflow_kept:
-            self.controller = controller
+            if controller_pool is None:
+                self.controller = controller
+            else:
+                self.controller_pool = controller_pool
             self.workflow_id = workflow_id
         if verbose:
             import soma_workflow.client as swclient
@@ -112,6 +129,25 @@ class WorkflowExecutionError(Exception):
             'The workflow has %sbeen removed%s. %s'
             % (status, wk, wc, precisions))
 
+    @contextmanager
+    def workflow_controller(self):
+        '''
+        Context manager giving a controller for the failed workflow, for
+        instance to delete it::
+
+            with error.workflow_controller() as controller:
+                controller.delete_workflow(error.workflow_id)
+
+        With a controller pool, the controller is checked out of it for the
+        duration of the block.
+        '''
+        if self.controller_pool is None:
+            yield self.controller
+        else:
+            with self.controller_pool.controller(
+                    self.resource_id) as controller:
+                yield controller
+
 
 def start(engine, process, workflow=None, history=True, get_pipeline=False, **kwargs):
     '''
@@ -170,28 +206,15 @@ def start(engine, process, workflow=None, history=True, get_pipeline=False, **kw
     from capsul.pipeline.pipeline_workflow import workflow_from_pipeline
     import soma_workflow.client as swclient
 
-    swm = engine.study_config.modules['SomaWorkflowConfig']
-    swm.connect_resource(engine.connected_to())
-    controller = swm.get_workflow_controller()
-    resource_id = swm.get_resource_id()
-
-    query = 'config_id=="somaworkflow"'
-    if resource_id is not None:
-        query = f'computing_resource == "{resource_id}"'
-    resource_config_d = engine.settings.select_configurations(
-        'global', {'somaworkflow': query})
-    resource_config = resource_config_d.get(
-        'capsul.engine.module.somaworkflow', {})
-    has_resource_config = ('capsul.engine.module.somaworkflow'
-        in resource_config_d)
-
-    if has_resource_config:
-        environment = resource_id
-    else:
-        environment = 'global'
+    pool = engine.controller_pool
+    resource_id = pool.resource_id()
+    environment, resource_config = pool.resource_settings(resource_id)
 
     if workflow is None:
-        workflow = workflow_from_pipeline(process, environment=environment)
+        workflow = workflow_from_pipeline(
+            process, environment=environment,
+            batch_jobs=resource_config.get('batch_jobs') or 0,
+            array_jobs=resource_config.get('array_jobs') or 0)
 
     queue = resource_config.get('queue', None)
     max_running_jobs = resource_config.get('max_running_jobs', None)
@@ -204,25 +227,27 @@ def start(engine, process, workflow=None, history=True, get_pipeline=False, **kw
         #queue = res_conf.queue
         #if queue is Undefined:
             #queue = None
-    if max_running_jobs is not None:
-        controller.config.change_running_jobs_limits(queue, max_running_jobs)
-        if controller.config.is_local_resource(
-                controller.config._config_parser, resource_id) \
-                and controller.config.get_scheduler_type() \
-                == 'local_basic':
-            controller.scheduler_config.set_max_proc_nb(max_running_jobs)
-            controller.scheduler_config.set_proc_nb(max_running_jobs)
-    if max_queued_jobs is not None:
-        controller.config.change_queue_limits(queue, max_queued_jobs)
-        if controller.config.is_local_resource(
-                controller.config._config_parser, resource_id) \
-                and controller.config.get_scheduler_type() \
-                == 'local_basic':
-            controller.scheduler_config.set_proc_nb(max_queued_jobs)
-    workflow_name = process.name
-    wf_id = controller.submit_workflow(workflow=workflow, name=workflow_name,
-                                       queue=queue)
-    swclient.Helper.transfer_input_files(wf_id, controller)
+    with pool.controller(resource_id) as controller:
+        if max_running_jobs is not None:
+            controller.config.change_running_jobs_limits(queue,
+                                                         max_running_jobs)
+            if controller.config.is_local_resource(
+                    controller.config._config_parser, resource_id) \
+                    and controller.config.get_scheduler_type() \
+                    == 'local_basic':
+                controller.scheduler_config.set_max_proc_nb(max_running_jobs)
+                controller.scheduler_config.set_proc_nb(max_running_jobs)
+        if max_queued_jobs is not None:
+            controller.config.change_queue_limits(queue, max_queued_jobs)
+            if controller.config.is_local_resource(
+                    controller.config._config_parser, resource_id) \
+                    and controller.config.get_scheduler_type() \
+                    == 'local_basic':
+                controller.scheduler_config.set_proc_nb(max_queued_jobs)
+        workflow_name = process.name
+        wf_id = controller.submit_workflow(workflow=workflow,
+                                           name=workflow_name, queue=queue)
+        swclient.Helper.transfer_input_files(wf_id, controller)
 
     if get_pipeline:
         return wf_id, workflow.pipeline()
@@ -238,52 +263,38 @@ def wait(engine, execution_id, timeout=-1, pipeline=None):
     import soma_workflow.client as swclient
     from soma_workflow import constants
 
-    swm = engine.study_config.modules['SomaWorkflowConfig']
-    swm.connect_resource(engine.connected_to())
-    controller = swm.get_workflow_controller()
+    pool = engine.controller_pool
     wf_id = execution_id
 
-    controller.wait_workflow(wf_id, timeout=timeout)
-    workflow_status = controller.workflow_status(wf_id)
-    if workflow_status != constants.WORKFLOW_DONE:
-        # not finished
-        return workflow_status
-
-    # get output values
-    if pipeline:
-        proc_map = {}
-        todo = [pipeline]
-        while todo:
-            process = todo.pop(0)
-            if isinstance(process, Pipeline):
-                todo += [n.process for n in process.nodes.values()
-                         if n is not process.pipeline_node
-                             and isinstance(n, ProcessNode)]
-            else:
-                proc_map[id(process)] = process
-
-        eng_wf = controller.workflow(wf_id)
-        for job in eng_wf.jobs:
-            if job.has_outputs:
-                out_params = controller.get_job_output_params(
-                    eng_wf.job_mapping[job].job_id)
-                if out_params:
-                    process = proc_map.get(job.process_hash)
-                    if process is None:
-                        # iteration or non-process job
-                        continue
-                    for param in list(out_params.keys()):
-                        if process.trait(param) is None:
-                            del out_params[param]
-                    try:
-                        process.import_from_dict(out_params)
-                    except Exception as e:
-                        print('error while importing outputs in', process.name)
-                        print('outputs:', out_params)
-                        print(e)
-
-    # TODO: should we transfer if the WF fails ?
-    swclient.Helper.transfer_output_files(wf_id, controller)
+    # wait by slices, so that exclusive controllers are not held for the
+    # whole execution
+    start_time = time.time()
+    while True:
+        wait_time = _wait_slice
+        if timeout >= 0:
+            wait_time = min(wait_time,
+                            max(0, timeout - (time.time() - start_time)))
+        with pool.controller() as controller:
+            controller.wait_workflow(wf_id, timeout=wait_time)
+            workflow_status = controller.workflow_status(wf_id)
+        if workflow_status == constants.WORKFLOW_DONE:
+            break
+        if workflow_status is None or (
+                timeout >= 0 and time.time() - start_time >= timeout):
+            # unknown workflow, or not finished
+            return workflow_status
+
+    with pool.controller() as controller:
+        # get output values
+        if pipeline:
+            from capsul.pipeline.pipeline_workflow \
+                import import_workflow_outputs
+
+            import_workflow_outputs(pipeline, controller, wf_id,
+                                    ignore_errors=True)
+
+        # TODO: should we transfer if the WF fails ?
+        swclient.Helper.transfer_output_files(wf_id, controller)
     return status(engine, execution_id)
 
 
@@ -292,10 +303,8 @@ def interrupt(engine, execution_id):
     Try to stop the execution of a process. Does not wait for the process
     to be terminated.
     '''
-    swm = engine.study_config.modules['SomaWorkflowConfig']
-    swm.connect_resource(engine.connected_to())
-    controller = swm.get_workflow_controller()
-    controller.stop_workflow(execution_id)
+    with engine.controller_pool.controller() as controller:
+        controller.stop_workflow(execution_id)
 
 
 def status(engine, execution_id):
@@ -305,13 +314,13 @@ def status(engine, execution_id):
     '''
     from soma_workflow import constants
 
-    swm = engine.study_config.modules['SomaWorkflowConfig']
-    swm.connect_resource(engine.connected_to())
-    controller = swm.get_workflow_controller()
-    workflow_status = controller.workflow_status(execution_id)
+    with engine.controller_pool.controller() as controller:
+        workflow_status = controller.workflow_status(execution_id)
+        if workflow_status == constants.WORKFLOW_DONE:
+            # finished, but in which state ?
+            elements_status = controller.workflow_elements_status(
+                execution_id)
     if workflow_status == constants.WORKFLOW_DONE:
-        # finished, but in which state ?
-        elements_status = controller.workflow_elements_status(execution_id)
         failed_jobs = [element for element in elements_status[0]
                        if element[1] == constants.FAILED
                        or (element[1] == constants.DONE and
@@ -329,14 +338,23 @@ def detailed_information(engine, execution_id):
     Return complete (and possibly big) information about a process
     execution.
     '''
-    swm = engine.study_config.modules['SomaWorkflowConfig']
-    swm.connect_resource(engine.connected_to())
-    controller = swm.get_workflow_controller()
-    elements_status = controller.workflow_elements_status(execution_id)
+    with engine.controller_pool.controller() as controller:
+        elements_status = controller.workflow_elements_status(execution_id)
 
     return elements_status
 
 
+def execution_profile(engine, execution_id):
+    '''
+    Return the profile of the jobs of a process execution (see
+    :func:`capsul.utils.profiling.workflow_profile`).
+    '''
+    from capsul.utils.profiling import workflow_profile
+
+    with engine.controller_pool.controller() as controller:
+        return workflow_profile(controller, execution_id)
+
+
 def dispose(engine, execution_id, conditional=False):
     '''
     Update the database with the current state of a process execution and
@@ -360,10 +378,8 @@ def dispose(engine, execution_id, conditional=False):
                 if status != constants.WORKFLOW_DONE:
                     keep = True
     if not keep:
-        swm = engine.study_config.modules['SomaWorkflowConfig']
-        swm.connect_resource(engine.connected_to())
-        controller = swm.get_workflow_controller()
-        controller.delete_workflow(execution_id)
+        with engine.controller_pool.controller() as controller:
+            controller.delete_workflow(execution_id)
         # TODO: update engine DB
 
 
@@ -392,9 +408,11 @@ def raise_for_status(engine, status, execution_id=None):
     from soma_workflow import constants
 
     if status != constants.WORKFLOW_DONE:
-        swm = engine.study_config.modules['SomaWorkflowConfig']
-        swm.connect_resource(engine.connected_to())
-        controller = swm.get_workflow_controller()
-        raise WorkflowExecutionError(
-            controller, execution_id, status,
-            engine.study_config.somaworkflow_keep_failed_workflows)
+        pool = engine.controller_pool
+        resource_id = pool.resource_id()
+        with pool.controller(resource_id) as controller:
+            error = WorkflowExecutionError(
+                controller, execution_id, status,
+                engine.study_config.somaworkflow_keep_failed_workflows,
+                controller_pool=pool, resource_id=resource_id)
+        raise error
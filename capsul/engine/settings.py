@@ -16,6 +16,8 @@ CapsulEngine settings are organized in modules. Each module defines and document
 
 Settings cannot be used directly to configure the execution of a software. It is necessary to first select a single configuration document for each module. This configurations selection step is done by the :meth:`Settings.select_configurations` method.
 
+Selected configurations are cached, since the same selection is generally performed for many processes (when building a workflow for instance). The cache is cleared whenever settings are modified through the settings API.
+
 """
 
 #
@@ -38,6 +40,7 @@ Settings cannot be used directly to configure the execution of a software. It is
 # doc on modules activation / use ?
 #
 
+import copy
 import importlib
 from uuid import uuid4
 import sys
@@ -73,13 +76,21 @@ class Settings:
         """
         self.populse_db = populse_db
         self.module_notifiers = {}
+        # (environment, uses, check_invalid_mods) -> (configurations,
+        # number of database queries)
+        self.selection_cache = {}
+        self.selection_cache_stats = {"hits": 0, "misses": 0, "queries_avoided": 0}
 
     def __enter__(self):
         """
         Starts a session to read or write settings
         """
 
-        return SettingsSession(self.populse_db, module_notifiers=self.module_notifiers)
+        return SettingsSession(
+            self.populse_db,
+            module_notifiers=self.module_notifiers,
+            selection_cache=self.selection_cache,
+        )
 
     def __exit__(self, *args):
         pass
@@ -98,6 +109,15 @@ class Settings:
             module_name = "capsul.engine.module." + module_name
         return module_name
 
+    def clear_selection_cache(self):
+        """
+        Forget configurations selected by :meth:`select_configurations`. This
+        is done automatically when settings are modified using the settings
+        API, but has to be called if the settings database is modified by
+        other means.
+        """
+        self.selection_cache.clear()
+
     def select_configurations(self, environment, uses=None, check_invalid_mods=False):
         """
         Select a configuration for a given environment. A configuration is
@@ -127,12 +147,47 @@ class Settings:
 
             config = ce.select_configurations('my_environment',
                                               uses={'spm': 'version > 8'})
+
+        Selections are cached: the number of cache hits and misses, and of
+        database queries avoided, are counted in
+        :attr:`selection_cache_stats`.
         """
+        try:
+            key = (
+                environment,
+                None if uses is None else frozenset(uses.items()),
+                bool(check_invalid_mods),
+            )
+            cached = self.selection_cache.get(key)
+        except TypeError:
+            # unhashable queries
+            key = None
+            cached = None
+        stats = self.selection_cache_stats
+        if cached is not None:
+            stats["hits"] += 1
+            stats["queries_avoided"] += cached[1]
+            return copy.deepcopy(cached[0])
+        stats["misses"] += 1
+        configurations, queries = self._select_configurations(
+            environment, uses, check_invalid_mods
+        )
+        if key is not None:
+            self.selection_cache[key] = (copy.deepcopy(configurations), queries)
+        return configurations
+
+    def _select_configurations(self, environment, uses, check_invalid_mods):
+        """
+        Select configurations without using the cache. Returns the
+        configurations, and the number of database queries performed.
+        """
+        queries = 0
         configurations = {}
         with self as settings:
             if uses is None:
                 uses = {}
                 with settings._storage.data() as data:
+                    queries += 1
                     for collection in data.collection_names():
                         if collection.startswith(Settings.collection_prefix):
                             module_name = collection[len(Settings.collection_prefix) :]
@@ -161,6 +216,7 @@ class Settings:
                 )
                 collection = "%s%s" % (Settings.collection_prefix, module)
                 with settings._storage.data() as data:
+                    queries += 1
                     if data.has_collection(collection):
                         docs = data[collection].search(full_query)
                     else:
@@ -198,6 +254,7 @@ class Settings:
                     )
                     query_env = Settings.global_environment
                     with settings._storage.data() as data:
+                        queries += 1
                         if data.has_collection(collection):
                             docs = data[collection].search(full_query)
                         else:
@@ -253,7 +310,7 @@ class Settings:
                                 [(Settings.module_name(k), v) for k, v in d.items()]
                             )
 
-        return configurations
+        return configurations, queries
 
     def export_config_dict(self, environment=None):
         conf = {}
@@ -348,7 +405,7 @@ class SettingsSession:
     Settings use/modification session, returned by "with settings as session:"
     """
 
-    def __init__(self, populse_db_storage, module_notifiers=None):
+    def __init__(self, populse_db_storage, module_notifiers=None, selection_cache=None):
         """
         SettingsSession are created with Settings.__enter__ using a `with`
         statement.
@@ -358,6 +415,10 @@ class SettingsSession:
             self.module_notifiers = {}
         else:
             self.module_notifiers = module_notifiers
+        if selection_cache is None:
+            self.selection_cache = {}
+        else:
+            self.selection_cache = selection_cache
 
     @staticmethod
     def collection_name(module):
@@ -378,6 +439,7 @@ class SettingsSession:
         - description: the documentation of the field
         """
         collection = self.collection_name(module)
+        self.selection_cache.clear()
         with self._storage.schema() as schema:
             schema.add_collection(collection, Settings.config_id_field)
             schema.add_field(collection, Settings.environment_field, "str", index=True)
@@ -417,6 +479,7 @@ class SettingsSession:
             id,
             environment,
             notifiers=self.module_notifiers.get(Settings.module_name(module), []),
+            selection_cache=self.selection_cache,
         )
         config.notify()
         return config
@@ -430,6 +493,7 @@ class SettingsSession:
         id = "%s-%s" % (config_id, environment)
         with self._storage.data(write=True) as data:
             del data[collection][id]
+        self.selection_cache.clear()
 
     def configs(self, module, environment, selection=None):
         """
@@ -466,6 +530,7 @@ class SettingsSession:
                         notifiers=self.module_notifiers.get(
                             Settings.module_name(module), []
                         ),
+                        selection_cache=self.selection_cache,
                     )
 
     def config(self, module, environment, selection=None, any=True):
@@ -515,12 +580,21 @@ class SettingsSession:
 
 
 class SettingsConfig:
-    def __init__(self, populse_session, collection, id, environment, notifiers=[]):
+    def __init__(
+        self,
+        populse_session,
+        collection,
+        id,
+        environment,
+        notifiers=[],
+        selection_cache=None,
+    ):
         super(SettingsConfig, self).__setattr__("_storage", populse_session)
         super(SettingsConfig, self).__setattr__("_collection", collection)
         super(SettingsConfig, self).__setattr__("_environment", environment)
         super(SettingsConfig, self).__setattr__("_id", id)
         super(SettingsConfig, self).__setattr__("_notifiers", notifiers)
+        super(SettingsConfig, self).__setattr__("_selection_cache", selection_cache)
 
     def __setattr__(self, name, value):
         id = "%s-%s" % (
@@ -555,5 +629,7 @@ class SettingsConfig:
                     self.notify(name, value)
 
     def notify(self, name=None, value=None):
+        if self._selection_cache is not None:
+            self._selection_cache.clear()
         for notifier in self._notifiers:
             notifier(name, value)
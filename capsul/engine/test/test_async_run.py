@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import absolute_import
+
+import asyncio
+import time
+import unittest
+import weakref
+
+from capsul.engine import async_run
+from capsul.engine.controller_pool import WorkflowControllerPool
+from capsul.engine.test.test_controller_pool import FakeController, \
+    FakeEngine
+
+
+class StatusController(FakeController):
+    """ Controller of executions which end at given times, each with two
+    jobs.
+    """
+    end_times = {}
+
+    def workflow_status(self, workflow_id):
+        end_time = self.end_times.get(workflow_id)
+        if end_time is None:
+            raise KeyError('unknown workflow %s' % workflow_id)
+        if time.time() >= end_time:
+            return 'workflow_done'
+        return 'workflow_in_progress'
+
+    def workflow_elements_status(self, workflow_id):
+        done = self.workflow_status(workflow_id) == 'workflow_done'
+        exit_info = ('finished_regularly', 0, None, None)
+        jobs = [(workflow_id * 10, 'done', 'queue', exit_info),
+                (workflow_id * 10 + 1, 'done' if done else 'running',
+                 'queue', exit_info if done else None)]
+        return (jobs, [], [])
+
+
+class StatusEngine(FakeEngine):
+
+    def __init__(self):
+        super(StatusEngine, self).__init__('light')
+        module = self.study_config.modules['SomaWorkflowConfig']
+        module.new_workflow_controller = self.new_controller
+        self.controller_pool = WorkflowControllerPool(self)
+        self._execution_monitors = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def new_controller(resource_id=None):
+        return StatusController('light')
+
+
+class TestAsyncRun(unittest.TestCase):
+
+    def test_many_executions(self):
+        engine = StatusEngine()
+        count = 1000
+        start = time.time()
+        StatusController.end_times = dict(
+            (i + 1, start + 0.3 * i / count) for i in range(count))
+
+        async def collect(execution_id):
+            return [event async for event
+                    in async_run.execution_events(engine, execution_id)]
+
+        async def run():
+            monitor = async_run.execution_monitor(engine)
+            monitor.poll_interval = 0.05
+            results = await asyncio.gather(
+                *[collect(i + 1) for i in range(count)])
+            return results, monitor.rounds
+
+        results, rounds = asyncio.run(run())
+        for i, events in enumerate(results):
+            self.assertEqual(sorted(event.job_id for event in events
+                                    if event.kind == 'job'),
+                             [(i + 1) * 10, (i + 1) * 10 + 1])
+            self.assertEqual(events[-1].kind, 'status')
+            self.assertEqual(events[-1].status, 'workflow_done')
+        # all executions are polled together
+        self.assertTrue(rounds < 20)
+        print('%d executions supervised in %d polling rounds, %.2fs'
+              % (count, rounds, time.time() - start))
+
+    def test_unknown_execution(self):
+        engine = StatusEngine()
+        StatusController.end_times = {}
+
+        async def run():
+            return [event async for event
+                    in async_run.execution_events(engine, 12)]
+
+        self.assertRaises(KeyError, asyncio.run, run())
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestAsyncRun)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
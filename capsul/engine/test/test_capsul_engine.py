@@ -295,6 +295,42 @@ class TestCapsulEngine(unittest.TestCase):
                     {'capsul.engine.module.spm': 'version=="12"',
                      'capsul.engine.module.matlab': 'any'}}})
 
+    def test_selection_cache(self):
+        cif = self.ce.settings.config_id_field
+        with self.ce.settings as settings:
+            settings.new_config('spm', 'global', {'version': '12',
+                                                  'standalone': True,
+                                                  cif: '12'})
+        settings = self.ce.settings
+        stats = settings.selection_cache_stats
+        stats.update({'hits': 0, 'misses': 0, 'queries_avoided': 0})
+        uses = {'spm': 'version=="12"'}
+        config = settings.select_configurations('global', uses=uses)
+        self.assertEqual(config['capsul.engine.module.spm']['version'], '12')
+        # modifying the returned dict does not affect the cache
+        config['capsul.engine.module.spm']['version'] = '0'
+        for i in range(10):
+            config = settings.select_configurations('global', uses=uses)
+            self.assertEqual(config['capsul.engine.module.spm']['version'],
+                             '12')
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 10)
+        self.assertTrue(stats['queries_avoided'] >= 10)
+
+        # settings modifications invalidate the cache
+        with self.ce.settings as session:
+            session.config('spm', 'global').standalone = False
+        config = settings.select_configurations('global', uses=uses)
+        self.assertEqual(config['capsul.engine.module.spm']['standalone'],
+                         False)
+        self.assertEqual(stats['misses'], 2)
+        with self.ce.settings as session:
+            session.remove_config('spm', 'global', '12')
+        self.assertEqual(settings.select_configurations('global', uses=uses),
+                         {'capsul_engine': {'uses': {
+                             'capsul.engine.module.spm': 'version=="12"'}}})
+        self.assertEqual(stats['misses'], 3)
+
     def test_fsl_config(self):
         # fake the FSL "bet" command to have test working without FSL installed
         path = os.environ.get('PATH')
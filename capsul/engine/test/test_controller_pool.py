@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import absolute_import
+
+import threading
+import time
+import unittest
+
+from capsul.engine.controller_pool import WorkflowControllerPool
+from capsul.engine.run import WorkflowExecutionError
+
+
+class FakeConfig(object):
+
+    def __init__(self, mode):
+        self.mode = mode
+
+    def get_mode(self):
+        return self.mode
+
+
+class FakeController(object):
+    """ Controller whose calls take some time, and which cannot be used by
+    two threads at the same time (like a remote connection).
+    """
+    latency = 0.
+
+    def __init__(self, mode):
+        self.config = FakeConfig(mode)
+        self.alive = True
+        self.busy = False
+        self.connected = True
+
+    def get_scheduler_type(self):
+        if not self.alive:
+            raise RuntimeError('connection lost')
+        return 'local_basic'
+
+    def workflow_status(self, workflow_id):
+        if self.busy and self.config.mode != 'light':
+            raise RuntimeError('controller used by two threads')
+        self.busy = True
+        time.sleep(self.latency)
+        self.busy = False
+        return 'workflow_in_progress'
+
+    def disconnect(self):
+        self.connected = False
+
+
+class FakeSomaWorkflowModule(object):
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.controller = None
+        self.created = []
+
+    def get_resource_id(self, resource_id=None, set_it=False):
+        return resource_id or 'localhost'
+
+    def get_workflow_controller(self, resource_id=None):
+        return self.controller
+
+    def new_workflow_controller(self, resource_id=None):
+        controller = FakeController(self.mode)
+        self.created.append(controller)
+        return controller
+
+    def connect_resource(self, resource_id=None, force_reconnect=False):
+        if force_reconnect or self.controller is None:
+            if self.controller is not None:
+                self.controller.disconnect()
+            self.controller = self.new_workflow_controller(resource_id)
+        return self.controller
+
+
+class FakeStudyConfig(object):
+
+    def __init__(self, mode):
+        self.modules = {'SomaWorkflowConfig': FakeSomaWorkflowModule(mode)}
+
+
+class FakeEngine(object):
+
+    def __init__(self, mode='local'):
+        self.study_config = FakeStudyConfig(mode)
+
+    def connected_to(self):
+        return 'localhost'
+
+
+class TestControllerPool(unittest.TestCase):
+
+    def setUp(self):
+        FakeController.latency = 0.
+
+    def poll(self, pool, threads, polls):
+        errors = []
+
+        def run():
+            try:
+                for i in range(polls):
+                    with pool.controller() as controller:
+                        controller.workflow_status(1)
+            except Exception as e:
+                errors.append(e)
+
+        workers = [threading.Thread(target=run) for i in range(threads)]
+        start = time.time()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(errors, [])
+        return time.time() - start
+
+    def test_exclusive_checkout(self):
+        engine = FakeEngine()
+        module = engine.study_config.modules['SomaWorkflowConfig']
+        pool = WorkflowControllerPool(engine, size=3)
+        FakeController.latency = 0.002
+        self.poll(pool, 8, 10)
+        self.assertEqual(len(module.created), 3)
+        # the first one is the module controller
+        self.assertTrue(module.created[0] is module.controller)
+        self.assertEqual(pool.stats['checkouts'], 80)
+        self.assertTrue(pool.stats['waits'] > 0)
+
+    def test_health_check(self):
+        engine = FakeEngine()
+        module = engine.study_config.modules['SomaWorkflowConfig']
+        pool = WorkflowControllerPool(engine, check_interval=1000.)
+        with pool.controller() as controller:
+            pass
+        controller.alive = False
+        # recently used: not checked
+        with pool.controller() as controller2:
+            self.assertTrue(controller2 is controller)
+        # a failure forces a check on the next checkout
+        try:
+            with pool.controller() as controller2:
+                raise RuntimeError('connection lost')
+        except RuntimeError:
+            pass
+        with pool.controller() as controller3:
+            self.assertTrue(controller3 is not controller)
+            self.assertTrue(controller3.alive)
+        self.assertFalse(controller.connected)
+        # the module controller has been reconnected
+        self.assertTrue(module.controller is controller3)
+        self.assertEqual(pool.stats['reconnections'], 1)
+
+        pool.check_interval = 0.
+        controller3.alive = False
+        with pool.controller() as controller4:
+            self.assertTrue(controller4.alive)
+        self.assertEqual(pool.stats['reconnections'], 2)
+
+    def test_light_mode(self):
+        engine = FakeEngine('light')
+        module = engine.study_config.modules['SomaWorkflowConfig']
+        pool = WorkflowControllerPool(engine, size=4)
+        FakeController.latency = 0.002
+        self.poll(pool, 4, 10)
+        # a single controller is shared
+        self.assertEqual(module.created, [module.controller])
+        self.assertEqual(pool.stats['waits'], 0)
+
+    def test_clear(self):
+        engine = FakeEngine()
+        module = engine.study_config.modules['SomaWorkflowConfig']
+        pool = WorkflowControllerPool(engine, size=2)
+        with pool.controller() as controller1:
+            with pool.controller() as controller2:
+                pass
+        pool.clear()
+        # the module controller is kept
+        self.assertTrue(controller1.connected)
+        self.assertFalse(controller2.connected)
+        with pool.controller() as controller:
+            self.assertTrue(controller is controller1)
+
+    def test_execution_error(self):
+        engine = FakeEngine()
+        pool = WorkflowControllerPool(engine, size=1)
+        with pool.controller() as controller:
+            error = WorkflowExecutionError(
+                controller, 12, 'workflow_done', verbose=False,
+                controller_pool=pool, resource_id='localhost')
+        # the checked in controller is not kept by the error
+        self.assertTrue(error.controller is None)
+        self.assertEqual(error.workflow_id, 12)
+        checkouts = pool.stats['checkouts']
+        with error.workflow_controller() as controller2:
+            self.assertTrue(controller2 is controller)
+        self.assertEqual(pool.stats['checkouts'], checkouts + 1)
+
+    def test_status_polling_benchmark(self):
+        # simulated round trip to a remote soma-workflow engine
+        FakeController.latency = 0.002
+        threads = 8
+        polls = 25
+        durations = {}
+        engine = FakeEngine()
+        for size in (1, 4, 8):
+            pool = WorkflowControllerPool(engine, size=size)
+            durations[size] = self.poll(pool, threads, polls)
+            print('status polling, %d threads, %d controllers: %.0f polls/s'
+                  % (threads, size, threads * polls / durations[size]))
+        self.assertTrue(durations[4] * 2 < durations[1])
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestControllerPool)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
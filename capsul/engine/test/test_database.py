@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import tempfile
+import os.path as osp
+import shutil
+
+from capsul.engine.database_json import JSONDBEngine
+from capsul.engine.database_sqlite import SQLiteDBEngine
+
+
+class TestDatabaseEngines(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='capsul_database')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def fill(self, db):
+        db.set_named_directory('data', osp.join(self.tmpdir, 'data'))
+        db.set_json_value('settings', {'a': [1, 2]})
+        db.set_path_metadata(osp.join(self.tmpdir, 'data', 'sub1', 't1.nii'),
+                             {'subject': 'sub1'})
+        db.set_paths_metadata(
+            [('sub%d/t1.nii' % i, {'subject': 'sub%d' % i})
+             for i in range(2, 5)], named_directory='data')
+        db.set_path_metadata('/other/t1.nii', {'subject': 'other'})
+        # the named_directory argument takes precedence over the metadata
+        db.set_named_directory('other', osp.join(self.tmpdir, 'other'))
+        db.set_paths_metadata(
+            [('sub5/t1.nii', {'subject': 'sub5',
+                              'named_directory': 'other'})],
+            named_directory='data')
+        db.set_path_metadata('sub6/t1.nii', {'subject': 'sub6',
+                                             'named_directory': 'other'})
+
+    def check(self, db):
+        self.assertEqual(db.named_directory('data'),
+                         osp.join(self.tmpdir, 'data'))
+        self.assertEqual(db.json_value('settings'), {'a': [1, 2]})
+        self.assertEqual(
+            db.path_metadata(osp.join(self.tmpdir, 'data', 'sub1',
+                                      't1.nii')),
+            {'subject': 'sub1', 'named_directory': 'data',
+             'path': 'sub1/t1.nii'})
+        self.assertEqual(
+            db.path_metadata('sub3/t1.nii', 'data')['subject'], 'sub3')
+        self.assertEqual(
+            db.path_metadata('/other/t1.nii')['named_directory'], 'absolute')
+        self.assertEqual(db.path_metadata('sub9/t1.nii', 'data'), None)
+        self.assertEqual(
+            db.path_metadata('sub5/t1.nii', 'data')['subject'], 'sub5')
+        self.assertEqual(db.path_metadata('sub5/t1.nii', 'other'), None)
+        self.assertEqual(
+            db.path_metadata('sub6/t1.nii', 'other')['subject'], 'sub6')
+
+    def test_json_engine(self):
+        json_file = osp.join(self.tmpdir, 'db', 'capsul.json')
+        db = JSONDBEngine(json_file)
+        self.fill(db)
+        db.commit()
+        # path metadata keys are tuples, they must survive a JSON round-trip
+        self.check(JSONDBEngine(json_file))
+
+    def test_sqlite_engine(self):
+        sqlite_file = osp.join(self.tmpdir, 'db', 'capsul.sqlite')
+        db = SQLiteDBEngine(sqlite_file)
+        self.fill(db)
+        self.assertTrue(db.modified)
+        self.check(db)
+        db.commit()
+        self.assertFalse(db.modified)
+        db.set_path_metadata('/other/t2.nii', {'subject': 'other'})
+        db.rollback()
+        self.assertEqual(db.path_metadata('/other/t2.nii'), None)
+        db.close()
+        self.check(SQLiteDBEngine(sqlite_file))
+
+    def test_json_import_export(self):
+        db = SQLiteDBEngine(':memory:')
+        self.fill(db)
+        json_file = osp.join(self.tmpdir, 'capsul.json')
+        db.export_json(json_file)
+        self.check(JSONDBEngine(json_file))
+        db2 = SQLiteDBEngine(':memory:')
+        db2.import_json(json_file)
+        self.check(db2)
+
+
+def test():
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestDatabaseEngines)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
@@ -0,0 +1,447 @@
+# -*- coding: utf-8 -*-
+'''
+Incremental computation of pipeline nodes and plugs activations.
+
+The activation rules are the ones described in
+:meth:`Pipeline.update_nodes_and_plugs_activation
+<capsul.pipeline.pipeline.Pipeline.update_nodes_and_plugs_activation>`:
+
+* a forward pass activates nodes and plugs which can be reached from the
+  pipeline inputs (or default values) through enabled nodes and plugs;
+* a backward pass deactivates plugs and nodes which do not form a complete
+  chain.
+
+The forward pass is a least fixpoint and the backward pass is a greatest
+fixpoint below the forward result. Both are monotonic, which allows to
+recompute them only around the nodes which have changed ("dirty" nodes)
+while getting exactly the same result as a full recomputation.
+
+Classes
+=======
+:class:`ActivationEngine`
+-------------------------
+'''
+
+from __future__ import absolute_import
+
+import itertools
+import six
+
+from soma.utils.weak_proxy import weak_proxy
+
+from .pipeline_nodes import Plug
+from .pipeline_nodes import Node
+from .pipeline_nodes import PipelineNode
+
+
+class ActivationEngine(object):
+    """ Keeps the activation state of all nodes and plugs of a top-level
+    pipeline, and updates it incrementally.
+
+    The engine stores:
+
+    * the forward pass activation state (which is not visible on nodes and
+      plugs since it is modified by the backward pass),
+    * the final activation state, which is mirrored on the ``activated``
+      traits of nodes and plugs,
+    * an index of all nodes and plugs of the pipeline (including nodes of
+      sub-pipelines) which allows to find the node a plug belongs to.
+
+    Nodes whose local state has changed (``enabled`` flags, links, switch
+    values) are recorded using :meth:`mark_dirty`. Structural changes which
+    are not tracked node by node (nodes added or removed, plugs created...)
+    should be signaled using :meth:`invalidate`: the next update will then
+    be a full recomputation.
+
+    Attributes
+    ----------
+    nodes: list
+        all pipeline nodes, in the order of
+        :meth:`Pipeline.all_nodes() <capsul.pipeline.pipeline.Pipeline.all_nodes>`
+    forward: set
+        nodes and plugs activated by the forward pass
+    active: set
+        nodes and plugs activated after the backward pass
+    stats: dict
+        counters of full and incremental updates, and of nodes visited by
+        incremental updates
+    """
+
+    def __init__(self, pipeline):
+        self.pipeline = weak_proxy(pipeline)
+        self.nodes = []
+        self.forward = set()
+        self.active = set()
+        self.stats = {'full_updates': 0, 'incremental_updates': 0,
+                      'checked_nodes': 0}
+        self._node_index = {}
+        self._plug_owner = {}
+        self._dirty = set()
+        self._valid = False
+
+    def invalidate(self):
+        """ Force a full recomputation on next update
+        """
+        self._valid = False
+        self._dirty = set()
+
+    def mark_dirty(self, obj):
+        """ Record a node (or the node of a plug) which local state has
+        changed.
+
+        Unknown objects (not indexed yet, or which are neither nodes nor
+        plugs) invalidate the whole state.
+        """
+        if not self._valid:
+            return
+        if isinstance(obj, Plug):
+            owner = self._plug_owner.get(obj)
+            if owner is not None:
+                self._dirty.add(owner[0])
+                return
+        elif isinstance(obj, Node) and obj in self._node_index:
+            self._dirty.add(obj)
+            return
+        self.invalidate()
+
+    @property
+    def pending(self):
+        """ True if some changes have not been taken into account yet
+        """
+        return not self._valid or bool(self._dirty)
+
+    def update(self):
+        """ Update activations, either incrementally from dirty nodes, or
+        completely if the engine state has been invalidated.
+
+        The ``activated`` traits of nodes and plugs which state has changed
+        are updated, and values are propagated through links which have
+        become active.
+        """
+        if not self._valid:
+            self._full_update()
+        elif self._dirty:
+            self._incremental_update()
+
+    def check(self):
+        """ Compare the engine state with the ``activated`` traits of nodes
+        and plugs.
+
+        Returns
+        -------
+        differences: list of str
+            names of nodes and plugs which states differ
+        """
+        differences = []
+        for node in self.nodes:
+            if node.activated != (node in self.active):
+                differences.append(node.full_name)
+            for plug_name, plug in six.iteritems(node.plugs):
+                if plug.activated != (plug in self.active):
+                    differences.append('%s.%s' % (node.full_name, plug_name))
+        return differences
+
+    def _build_index(self):
+        self.nodes = list(self.pipeline.all_nodes())
+        self._node_index = {}
+        self._plug_owner = {}
+        for index, node in enumerate(self.nodes):
+            self._node_index[node] = index
+            for rank, (plug_name, plug) in enumerate(six.iteritems(
+                    node.plugs)):
+                self._plug_owner[plug] = (node, plug_name, rank)
+
+    def _full_update(self):
+        self._build_index()
+        self._dirty = set()
+        old_active = set()
+        for node in self.nodes:
+            if node.activated:
+                old_active.add(node)
+            for plug in six.itervalues(node.plugs):
+                if plug.activated:
+                    old_active.add(plug)
+        forward = set()
+        self._propagate_forward(self.nodes, forward)
+        active = set(forward)
+        self._propagate_backward(self.nodes, active)
+        self.forward = forward
+        self.active = active
+        self._valid = True
+        self.stats['full_updates'] += 1
+        self._apply(old_active)
+
+    def _incremental_update(self):
+        dirty = self._dirty
+        self._dirty = set()
+        top = self.pipeline.pipeline_node
+        forward = self.forward
+        old_forward = set(forward)
+        old_active = set(self.active)
+
+        # Forward pass, "delete and rederive": reset the dirty nodes and
+        # all nodes which forward state may derive from them, then
+        # propagate activations again from there.
+        todo = []
+        to_check = set()
+        if top in dirty:
+            # the pipeline node state does not depend on other nodes: only
+            # its changed plugs have to be propagated.
+            top_facts = [top] + list(six.itervalues(top.plugs))
+            for fact in top_facts:
+                forward.discard(fact)
+            for plug in self._forward_node(top, forward):
+                if plug in old_forward:
+                    continue
+                for link in itertools.chain(plug.links_to, plug.links_from):
+                    if not link[4] and link[3].enabled:
+                        to_check.add(link[2])
+            for fact in top_facts:
+                if isinstance(fact, Plug) and fact in old_forward \
+                        and fact not in forward:
+                    todo.extend(link[2] for link in fact.links_to
+                                if link[3] in forward)
+        todo.extend(dirty)
+        reset = set()
+        while todo:
+            node = todo.pop()
+            if node in reset or node is top:
+                continue
+            reset.add(node)
+            for plug in six.itervalues(node.plugs):
+                if plug in forward:
+                    todo.extend(link[2] for link in plug.links_to
+                                if link[3] in forward)
+        for node in reset:
+            forward.discard(node)
+            forward.difference_update(six.itervalues(node.plugs))
+        to_check.update(reset)
+        self._propagate_forward(to_check, forward)
+        self.stats['checked_nodes'] += len(to_check)
+
+        # Backward pass: start from the previous final state restricted to
+        # the new forward state, and reactivate the facts which may have
+        # regained a support because they are connected to a changed one.
+        changed = set()
+        for fact in old_forward.symmetric_difference(forward):
+            changed.add(self._node_of(fact))
+        changed.update(dirty)
+        active = self.active
+        to_check = set(changed)
+        removed = [fact for fact in old_forward.difference(forward)
+                   if fact in active]
+        for fact in removed:
+            active.discard(fact)
+            to_check.add(self._node_of(fact))
+            if isinstance(fact, Plug):
+                to_check.update(link[2] for link in itertools.chain(
+                    fact.links_to, fact.links_from))
+        seeds = []
+        for node in changed:
+            if node in forward:
+                seeds.append(node)
+            seeds.extend(plug for plug in six.itervalues(node.plugs)
+                         if plug in forward)
+        regained = set(seeds)
+        while seeds:
+            fact = seeds.pop()
+            if isinstance(fact, Plug):
+                neighbours = [self._node_of(fact)] \
+                    + [link[3] for link in itertools.chain(fact.links_to,
+                                                           fact.links_from)]
+            else:
+                neighbours = six.itervalues(fact.plugs)
+            for neighbour in neighbours:
+                if neighbour not in regained and neighbour in forward \
+                        and neighbour not in old_active:
+                    regained.add(neighbour)
+                    seeds.append(neighbour)
+        for fact in regained:
+            if fact not in active:
+                active.add(fact)
+                to_check.add(self._node_of(fact))
+        self._propagate_backward(to_check, active)
+        self.stats['checked_nodes'] += len(to_check)
+        self.stats['incremental_updates'] += 1
+        self._apply(old_active)
+
+    def _node_of(self, fact):
+        if isinstance(fact, Plug):
+            return self._plug_owner[fact][0]
+        return fact
+
+    def _apply(self, old_active):
+        """ Set ``activated`` traits which have changed, and propagate values
+        through links which have become active.
+        """
+        active = self.active
+        changed = old_active.symmetric_difference(active)
+        activated_links = set()
+        for fact in changed:
+            state = fact in active
+            if fact.activated != state:
+                fact.activated = state
+            if state and isinstance(fact, Plug):
+                node, plug_name, rank = self._plug_owner[fact]
+                for nn, pn, n, p, weak_link in fact.links_to:
+                    if p in active:
+                        activated_links.add((node, plug_name, rank, n, pn))
+                for nn, pn, n, p, weak_link in fact.links_from:
+                    if p in active:
+                        activated_links.add(
+                            (n, pn, self._plug_owner[p][2], node, plug_name))
+        if not activated_links:
+            return
+        node_index = self._node_index
+        for node, plug_name, rank, n, pn in sorted(
+                activated_links, key=lambda l: (node_index[l[0]], l[2])):
+            callback = node._callbacks.get((plug_name, n, pn))
+            if callback is None:
+                # the link is being built (see Pipeline.add_link), values
+                # are propagated there.
+                continue
+            callback(node.get_plug_value(plug_name))
+
+    def _forward_node(self, node, forward):
+        """ Try to activate a node and its plugs according to its state and
+        the forward state of its direct neighbouring nodes.
+
+        Returns the list of newly activated plugs.
+        """
+        plugs_activated = []
+        # If a node is disabled, it will never be activated
+        if not node.enabled:
+            return plugs_activated
+        node_activated = True
+        if node is self.pipeline.pipeline_node:
+            # For the top-level pipeline node, all enabled plugs are
+            # activated
+            for plug in six.itervalues(node.plugs):
+                if plug.enabled and plug not in forward:
+                    forward.add(plug)
+                    plugs_activated.append(plug)
+        else:
+            for plug in six.itervalues(node.plugs):
+                if plug.output:
+                    continue
+                if plug.enabled and plug not in forward:
+                    if plug.has_default_value:
+                        forward.add(plug)
+                        plugs_activated.append(plug)
+                    else:
+                        # Look for a non weak link connected to an activated
+                        # plug
+                        for nn, pn, n, p, weak_link in plug.links_from:
+                            if not weak_link and p in forward:
+                                forward.add(plug)
+                                plugs_activated.append(plug)
+                                break
+                if plug not in forward and not plug.optional:
+                    node_activated = False
+        if node_activated:
+            forward.add(node)
+            for plug in six.itervalues(node.plugs):
+                if plug.output and plug.enabled and plug not in forward:
+                    forward.add(plug)
+                    plugs_activated.append(plug)
+        return plugs_activated
+
+    def _propagate_forward(self, nodes_to_check, forward):
+        while nodes_to_check:
+            new_nodes_to_check = set()
+            for node in nodes_to_check:
+                for plug in self._forward_node(node, forward):
+                    for nn, pn, n, p, weak_link in itertools.chain(
+                            plug.links_to, plug.links_from):
+                        if not weak_link and p.enabled:
+                            new_nodes_to_check.add(n)
+            nodes_to_check = new_nodes_to_check
+
+    @staticmethod
+    def _check_plug_activation(links, active):
+        # True if there is a non weak link connected to an activated plug,
+        # False if there are non weak links that are all connected to
+        # inactive plugs. If there is no non weak link, weak links define
+        # the activation state.
+        plug_activated = None
+        weak_activation = False
+        for nn, pn, n, p, weak_link in links:
+            if weak_link:
+                weak_activation = (weak_activation or p in active)
+            elif p in active:
+                return True
+            else:
+                plug_activated = False
+        if plug_activated is None:
+            plug_activated = weak_activation
+        return plug_activated
+
+    def _backward_node(self, node, active):
+        """ Deactivate plugs of a node which are not supported by activated
+        neighbours any longer, and the node itself if needed.
+
+        Returns the list of deactivated plugs.
+        """
+        plugs_deactivated = []
+        if node not in active:
+            return plugs_deactivated
+        top = self.pipeline.pipeline_node
+        check = self._check_plug_activation
+        deactivate_node = bool([plug for plug in six.itervalues(node.plugs)
+                                if plug.output])
+        for plug in six.itervalues(node.plugs):
+            try:
+                if plug in active:
+                    # A plug with a default value is always activated
+                    if plug.has_default_value:
+                        continue
+                    output = plug.output
+                    if isinstance(node, PipelineNode) and node is not top \
+                            and output:
+                        plug_activated = (
+                            check(plug.links_to, active)
+                            and check(plug.links_from, active))
+                    else:
+                        if node is top:
+                            output = not output
+                        if output:
+                            plug_activated = check(plug.links_to, active)
+                        else:
+                            plug_activated = check(plug.links_from, active)
+                    if not plug_activated:
+                        active.discard(plug)
+                        plugs_deactivated.append(plug)
+                        if not (plug.optional or node is top):
+                            active.discard(node)
+                            break
+            finally:
+                if plug.output and plug in active:
+                    deactivate_node = False
+        if deactivate_node:
+            active.discard(node)
+            for plug in six.itervalues(node.plugs):
+                if plug in active:
+                    active.discard(plug)
+                    plugs_deactivated.append(plug)
+        return plugs_deactivated
+
+    def _propagate_backward(self, nodes_to_check, active):
+        while nodes_to_check:
+            new_nodes_to_check = set()
+            for node in nodes_to_check:
+                deactivated = self._backward_node(node, active)
+                if not deactivated:
+                    continue
+                if node not in active:
+                    # If the node has been deactivated, force deactivation
+                    # of all plugs that are still active
+                    for plug in six.itervalues(node.plugs):
+                        if plug in active:
+                            active.discard(plug)
+                            deactivated.append(plug)
+                for plug in deactivated:
+                    for nn, pn, n, p, weak_link in itertools.chain(
+                            plug.links_from, plug.links_to):
+                        if p in active:
+                            new_nodes_to_check.add(n)
+            nodes_to_check = new_nodes_to_check
@@ -101,6 +101,7 @@ class MapNode(Node):
             self.plugs[pname] = plug
             plug.on_trait_change(
                 self.pipeline.update_nodes_and_plugs_activation, "enabled")
+            self.pipeline._mark_activations_dirty()
         for i, val in enumerate(value):
             setattr(self, output % i, val)
         # update lengths
@@ -118,6 +118,7 @@ class ReduceNode(Node):
                 self.plugs[pname] = plug
                 plug.on_trait_change(
                     self.pipeline.update_nodes_and_plugs_activation, "enabled")
+                self.pipeline._mark_activations_dirty()
             if oval != val:
                 ovalue = [getattr(self, pname_p % i) for i in range(val)]
                 if isinstance(ptype,
@@ -149,6 +149,10 @@ def create_json_pipeline(module, name, json_file):
             for plug_name, state in child.items():
                 for key, value in state.items():
                     builder.add_plug_state(plug_name, key, value)
+        elif child_name == 'state':
+            for node_name, state in child.items():
+                for key, value in state.items():
+                    builder.add_node_state(node_name, key, value)
         elif child_name == 'parameters':
             for key, value in child.items():
                 node_key = key.rsplit('.', 1)
@@ -466,7 +470,7 @@ def save_json_pipeline(pipeline, json_file):
             else:
                 xmlnode = _write_custom_node(node, root, node_name)
             if not node.enabled:
-                xmlnode.set('enabled', 'false')
+                xmlnode['enabled'] = 'false'
 
     def _write_links(pipeline, root):
         for node_name, node in pipeline.nodes.items():
@@ -12,6 +12,8 @@ from __future__ import absolute_import
 
 # System import
 import logging
+import heapq
+from contextlib import contextmanager
 from copy import deepcopy
 import tempfile
 import os
@@ -40,6 +42,8 @@ except ImportError:
 from capsul.process.process import Process, NipypeProcess
 from .topological_sort import GraphNode
 from .topological_sort import Graph
+from .topological_sort import CompiledGraph
+from .activation_engine import ActivationEngine
 from .pipeline_nodes import Plug
 from .pipeline_nodes import ProcessNode
 from .pipeline_nodes import PipelineNode
@@ -53,6 +57,138 @@ from soma.controller.trait_utils import relax_exists_constraint
 from soma.sorted_dictionary import SortedDictionary
 from soma.utils.functiontools import SomaPartial
 
+class _BatchPropagation(object):
+    """ Propagation of values through links at the end of a
+    :meth:`Pipeline.batch_update` block.
+
+    Links are bidirectional, so plugs connected by links form groups which
+    share the same value. Each modified group is propagated once, in
+    topological order (nodes outputs come after their inputs), using the
+    value of its latest assignment, so that the final state is the same as
+    if values had been propagated at each assignment.
+    """
+
+    def __init__(self, pipeline):
+        # links from each plug, (id(node), plug_name) being used as plug key
+        self.links = {}
+        # plug key -> group index
+        self.groups = {}
+        parents = {}
+
+        def find(key):
+            root = key
+            while parents[root] != root:
+                root = parents[root]
+            while parents[key] != root:
+                parents[key], key = root, parents[key]
+            return root
+
+        nodes = list(pipeline.all_nodes())
+        for node in nodes:
+            for plug_name in node.plugs:
+                key = (id(node), plug_name)
+                parents[key] = key
+        for node in nodes:
+            for source_plug_name, dest_node, dest_plug_name \
+                    in node._callbacks:
+                dest_node = get_ref(dest_node)
+                key = (id(node), source_plug_name)
+                dest_key = (id(dest_node), dest_plug_name)
+                self.links.setdefault(key, []).append(
+                    (node, source_plug_name, dest_node, dest_plug_name,
+                     dest_key))
+                parents.setdefault(key, key)
+                parents.setdefault(dest_key, dest_key)
+                parents[find(key)] = find(dest_key)
+        roots = {}
+        for key in parents:
+            self.groups[key] = roots.setdefault(find(key), len(roots))
+
+        # rank groups in topological order: node outputs may be computed
+        # from its inputs (except for pipelines, which use links)
+        successors = {}
+        predecessors_count = dict((group, 0) for group in range(len(roots)))
+        for node in nodes:
+            if isinstance(node, PipelineNode):
+                continue
+            inputs = set()
+            outputs = set()
+            for plug_name, plug in six.iteritems(node.plugs):
+                group = self.groups[(id(node), plug_name)]
+                if plug.output:
+                    outputs.add(group)
+                else:
+                    inputs.add(group)
+            for group in inputs:
+                for dest_group in outputs:
+                    if dest_group != group:
+                        successors.setdefault(group, []).append(dest_group)
+                        predecessors_count[dest_group] += 1
+        self.rank = {}
+        ready = [group for group, count in six.iteritems(predecessors_count)
+                 if count == 0]
+        while ready:
+            group = ready.pop()
+            self.rank[group] = len(self.rank)
+            for dest_group in successors.get(group, ()):
+                predecessors_count[dest_group] -= 1
+                if predecessors_count[dest_group] == 0:
+                    ready.append(dest_group)
+
+        self.heap = []
+        # group -> (time, node, plug_name) of the latest assignment
+        self.latest = {}
+        self.current = None
+        self.changed = []
+        self.time = 0
+
+    def record(self, node, plug_name, time=None):
+        """ Record a plug value change.
+        """
+        key = (id(node), plug_name)
+        group = self.groups.get(key)
+        if group is None:
+            return
+        if group == self.current:
+            # change caused by the current group propagation
+            self.changed.append(key)
+            return
+        if time is None:
+            time = self.time
+        latest = self.latest.get(group)
+        if latest is None:
+            heapq.heappush(self.heap, (self.rank.get(group, len(self.rank)),
+                                       group))
+        if latest is None or time >= latest[0]:
+            self.latest[group] = (time, node, plug_name)
+
+    def run(self, pending):
+        """ Propagate values from a list of (node, plug_name, time) changes.
+        """
+        for node, plug_name, time in pending:
+            self.record(node, plug_name, time)
+        while self.heap:
+            group = heapq.heappop(self.heap)[1]
+            self.time, node, plug_name = self.latest.pop(group)
+            self.current = group
+            key = (id(node), plug_name)
+            done = set([key])
+            keys = [key]
+            while keys:
+                for node, plug_name, dest_node, dest_plug_name, dest_key \
+                        in self.links.get(keys.pop(), ()):
+                    if dest_key in done:
+                        continue
+                    done.add(dest_key)
+                    node._propagate_value(plug_name, dest_node,
+                                          dest_plug_name,
+                                          node.get_plug_value(plug_name))
+                # go on from the plugs which have actually changed
+                keys += self.changed
+                self.changed = []
+            self.current = None
+
+
 class Pipeline(Process):
     """ Pipeline containing Process nodes, and links between node parameters.
 
@@ -159,6 +295,7 @@ class Pipeline(Process):
     * :meth:`get_pipeline_step_nodes`
     * :meth:`find_empty_parameters`
     * :meth:`count_items`
+    * :meth:`batch_update`
 
     Attributes
     ----------
@@ -209,6 +346,10 @@ class Pipeline(Process):
     # this value to False will make it visible.
     hide_nodes_activation = True
 
+    # When set, each incremental update of nodes and plugs activations is
+    # checked against a full recomputation (slow, for debugging / testing).
+    verify_activations = False
+
     def __init__(self, autoexport_nodes_parameters=None, **kwargs):
         """ Initialize the Pipeline class
 
@@ -249,6 +390,12 @@ class Pipeline(Process):
         #########################################################
             
             
+        self._activation_engine = ActivationEngine(self)
+        self._compiled_workflow_graphs = {}
+        self._batch_update_depth = 0
+        self._batch_pending = OrderedDict()
+        self._batch_propagation = None
+        self._batch_time = 0
         self.pipeline_node = PipelineNode(self, '', self)
         self.nodes[''] = self.pipeline_node
         self.do_not_export = set()
@@ -335,6 +482,7 @@ class Pipeline(Process):
             self.pipeline_node.plugs[name] = plug
             plug.on_trait_change(self.update_nodes_and_plugs_activation,
                                  'enabled')
+            self._mark_activations_dirty()
 
     def remove_trait(self, name):
         """ Remove a trait to the pipeline
@@ -363,6 +511,7 @@ class Pipeline(Process):
                 for link in links_to_remove:    
                     self.remove_link(link)
                 del self.pipeline_node.plugs[name]
+                self._mark_activations_dirty()
 
         # Remove the trait
         super(Pipeline, self).remove_trait(name)
@@ -568,6 +717,7 @@ class Pipeline(Process):
 
         # Add new node in pipeline process list to keep its life
         self.list_process_in_pipeline.append(process)
+        self._mark_activations_dirty()
 
     def remove_node(self, node_name):
         """ Remove a node from the pipeline
@@ -592,6 +742,7 @@ class Pipeline(Process):
             self.nodes_activation.on_trait_change(
                 self._set_node_enabled, node_name, remove=True)
             self.nodes_activation.remove_trait(node_name)
+        self._mark_activations_dirty()
 
     def add_iterative_process(self, name, process, iterative_plugs=None,
                               do_not_export=None, make_optional=None,
@@ -728,6 +879,7 @@ class Pipeline(Process):
         if opt_nodes:
             node._optional_input_nodes = opt_inputs
         self.nodes[name] = node
+        self._mark_activations_dirty()
 
         # Export the switch controller to the pipeline node
         if export_switch:
@@ -800,6 +952,7 @@ class Pipeline(Process):
         # Create the node
         node = OptionalOutputSwitch(self, name, input, output)
         self.nodes[name] = node
+        self._mark_activations_dirty()
 
         self._set_subprocess_context_name(node, name)
         study_config = getattr(self, 'study_config', None)
@@ -843,6 +996,7 @@ class Pipeline(Process):
                 "could not build a Node of type '%s' with the given parameters"
                 % node_type)
         self.nodes[name] = node
+        self._mark_activations_dirty()
 
         do_not_export = set(do_not_export or [])
         do_not_export.update(kwargs)
@@ -1105,7 +1259,8 @@ class Pipeline(Process):
         dest_node.connect(dest_plug_name, source_node, source_plug_name)
 
         # Refresh pipeline activation
-        self.update_nodes_and_plugs_activation()
+        self._mark_activations_dirty([source_node, dest_node])
+        self._update_activations()
 
     def remove_link(self, link):
         """ Remove a link between pipeline nodes
@@ -1159,7 +1314,8 @@ class Pipeline(Process):
         dest_node.disconnect(dest_plug_name, source_node, source_plug_name)
 
         # Refresh pipeline activation
-        self.update_nodes_and_plugs_activation()
+        self._mark_activations_dirty([source_node, dest_node])
+        self._update_activations()
 
     def export_parameter(self, node_name, plug_name,
                          pipeline_parameter=None, weak_link=False,
@@ -1484,27 +1640,182 @@ class Pipeline(Process):
         self._disable_update_nodes_and_plugs_activation -= 1
         if self._disable_update_nodes_and_plugs_activation == 0 and \
                 self._must_update_nodes_and_plugs_activation:
-            self.update_nodes_and_plugs_activation()
+            self._update_activations()
+
+    @contextmanager
+    def batch_update(self):
+        """ Context manager which delays the propagation of parameters values
+        through links, and nodes activations updates, until the end of the
+        block::
+
+            with pipeline.batch_update():
+                pipeline.import_from_dict(values)
+
+        Values set in the block are propagated once when leaving it,
+        following the links in topological order, then activations are
+        updated once. Within the block, nodes downstream of the modified
+        parameters still hold their former values.
+
+        Batch updates are managed by the top-level pipeline, and may be
+        nested: propagation happens when leaving the outermost block.
+
+        The resulting state is the same as when values are propagated at each
+        assignment, except when a switch selection and values which are
+        propagated backwards through this switch (from its outputs) are
+        changed in the same block.
+        """
+        top_pipeline = self
+        while top_pipeline.parent_pipeline is not None:
+            top_pipeline = top_pipeline.parent_pipeline
+        top_pipeline.delay_update_nodes_and_plugs_activation()
+        top_pipeline._batch_update_depth += 1
+        try:
+            yield self
+        finally:
+            try:
+                if top_pipeline._batch_update_depth == 1:
+                    top_pipeline._propagate_batch_update()
+            finally:
+                top_pipeline._batch_update_depth -= 1
+                top_pipeline.restore_update_nodes_and_plugs_activation()
+
+    def import_from_dict(self, state_dict, clear=False):
+        """ Set parameters values from a dictionary, in a
+        :meth:`batch_update` block.
+        """
+        with self.batch_update():
+            super(Pipeline, self).import_from_dict(state_dict, clear=clear)
 
-    def update_nodes_and_plugs_activation(self):
-        """ Reset all nodes and plugs activations according to the current
+    def _delay_link_propagation(self, node, plug_name):
+        """ Record a plug value change, to be propagated through links when
+        the current :meth:`batch_update` block ends.
+
+        Returns False (and records nothing) if no batch update is in
+        progress.
+        """
+        if self.parent_pipeline is not None:
+            return self.parent_pipeline._delay_link_propagation(node,
+                                                                plug_name)
+        if not getattr(self, '_batch_update_depth', 0):
+            return False
+        node = get_ref(node)
+        if self._batch_propagation is not None:
+            self._batch_propagation.record(node, plug_name)
+        else:
+            key = (id(node), plug_name)
+            # a new assignment supersedes the former ones
+            self._batch_pending.pop(key, None)
+            self._batch_time += 1
+            self._batch_pending[key] = (node, plug_name, self._batch_time)
+        return True
+
+    def _propagate_batch_update(self):
+        """ Propagate values recorded during a :meth:`batch_update` block
+        through links.
+        """
+        if not self._batch_pending:
+            return
+        pending = list(six.itervalues(self._batch_pending))
+        self._batch_pending.clear()
+        self._batch_time = 0
+        self._batch_propagation = _BatchPropagation(self)
+        try:
+            self._batch_propagation.run(pending)
+        finally:
+            self._batch_propagation = None
+
+    def update_nodes_and_plugs_activation(self, object=None, name=None,
+                                          old=None, new=None):
+        """ Update all nodes and plugs activations according to the current
         state of the pipeline (i.e. switch selection, nodes disabled, etc.).
         Activations are set according to the following rules.
+
+        This method is also used as a callback on nodes and plugs ``enabled``
+        traits. In this case only the activations which may depend on the
+        modified node or plug are recomputed (see
+        :class:`~capsul.pipeline.activation_engine.ActivationEngine`).
+        When called without parameters, all activations are recomputed.
+
+        Parameters
+        ----------
+        object: Node or Plug (optional)
+            node or plug which state has changed.
+        name, old, new:
+            unused, trait notification parameters.
         """
         if not hasattr(self, 'parent_pipeline'):
             # self is being initialized (the call comes from self.__init__).
             return
+        if object is None:
+            self._mark_activations_dirty()
+        else:
+            self._mark_activations_dirty([object])
+        self._update_activations()
+
+    def _mark_activations_dirty(self, objects=None):
+        """ Record nodes or plugs which activation state has to be updated.
+
+        If objects is None, all activations will be recomputed.
+        """
+        if self.parent_pipeline is not None:
+            # Only the top level pipeline can manage activations
+            self.parent_pipeline._mark_activations_dirty(objects)
+            return
+        self._compiled_workflow_graphs.clear()
+        if objects is None:
+            self._activation_engine.invalidate()
+        else:
+            for obj in objects:
+                self._activation_engine.mark_dirty(obj)
+
+    def _update_activations(self):
+        """ Update nodes and plugs activations which have been marked dirty
+        using :meth:`_mark_activations_dirty`, unless updates are currently
+        delayed.
+        """
         if self.parent_pipeline is not None:
             # Only the top level pipeline can manage activations
-            self.parent_pipeline.update_nodes_and_plugs_activation()
+            self.parent_pipeline._update_activations()
             return
         if self._disable_update_nodes_and_plugs_activation:
             self._must_update_nodes_and_plugs_activation = True
             return
 
         self._disable_update_nodes_and_plugs_activation += 1
+        # workflow graphs may have been compiled while updates were delayed
+        self._compiled_workflow_graphs.clear()
 
+        engine = self._activation_engine
         debug = getattr(self, '_debug_activations', None)
+        if debug:
+            # the activations recording needs the full algorithm
+            self._full_update_nodes_and_plugs_activation(debug)
+            engine.invalidate()
+        else:
+            engine.update()
+            # Refresh views relying on plugs and nodes selection
+            for node in engine.nodes:
+                if isinstance(node, PipelineNode):
+                    node.process.selection_changed = True
+            if self.verify_activations and not engine.pending:
+                self._full_update_nodes_and_plugs_activation()
+                differences = engine.check()
+                if differences:
+                    engine.invalidate()
+                    raise RuntimeError(
+                        'Incremental activations differ from the full '
+                        'recomputation for: %s' % ', '.join(differences))
+
+        self._disable_update_nodes_and_plugs_activation -= 1
+
+    def _full_update_nodes_and_plugs_activation(self, debug=None):
+        """ Reset all nodes and plugs activations, and compute them again
+        from scratch.
+
+        This is the reference algorithm, which is used to record activation
+        steps (see :mod:`capsul.qt_gui.widgets.activation_inspector`) and to
+        verify the incremental updates (see :attr:`verify_activations`).
+        """
         if debug:
             debug = open(debug, 'w')
             print(self.id, file=debug)
@@ -1627,8 +1938,6 @@ class Pipeline(Process):
             if isinstance(node, PipelineNode):
                 node.process.selection_changed = True
 
-        self._disable_update_nodes_and_plugs_activation -= 1
-
     def workflow_graph(self, remove_disabled_steps=True,
                        remove_disabled_nodes=True):
         """ Generate a workflow graph
@@ -1769,39 +2078,52 @@ class Pipeline(Process):
             in the workflow graph.
             Default: True
         """
-        # Create a graph and a list of graph node edges
-        graph = self.workflow_graph(remove_disabled_steps)
+        graph = self.compiled_workflow_graph(remove_disabled_steps)
 
-        # Start the topologival sort
-        ordered_list = graph.topological_sort()
-
-        def walk_workflow(wokflow, workflow_list):
-            """ Recursive function to go through pipelines' graphs
-            """
-            # Go through all the workflows
-            for sub_workflow in wokflow:
+        # Generate the output workflow representation
+        self.workflow_repr = graph.repr
+        logger.debug("Workflow: {0}". format(self.workflow_repr))
 
-                # If we have already a flatten graph structure just add it
-                if isinstance(sub_workflow[1], list):
-                    workflow_list.extend(sub_workflow[1])
+        return graph.ordered_metas()
 
-                # Otherwise we need to call the topological sort in order to
-                # sort the graph and than flat the graph structure
-                else:
-                    flat_structure = sub_workflow[1].topological_sort()
-                    walk_workflow(flat_structure, workflow_list)
+    def compiled_workflow_graph(self, remove_disabled_steps=True):
+        """ Get the workflow graph in a flat, sorted form
 
-        # Generate the output workflow representation
-        self.workflow_repr = "->".join([x[0] for x in ordered_list])
-        logger.debug("Workflow: {0}". format(self.workflow_repr))
+        On a top level pipeline the result is cached until the pipeline
+        structure, its nodes and plugs activations, or its steps change.
 
-        # Generate the final workflow by flattening graphs structures
-        workflow_list = []
-        walk_workflow(ordered_list, workflow_list)
+        Parameters
+        ----------
+        remove_disabled_steps: bool (optional)
+            When set, disabled steps (and their children) will not be included
+            in the workflow graph.
+            Default: True
 
-        return workflow_list
+        Returns
+        -------
+        graph: topological_sort.CompiledGraph
+            compiled graph of the process nodes, which must not be modified
+        """
+        if remove_disabled_steps:
+            steps = getattr(self, 'pipeline_steps', Controller())
+            key = (True, tuple(sorted(
+                step for step in steps.user_traits()
+                if not getattr(steps, step))))
+        else:
+            key = (False, )
+        cache = None
+        if self.parent_pipeline is None:
+            cache = self._compiled_workflow_graphs
+            graph = cache.get(key)
+            if graph is not None:
+                return graph
+        graph = CompiledGraph(self.workflow_graph(remove_disabled_steps))
+        if cache is not None:
+            cache[key] = graph
+        return graph
 
-    def _check_temporary_files_for_node(self, node, temp_files):
+    def _check_temporary_files_for_node(self, node, temp_files,
+                                        temp_dir=None):
         """ Check temporary outputs and allocate files for them.
 
         Temporary files or directories will be appended to the temp_files list,
@@ -1819,6 +2141,9 @@ class Pipeline(Process):
         temp_files: list
             list of temporary files for the pipeline execution. The list will
             be modified (completed).
+        temp_dir: str (optional)
+            directory where temporary files are created. If None, the system
+            default temporary directory is used.
         """
         process = getattr(node, 'process', None)
         if process is not None and isinstance(process, NipypeProcess):
@@ -1860,7 +2185,8 @@ class Pipeline(Process):
                     tmpdirs = []
                     for i in range(len(value)):
                         if value[i] in ('', traits.Undefined):
-                            tmpdir = tempfile.mkdtemp(suffix='capsul_run')
+                            tmpdir = tempfile.mkdtemp(suffix='capsul_run',
+                                                      dir=temp_dir)
                             new_value.append(tmpdir)
                             tmpdirs.append(tmpdir)
                         else:
@@ -1876,7 +2202,8 @@ class Pipeline(Process):
                         suffix = 'capsul'
                     for i in range(len(value)):
                         if value[i] in ('', traits.Undefined):
-                            tmpfile = tempfile.mkstemp(suffix=suffix)
+                            tmpfile = tempfile.mkstemp(suffix=suffix,
+                                                       dir=temp_dir)
                             tmpfiles.append(tmpfile[1])
                             os.close(tmpfile[0])
                             new_value.append(tmpfile[1])
@@ -1886,7 +2213,8 @@ class Pipeline(Process):
                     temp_files.append((node, plug_name, tmpfiles, value))
             else:
                 if trait.trait_type is traits.Directory:
-                    tmpdir = tempfile.mkdtemp(suffix='capsul_run')
+                    tmpdir = tempfile.mkdtemp(suffix='capsul_run',
+                                              dir=temp_dir)
                     temp_files.append((node, plug_name, tmpdir, value))
                     node.set_plug_value(plug_name, tmpdir)
                 else:
@@ -1894,7 +2222,7 @@ class Pipeline(Process):
                         suffix = 'capsul' + trait.allowed_extensions[0]
                     else:
                         suffix = 'capsul'
-                    tmpfile = tempfile.mkstemp(suffix=suffix)
+                    tmpfile = tempfile.mkstemp(suffix=suffix, dir=temp_dir)
                     node.set_plug_value(plug_name, tmpfile[1])
                     os.close(tmpfile[0])
                     temp_files.append((node, plug_name, tmpfile[1], value))
@@ -1908,26 +2236,87 @@ class Pipeline(Process):
         #
         for node, plug_name, tmpfiles, value in temp_files:
             node.set_plug_value(plug_name, value)
+            self._delete_temporary_files(tmpfiles)
+
+    @staticmethod
+    def _delete_temporary_files(tmpfiles):
+        """ Delete a temporary file or directory (or a list of them), as
+        allocated by _check_temporary_files_for_node().
+
+        Files which do not exist (anymore) are ignored.
+        """
+        if not isinstance(tmpfiles, list):
+            tmpfiles = [tmpfiles]
+        for tmpfile in tmpfiles:
+            if os.path.isdir(tmpfile):
+                try:
+                    shutil.rmtree(tmpfile)
+                except OSError:
+                    pass
+            else:
+                try:
+                    os.unlink(tmpfile)
+                except OSError:
+                    pass
+            # handle additional files (.hdr, .minf...)
+            # TODO
+            if os.path.exists(tmpfile + '.minf'):
+                try:
+                    os.unlink(tmpfile + '.minf')
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _temporary_files_users(nodes, temp_files):
+        """ Find which nodes use each temporary file.
+
+        This is the lifetime analysis used to delete temporary files as soon
+        as they are not needed anymore during the execution: a temporary
+        file may be deleted when all the nodes using it have completed.
+
+        Parameters
+        ----------
+        nodes: list
+            nodes which will be executed.
+        temp_files: list
+            temporary files, as allocated by
+            _check_temporary_files_for_node().
+
+        Returns
+        -------
+        users: list
+            for each item of temp_files, the set of indices (in nodes) of the
+            nodes which produce or read it: nodes having a plug value equal to
+            the temporary file, or inside the temporary directory.
+        """
+        owners = {}
+        directories = []
+        for index, item in enumerate(temp_files):
+            tmpfiles = item[2]
             if not isinstance(tmpfiles, list):
                 tmpfiles = [tmpfiles]
             for tmpfile in tmpfiles:
+                owners[tmpfile] = index
                 if os.path.isdir(tmpfile):
-                    try:
-                        shutil.rmtree(tmpfile)
-                    except OSError:
-                        pass
-                else:
-                    try:
-                        os.unlink(tmpfile)
-                    except OSError:
-                        pass
-                # handle additional files (.hdr, .minf...)
-                # TODO
-                if os.path.exists(tmpfile + '.minf'):
-                    try:
-                        os.unlink(tmpfile + '.minf')
-                    except OSError:
-                        pass
+                    directories.append((os.path.join(tmpfile, ''), index))
+        users = [set() for item in temp_files]
+
+        def check_value(value, node_index):
+            if isinstance(value, (list, tuple)):
+                for item in value:
+                    check_value(item, node_index)
+            elif isinstance(value, six.string_types):
+                index = owners.get(value)
+                if index is not None:
+                    users[index].add(node_index)
+                for directory, index in directories:
+                    if value.startswith(directory):
+                        users[index].add(node_index)
+
+        for node_index, node in enumerate(nodes):
+            for plug_name in node.plugs:
+                check_value(node.get_plug_value(plug_name), node_index)
+        return users
 
     def _run_process(self):
         '''
@@ -2431,6 +2820,7 @@ class Pipeline(Process):
             self.trait('pipeline_steps').optional = True
             self.pipeline_steps = Controller()
         self.pipeline_steps.add_trait(step_name, Bool(nodes=nodes))
+        self._compiled_workflow_graphs.clear()
         trait = self.pipeline_steps.trait(step_name)
         setattr(self.pipeline_steps, step_name, enabled)
 
@@ -2439,6 +2829,7 @@ class Pipeline(Process):
         '''
         if 'pipeline_steps' in self.user_traits():
             self.pipeline_steps.remove_trait(step_name)
+            self._compiled_workflow_graphs.clear()
 
     def disabled_pipeline_steps_nodes(self):
         '''List nodes disabled for runtime execution
@@ -2679,6 +3070,7 @@ class Pipeline(Process):
             # change the node entry with the new name and delete the former
             self.nodes[new_node_name] = node
             del self.nodes[old_node_name]
+            self._mark_activations_dirty()
 
             # look for the node in the pipeline_steps, if any
             steps = getattr(self, 'pipeline_steps', None)
@@ -4,6 +4,8 @@ Node classes for CAPSUL pipeline elements
 
 Classes
 =======
+:class:`ValueCallback`
+----------------------
 :class:`Plug`
 -------------
 :class:`Node`
@@ -53,6 +55,22 @@ from soma.utils.weak_proxy import weak_proxy, get_ref
 import os
 
 
+class _ArgCount1(object):
+    co_argcount = 1
+
+
+class ValueCallback(SomaPartial):
+    """ SomaPartial used for plugs values callbacks, which take a single
+    argument (the new value) once bound.
+
+    traits checks the number of arguments of callbacks when they are
+    registered, and SomaPartial computes it using inspect, which is slow when
+    building large pipelines: it is given directly here.
+    """
+    func_code = _ArgCount1
+    __code__ = _ArgCount1
+
+
 class Plug(Controller):
     """ Overload of the traits in order to keep the pipeline memory.
 
@@ -78,11 +96,18 @@ class Plug(Controller):
     output = Bool(default_value=False)
     optional = Bool(default_value=False)
 
+    _plug_traits = ('activated', 'enabled', 'optional', 'output')
+
     def __init__(self, **kwargs):
         """ Generate a Plug, i.e. a trait with the memory of the
         pipeline adjacent nodes.
         """
-        super(Plug, self).__init__(**kwargs)
+        # Plug traits are fixed, class-level definitions: unlike what
+        # Controller.__init__ does, they are not cloned for each instance,
+        # which is costly in pipelines with thousands of plugs.
+        super(Controller, self).__init__(**kwargs)
+        self._user_traits = SortedDictionary(
+            *[(name, self.trait(name)) for name in self._plug_traits])
         # The links correspond to edges in the graph theory
         # links_to = successor
         # links_from = predecessor
@@ -228,6 +253,17 @@ class Node(Controller):
     @staticmethod
     def _value_callback(self, source_plug_name, dest_node, dest_plug_name,
                         value):
+        """ Spread the source plug value to the destination plug, or record
+        it during a pipeline batch update
+        (see :meth:`~capsul.pipeline.pipeline.Pipeline.batch_update`).
+        """
+        if self.pipeline._delay_link_propagation(self, source_plug_name):
+            return
+        self._propagate_value(source_plug_name, dest_node, dest_plug_name,
+                              value)
+
+    def _propagate_value(self, source_plug_name, dest_node, dest_plug_name,
+                         value):
         """ Spread the source plug value to the destination plug.
         """
         try:
@@ -327,7 +363,7 @@ class Node(Controller):
             the destination plug name
         """
         # add a callback to spread the source plug value
-        value_callback = SomaPartial(
+        value_callback = ValueCallback(
             self.__class__._value_callback, weak_proxy(self),
             source_plug_name, weak_proxy(dest_node), dest_plug_name)
         self._callbacks[(source_plug_name, dest_node,
@@ -417,8 +453,9 @@ class Node(Controller):
     def __setstate__(self, state):
         """ Restore the callbacks that have been removed by __getstate__.
         """
-        state['_callbacks'] = dict((i, SomaPartial(self._value_callback, *i))
-                                   for i in state['_callbacks'])
+        state['_callbacks'] = dict(
+            (i, ValueCallback(self._value_callback, *i))
+            for i in state['_callbacks'])
         if state['pipeline'] is state['process']:
             state['pipeline'] = state['process'] = weak_proxy(state['pipeline'])
         else:
@@ -1131,7 +1168,7 @@ class Switch(Node):
             self.plugs[plug_name].enabled = True
 
         # refresh the pipeline
-        self.pipeline.update_nodes_and_plugs_activation()
+        self.pipeline.update_nodes_and_plugs_activation(self)
 
         # Refresh the links to the output plugs
         for output_plug_name in self._outputs:
@@ -16,6 +16,8 @@ Functions
 ----------------------
 :func:`save_dot_image`
 ----------------------
+:func:`filesystem_snapshot`
+---------------------------
 :func:`disable_runtime_steps_with_existing_outputs`
 ---------------------------------------------------
 :func:`nodes_with_existing_outputs`
@@ -577,7 +579,54 @@ def save_dot_image(pipeline, filename, nodes_sizes={}, use_nodes_pos=False,
     os.unlink(dot_filename)
 
 
-def disable_runtime_steps_with_existing_outputs(pipeline):
+def filesystem_snapshot(pipeline, workers=8):
+    '''
+    Build a snapshot of the filesystem for the files referenced by the nodes
+    of a pipeline (recursively): directories of all files parameters values
+    are listed at once, so that many files can be checked without accessing
+    the filesystem for each of them. The snapshot may be shared by
+    :func:`disable_runtime_steps_with_existing_outputs`,
+    :func:`nodes_with_existing_outputs` and
+    :func:`nodes_with_missing_inputs`.
+
+    Parameters
+    ----------
+    pipeline: Pipeline (mandatory)
+        pipeline to get files from.
+    workers: int (optional)
+        number of directories listed at the same time.
+
+    Returns
+    -------
+    snapshot: :class:`~capsul.utils.fs_snapshot.FileSystemSnapshot`
+    '''
+    from capsul.utils.fs_snapshot import FileSystemSnapshot
+
+    paths = set()
+    processes = [pipeline]
+    while processes:
+        process = processes.pop(0)
+        if isinstance(process, Pipeline):
+            processes += [node.process for name, node
+                          in six.iteritems(process.nodes)
+                          if name != '' and hasattr(node, 'process')]
+        for param, trait in six.iteritems(process.user_traits()):
+            if not isinstance(trait.trait_type, (traits.File,
+                                                 traits.Directory,
+                                                 traits.Any,
+                                                 traits.List)):
+                continue
+            values = [getattr(process, param, None)]
+            while values:
+                value = values.pop()
+                if isinstance(value, six.string_types):
+                    paths.add(value)
+                elif isinstance(value, (list, tuple)):
+                    values += value
+    return FileSystemSnapshot(paths, workers=workers)
+
+
+def disable_runtime_steps_with_existing_outputs(pipeline, snapshot=None):
     '''
     Disable steps in a pipeline which outputs contain existing files. This
     disabling is the "runtime steps disabling" one (see
@@ -590,7 +639,13 @@ def disable_runtime_steps_with_existing_outputs(pipeline):
     ----------
     pipeline: Pipeline (mandatory)
         pipeline to disable nodes in.
+    snapshot: FileSystemSnapshot (optional)
+        filesystem snapshot used to check files (see
+        :func:`filesystem_snapshot`). If not given, one is built for the
+        pipeline.
     '''
+    if snapshot is None:
+        snapshot = filesystem_snapshot(pipeline)
     steps = getattr(pipeline, 'pipeline_steps', Controller())
     for step, trait in six.iteritems(steps.user_traits()):
         if not getattr(steps, step):
@@ -606,7 +661,7 @@ def disable_runtime_steps_with_existing_outputs(pipeline):
                                      or isinstance(trait.trait_type, traits.Directory)):
                     value = getattr(process, param)
                     if value is not None and value is not traits.Undefined \
-                            and os.path.exists(value):
+                            and snapshot.exists(value):
                         # check special case when the output is also an input
                         # (of the same node)
                         disable = True
@@ -629,7 +684,8 @@ def disable_runtime_steps_with_existing_outputs(pipeline):
 
 
 def nodes_with_existing_outputs(pipeline, exclude_inactive=True,
-                                recursive=False, exclude_inputs=True):
+                                recursive=False, exclude_inputs=True,
+                                snapshot=None):
     '''
     Checks nodes in a pipeline which outputs contain existing files on the
     filesystem. Such nodes, maybe, should not run again. Only nodes which
@@ -657,6 +713,10 @@ def nodes_with_existing_outputs(pipeline, exclude_inactive=True,
         inputs will not be listed in the existing outputs, so that they will
         not be erased by a cleaning operation, and will not prevent execution
         of these nodes.
+    snapshot: FileSystemSnapshot (optional)
+        filesystem snapshot used to check files (see
+        :func:`filesystem_snapshot`). If not given, one is built for the
+        pipeline.
 
     Returns
     -------
@@ -664,6 +724,8 @@ def nodes_with_existing_outputs(pipeline, exclude_inactive=True,
         keys: node names
         values: list of pairs (param_name, file_name)
     '''
+    if snapshot is None:
+        snapshot = filesystem_snapshot(pipeline)
     selected_nodes = {}
     if exclude_inactive:
         steps = getattr(pipeline, 'pipeline_steps', Controller())
@@ -697,7 +759,7 @@ def nodes_with_existing_outputs(pipeline, exclude_inactive=True,
                     or isinstance(trait.trait_type, traits.Any):
                 value = getattr(process, plug_name)
                 if isinstance(value, six.string_types) \
-                        and os.path.exists(value) \
+                        and snapshot.exists(value) \
                         and value not in input_files_list:
                     if plug.output:
                         plug_list.append((plug_name, value))
@@ -712,7 +774,7 @@ def nodes_with_existing_outputs(pipeline, exclude_inactive=True,
     return selected_nodes
 
 
-def nodes_with_missing_inputs(pipeline, recursive=True):
+def nodes_with_missing_inputs(pipeline, recursive=True, snapshot=None):
     '''
     Checks nodes in a pipeline which inputs contain invalid inputs.
     Inputs which are files non-existing on the filesystem (so, which cannot
@@ -729,6 +791,10 @@ def nodes_with_missing_inputs(pipeline, recursive=True):
         that if not set, a pipeline is regarded as a process, but pipelines may
         not use all their inputs/outputs so the result might be inaccurate.
         Default: True
+    snapshot: FileSystemSnapshot (optional)
+        filesystem snapshot used to check files (see
+        :func:`filesystem_snapshot`). If not given, one is built for the
+        pipeline.
 
     Returns
     -------
@@ -736,6 +802,8 @@ def nodes_with_missing_inputs(pipeline, recursive=True):
         keys: node names
         values: list of pairs (param_name, file_name)
     '''
+    if snapshot is None:
+        snapshot = filesystem_snapshot(pipeline)
     selected_nodes = {}
     steps = getattr(pipeline, 'pipeline_steps', Controller())
     disabled_nodes = set()
@@ -767,7 +835,7 @@ def nodes_with_missing_inputs(pipeline, recursive=True):
                     value = getattr(process, plug_name)
                     keep_me = False
                     if value is None or value is traits.Undefined \
-                            or value == '' or not os.path.exists(value):
+                            or value == '' or not snapshot.exists(value):
                         # check where this file comes from
                         origin_node, origin_param, origin_parent \
                             = where_is_plug_value_from(plug, recursive)
@@ -1119,6 +1187,14 @@ def set_pipeline_state_from_dict(pipeline, state_dict):
     state_dict: dict (mapping object)
         state dictionary
     '''
+    if isinstance(pipeline, Pipeline):
+        with pipeline.batch_update():
+            _set_pipeline_state_from_dict(pipeline, state_dict)
+    else:
+        _set_pipeline_state_from_dict(pipeline, state_dict)
+
+
+def _set_pipeline_state_from_dict(pipeline, state_dict):
     nodes = [(pipeline, state_dict)]
     while nodes:
         node, current_dict = nodes.pop(0)
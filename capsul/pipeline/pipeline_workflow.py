@@ -12,10 +12,14 @@ Functions
 ------------------------------
 :func:`workflow_run`
 --------------------
+:func:`import_workflow_outputs`
+-------------------------------
 """
 
 from __future__ import print_function
 from __future__ import absolute_import
+import collections
+import logging
 import os
 import socket
 import sys
@@ -108,7 +112,8 @@ class TempFile(str):
 def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
                            jobs_priority=0, create_directories=True,
                            environment='global', check_requirements=True,
-                           complete_parameters=False):
+                           complete_parameters=False, batch_jobs=0,
+                           array_jobs=0):
     """ Create a soma-workflow workflow from a Capsul Pipeline
 
     Parameters
@@ -146,6 +151,24 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
         several times when it's already done, but in iteration nodes,
         completion needs to be done anyway for each iteration, so this option
         offers to do the rest of the "parent" pipeline completion.
+    batch_jobs: int (default: 0)
+        if more than 1, independent process jobs which share the same
+        dependencies, and have no output parameters values to pass to other
+        jobs, are grouped by this number into batched jobs. Each batched job
+        runs its processes one after the other in the same python
+        interpreter (see :func:`capsul.process.runprocess.run_jobs`), which
+        saves the startup time of each job. 0 or 1 disables batching.
+    array_jobs: int (default: 0)
+        if more than 1, iteration nodes are not expanded into one set of
+        jobs per iteration: each process of the iterated process or pipeline
+        becomes array jobs, made of a job template (parameters common to
+        all iterations) and of a table of per-iteration parameters, for up
+        to this number of iterations. Iterations are expanded when the array
+        job runs (see :func:`capsul.process.runprocess.batch_jobs_descriptions`).
+        Iterated processes which cannot be represented this way (processes
+        which are not python jobs, output parameters values passed to other
+        jobs) use the expanded form, as well as iterations where the state of
+        the nodes of an iterated pipeline differs from the first iteration.
 
     Returns
     -------
@@ -153,6 +176,9 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
         a soma-workflow workflow
     """
 
+    job_forbidden_traits = ('nodes_activation', 'selection_changed',
+                            'activated', 'enabled', 'name', 'node_type', )
+
     def _files_group(path, merged_formats):
         bname = os.path.basename(path)
         l0 = len(path) - len(bname)
@@ -301,6 +327,78 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
                 else:
                     rdict[param_name] = value
 
+    def has_output_values(process):
+        """ Tell if a process has output values (which are not files) to pass
+        to other jobs.
+        """
+        for param_name, parameter in six.iteritems(process.user_traits()):
+            if param_name not in job_forbidden_traits \
+                    and parameter.output \
+                    and (parameter.input_filename is False
+                         or not (isinstance(parameter.trait_type,
+                                            (File, Directory))
+                                 or (isinstance(parameter.trait_type, List)
+                                     and isinstance(
+                                         parameter.inner_traits[0].trait_type,
+                                         (File, Directory))))):
+                return True
+        return False
+
+    def job_paths(process, temp_map, shared_map, shared_paths,
+                  forbidden_temp, job_name):
+        """ Temporary paths used by a process job, and shared paths
+        translation (recorded in shared_map).
+
+        Returns
+        -------
+        (input_replaced_paths, output_replaced_paths, has_outputs)
+            has_outputs: see has_output_values()
+        """
+        input_replaced_paths = []
+        output_replaced_paths = []
+        has_outputs = has_output_values(process)
+        for param_name, parameter in six.iteritems(process.user_traits()):
+            if param_name not in job_forbidden_traits:
+                value = getattr(process, param_name)
+                if isinstance(value, list):
+                    values = value
+                else:
+                    values = [value]
+                for value in values:
+                    if isinstance(value, TempFile):
+                        # duplicate swf temp and copy pattern into it
+                        tval = temp_map[value]
+                        tval = tval.__class__(tval)
+                        tval.pattern = value.pattern
+                        if parameter.output:
+                            output_replaced_paths.append(tval)
+                        else:
+                            if value in forbidden_temp:
+                                raise ValueError(
+                                    'Temporary value used cannot be generated '
+                                    'in the workflkow: %s.%s'
+                                    % (job_name, param_name))
+                            input_replaced_paths.append(tval)
+                    else:
+                        _translated_path(value, shared_map, shared_paths,
+                                        parameter)
+        return input_replaced_paths, output_replaced_paths, has_outputs
+
+    def job_param_dict(process, temp_map, shared_map, transfers):
+        """ Parameters of a job using an input parameters file, with
+        temporary, shared and transferred paths replaced.
+        """
+        param_dict = process.export_to_dict(exclude_undefined=True)
+        for name in job_forbidden_traits:
+            if name in param_dict:
+                del param_dict[name]
+        _replace_in_dict(param_dict, temp_map)
+        _replace_in_dict(param_dict, shared_map)
+        _replace_dict_transfers(
+            param_dict, process, transfers[0].get(process, {}),
+            transfers[1].get(process, {}))
+        return param_dict
+
     def build_job(process, temp_map={}, shared_map={}, transfers=[{}, {}],
                   shared_paths={}, forbidden_temp=set(), name='', priority=0,
                   step_name='', engine=None, environment='global'):
@@ -344,47 +442,9 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
             job_name = process.name
 
         # check for special modified paths in parameters
-        input_replaced_paths = []
-        output_replaced_paths = []
-        param_dict = {}
-        has_outputs = False
-        forbidden_traits = ('nodes_activation', 'selection_changed',
-                            'activated', 'enabled', 'name', 'node_type', )
-        for param_name, parameter in six.iteritems(process.user_traits()):
-            if param_name not in forbidden_traits:
-                if parameter.output \
-                        and (parameter.input_filename is False
-                             or not (isinstance(parameter.trait_type,
-                                                (File, Directory))
-                                     or (isinstance(parameter.trait_type,
-                                                    List)
-                                         and isinstance(
-                                              parameter.inner_traits[0].trait_type,
-                                              (File, Directory))))):
-                    has_outputs = True
-                value = getattr(process, param_name)
-                if isinstance(value, list):
-                    values = value
-                else:
-                    values = [value]
-                for value in values:
-                    if isinstance(value, TempFile):
-                        # duplicate swf temp and copy pattern into it
-                        tval = temp_map[value]
-                        tval = tval.__class__(tval)
-                        tval.pattern = value.pattern
-                        if parameter.output:
-                            output_replaced_paths.append(tval)
-                        else:
-                            if value in forbidden_temp:
-                                raise ValueError(
-                                    'Temporary value used cannot be generated '
-                                    'in the workflkow: %s.%s'
-                                    % (job_name, param_name))
-                            input_replaced_paths.append(tval)
-                    else:
-                        _translated_path(value, shared_map, shared_paths,
-                                        parameter)
+        input_replaced_paths, output_replaced_paths, has_outputs \
+            = job_paths(process, temp_map, shared_map, shared_paths,
+                        forbidden_temp, job_name)
 
         # Get the process command line
         #process_cmdline = process.get_commandline()
@@ -406,6 +466,7 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
             config = {}
 
         use_input_params_file = False
+        batch_info = None
         if process_cmdline[0] == 'capsul_job':
             # use python executable from config, if any
             pconf = config.get('capsul.engine.module.python')
@@ -437,24 +498,21 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
             if ppath:
                 path_trick = 'import sys; sys.path = %s + sys.path; ' \
                     % repr(ppath)
+            batch_info = (python_command, path_trick, process_cmdline[1])
             process_cmdline = [
                 'capsul_job', python_command, '-c',
                 '%sfrom capsul.api import Process; '
                 'Process.run_from_commandline("%s")'
                 % (path_trick, process_cmdline[1])]
             use_input_params_file = True
-            param_dict = process.export_to_dict(exclude_undefined=True)
+            param_dict = job_param_dict(process, temp_map, shared_map,
+                                        transfers)
         elif process_cmdline[0] in ('json_job', 'custom_job'):
             use_input_params_file = True
-            param_dict = process.export_to_dict(exclude_undefined=True)
-        for name in forbidden_traits:
-            if name in param_dict:
-                del param_dict[name]
-
-        _replace_in_dict(param_dict, temp_map)
-        _replace_in_dict(param_dict, shared_map)
-        _replace_dict_transfers(
-            param_dict, process, iproc_transfers, oproc_transfers)
+            param_dict = job_param_dict(process, temp_map, shared_map,
+                                        transfers)
+        else:
+            param_dict = {}
 
         # handle native specification (cluster-specific specs as in
         # soma-workflow)
@@ -501,6 +559,10 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
         job.process = weakref.ref(process)
         job._do_not_pickle = ['process']
         job.process_hash = id(process)
+        if batch_info:
+            # allows to group the job with others in a batched job
+            job.batch_info = batch_info
+            job._do_not_pickle.append('batch_info')
         return job
 
     def build_custom_job(node, process_cmdline, name,
@@ -534,6 +596,332 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
         """
         return swclient.Group(jobs, name=name)
 
+    def batch_small_jobs(all_jobs, root_jobs, dependencies, param_links,
+                         batch_jobs):
+        """ Group independent process jobs into batched jobs (see the
+        ``batch_jobs`` parameter of :func:`workflow_from_pipeline`).
+
+        Jobs are grouped when they are in the same group, have the same
+        dependencies, and the same python command and configuration.
+        all_jobs, root_jobs, dependencies and param_links are modified in
+        place.
+        """
+        predecessors = {}
+        successors = {}
+        for source, dest in dependencies:
+            successors.setdefault(source, set()).add(dest)
+            predecessors.setdefault(dest, set()).add(source)
+        link_sources = set()
+        for dlinks in six.itervalues(param_links):
+            for linkl in six.itervalues(dlinks):
+                link_sources.update(link[0] for link in linkl)
+        # groups elements lists, indexed by jobs
+        containers = {}
+        todo = [root_jobs]
+        while todo:
+            elements = todo.pop(0)
+            for element in elements:
+                if isinstance(element, swclient.Group):
+                    todo.append(element.elements)
+                else:
+                    containers[element] = elements
+
+        batches = OrderedDict()
+        for job in all_jobs:
+            if not getattr(job, 'batch_info', None) or job.has_outputs \
+                    or job in link_sources or job not in containers \
+                    or getattr(job, 'parallel_job_info', None) \
+                    or job.native_specification:
+                continue
+            key = (id(containers[job]),
+                   frozenset(predecessors.get(job, ())),
+                   frozenset(successors.get(job, ())),
+                   job.batch_info[:2], job.priority,
+                   getattr(job, 'user_storage', None),
+                   repr(sorted(job.configuration.items())))
+            batches.setdefault(key, []).append(job)
+
+        replaced = {}
+        for jobs in six.itervalues(batches):
+            for start in range(0, len(jobs), batch_jobs):
+                chunk = jobs[start:start + batch_jobs]
+                if len(chunk) < 2:
+                    continue
+                batch_job = build_batch_job(chunk, param_links)
+                for job in chunk:
+                    replaced[job] = batch_job
+        if not replaced:
+            return
+
+        def replace_jobs(jobs):
+            new_jobs = []
+            done = set()
+            for job in jobs:
+                job = replaced.get(job, job)
+                if job not in done:
+                    new_jobs.append(job)
+                    done.add(job)
+            jobs[:] = new_jobs
+
+        replace_jobs(all_jobs)
+        for elements in dict((id(elements), elements)
+                             for elements in containers.values()).values():
+            replace_jobs(elements)
+        new_deps = set((replaced.get(source, source), replaced.get(dest, dest))
+                       for source, dest in dependencies)
+        dependencies.clear()
+        dependencies.update(new_deps)
+
+    def build_batch_job(jobs, param_links):
+        """ Build a batched job running the processes of the given jobs
+        """
+        python_command, path_trick = jobs[0].batch_info[:2]
+        param_dict = {'batch_jobs': [job.batch_info[2] for job in jobs]}
+        input_files = []
+        output_files = []
+        links = {}
+        for num, job in enumerate(jobs):
+            for param, value in six.iteritems(job.param_dict):
+                param_dict['%d:%s' % (num, param)] = value
+            for path in job.referenced_input_files:
+                if path not in input_files:
+                    input_files.append(path)
+            for path in job.referenced_output_files:
+                if path not in output_files:
+                    output_files.append(path)
+            for param, linkl in six.iteritems(param_links.pop(job, {})):
+                links['%d:%s' % (num, param)] = linkl
+        name = ', '.join(job.name for job in jobs)
+        if len(name) > 80:
+            name = name[:77] + '...'
+        batch_job = swclient.Job(
+            name='batch[%d]: %s' % (len(jobs), name),
+            command=[python_command, '-c',
+                     '%sfrom capsul.process.runprocess import '
+                     'run_batch_from_commandline; '
+                     'run_batch_from_commandline()' % path_trick],
+            referenced_input_files=input_files,
+            referenced_output_files=output_files,
+            priority=jobs[0].priority,
+            param_dict=param_dict,
+            use_input_params_file=True,
+            has_outputs=False)
+        if getattr(jobs[0], 'user_storage', None):
+            batch_job.user_storage = jobs[0].user_storage
+        batch_job.configuration = jobs[0].configuration
+        batch_job.batched_jobs = jobs
+        batch_job._do_not_pickle = ['batched_jobs']
+        if links:
+            param_links[batch_job] = links
+        return batch_job
+
+    def array_candidate(process):
+        """ Tell if the iterations of a process or pipeline may be gathered
+        into array jobs (see the ``array_jobs`` parameter of
+        :func:`workflow_from_pipeline`): all its processes must be python
+        jobs, without output values passed to other jobs, nor cluster
+        specific options.
+        """
+        if isinstance(process, Pipeline):
+            processes = []
+            for node in process.all_nodes():
+                if isinstance(node, PipelineNode):
+                    continue
+                if isinstance(node, ProcessNode):
+                    processes.append(node.process)
+                elif not isinstance(node, Switch):
+                    # custom nodes build their own jobs
+                    return False
+        else:
+            processes = [process]
+        for proc in processes:
+            if isinstance(proc, (Pipeline, ProcessIteration)) \
+                    or getattr(proc, 'parallel_job_info', None) \
+                    or getattr(proc, 'native_specification', None):
+                return False
+            try:
+                if proc.params_to_command()[0] != 'capsul_job':
+                    return False
+            except Exception:
+                return False
+            if has_output_values(proc):
+                return False
+        return True
+
+    def array_structure(process):
+        """ Nodes state of an iterated pipeline, which must be the same in all
+        iterations of array jobs.
+        """
+        if not isinstance(process, Pipeline):
+            return None
+        return [(node.name, node.enabled, node.activated)
+                for node in process.all_nodes()]
+
+    def array_template(iteration, sub_jobs, sub_dependencies):
+        """ Jobs template of an iteration, to be gathered in array jobs.
+
+        Returns
+        -------
+        (procs, deps):
+            procs is an OrderedDict {process: job}, deps the set of
+            dependencies between processes. None if the iteration jobs cannot
+            be represented as array jobs.
+        """
+        procs = OrderedDict()
+        job_procs = {}
+        for key, job in six.iteritems(sub_jobs):
+            if not isinstance(key, tuple) or key[1] != iteration \
+                    or isinstance(job, tuple) \
+                    or not getattr(job, 'batch_info', None) \
+                    or job.has_outputs \
+                    or getattr(job, 'parallel_job_info', None) \
+                    or job.native_specification:
+                return None
+            procs[key[0]] = job
+            job_procs[job] = key[0]
+        deps = set()
+        for source, dest in sub_dependencies:
+            source = job_procs.get(source, source)
+            dest = job_procs.get(dest, dest)
+            if source not in procs or dest not in procs:
+                return None
+            deps.add((source, dest))
+        return procs, deps
+
+    def array_rows(process, procs, temp_map, shared_map, transfers,
+                   shared_paths, remove_temp):
+        """ Parameters of the template processes of array jobs, for the
+        current iteration values, without building the iteration jobs.
+
+        Returns
+        -------
+        rows: dict
+            {process: (param_dict, input_files, output_files)}
+        """
+        temp_map2 = {}
+        if isinstance(process, Pipeline):
+            temp_map2 = assign_temporary_filenames(process, len(temp_map))
+        temp_subst_map = dict((x1, x2[0])
+                              for x1, x2 in six.iteritems(temp_map2))
+        temp_subst_map.update(temp_map)
+        try:
+            rows = {}
+            for proc in procs:
+                input_files, output_files, has_outputs = job_paths(
+                    proc, temp_subst_map, shared_map, shared_paths,
+                    remove_temp, proc.name)
+                param_dict = job_param_dict(proc, temp_subst_map, shared_map,
+                                            transfers)
+                input_files += [x[0] for x in
+                                transfers[0].get(proc, {}).values()]
+                output_files += [x[0] for x in
+                                 transfers[1].get(proc, {}).values()]
+                rows[proc] = (param_dict, input_files, output_files)
+        finally:
+            restore_empty_filenames(temp_map2)
+        return rows
+
+    def add_array_iteration(array, iteration, rows, iter_links, jobs,
+                            dependencies, root_jobs, links):
+        """ Record the parameters of an iteration in the array jobs of an
+        iteration node (see the ``array_jobs`` parameter of
+        :func:`workflow_from_pipeline`).
+        """
+        procs = array['procs']
+        num = iteration - array['start']
+        for proc in procs:
+            array['rows'].setdefault(proc, []).append(rows[proc])
+        for dest, dlinks in six.iteritems(iter_links):
+            if isinstance(dest, tuple) and dest[0] in procs:
+                array_links = array['links'].setdefault(dest[0], {})
+            else:
+                array_links = None
+            for param, linkl in six.iteritems(dlinks):
+                for link in linkl:
+                    source = link[0]
+                    if isinstance(source, tuple) and source[0] in procs:
+                        # array jobs have no output values: only keep the
+                        # dependency
+                        array['deps'].add((source[0], dest[0]
+                                           if array_links is not None
+                                           else dest))
+                    elif array_links is not None:
+                        array_links.setdefault('%d:%s' % (num, param),
+                                               []).append(link)
+                    else:
+                        links.setdefault(dest, {}).setdefault(
+                            param, []).append(link)
+        if num + 1 == array_jobs:
+            flush_array_jobs(array, jobs, dependencies, root_jobs, links)
+
+    def flush_array_jobs(array, jobs, dependencies, root_jobs, links):
+        """ Build the array jobs of the iterations recorded by
+        add_array_iteration(), and reset them.
+        """
+        start = array['start']
+        proc_jobs = {}
+        for proc, template in six.iteritems(array['procs']):
+            job = build_array_job(template, array['rows'][proc],
+                                  array['iteration'], start)
+            key = (proc, 'array', start)
+            jobs[key] = job
+            root_jobs[key] = job
+            proc_jobs[proc] = job
+            if proc in array['links']:
+                links[key] = array['links'][proc]
+        for source, dest in array['deps']:
+            dependencies.add((proc_jobs[source], proc_jobs.get(dest, dest)))
+        array['start'] += len(next(iter(array['rows'].values()), ()))
+        array['rows'] = {}
+        array['links'] = {}
+        array['deps'] = set(array['template_deps'])
+
+    def build_array_job(template, rows, iteration, start):
+        """ Build an array job running the process of the template job (built
+        for the given iteration), with the parameters of each row.
+        """
+        python_command, path_trick, definition = template.batch_info
+        # parameters with the same value in all iterations are stored once
+        common = dict(
+            (param, value)
+            for param, value in six.iteritems(rows[0][0])
+            if all(param in row[0] and row[0][param] == value
+                   for row in rows[1:]))
+        # these names cannot be process parameters
+        param_dict = {'array:job': definition, 'array:size': len(rows)}
+        param_dict.update(common)
+        input_files = []
+        output_files = []
+        for num, (row_params, row_inputs, row_outputs) in enumerate(rows):
+            for param, value in six.iteritems(row_params):
+                if param not in common:
+                    param_dict['%d:%s' % (num, param)] = value
+            for path in row_inputs:
+                if path not in input_files:
+                    input_files.append(path)
+            for path in row_outputs:
+                if path not in output_files:
+                    output_files.append(path)
+        name = template.name
+        if name.endswith('_%d' % iteration):
+            name = name[:-len('_%d' % iteration)]
+        array_job = swclient.Job(
+            name='%s[%d:%d]' % (name, start, start + len(rows)),
+            command=[python_command, '-c',
+                     '%sfrom capsul.process.runprocess import '
+                     'run_batch_from_commandline; '
+                     'run_batch_from_commandline()' % path_trick],
+            referenced_input_files=input_files,
+            referenced_output_files=output_files,
+            priority=template.priority,
+            param_dict=param_dict,
+            use_input_params_file=True,
+            has_outputs=False)
+        if getattr(template, 'user_storage', None):
+            array_job.user_storage = template.user_storage
+        array_job.configuration = template.configuration
+        return array_job
+
     def get_jobs(group, groups):
         gqueue = list(group.elements)
         jobs = []
@@ -921,7 +1309,9 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
         '''
         Build workflow for an iterative process: the process / sub-pipeline is
         filled with appropriate parameters for each iteration, and its
-        workflow is generated.
+        workflow is generated. With the ``array_jobs`` option, the workflow
+        of the first iteration is used as a template of array jobs when
+        possible, and the other iterations only provide parameters.
 
         Returns
         -------
@@ -1186,6 +1576,13 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
             # iterate the iterates process / pipeline
 
             iter_values = {}
+            array = None
+            if array_jobs > 1 and array_candidate(it_process.process):
+                # the jobs of the first iteration are the template of array
+                # jobs. Other iterations only provide parameters.
+                array = {'procs': None, 'iteration': None, 'structure': None,
+                         'start': 0, 'rows': {}, 'links': {}, 'deps': set(),
+                         'template_deps': set()}
             for iteration in range(size):
                 for parameter in it_process.iterative_parameters:
                     if it_process.process.trait(parameter).input_filename \
@@ -1212,26 +1609,65 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
                     value = getattr(it_process.process, parameter)
                     iter_values.setdefault(parameter, []).append(value)
 
-                # build a workflow for the job / pipeline iteration
-                process_name = it_process.process.name + '_%d' % iteration
-                (sub_jobs, sub_dependencies, sub_groups, sub_root_jobs,
-                 sub_links, sub_nodes) = \
-                    iter_to_workflow(it_process.process, process_name,
-                        step_name,
-                        temp_map, shared_map, transfers,
-                        shared_paths, disabled_nodes, remove_temp, steps,
-                        study_config, iteration, map_job=map_job,
-                        reduce_job=reduce_job, environment=environment)
-                nodes += sub_nodes
-                jobs.update(sub_jobs)
-                dependencies.update(sub_dependencies)
-                groups.update(sub_groups)
-                root_jobs.update(sub_root_jobs)
-                links.update(sub_links)
+                rows = None
+                if array is not None and array['procs'] is not None:
+                    if array_structure(it_process.process) \
+                            == array['structure']:
+                        rows = array_rows(
+                            it_process.process, array['procs'], temp_map,
+                            shared_map, transfers, shared_paths, remove_temp)
+                        iter_links = {}
+                    else:
+                        # the nodes state has changed: this iteration and
+                        # the next ones are expanded
+                        if array['rows']:
+                            flush_array_jobs(array, jobs, dependencies,
+                                             root_jobs, links)
+                        array = None
+
+                if rows is None:
+                    # build a workflow for the job / pipeline iteration
+                    process_name = it_process.process.name + '_%d' % iteration
+                    (sub_jobs, sub_dependencies, sub_groups, sub_root_jobs,
+                     sub_links, sub_nodes) = \
+                        iter_to_workflow(it_process.process, process_name,
+                            step_name,
+                            temp_map, shared_map, transfers,
+                            shared_paths, disabled_nodes, remove_temp, steps,
+                            study_config, iteration, map_job=map_job,
+                            reduce_job=reduce_job, environment=environment)
+                    if array is not None:
+                        template = array_template(iteration, sub_jobs,
+                                                  sub_dependencies)
+                        if template is None:
+                            array = None
+                        else:
+                            procs, deps = template
+                            array.update({
+                                'procs': procs, 'iteration': iteration,
+                                'structure': array_structure(
+                                    it_process.process),
+                                'start': iteration, 'deps': set(deps),
+                                'template_deps': deps})
+                            rows = dict(
+                                (proc, (job.param_dict,
+                                        job.referenced_input_files,
+                                        job.referenced_output_files))
+                                for proc, job in six.iteritems(procs))
+                            # jobs are gathered in array jobs
+                            iter_links = dict(sub_links)
+                    if array is None:
+                        nodes += sub_nodes
+                        jobs.update(sub_jobs)
+                        dependencies.update(sub_dependencies)
+                        groups.update(sub_groups)
+                        root_jobs.update(sub_root_jobs)
+                        links.update(sub_links)
+                        iter_links = links
 
                 # connect map / reduce nodes to iterated jobs
                 for proc, dlink in six.iteritems(map_iter_links):
-                    slink = links.setdefault((proc, iteration), {})
+                    slink = iter_links.setdefault((proc, iteration), {})
                     for dparam, linkl in six.iteritems(dlink):
                         l = slink.setdefault(dparam, [])
                         for link in linkl:
@@ -1247,10 +1683,17 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
                             # iterative param
                             dparam = '%s_%d' % (dparam, iteration)
                         for link in linkl:
-                            links.setdefault(proc, {}) \
+                            iter_links.setdefault(proc, {}) \
                                 .setdefault(dparam, []) \
                                 .append(((link[0], iteration), link[1]))
 
+                if array is not None:
+                    add_array_iteration(array, iteration, rows, iter_links,
+                                        jobs, dependencies, root_jobs, links)
+
+            if array is not None and array['rows']:
+                flush_array_jobs(array, jobs, dependencies, root_jobs, links)
+
         # set values on the iter node (what a full completion does, but we're
         # doing it only partially here)
         for param, value in iter_values.items():
@@ -1652,6 +2095,10 @@ def workflow_from_pipeline(pipeline, study_config=None, disabled_nodes=None,
     all_jobs = [job for job in list(jobs.values()) if not isinstance(job, tuple)]
     root_jobs = sum(list(root_jobs.values()), [])
 
+    if batch_jobs > 1:
+        batch_small_jobs(all_jobs, root_jobs, dependencies, param_links,
+                         batch_jobs)
+
     # if directories have to be created, all other primary jobs will depend
     # on this first one
     if create_directories and dirs_job is not None:
@@ -1716,32 +2163,79 @@ def workflow_run(workflow_name, workflow, study_config):
     pipeline = getattr(workflow, 'pipeline', None)
     if pipeline:
         pipeline = pipeline()  # dereference the weakref
-        proc_map = {}
-        todo = [pipeline]
-        while todo:
-            process = todo.pop(0)
-            if isinstance(process, Pipeline):
-                todo += [n.process for n in process.nodes.values()
-                         if n is not process.pipeline_node
-                             and isinstance(n, ProcessNode)]
-            else:
-                proc_map[id(process)] = process
-
-        eng_wf = controller.workflow(wf_id)
-        for job in eng_wf.jobs:
-            if job.has_outputs:
-                out_params = controller.get_job_output_params(
-                    eng_wf.job_mapping[job].job_id)
-                if out_params:
-                    process = proc_map.get(job.process_hash)
-                    if process is None:
-                        # iteration or non-process job
-                        continue
-                    for param in list(out_params.keys()):
-                        if process.trait(param) is None:
-                            del out_params[param]
-                    process.import_from_dict(out_params)
+        import_workflow_outputs(pipeline, controller, wf_id)
 
     # TODO: should we transfer if the WF fails ?
     swclient.Helper.transfer_output_files(wf_id, controller)
     return controller, wf_id
+
+
+def import_workflow_outputs(pipeline, controller, workflow_id,
+                            ignore_errors=False):
+    '''
+    Set the output values of the jobs of a finished workflow on the
+    corresponding processes of a pipeline (or on a single process).
+
+    Outputs are only queried for jobs which correspond to a process in the
+    pipeline. They are set in a single
+    :meth:`~capsul.pipeline.pipeline.Pipeline.batch_update` transaction, so
+    that links are propagated once.
+
+    Parameters
+    ----------
+    pipeline: Pipeline or Process
+        pipeline (or process) the workflow has been built from.
+    controller: WorkflowController
+        soma-workflow controller the workflow has been submitted to.
+    workflow_id: int
+        workflow id in soma-workflow.
+    ignore_errors: bool (optional, default False)
+        if set, errors while setting the outputs of a process are logged as
+        warnings, and the other outputs are imported. Otherwise they are
+        raised.
+    '''
+    # index leaf processes by their id (job.process_hash)
+    proc_map = {}
+    todo = collections.deque([pipeline])
+    while todo:
+        process = todo.popleft()
+        if isinstance(process, Pipeline):
+            todo.extend(n.process for n in process.nodes.values()
+                        if n is not process.pipeline_node
+                        and isinstance(n, ProcessNode))
+        else:
+            proc_map[id(process)] = process
+
+    eng_wf = controller.workflow(workflow_id)
+    jobs = []
+    for job in eng_wf.jobs:
+        if job.has_outputs:
+            process = proc_map.get(getattr(job, 'process_hash', None))
+            if process is not None:
+                # otherwise, iteration or non-process job
+                jobs.append((eng_wf.job_mapping[job].job_id, process))
+    if not jobs:
+        return
+
+    def import_outputs():
+        for job_id, process in jobs:
+            out_params = controller.get_job_output_params(job_id)
+            if not out_params:
+                continue
+            out_params = dict((param, value)
+                              for param, value in six.iteritems(out_params)
+                              if process.trait(param) is not None)
+            try:
+                process.import_from_dict(out_params)
+            except Exception as e:
+                if not ignore_errors:
+                    raise
+                logging.getLogger(__name__).warning(
+                    'error while importing outputs %s in %s: %s',
+                    out_params, process.name, e)
+
+    if isinstance(pipeline, Pipeline):
+        with pipeline.batch_update():
+            import_outputs()
+    else:
+        import_outputs()
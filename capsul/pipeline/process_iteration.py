@@ -7,8 +7,11 @@ Classes
 =======
 :class:`ProcessIteration`
 -------------------------
+:class:`IterationError`
+-----------------------
 '''
 
+import os
 import sys
 import six
 from traits.api import List, Undefined
@@ -22,13 +25,78 @@ from six.moves import range
 if sys.version_info[0] >= 3:
     xrange = range
 
+
+class IterationError(RuntimeError):
+    '''
+    Raised by :class:`ProcessIteration` when some iterations have failed in
+    parallel mode. Results of the other iterations are kept.
+
+    Attributes
+    ----------
+    errors: dict
+        {iteration: exception} for each failed iteration
+    '''
+
+    def __init__(self, errors):
+        self.errors = errors
+        super(IterationError, self).__init__(
+            '%d iteration(s) failed: %s'
+            % (len(errors), '; '.join('%d: %s' % (i, errors[i])
+                                      for i in sorted(errors))))
+
+
+def _pipeline_state(pipeline):
+    # nodes activation and steps of a pipeline and its sub-pipelines, which
+    # are not part of its parameters
+    state = []
+    for node in pipeline.all_nodes():
+        steps = getattr(node.process, 'pipeline_steps', None) \
+            if hasattr(node, 'process') else None
+        state.append((node.name, node.enabled,
+                      [(step, getattr(steps, step))
+                       for step in steps.user_traits()]
+                      if steps is not None else None))
+    return state
+
+
+def _copy_pipeline_state(source, process):
+    # copy the nodes activation and steps of the pipeline source to a new
+    # instance of it. Returns False if they could not get the same state.
+    from capsul.pipeline.pipeline import Pipeline
+
+    if not isinstance(source, Pipeline):
+        return True
+    state = _pipeline_state(source)
+    for node, (name, enabled, steps) in zip(process.all_nodes(), state):
+        if steps:
+            for step, value in steps:
+                setattr(node.process.pipeline_steps, step, value)
+        node.enabled = enabled
+    return _pipeline_state(process) == state
+
+
 class ProcessIteration(Process):
+    '''
+    Iterates a process over list parameters.
+
+    In local execution, iterations are run one after another on the
+    iterated process, unless ``max_workers`` is not 1: then iterations
+    are run concurrently, each on a separate instance of the process, by
+    at most ``max_workers`` threads (0 means the number of CPUs). The
+    nodes and steps activation of an iterated pipeline is copied to the
+    separate instances; if they cannot get the same state, iterations are
+    run sequentially. Completion is still performed sequentially. When some iterations fail,
+    outputs of the other ones are set (failed ones get the default
+    value), then an :class:`IterationError` is
+    raised.
+    '''
 
     _doc_path = 'api/pipeline.html#processiteration'
 
     def __init__(self, process, iterative_parameters, study_config=None,
-                 context_name=None):
+                 context_name=None, max_workers=1):
         super(ProcessIteration, self).__init__()
+        self.max_workers = max_workers
 
         if self.study_config is None and hasattr(Process, '_study_config'):
             study_config = study_cmod.default_study_config()
@@ -234,6 +302,10 @@ class ProcessIteration(Process):
 
         for parameter in self.regular_parameters:
             setattr(self.process, parameter, getattr(self, parameter))
+        instances = self._iteration_instances(size)
+        if instances:
+            return self._run_iterations(size, iterative_parameters,
+                                        no_output_value, instances)
         if no_output_value:
             for parameter in iterative_parameters:
                 trait = self.trait(parameter)
@@ -268,6 +340,111 @@ class ProcessIteration(Process):
                 self.complete_iteration(iteration)
                 self.process()
 
+    def _iteration_instances(self, size):
+        # separate instances of the iterated process for parallel mode, or
+        # None for sequential mode. Processes which cannot be instantiated
+        # again from their class (built with constructor arguments, or with
+        # traits added to the instance), pipelines whose nodes state
+        # cannot be reproduced, and processes which must run alone (see
+        # capsul.study_config.run), are run sequentially.
+        from capsul.pipeline.pipeline import Pipeline
+        from capsul.study_config import run
+
+        workers = self.max_workers
+        if not workers:
+            workers = os.cpu_count() or 1
+        workers = min(workers, size)
+        if workers <= 1:
+            return None
+        if isinstance(self.process, Pipeline):
+            processes = [node.process for node in self.process.all_nodes()
+                         if hasattr(node, 'process')]
+        else:
+            processes = [self.process]
+        if any(run._runs_exclusively(process) for process in processes):
+            return None
+        instances = []
+        for i in range(workers):
+            try:
+                process = get_process_instance(
+                    type(self.process), study_config=self.study_config)
+            except Exception:
+                return None
+            if set(process.user_traits()) != set(self.process.user_traits()):
+                return None
+            if hasattr(self.process, 'context_name'):
+                process.context_name = self.process.context_name
+            if not _copy_pipeline_state(self.process, process):
+                return None
+            instances.append(process)
+        return instances
+
+    def _run_iterations(self, size, iterative_parameters, no_output_value,
+                        instances):
+        # Run iterations concurrently on separate process instances.
+        # Parameters of each iteration are completed sequentially on
+        # self.process, then copied to an idle instance in a worker thread.
+        from concurrent.futures import ThreadPoolExecutor
+        from six.moves import queue
+
+        idle = queue.Queue()
+        for process in instances:
+            idle.put(process)
+        outputs = [parameter for parameter in iterative_parameters
+                   if self.trait(parameter).output]
+        if no_output_value:
+            for parameter in outputs:
+                setattr(self, parameter, [])
+        # pipeline control parameters are not copied
+        parameters = [parameter for parameter in self.process.user_traits()
+                      if parameter not in ('nodes_activation',
+                                           'selection_changed',
+                                           'pipeline_steps',
+                                           'visible_groups')]
+
+        def run_iteration(values):
+            process = idle.get()
+            try:
+                for parameter, value in zip(parameters, values):
+                    setattr(process, parameter, value)
+                process()
+                return [getattr(process, parameter)
+                        for parameter in outputs]
+            finally:
+                idle.put(process)
+
+        futures = []
+        with ThreadPoolExecutor(max_workers=len(instances)) as executor:
+            for iteration in range(size):
+                for parameter in iterative_parameters:
+                    value = getattr(self, parameter)
+                    if len(value) > iteration:
+                        setattr(self.process, parameter, value[iteration])
+                # operate completion
+                self.complete_iteration(iteration)
+                futures.append(executor.submit(
+                    run_iteration,
+                    [getattr(self.process, parameter)
+                     for parameter in parameters]))
+                if no_output_value:
+                    for parameter in outputs:
+                        setattr(self.process, parameter, Undefined)
+
+        errors = {}
+        results = []
+        for iteration, future in enumerate(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors[iteration] = e
+                results.append([self.process.trait(parameter).default
+                                for parameter in outputs])
+        if no_output_value:
+            for parameter, value in zip(outputs, zip(*results)):
+                setattr(self, parameter, list(value))
+        if errors:
+            raise IterationError(errors)
+
     def set_study_config(self, study_config):
         super(ProcessIteration, self).set_study_config(study_config)
         self.process.set_study_config(study_config)
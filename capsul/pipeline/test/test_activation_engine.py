@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import absolute_import
+import unittest
+import random
+from capsul.api import Pipeline
+from capsul.api import get_process_instance
+from capsul.pipeline.pipeline_nodes import Switch
+
+
+class TestActivationEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.verify_activations = Pipeline.verify_activations
+        Pipeline.verify_activations = True
+        self.pipeline = get_process_instance(
+            'capsul.pipeline.test.fake_morphologist.morphologist.Morphologist')
+
+    def tearDown(self):
+        Pipeline.verify_activations = self.verify_activations
+
+    def test_incremental_updates(self):
+        pipeline = self.pipeline
+        engine = pipeline._activation_engine
+        full_updates = engine.stats['full_updates']
+        nodes = list(pipeline.all_nodes())
+        switches = [node for node in nodes if isinstance(node, Switch)]
+        rng = random.Random(0)
+        # each change is checked against a full recomputation, which raises
+        # a RuntimeError if results differ.
+        for i in range(60):
+            choice = rng.random()
+            if choice < 0.4:
+                switch = rng.choice(switches)
+                switch.switch = rng.choice(switch._switch_values)
+            elif choice < 0.8:
+                node = rng.choice(nodes[1:])
+                node.enabled = not node.enabled
+            else:
+                node = rng.choice(nodes)
+                plug = rng.choice(list(node.plugs.values()))
+                plug.enabled = not plug.enabled
+        self.assertEqual(engine.stats['full_updates'], full_updates)
+        self.assertTrue(engine.stats['incremental_updates'] >= 60)
+
+    def test_links_changes(self):
+        pipeline = self.pipeline
+        engine = pipeline._activation_engine
+        full_updates = engine.stats['full_updates']
+        link = 'BrainSegmentation.brain_mask->SplitBrain.brain_mask'
+        pipeline.remove_link(link)
+        self.assertFalse(pipeline.nodes['SplitBrain'].activated)
+        pipeline.add_link(link)
+        self.assertTrue(pipeline.nodes['SplitBrain'].activated)
+        self.assertEqual(engine.stats['full_updates'], full_updates)
+
+    def test_delayed_updates(self):
+        pipeline = self.pipeline
+        engine = pipeline._activation_engine
+        incremental_updates = engine.stats['incremental_updates']
+        pipeline.delay_update_nodes_and_plugs_activation()
+        pipeline.nodes['SplitBrain'].enabled = False
+        pipeline.select_Talairach = 'StandardACPC'
+        self.assertTrue(pipeline.nodes['SplitBrain'].activated)
+        pipeline.restore_update_nodes_and_plugs_activation()
+        self.assertFalse(pipeline.nodes['SplitBrain'].activated)
+        self.assertEqual(engine.stats['incremental_updates'],
+                         incremental_updates + 1)
+
+    def test_structure_changes(self):
+        pipeline = self.pipeline
+        engine = pipeline._activation_engine
+        full_updates = engine.stats['full_updates']
+        pipeline.add_process(
+            'new_node',
+            'capsul.pipeline.test.fake_morphologist.splitbrain.SplitBrain')
+        pipeline.nodes['SplitBrain'].enabled = False
+        self.assertEqual(engine.stats['full_updates'], full_updates + 1)
+        self.assertFalse(pipeline.nodes['new_node'].activated)
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestActivationEngine)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
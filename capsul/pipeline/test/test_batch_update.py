@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import absolute_import
+import unittest
+from traits.api import Str
+from capsul.api import Process
+from capsul.api import Pipeline
+from capsul.pipeline import pipeline_tools
+
+
+class Suffix(Process):
+    """ Process which output is computed as soon as its input changes
+    """
+    calls = 0
+
+    def __init__(self):
+        super(Suffix, self).__init__()
+        self.add_trait("input", Str())
+        self.add_trait("output", Str(output=True))
+        self.on_trait_change(self._update_output, "input")
+
+    def _update_output(self, value):
+        Suffix.calls += 1
+        self.output = value + "+" if value else value
+
+    def _run_process(self):
+        pass
+
+
+class ChainPipeline(Pipeline):
+    """ Chain of processes, and a switch between the chain end and its
+    first output
+    """
+    length = 20
+
+    def pipeline_definition(self):
+        for i in range(self.length):
+            self.add_process(
+                "node%d" % i,
+                "capsul.pipeline.test.test_batch_update.Suffix")
+            if i != 0:
+                self.add_link("node%d.output->node%d.input" % (i - 1, i))
+        self.export_parameter("node0", "input")
+        self.add_switch("switch", ["long", "short"], ["output"])
+        self.add_link("node%d.output->switch.long_switch_output"
+                      % (self.length - 1))
+        self.add_link("node0.output->switch.short_switch_output")
+        self.export_parameter("switch", "output")
+
+
+class MainPipeline(Pipeline):
+    """ Pipeline with a sub-pipeline
+    """
+    def pipeline_definition(self):
+        self.add_process(
+            "chain", "capsul.pipeline.test.test_batch_update.ChainPipeline")
+        self.add_process(
+            "last", "capsul.pipeline.test.test_batch_update.Suffix")
+        self.add_link("chain.output->last.input")
+        self.export_parameter("chain", "input")
+        self.export_parameter("chain", "switch")
+        self.export_parameter("last", "output")
+
+
+class TestBatchUpdate(unittest.TestCase):
+
+    def test_single_propagation(self):
+        pipeline = ChainPipeline()
+        Suffix.calls = 0
+        for i in range(10):
+            pipeline.input = "value%d" % i
+        self.assertEqual(Suffix.calls, 10 * ChainPipeline.length)
+        self.assertEqual(pipeline.output,
+                         "value9" + "+" * ChainPipeline.length)
+
+        Suffix.calls = 0
+        with pipeline.batch_update():
+            for i in range(10):
+                pipeline.input = "other%d" % i
+            # not propagated yet
+            self.assertEqual(pipeline.output,
+                             "value9" + "+" * ChainPipeline.length)
+        self.assertEqual(Suffix.calls, ChainPipeline.length)
+        self.assertEqual(pipeline.output,
+                         "other9" + "+" * ChainPipeline.length)
+
+    def test_switch(self):
+        pipeline = ChainPipeline()
+        with pipeline.batch_update():
+            pipeline.input = "value"
+            pipeline.switch = "short"
+        self.assertEqual(pipeline.output, "value+")
+        self.assertFalse(pipeline.nodes["node1"].activated)
+        with pipeline.batch_update():
+            pipeline.switch = "long"
+            pipeline.input = "other"
+        self.assertEqual(pipeline.output,
+                         "other" + "+" * ChainPipeline.length)
+        self.assertTrue(pipeline.nodes["node1"].activated)
+
+    def test_sub_pipeline(self):
+        pipeline = MainPipeline()
+        reference = MainPipeline()
+        chain = pipeline.nodes["chain"].process
+        Suffix.calls = 0
+        with pipeline.batch_update():
+            # nested blocks, and a block on the sub-pipeline
+            with chain.batch_update():
+                chain.input = "value"
+                pipeline.switch = "short"
+            self.assertEqual(pipeline.output, "")
+            pipeline.input = "other"
+        self.assertEqual(Suffix.calls, ChainPipeline.length + 1)
+        self.assertEqual(pipeline.output, "other++")
+        reference.input = "value"
+        reference.switch = "short"
+        reference.input = "other"
+        self.assertEqual(
+            pipeline_tools.dump_pipeline_state_as_dict(pipeline),
+            pipeline_tools.dump_pipeline_state_as_dict(reference))
+
+    def test_import_state(self):
+        reference = MainPipeline()
+        reference.input = "value"
+        reference.switch = "short"
+        state = pipeline_tools.dump_pipeline_state_as_dict(reference)
+        pipeline = MainPipeline()
+        Suffix.calls = 0
+        pipeline_tools.set_pipeline_state_from_dict(pipeline, state)
+        self.assertEqual(
+            pipeline_tools.dump_pipeline_state_as_dict(pipeline), state)
+        # each node output is computed at most once
+        self.assertTrue(Suffix.calls <= ChainPipeline.length + 1)
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestBatchUpdate)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
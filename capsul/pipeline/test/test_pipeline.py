@@ -7,6 +7,7 @@ from capsul.api import Process
 from capsul.api import Pipeline
 from capsul.api import get_process_instance
 import tempfile
+import json
 import os
 import os.path as osp
 import sys
@@ -119,6 +120,24 @@ class TestPipeline(unittest.TestCase):
         self.pipeline.workflow_ordered_nodes()
         self.assertEqual(self.pipeline.workflow_repr, "")
 
+    def test_compiled_workflow_graph(self):
+        graph = self.pipeline.compiled_workflow_graph()
+        self.assertTrue(self.pipeline.compiled_workflow_graph() is graph)
+        node1 = graph.index[self.pipeline.nodes['node1']]
+        node2 = graph.index[self.pipeline.nodes['node2']]
+        self.assertEqual(graph.successors[node1], [node2])
+        self.assertEqual(graph.names[node2], 'node2')
+        self.pipeline.nodes_activation.node2 = False
+        graph2 = self.pipeline.compiled_workflow_graph()
+        self.assertTrue(graph2 is not graph)
+        self.assertEqual(graph2.metas, [])
+        self.pipeline.nodes_activation.node2 = True
+        self.pipeline.add_pipeline_step('step1', ['node2'], enabled=False)
+        self.pipeline.workflow_ordered_nodes()
+        self.assertTrue(
+            self.pipeline.workflow_repr in
+                ("constant->node1", "node1->constant"))
+
     def test_run_pipeline(self):
         setattr(self.pipeline.nodes_activation, "node2", True)
         tmp = tempfile.mkstemp('', prefix='capsul_test_pipeline')
@@ -196,6 +215,22 @@ class TestPipeline(unittest.TestCase):
             self.temp_files.append(filename)
         self.run_pipeline_io(filename)
 
+    def test_pipeline_json_node_state(self):
+        fd, filename = tempfile.mkstemp(prefix='test_pipeline',
+                                        suffix='.json')
+        os.close(fd)
+        self.temp_files.append(filename)
+        pipeline = MyPipeline()
+        pipeline.nodes['node2'].enabled = False
+        from capsul.pipeline import pipeline_tools
+        pipeline_tools.save_pipeline(pipeline, filename)
+        with open(filename) as f:
+            definition = json.load(f)['definition']
+        self.assertEqual(definition['executables']['node2']['enabled'],
+                         'false')
+        pipeline2 = get_process_instance(filename)
+        self.assertFalse(pipeline2.nodes['node2'].enabled)
+
 def test():
     """ Function to execute unitest
     """
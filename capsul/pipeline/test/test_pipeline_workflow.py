@@ -2,6 +2,7 @@
 from __future__ import print_function
 from __future__ import absolute_import
 
+import asyncio
 import unittest
 import os
 import os.path as osp
@@ -10,7 +11,9 @@ from traits.api import File, List
 from capsul.api import Process
 from capsul.api import Pipeline, PipelineNode
 from capsul.pipeline import pipeline_workflow
+from capsul.process import runprocess
 from capsul.study_config.study_config import StudyConfig
+import soma_workflow.client as swclient
 from soma_workflow.configuration import \
     change_soma_workflow_directory, restore_soma_workflow_directory
 import tempfile
@@ -303,6 +306,71 @@ class TestPipelineWorkflow(unittest.TestCase):
                 #print(text)
                 self.assertEqual(len(text.split('\n')), lens[o])
 
+    def test_async_run(self):
+        from capsul.engine.async_run import execution_monitor
+
+        engine = self.study_config.engine
+        pipeline = self.pipeline
+        pipeline.enable_all_pipeline_steps()
+        with open(pipeline.input, 'w') as f:
+            print('MAIN INPUT', file=f)
+
+        async def collect(events):
+            return [event async for event in events]
+
+        async def run():
+            monitor = execution_monitor(engine)
+            monitor.poll_interval = 0.1
+            exec_id = await engine.astart(pipeline)
+            self.exec_ids.append(exec_id)
+            # one polling task serves both coroutines
+            status, events = await asyncio.gather(
+                engine.await_execution(exec_id, pipeline=pipeline),
+                collect(engine.execution_events(exec_id)))
+            self.assertTrue(monitor._task is None)
+            return status, events, exec_id
+
+        status, events, exec_id = asyncio.run(run())
+        self.assertEqual(status, 'workflow_done')
+        with open(pipeline.output3) as f:
+            self.assertEqual(len(f.read().split('\n')), 5)
+        jobs = [event for event in events if event.kind == 'job']
+        # each job completion is reported once
+        job_ids = [element[0] for element
+                   in engine.detailed_information(exec_id)[0]]
+        self.assertEqual(sorted(event.job_id for event in jobs),
+                         sorted(job_ids))
+        self.assertEqual(set(event.status for event in jobs), set(['done']))
+        self.assertEqual(events[-1].kind, 'status')
+        self.assertEqual(events[-1].status, 'workflow_done')
+        self.assertEqual(asyncio.run(engine.astatus(exec_id)),
+                         'workflow_done')
+
+    def test_batched_wf_run(self):
+        engine = self.study_config.engine
+        pipeline = self.pipeline
+        # jobs of different steps are not batched together
+        pipeline.remove_pipeline_step('step3')
+        pipeline.enable_all_pipeline_steps()
+        with open(pipeline.input, 'w') as f:
+            print('MAIN INPUT', file=f)
+        wf = pipeline_workflow.workflow_from_pipeline(
+            pipeline, study_config=self.study_config, batch_jobs=4)
+        # node3 and node4 are batched in a single job
+        self.assertEqual(len(wf.jobs), 4)
+        self.assertEqual(len(wf.dependencies), 3)
+        batch_job = [job for job in wf.jobs
+                     if hasattr(job, 'batched_jobs')][0]
+        self.assertEqual(sorted(job.name for job in batch_job.batched_jobs),
+                         ['node3', 'node4'])
+
+        exec_id = engine.start(pipeline, workflow=wf)
+        self.exec_ids.append(exec_id)
+        status = engine.wait(exec_id, pipeline=pipeline)
+        self.assertEqual(status, 'workflow_done')
+        self.assertTrue(osp.exists(pipeline.output2))
+        self.assertTrue(osp.exists(pipeline.output3))
+
     def test_iter_workflow_without_temp(self):
         engine = self.study_config.engine
         pipeline = engine.get_process_instance(DummyPipelineIterSimple)
@@ -397,6 +465,106 @@ class TestPipelineWorkflow(unittest.TestCase):
                 #print(text)
                 self.assertEqual(len(text.split('\n')), lens[o])
 
+    def test_array_iter_workflow(self):
+        engine = self.study_config.engine
+        pipeline = engine.get_process_instance(DummyPipelineIter)
+        pipeline.output1 = osp.join(self.tmpdir, 'file_out1')
+        pipeline.output2 = osp.join(self.tmpdir, 'file_out2')
+        pipeline.output3 = osp.join(self.tmpdir, 'file_out3')
+        # 4 jobs per iteration are gathered in arrays of 2 iterations
+        pipeline.input = [osp.join(self.tmpdir, 'file_in%d' % i)
+                          for i in range(5)]
+        wf = pipeline_workflow.workflow_from_pipeline(
+            pipeline, study_config=self.study_config,
+            create_directories=False, array_jobs=2)
+        self.assertEqual(len(wf.jobs), 4 * 3 + 3 + 2)
+
+        niter = 2
+        pipeline.input = [osp.join(self.tmpdir, 'file_in%d' % i)
+                          for i in range(niter)]
+        wf = pipeline_workflow.workflow_from_pipeline(
+            pipeline, study_config=self.study_config,
+            create_directories=False, array_jobs=2)
+        self.assertEqual(len(wf.jobs), 4 + 3 + 2)
+        array_jobs = [job for job in wf.jobs
+                      if job.param_dict.get('array:size') == niter]
+        self.assertEqual(len(array_jobs), 4)
+        # each iteration gets its own temporary file
+        node1_job = [job for job in array_jobs
+                     if job.name.startswith('node1')][0]
+        temp_files = [path for path in node1_job.referenced_output_files
+                      if isinstance(path, swclient.TemporaryPath)]
+        self.assertEqual(len(temp_files), niter)
+        self.assertNotEqual(node1_job.param_dict['0:output'],
+                            node1_job.param_dict['1:output'])
+        self.assertEqual(
+            [job['parameters']['input']
+             for job in runprocess.batch_jobs_descriptions(
+                 {'parameters': array_jobs[0].param_dict})],
+            pipeline.input)
+
+        for i, filein in enumerate(pipeline.input):
+            with open(filein, 'w') as f:
+                print('MAIN INPUT %d' % i, file=f)
+        exec_id = engine.start(pipeline, workflow=wf)
+        self.exec_ids.append(exec_id)
+        status = engine.wait(exec_id, pipeline=pipeline)
+        self.assertEqual(status, 'workflow_done')
+        lens = [16, 20, 20]
+        for o in range(3):
+            with open(getattr(pipeline, 'output%d' % (o+1))) as f:
+                text = f.read()
+                self.assertEqual(len(text.split('\n')), lens[o])
+
+    def test_import_workflow_outputs(self):
+        class Job(object):
+            def __init__(self, process, has_outputs=True):
+                self.process_hash = id(process)
+                self.has_outputs = has_outputs
+                self.job_id = id(self)
+
+        class Controller(object):
+            # records the output queries of import_workflow_outputs()
+            def __init__(self, outputs):
+                self.outputs = outputs
+                self.queried = []
+
+            def workflow(self, wf_id):
+                return self.engine_workflow
+
+            def get_job_output_params(self, job_id):
+                self.queried.append(job_id)
+                return dict(self.outputs.get(job_id, {}))
+
+        pipeline = self.pipeline
+        node1 = pipeline.nodes['node1'].process
+        node2 = pipeline.nodes['node2'].process
+        jobs = [Job(node1, has_outputs=False), Job(node2), Job(object())]
+        output = osp.join(self.tmpdir, 'computed_out.nii')
+        controller = Controller({jobs[1].job_id: {'output': output,
+                                                  'unknown': 'value'}})
+        controller.engine_workflow = type(
+            'EngineWorkflow', (object, ),
+            {'jobs': jobs, 'job_mapping': dict((job, job) for job in jobs)})
+
+        pipeline_workflow.import_workflow_outputs(pipeline, controller, 1)
+        # only jobs with outputs, matching a process, are queried
+        self.assertEqual(controller.queried, [jobs[1].job_id])
+        self.assertEqual(node2.output, output)
+        self.assertEqual(pipeline.output1, output)
+        self.assertEqual(pipeline.nodes['node3'].process.input, output)
+        self.assertEqual(pipeline.nodes['node4'].process.input, output)
+
+        # invalid output values are raised, or logged if ignored
+        controller.outputs[jobs[1].job_id] = {'output': 12}
+        self.assertRaises(Exception,
+                          pipeline_workflow.import_workflow_outputs,
+                          pipeline, controller, 1)
+        with self.assertLogs(pipeline_workflow.__name__, 'WARNING'):
+            pipeline_workflow.import_workflow_outputs(
+                pipeline, controller, 1, ignore_errors=True)
+        self.assertEqual(node2.output, output)
+
 
 def test():
     """ Function to execute unitest
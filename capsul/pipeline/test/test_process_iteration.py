@@ -9,6 +9,10 @@ import os.path as osp
 import unittest
 from tempfile import NamedTemporaryFile
 import struct
+try:
+    from unittest import mock
+except ImportError:
+    import mock
 
 # Trait import
 from traits.api import String, Int, List, File
@@ -16,7 +20,9 @@ from traits.api import String, Int, List, File
 # Capsul import
 from capsul.api import Process
 from capsul.api import Pipeline
-from capsul.pipeline.process_iteration import ProcessIteration
+from capsul.pipeline.process_iteration import ProcessIteration, \
+    IterationError
+from capsul.study_config import run
 import six
 from six.moves import range
 
@@ -48,6 +54,30 @@ class ProcessSlice(Process):
             f.seek(self.slice_number*2, 0)
             f.write(struct.pack('H', self.slice_number))
 
+class Square(Process):
+    value = Int()
+    square = Int(output=True)
+
+    def _run_process(self):
+        if self.value < 0:
+            raise ValueError('negative value: %d' % self.value)
+        self.square = self.value * self.value
+
+
+class SquareSteps(Pipeline):
+    """ Square and fourth power, in two steps.
+    """
+    def pipeline_definition(self):
+        self.add_process('square', Square)
+        self.add_process('fourth', Square)
+        self.add_link('square.square->fourth.value')
+        self.export_parameter('square', 'value')
+        self.export_parameter('square', 'square')
+        self.export_parameter('fourth', 'square', 'fourth')
+        self.add_pipeline_step('square_step', ['square'])
+        self.add_pipeline_step('fourth_step', ['fourth'])
+
+
 class MyPipeline(Pipeline):
     """ Simple Pipeline to test the iterative Node
     """
@@ -117,6 +147,74 @@ class TestPipeline(unittest.TestCase):
         numbers = struct.unpack_from('H' * self.parallel_processes, result)
         self.assertEqual(numbers, tuple(range(self.parallel_processes)))
 
+    def test_parallel_iterations(self):
+        """ Method to test iterations run on separate instances by
+        several workers.
+        """
+        self.pipeline.nodes['process_slices'].process.max_workers = 4
+        self.pipeline()
+        with open(self.pipeline.output_image,'rb') as f:
+            result = f.read()
+        numbers = struct.unpack_from('H' * self.parallel_processes, result)
+        self.assertEqual(numbers, tuple(range(self.parallel_processes)))
+
+        iteration = ProcessIteration(Square, ['value', 'square'],
+                                     max_workers=3)
+        iteration.value = list(range(8))
+        iteration()
+        self.assertEqual(iteration.square, [i * i for i in range(8)])
+        # failed iterations are reported, others keep their outputs
+        iteration.value = [2, -1, 3, -4, 5]
+        iteration.square = []
+        with self.assertRaises(IterationError) as context:
+            iteration()
+        self.assertEqual(sorted(context.exception.errors), [1, 3])
+        self.assertEqual(iteration.square, [4, 0, 9, 0, 25])
+
+    def test_parallel_pipeline_state(self):
+        """ Method to test that the steps state of an iterated pipeline is
+        used by the parallel instances.
+        """
+        iteration = ProcessIteration(SquareSteps, ['value', 'square'],
+                                     max_workers=2)
+        iteration.process.pipeline_steps.fourth_step = False
+        instances = iteration._iteration_instances(4)
+        self.assertEqual(len(instances), 2)
+        for instance in instances:
+            self.assertFalse(instance.pipeline_steps.fourth_step)
+        iteration._iteration_instances = lambda size: instances
+        iteration.value = [1, 2, 3, 4]
+        iteration()
+        self.assertEqual(iteration.square, [1, 4, 9, 16])
+        # the disabled step has not been run
+        for instance in instances:
+            self.assertEqual(instance.nodes['fourth'].process.square, 0)
+        # sequential by default
+        iteration = ProcessIteration(SquareSteps, ['value', 'square'])
+        self.assertTrue(iteration._iteration_instances(4) is None)
+
+    def test_exclusive_iterations(self):
+        """ Method to test that processes which must run alone are iterated
+        sequentially.
+        """
+        def square_exclusive(process):
+            return isinstance(process, Square)
+
+        with mock.patch.object(run, '_runs_exclusively', square_exclusive):
+            iteration = ProcessIteration(Square, ['value', 'square'],
+                                         max_workers=3)
+            self.assertTrue(iteration._iteration_instances(4) is None)
+            # also in an iterated pipeline
+            iteration = ProcessIteration(SquareSteps, ['value', 'square'],
+                                         max_workers=2)
+            self.assertTrue(iteration._iteration_instances(4) is None)
+            iteration.value = [1, 2, 3]
+            iteration()
+            self.assertEqual(iteration.square, [1, 4, 9])
+        iteration = ProcessIteration(Square, ['value', 'square'],
+                                     max_workers=3)
+        self.assertEqual(len(iteration._iteration_instances(4)), 3)
+
 
 def test():
     """ Function to execute unitest
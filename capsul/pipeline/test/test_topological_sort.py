@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import absolute_import
+import unittest
+from capsul.pipeline.topological_sort import Graph, GraphNode, IndexedGraph
+
+
+class TestTopologicalSort(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = Graph()
+        for name in ("slip", "chemise", "pantalon", "ceinture", "cravate"):
+            self.graph.add_node(GraphNode(name, name.upper()))
+        self.graph.add_link("slip", "pantalon")
+        self.graph.add_link("chemise", "pantalon")
+        self.graph.add_link("chemise", "cravate")
+        self.graph.add_link("pantalon", "ceinture")
+        self.graph.add_link("pantalon", "ceinture")
+
+    def test_sort(self):
+        ordered = [name for name, meta in self.graph.topological_sort()]
+        self.assertEqual(len(ordered), 5)
+        for before, after in self.graph._links:
+            self.assertTrue(ordered.index(before) < ordered.index(after))
+        self.assertEqual(len(self.graph._links), 4)
+        self.assertEqual(self.graph.find_node("pantalon").links_from_degree,
+                         2)
+        # the graph is not consumed by the sort
+        self.assertEqual(
+            [name for name, meta in self.graph.topological_sort()], ordered)
+
+    def test_levels(self):
+        levels = [sorted(name for name, meta in level)
+                  for level in self.graph.levels()]
+        self.assertEqual(levels, [["chemise", "slip"],
+                                  ["cravate", "pantalon"],
+                                  ["ceinture"]])
+
+    def test_loop(self):
+        self.graph.add_link("ceinture", "slip")
+        self.assertRaises(Exception, self.graph.topological_sort)
+        self.assertRaises(Exception, self.graph.levels)
+
+    def test_indexed_graph(self):
+        graph = IndexedGraph(4)
+        graph.add_link(0, 2)
+        graph.add_link(0, 1)
+        graph.add_link(3, 0)
+        offsets, targets, in_degrees = graph.csr()
+        self.assertEqual(list(offsets), [0, 2, 2, 2, 3])
+        self.assertEqual(list(targets), [2, 1, 0])
+        self.assertEqual(list(in_degrees), [1, 1, 1, 0])
+        self.assertEqual(graph.topological_sort(), [3, 0, 1, 2])
+        self.assertEqual(graph.levels(), [[3], [0], [1, 2]])
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestTopologicalSort)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
@@ -4,20 +4,198 @@ Build graph with dependencies from a pipeline
 
 Classes
 =======
+:class:`IndexedGraph`
+---------------------
 :class:`GraphNode`
 ------------------
+:class:`Graph`
+--------------
+:class:`CompiledGraph`
+----------------------
 '''
 
 # System import
 from __future__ import absolute_import
 from __future__ import print_function
 import logging
+from array import array
 import six
+from six.moves import range
 
 # Define the logger
 logger = logging.getLogger(__name__)
 
 
+class IndexedGraph(object):
+    """ Compact directed graph with integer node ids.
+
+    Edges are recorded in insertion order, and converted on demand into
+    compressed sparse row (CSR) adjacency arrays: the successors of node
+    ``i`` are ``targets[offsets[i]:offsets[i + 1]]``. Sorting and levels
+    extraction are linear in the number of nodes and edges.
+
+    Attributes
+    ----------
+    size : int
+        the number of nodes
+    edges_count : int
+        the number of edges
+
+    Methods
+    --------
+    add_node
+    add_link
+    csr
+    topological_sort
+    levels
+    """
+
+    def __init__(self, size=0):
+        """ Create an IndexedGraph
+
+        Parameters
+        ----------
+        size: int (optional)
+            initial number of nodes, with ids 0 to size - 1
+        """
+        self.size = size
+        self._sources = array('l')
+        self._targets = array('l')
+        self._csr = None
+
+    @property
+    def edges_count(self):
+        return len(self._sources)
+
+    def add_node(self):
+        """ Method to add a node
+
+        Returns
+        -------
+        id: int
+            the new node id
+        """
+        self.size += 1
+        self._csr = None
+        return self.size - 1
+
+    def add_link(self, from_id, to_id):
+        """ Method to add an edge between two nodes
+
+        Duplicate edges are not detected here.
+
+        Parameters
+        ----------
+        from_id: int (mandatory)
+            a node id
+        to_id: int (mandatory)
+            the successor node id
+        """
+        self._sources.append(from_id)
+        self._targets.append(to_id)
+        self._csr = None
+
+    def csr(self):
+        """ Get the CSR adjacency arrays
+
+        Successors of each node are kept in edge insertion order.
+
+        Returns
+        -------
+        offsets: array
+            size + 1 offsets in targets
+        targets: array
+            successors ids
+        in_degrees: array
+            number of predecessors of each node
+        """
+        if self._csr is None:
+            size = self.size
+            offsets = array('l', [0]) * (size + 1)
+            in_degrees = array('l', [0]) * size
+            for source, target in zip(self._sources, self._targets):
+                offsets[source + 1] += 1
+                in_degrees[target] += 1
+            for i in range(size):
+                offsets[i + 1] += offsets[i]
+            position = array('l', offsets[:size])
+            targets = array('l', [0]) * len(self._targets)
+            for source, target in zip(self._sources, self._targets):
+                targets[position[source]] = target
+                position[source] += 1
+            self._csr = (offsets, targets, in_degrees)
+        return self._csr
+
+    def topological_sort(self):
+        """ Perform a Kahn topological sort
+
+        Nodes without pending predecessors are taken from a stack, starting
+        with the nodes of in-degree 0 in ids order.
+
+        Returns
+        -------
+        output: list of int
+            the ordered nodes ids
+
+        Raises
+        ------
+        Exception if the graph contains a loop
+        """
+        offsets, targets, in_degrees = self.csr()
+        degrees = array('l', in_degrees)
+        nnil = [i for i in range(self.size) if degrees[i] == 0]
+        ordered = []
+        while nnil:
+            current = nnil.pop()
+            ordered.append(current)
+            for j in range(offsets[current], offsets[current + 1]):
+                target = targets[j]
+                degrees[target] -= 1
+                if degrees[target] == 0:
+                    nnil.append(target)
+        if len(ordered) != self.size:
+            raise Exception("There is loop in the Graph."
+                            "Please inverstigate")
+        return ordered
+
+    def levels(self):
+        """ Split the nodes in levels (wavefronts)
+
+        The first level contains the nodes without predecessors, and each
+        following level contains the nodes whose predecessors all belong to
+        previous levels. Nodes of a same level do not depend on each other.
+
+        Returns
+        -------
+        output: list of list of int
+            nodes ids of each level, in ids order
+
+        Raises
+        ------
+        Exception if the graph contains a loop
+        """
+        offsets, targets, in_degrees = self.csr()
+        degrees = array('l', in_degrees)
+        level = [i for i in range(self.size) if degrees[i] == 0]
+        levels = []
+        count = 0
+        while level:
+            levels.append(level)
+            count += len(level)
+            next_level = []
+            for current in level:
+                for j in range(offsets[current], offsets[current + 1]):
+                    target = targets[j]
+                    degrees[target] -= 1
+                    if degrees[target] == 0:
+                        next_level.append(target)
+            level = sorted(next_level)
+        if count != self.size:
+            raise Exception("There is loop in the Graph."
+                            "Please inverstigate")
+        return levels
+
+
 class GraphNode(object):
     """ Simple Graph Node Structure
 
@@ -25,6 +203,8 @@ class GraphNode(object):
     ----------
     name : str
         the node name
+    id : int
+        the node id in its Graph (None before it is added)
     meta : object
         a python object stored in the node
     links_to : list
@@ -56,6 +236,7 @@ class GraphNode(object):
         an python object to store in the node
         """
         self.name = name
+        self.id = None
         self.meta = meta
         # variables to store the graph edges
         self.links_to = []
@@ -117,8 +298,8 @@ class Graph(object):
     """ Simple Graph Structure on which we want to perform a
     topological tree (no cycle).
 
-    The algorithm is based on the R.E. Tarjanlinear linear
-    optimization (O(N+A)).
+    Named nodes are a facade over an :class:`IndexedGraph`, on which the
+    sort is performed in linear time (O(N+A)).
 
     Attributes
     ----------
@@ -133,6 +314,7 @@ class Graph(object):
     find_node
     add_link
     topological_sort
+    levels
     """
 
     def __init__(self):
@@ -140,6 +322,9 @@ class Graph(object):
         """
         self._nodes = {}
         self._links = []
+        self._links_set = set()
+        self._indexed = IndexedGraph()
+        self._id_nodes = []
 
     def add_node(self, node):
         """ Method to add a GraphNode in the Graph
@@ -155,6 +340,8 @@ class Graph(object):
         if node.name in self._nodes:
             raise Exception("Expect a GraphNode with a unique name, "
                             "got {0}".format(node))
+        node.id = self._indexed.add_node()
+        self._id_nodes.append(node)
         self._nodes[node.name] = node
 
     def find_node(self, node_name):
@@ -186,55 +373,172 @@ class Graph(object):
         if to_node not in self._nodes:
             raise Exception("Node {0} is not defined in the Graph."
                    "Use add_node() method".format(to_node))
-        if (from_node, to_node) not in self._links:
-            self._nodes[to_node].add_link_from(self._nodes[from_node])
-            self._nodes[from_node].add_link_to(self._nodes[to_node])
+        if (from_node, to_node) not in self._links_set:
+            source = self._nodes[from_node]
+            target = self._nodes[to_node]
+            # the link is new: skip the GraphNode lists membership checks
+            target.links_from.append(source)
+            target.links_from_degree += 1
+            source.links_to.append(target)
+            source.links_to_degree += 1
+            self._links_set.add((from_node, to_node))
             self._links.append((from_node, to_node))
+            self._indexed.add_link(source.id, target.id)
 
     def topological_sort(self):
         """ Perform the topological sort: find an order in which all the
         nodes can be taken.
         Step 1: Identify nodes that have no incoming link (nnil).
         Step 2: Loop until there are nnil
-        a) Delete the current nodes c_nnil of in-degree 0.
+        a) Take the last node c_nnil of in-degree 0.
         b) Place it in the output.
-        c) Remove all its outgoing links from the graph.
-        d) If the node has in-degree 0, add the node to nnil.
+        c) Decrease the in-degree of its successors.
+        d) If a successor has in-degree 0, add it to nnil.
         Step 3: Assert that there is no loop in the graph.
 
+        The graph is left unchanged.
+
         Returns
         -------
         output: list of tuple
             a list of ordered nodes with a tuple element containing the node
             name and the node meta element.
         """
-        ordered_nodes = []
-
-        # Step 1
-        nnil = []
-        for name, node in six.iteritems(self._nodes):
-            if node.links_from_degree == 0:
-                nnil.append(node)
-
-        # Step 2
-        while len(nnil):
-        #-- a
-            c_nnil = nnil.pop()
-        #-- b
-            ordered_nodes.append(c_nnil)
-        #-- c
-            for node in c_nnil.links_to:
-                node.remove_link_from(c_nnil)
-        #-- d
-                if node.links_from_degree == 0:
-                    nnil.append(node)
-
-        # Step 3
-        if len(ordered_nodes) == len(self._nodes):
-            return [(node.name, node.meta) for node in ordered_nodes]
-        else:
-            raise Exception("There is loop in the Graph."
-                            "Please inverstigate")
+        nodes = self._id_nodes
+        return [(nodes[i].name, nodes[i].meta)
+                for i in self._indexed.topological_sort()]
+
+    def levels(self):
+        """ Split the nodes in levels (wavefronts) of nodes which may be
+        taken concurrently, once all the previous levels have been taken.
+
+        Returns
+        -------
+        output: list of list of tuple
+            for each level, a list of tuple elements containing the node
+            name and the node meta element.
+        """
+        nodes = self._id_nodes
+        return [[(nodes[i].name, nodes[i].meta) for i in level]
+                for level in self._indexed.levels()]
+
+
+class CompiledGraph(object):
+    """ Flat, integer-indexed form of a (possibly nested) :class:`Graph`.
+
+    Sub-graphs are expanded into their leaf elements, and dependencies
+    between sub-graphs are translated into dependencies between their
+    leaves: the ending leaves of a sub-graph precede the starting leaves of
+    the sub-graphs which depend on it. The graph is sorted once, when it is
+    compiled, and can be queried many times afterwards.
+
+    Attributes
+    ----------
+    names : list
+        dotted names of the leaf elements (sub-graph names as prefixes)
+    metas : list
+        the leaf elements (the items of the graph nodes meta lists)
+    index : dict
+        {meta: int} index of each leaf element in metas
+    successors : list
+        for each leaf element, the sorted list of its successors indices
+    predecessors : list
+        for each leaf element, the sorted list of its predecessors indices
+    order : list
+        leaf element indices in execution order
+    repr : str
+        top level nodes names in execution order, joined with "->"
+
+    Methods
+    -------
+    ordered_metas
+    """
+
+    def __init__(self, graph):
+        """ Compile a Graph
+
+        Parameters
+        ----------
+        graph: Graph (mandatory)
+            the graph to compile
+        """
+        self.names = []
+        self.metas = []
+        self.successors = []
+        self.predecessors = []
+        self.order = []
+        top_names = self._compile(graph, '')
+        self.repr = "->".join(top_names)
+        self.index = dict((meta, i) for i, meta in enumerate(self.metas))
+        self.successors = [sorted(s) for s in self.successors]
+        self.predecessors = [sorted(p) for p in self.predecessors]
+
+    def _add_leaf(self, name, meta):
+        index = len(self.metas)
+        self.names.append(name)
+        self.metas.append(meta)
+        self.successors.append(set())
+        self.predecessors.append(set())
+        self.order.append(index)
+        return index
+
+    def _add_link(self, from_index, to_index):
+        self.successors[from_index].add(to_index)
+        self.predecessors[to_index].add(from_index)
+
+    def _compile(self, graph, prefix):
+        """ Expand the graph leaves and their links, return the sorted top
+        level nodes names
+        """
+        links = graph._links
+        ordered = graph.topological_sort()
+        first = {}
+        last = {}
+        for name, meta in ordered:
+            start = len(self.metas)
+            if isinstance(meta, Graph):
+                self._compile(meta, prefix + name + '.')
+            else:
+                # items in a meta list are taken in sequence
+                for item in meta:
+                    index = self._add_leaf(prefix + name, item)
+                    if index > start:
+                        self._add_link(index - 1, index)
+            indices = range(start, len(self.metas))
+            first[name] = [i for i in indices
+                           if not self.predecessors[i]]
+            last[name] = [i for i in indices
+                          if not self.successors[i]]
+
+        # nodes without leaves do not break dependency chains: their
+        # predecessors ends are forwarded to their successors
+        ends = {}
+        predecessors = {}
+        for from_node, to_node in links:
+            predecessors.setdefault(to_node, []).append(from_node)
+        for name, meta in ordered:
+            if first[name]:
+                ends[name] = last[name]
+            else:
+                ends[name] = sorted(set(
+                    i for pred in predecessors.get(name, [])
+                    for i in ends[pred]))
+        for from_node, to_node in links:
+            for from_index in ends[from_node]:
+                for to_index in first[to_node]:
+                    self._add_link(from_index, to_index)
+
+        return [name for name, meta in ordered]
+
+    def ordered_metas(self):
+        """ Get the leaf elements in execution order
+
+        Returns
+        -------
+        output: list
+            a new list of the leaf elements
+        """
+        return [self.metas[i] for i in self.order]
 
 
 if __name__ == '__main__':
@@ -38,6 +38,7 @@ import sys
 import functools
 import glob
 import tempfile
+import time
 import traceback
 
 # Define the logger
@@ -57,6 +58,7 @@ from soma.utils import json_utils
 
 # Capsul import
 from capsul.utils.version_utils import get_tool_version
+from capsul.utils.fs_snapshot import FileSystemSnapshot
 
 
 class ProcessMeta(Controller.__class__):
@@ -712,40 +714,11 @@ class Process(six.with_metaclass(ProcessMeta, Controller)):
             with open(param_file) as f:
                 params_conf = json_utils.from_json(json.load(f))
 
-        configuration = params_conf.get('configuration_dict')
-        if configuration:
-            # activation will be re-done during run() but some global configs
-            # (nipype SPM/Matlab settings) need to be done before any process
-            # is instantiated, so we must do it earlier, right now.
-
-            # clear activations for now.
-            from capsul import engine
-            engine.activated_modules = set()
-            engine.activate_configuration(configuration)
-
-        params = params_conf.get('parameters', {})
-        ## filter out undefined values -- maybe this is not OK in all cases:
-        ## we may want to manually reset a parameter, but in normal cases,
-        ## Undefined values are just not set, which means that the values are
-        ## left to defaults depending on the global config: nipype works like
-        ## this for matlab parameters.
-        #params = dict([(k, v) for k, v in params.items()
-                       #if v is not Undefined])
-
-        process = ce.get_process_instance(process_definition)
-        try:
-            process.import_from_dict(params)
-        except Exception as e:
-            print('error in setting parameters of process %s, with dict:'
-                  % process.name, params, file=sys.stderr)
-            raise
-        # actually run the process
-        ce.study_config.use_soma_workflow = False
         cwd = os.getcwd()
         with tempfile.TemporaryDirectory() as temp_work_dir:
             os.chdir(temp_work_dir)
-            result = ce.study_config.run(process,
-                                         configuration_dict=configuration)
+            output_params = Process.run_from_params(
+                process_definition, params_conf, engine=ce)
             os.chdir(cwd)
         # collect output parameters
         out_param_file = os.environ.get('SOMAWF_OUTPUT_PARAMS')
@@ -760,26 +733,7 @@ class Process(six.with_metaclass(ProcessMeta, Controller)):
                               '${SOMAWF_OUTPUT_PARAMS}'):
             out_param_file = None
 
-        output_params = {}
         if out_param_file:
-            if result is None:
-                result = {}
-            reserved_params = ("nodes_activation", "selection_changed")
-            for param, trait in six.iteritems(process.user_traits()):
-                if param in reserved_params or not trait.output:
-                    continue
-                if isinstance(trait.trait_type, (File, Directory)) \
-                        and trait.input_filename is not False:
-                    continue
-                elif isinstance(trait.trait_type, List) \
-                        and isinstance(trait.inner_traits[0].trait_type,
-                                       (File, Directory)) \
-                        and trait.inner_traits[0].trait_type.input_filename \
-                            is not False \
-                        and trait.input_filename is not False:
-                    continue
-                output_params[param] = getattr(process, param)
-            output_params.update(result)
             with open(out_param_file, 'w') as f:
                 json.dump(json_utils.to_json(output_params), f)
 
@@ -789,6 +743,96 @@ class Process(six.with_metaclass(ProcessMeta, Controller)):
         # process has succeeded...
         os._exit(0)
 
+    @staticmethod
+    def run_from_params(process_definition, params_conf, engine=None,
+                        activate=True):
+        '''
+        Instantiate and run a process from a job description dict, as read
+        from the ``SOMAWF_INPUT_PARAMS`` file by :meth:`run_from_commandline`,
+        and return its output parameters.
+
+        This is the part of :meth:`run_from_commandline` which can be called
+        several times in the same interpreter, as done by batched workers
+        (see :func:`capsul.process.runprocess.run_jobs`). The current
+        directory is not changed.
+
+        Parameters
+        ----------
+        process_definition: str
+            process identifier, as given to ``get_process_instance()``
+        params_conf: dict
+            contains the ``parameters`` dict and optionally the
+            ``configuration_dict`` used for the execution.
+        engine: CapsulEngine (optional)
+            engine used to instantiate and run the process. A new one is
+            created if not given.
+        activate: bool (optional)
+            if False, the configuration is assumed to be already activated
+            in the current interpreter.
+
+        Returns
+        -------
+        output_params: dict
+            output parameters values which are not (input) filenames
+        '''
+        if engine is None:
+            from capsul.engine import capsul_engine
+            engine = capsul_engine()
+
+        configuration = params_conf.get('configuration_dict')
+        if configuration and activate:
+            # activation will be re-done during run() but some global configs
+            # (nipype SPM/Matlab settings) need to be done before any process
+            # is instantiated, so we must do it earlier, right now.
+
+            # clear activations for now.
+            from capsul import engine as engine_module
+            engine_module.activated_modules = set()
+            engine_module.activate_configuration(configuration)
+
+        params = params_conf.get('parameters', {})
+        ## filter out undefined values -- maybe this is not OK in all cases:
+        ## we may want to manually reset a parameter, but in normal cases,
+        ## Undefined values are just not set, which means that the values are
+        ## left to defaults depending on the global config: nipype works like
+        ## this for matlab parameters.
+        #params = dict([(k, v) for k, v in params.items()
+                       #if v is not Undefined])
+
+        process = engine.get_process_instance(process_definition)
+        try:
+            process.import_from_dict(params)
+        except Exception as e:
+            print('error in setting parameters of process %s, with dict:'
+                  % process.name, params, file=sys.stderr)
+            raise
+        # actually run the process
+        engine.study_config.use_soma_workflow = False
+        result = engine.study_config.run(process,
+                                         configuration_dict=configuration)
+
+        # collect output parameters
+        if result is None:
+            result = {}
+        output_params = {}
+        reserved_params = ("nodes_activation", "selection_changed")
+        for param, trait in six.iteritems(process.user_traits()):
+            if param in reserved_params or not trait.output:
+                continue
+            if isinstance(trait.trait_type, (File, Directory)) \
+                    and trait.input_filename is not False:
+                continue
+            elif isinstance(trait.trait_type, List) \
+                    and isinstance(trait.inner_traits[0].trait_type,
+                                   (File, Directory)) \
+                    and trait.inner_traits[0].trait_type.input_filename \
+                        is not False \
+                    and trait.input_filename is not False:
+                continue
+            output_params[param] = getattr(process, param)
+        output_params.update(result)
+        return output_params
+
     def get_log(self):
         """ Load the logging file.
 
@@ -1230,6 +1274,32 @@ class Process(six.with_metaclass(ProcessMeta, Controller)):
             return None
 
 
+def _reflink(src, dst):
+    """ Make a copy-on-write clone of the file src to dst, if the system and
+    filesystem support it (Linux FICLONE ioctl).
+
+    Returns
+    -------
+    done: bool
+        False if the clone could not be made.
+    """
+    if not sys.platform.startswith('linux') or os.path.isdir(src):
+        return False
+    import fcntl
+
+    FICLONE = 0x40049409
+    try:
+        with open(src, 'rb') as fsrc:
+            with open(dst, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except (IOError, OSError):
+        if os.path.exists(dst):
+            os.unlink(dst)
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
 class FileCopyProcess(Process):
     """ A specific process that copies all the input files.
 
@@ -1239,6 +1309,14 @@ class FileCopyProcess(Process):
         the list of copied file parameters {param: dst_value}
     copied_files: dict
         copied files {param: [dst_value1, ...]}
+    copy_mode: str
+        how files of inputs_to_copy are staged: "copy", "hardlink" or
+        "reflink" (see :meth:`__init__`)
+    copy_workers: int
+        number of files copied at the same time
+    _staging_time: float
+        time spent copying the inputs in the last execution (None if the
+        copy is not activated)
 
     Methods
     -------
@@ -1247,9 +1325,12 @@ class FileCopyProcess(Process):
     _get_process_arguments
     _copy_input_files
     """
+    copy_modes = ('copy', 'hardlink', 'reflink')
+
     def __init__(self, activate_copy=True, inputs_to_copy=None,
                  inputs_to_clean=None, destination=None,
-                 inputs_to_symlink=None, use_temp_output_dir=False):
+                 inputs_to_symlink=None, use_temp_output_dir=False,
+                 copy_mode='copy', copy_workers=4):
         """ Initialize the FileCopyProcess class.
 
         Parameters
@@ -1274,10 +1355,24 @@ class FileCopyProcess(Process):
             final location. This is useful when several parallel jobs are
             working in the same directory and may write the same intermediate
             files (SPM does this a lot).
+        copy_mode: str
+            how inputs_to_copy files are staged. "copy": full copies.
+            "hardlink": hard links, much faster, but the input files are
+            modified if the process modifies its copies (SPM may do so for
+            some inputs). "reflink": copy-on-write clones, on filesystems
+            which support them (Btrfs, XFS...). When links or clones cannot
+            be made (different filesystems for instance), files are copied.
+        copy_workers: int
+            number of files copied at the same time.
         """
         # Inheritance
         super(FileCopyProcess, self).__init__()
 
+        if copy_mode not in self.copy_modes:
+            raise ValueError('Unknown copy_mode: %s' % repr(copy_mode))
+        self.copy_mode = copy_mode
+        self.copy_workers = copy_workers
+
         # Class parameters
         self.activate_copy = activate_copy
         self.destination = destination
@@ -1327,10 +1422,13 @@ class FileCopyProcess(Process):
             self.output_directory = destdir
 
         # The copy option is activated
+        self._staging_time = None
         if self.activate_copy:
 
             # Copy the desired items
+            start_time = time.time()
             self._update_input_traits()
+            self._staging_time = time.time() - start_time
 
             self._recorded_params = {}
             # Set the process inputs
@@ -1491,12 +1589,16 @@ class FileCopyProcess(Process):
         # Get the new trait values
         input_parameters, input_symlinks = self._get_process_arguments()
         self.copied_files = {}
+        snapshot = FileSystemSnapshot()
+        operations = []
         self.copied_inputs \
-            = self._copy_input_files(input_parameters, False,
-                                     self.copied_files, copy=copy)
+            = self._stage_input_files(input_parameters, False,
+                                      self.copied_files, copy, snapshot,
+                                      operations)
         self.copied_inputs.update(
-            self._copy_input_files(input_symlinks, True, self.copied_files,
-                                   copy=copy))
+            self._stage_input_files(input_symlinks, True, self.copied_files,
+                                    copy, snapshot, operations))
+        self._run_staging_operations(operations)
 
     def _copy_input_files(self, python_object, use_symlink=True,
                           files_list=None, copy=True):
@@ -1523,6 +1625,22 @@ class FileCopyProcess(Process):
         out: object
             the copied-file input object.
         """
+        operations = []
+        out = self._stage_input_files(python_object, use_symlink, files_list,
+                                      copy, FileSystemSnapshot(), operations)
+        self._run_staging_operations(operations)
+        return out
+
+    def _stage_input_files(self, python_object, use_symlink, files_list,
+                           copy, snapshot, operations):
+        """ Recursive part of :meth:`_copy_input_files`: build the copied
+        input object, and the list of (source, destination, use_symlink)
+        operations to perform.
+
+        Input files existence, and their associated files (same name with a
+        different extension), are looked for in the filesystem snapshot, so
+        that each source directory is listed once.
+        """
         if sys.platform.startswith('win') and sys.version_info[0] < 3:
             # on windows, no symlinks (in python2 at least).
             use_symlink = False
@@ -1538,9 +1656,9 @@ class FileCopyProcess(Process):
                         sub_files_list = files_list.setdefault(key, [])
                     else:
                         sub_files_list = files_list
-                    out[key] = self._copy_input_files(val, use_symlink,
-                                                      sub_files_list,
-                                                      copy=copy)
+                    out[key] = self._stage_input_files(
+                        val, use_symlink, sub_files_list, copy, snapshot,
+                        operations)
 
         # Deal with tuple and list
         # Create an output list or tuple that will contain the copied file
@@ -1549,8 +1667,9 @@ class FileCopyProcess(Process):
             out = []
             for val in python_object:
                 if val is not Undefined:
-                    out.append(self._copy_input_files(val, use_symlink,
-                                                      files_list, copy=copy))
+                    out.append(self._stage_input_files(
+                        val, use_symlink, files_list, copy, snapshot,
+                        operations))
             if isinstance(python_object, tuple):
                 out = tuple(out)
 
@@ -1560,7 +1679,7 @@ class FileCopyProcess(Process):
             out = python_object
             if (python_object is not Undefined and
                     isinstance(python_object, six.string_types) and
-                    os.path.isfile(python_object)):
+                    snapshot.isfile(python_object)):
                 destdir = self._destination
                 if not os.path.exists(destdir):
                     os.makedirs(destdir)
@@ -1569,41 +1688,83 @@ class FileCopyProcess(Process):
                 if out == python_object:
                     return out  # input=output, nothing to do
                 if copy:
-                    if os.path.exists(out) or os.path.islink(out):
-                        if os.path.isdir(out):
-                            shutil.rmtree(out)
-                        else:
-                            os.unlink(out)
-                    if use_symlink:
-                        os.symlink(python_object, out)
-                    else:
-                        shutil.copy2(python_object, out)
+                    operations.append((python_object, out, use_symlink))
                     if files_list is not None:
                         files_list.append(out)
 
                     # Copy associated .mat/.json/.minf files
-                    name = fname.rsplit(".", 1)[0]
-                    matfnames = glob.glob(os.path.join(
-                        os.path.dirname(python_object), name + ".*"))
-                    for matfname in matfnames:
-                        extrafname = os.path.basename(matfname)
+                    name = fname.rsplit(".", 1)[0] + "."
+                    srcdir = os.path.dirname(python_object)
+                    for extrafname in snapshot.listdir(srcdir, name):
                         extraout = os.path.join(destdir, extrafname)
                         if extraout != out:
-                            if os.path.exists(extraout) \
-                                    or os.path.islink(extraout):
-                                if os.path.isdir(extraout):
-                                    shutil.rmtree(extraout)
-                                else:
-                                    os.unlink(extraout)
-                            if use_symlink:
-                                os.symlink(matfname, extraout)
-                            else:
-                                shutil.copy2(matfname, extraout)
+                            operations.append(
+                                (os.path.join(srcdir, extrafname), extraout,
+                                 use_symlink))
                             if files_list is not None:
                                 files_list.append(extraout)
 
         return out
 
+    def _run_staging_operations(self, operations):
+        """ Perform the (source, destination, use_symlink) operations
+        returned by :meth:`_stage_input_files`. Copies are done in a pool of
+        :attr:`copy_workers` threads.
+        """
+        # inputs may share a destination (repeated files, or sidecar files
+        # given as inputs too): only the last operation on it is done, as
+        # it would overwrite the other ones
+        last = dict((op[1], i) for i, op in enumerate(operations))
+        operations = [op for i, op in enumerate(operations)
+                      if last[op[1]] == i]
+        links = [op for op in operations if op[2]]
+        copies = [op[:2] for op in operations if not op[2]]
+        for src, dst, use_symlink in links:
+            self._stage_file(src, dst, True)
+        copy_mode = getattr(self, 'copy_mode', 'copy')
+        workers = min(getattr(self, 'copy_workers', 1) or 1, len(copies))
+        if workers <= 1:
+            for src, dst in copies:
+                self._stage_file(src, dst, False, copy_mode)
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(self._stage_file, src, dst, False,
+                                           copy_mode)
+                           for src, dst in copies]
+            for future in futures:
+                # raise errors, if any
+                future.result()
+
+    @staticmethod
+    def _stage_file(src, dst, use_symlink, copy_mode='copy'):
+        """ Symlink, copy, hardlink or clone a file (see
+        :attr:`copy_mode`). Links and clones fall back to copies when they
+        are not possible.
+        """
+        if os.path.lexists(dst):
+            if os.path.isdir(dst) and not os.path.islink(dst):
+                shutil.rmtree(dst)
+            else:
+                os.unlink(dst)
+        if use_symlink:
+            os.symlink(src, dst)
+            return
+        if copy_mode == 'hardlink' and hasattr(os, 'link') \
+                and not os.path.isdir(src):
+            try:
+                os.link(src, dst)
+                return
+            except OSError:
+                pass
+        elif copy_mode == 'reflink' and _reflink(src, dst):
+            return
+        if os.path.isdir(src):
+            shutil.copytree(src, dst, symlinks=True)
+        else:
+            shutil.copy2(src, dst)
+
     def _get_process_arguments(self):
         """ Get the process arguments.
 
@@ -2022,6 +2183,12 @@ class ProcessResult(object):
         Representation of the process inputs.
     outputs : dict (optional)
         Representation of the process outputs.
+
+    Attributes
+    ----------
+    profile : dict
+        Execution profile record (see :mod:`capsul.utils.profiling`), set
+        when the execution is profiled, None otherwise.
     """
 
     def __init__(self, process, runtime, returncode, inputs=None,
@@ -2033,3 +2200,4 @@ class ProcessResult(object):
         self.returncode = returncode
         self.inputs = inputs
         self.outputs = outputs
+        self.profile = None
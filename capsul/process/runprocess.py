@@ -52,26 +52,34 @@ Functions
 +++++++++++++++++++++++++++++++++++++
 :func:`convert_commandline_parameter`
 +++++++++++++++++++++++++++++++++++++
+:func:`batch_jobs_descriptions`
++++++++++++++++++++++++++++++++
+:func:`run_jobs`
+++++++++++++++++
+:func:`run_batch_from_commandline`
+++++++++++++++++++++++++++++++++++
+:func:`serve_job_queue`
++++++++++++++++++++++++
+:func:`serve_spool`
++++++++++++++++++++
 :func:`main`
 ++++++++++++
 
 
 """
 
-from capsul.api import StudyConfig
-from capsul.api import capsul_engine
-from capsul.api import Pipeline
-from capsul.attributes.completion_engine import ProcessCompletionEngine
+# capsul, traits and soma.controller modules are imported in functions, in
+# order to keep the commandline startup fast (--help does not need them).
 from soma.qt_gui import qt_backend
-from soma.controller import Controller
 import os
 import logging
 import sys
 import re
 from optparse import OptionParser, OptionGroup
-from traits.api import Undefined, List
 import tempfile
 import subprocess
+import threading
+import traceback
 try:
     import yaml
 except ImportError:
@@ -91,6 +99,8 @@ class ProcessParamError(Exception):
 
 def set_process_param_from_str(process, k, arg):
     """Set a process parameter from a string representation."""
+    from capsul.api import Pipeline
+
     if '.' in k and hasattr(process, 'nodes'):
         sub_node_name, k2 = k.split('.', 1)
         sub_node = process.nodes.get(sub_node_name)
@@ -140,6 +150,9 @@ def set_process_param_from_str(process, k, arg):
 
 
 def parse_pipeline_steps(process, kwargs):
+    from capsul.api import Pipeline
+    from soma.controller import Controller
+
     if not isinstance(process, Pipeline):
         return
 
@@ -213,6 +226,9 @@ def get_process_with_params(process_name, study_config, iterated_params=[],
     -------
     process: Process instance
     '''
+    from capsul.api import Pipeline
+    from capsul.attributes.completion_engine import ProcessCompletionEngine
+
     process = study_config.get_process_instance(process_name)
     signature = process.user_traits()
     params = list(signature.keys())
@@ -256,7 +272,8 @@ def run_process_with_distribution(
         resource_id=None, password=None, config=None, rsa_key_pass=None,
         queue=None, input_file_processing=None, output_file_processing=None,
         keep_workflow=False, keep_failed_workflow=False,
-        write_workflow_only=None, max_running_jobs=None, max_queued_jobs=None):
+        write_workflow_only=None, max_running_jobs=None, max_queued_jobs=None,
+        batch_jobs=None):
     ''' Run the given process, either sequentially or distributed through
     Soma-Workflow.
 
@@ -303,6 +320,10 @@ def run_process_with_distribution(
         override the queue settings for OCFG_MAX_JOB_RUNNING in soma-workflow
     max_queued_jobs: int
         override the queue settings for OCFG_MAX_JOB_IN_QUEUE in soma-workflow
+    batch_jobs: int
+        group up to this number of small independent jobs into batched
+        worker jobs in the workflow (see
+        :func:`~capsul.pipeline.pipeline_workflow.workflow_from_pipeline`)
     '''
     if write_workflow_only:
         use_soma_workflow = True
@@ -318,7 +339,8 @@ def run_process_with_distribution(
                 import workflow_from_pipeline
             import soma_workflow.client as swclient
 
-            workflow = workflow_from_pipeline(process)
+            workflow = workflow_from_pipeline(process,
+                                              batch_jobs=batch_jobs or 0)
             swclient.Helper.serialize(write_workflow_only, workflow)
 
             return
@@ -336,7 +358,8 @@ def run_process_with_distribution(
                         resource_id, {})
             getattr(study_config.somaworkflow_computing_resources_config,
                     resource_id).queue = queue
-        if max_running_jobs is not None or max_queued_jobs is not None:
+        if max_running_jobs is not None or max_queued_jobs is not None \
+                or batch_jobs is not None:
             values = {}
             values['computing_resource'] = resource_id
             if queue is not None:
@@ -345,6 +368,8 @@ def run_process_with_distribution(
                 values['max_running_jobs'] = max_running_jobs
             if max_queued_jobs is not None:
                 values['max_queued_jobs'] = max_queued_jobs
+            if batch_jobs is not None:
+                values['batch_jobs'] = batch_jobs
             engine = study_config.engine
             engine.load_module('somaworkflow')
             with engine.settings as session:
@@ -364,6 +389,8 @@ def run_process_with_distribution(
 
 
 def convert_commandline_parameter(i):
+    from traits.api import Undefined
+
     i = i.replace('<undefined>', 'Undefined')
     if len(i) > 0 and (i[0] in '[({' or i in ('None', 'True', 'False',
                                               'Undefined')):
@@ -376,6 +403,320 @@ def convert_commandline_parameter(i):
     return res
 
 
+
+# batched worker mode
+_activation_lock = threading.RLock()
+_activated_configuration = [None]
+
+
+def _activate_job_configuration(configuration):
+    ''' Activate a job configuration, unless it is already the active one
+    '''
+    with _activation_lock:
+        if configuration and configuration != _activated_configuration[0]:
+            from capsul import engine as engine_module
+            engine_module.activated_modules = set()
+            engine_module.activate_configuration(configuration)
+            _activated_configuration[0] = configuration
+
+
+def batch_jobs_descriptions(params_conf):
+    ''' Split the parameters of a batched workflow job (as built by
+    :func:`~capsul.pipeline.pipeline_workflow.workflow_from_pipeline` with the
+    ``batch_jobs`` option) into individual job descriptions.
+
+    Parameters of the batched job are flat (``"<num>:<param>"`` keys) in
+    order to let soma-workflow translate their paths.
+
+    Array jobs (built with the ``array_jobs`` option) run the same process
+    (``"array:job"`` parameter) ``"array:size"`` times: parameters without a
+    ``"<num>:"`` prefix are common to all iterations.
+
+    Returns
+    -------
+    jobs: list of dict
+        job descriptions, with ``process``, ``parameters`` and
+        ``configuration_dict`` keys.
+    '''
+    params = params_conf.get('parameters', {})
+    configuration = params_conf.get('configuration_dict')
+    if 'array:job' in params:
+        common = dict((key, value) for key, value in six.iteritems(params)
+                      if ':' not in key)
+        jobs = [{'process': params['array:job'], 'parameters': dict(common),
+                 'configuration_dict': configuration}
+                for i in range(params['array:size'])]
+    else:
+        jobs = [{'process': definition, 'parameters': {},
+                 'configuration_dict': configuration}
+                for definition in params.get('batch_jobs', [])]
+    for key, value in six.iteritems(params):
+        num, sep, param = key.partition(':')
+        if sep and num.isdigit():
+            jobs[int(num)]['parameters'][param] = value
+    return jobs
+
+
+# engine used by jobs run in the current process: worker processes
+# started by fork inherit the one given to _job_pool().
+_worker_engine = [None]
+
+
+def _init_worker_process(work_dir=None):
+    ''' Initializer of :func:`_job_pool` worker processes: move to a
+    private working directory
+    '''
+    if work_dir is not None:
+        os.chdir(tempfile.mkdtemp(prefix='worker', dir=work_dir))
+
+
+def _run_job(job, engine=None):
+    ''' Run one job description in the current process, and return its
+    output parameters, or the exception it has raised
+    '''
+    from capsul.api import Process
+
+    if engine is None:
+        engine = _worker_engine[0]
+        if engine is None:
+            from capsul.engine import capsul_engine
+            engine = _worker_engine[0] = capsul_engine()
+    try:
+        _activate_job_configuration(job.get('configuration_dict'))
+        return Process.run_from_params(job['process'], job, engine=engine,
+                                       activate=False)
+    except Exception as e:
+        traceback.print_exc()
+        return e
+
+
+def _job_pool(processes, engine=None, work_dir=None):
+    ''' Pool of worker processes running jobs with :func:`_run_job`.
+
+    Each worker runs one job at a time, so that jobs may change the
+    current directory or activate their configuration (which are global to
+    a process) without disturbing other ones.
+    '''
+    from concurrent.futures import ProcessPoolExecutor
+
+    _worker_engine[0] = engine
+    return ProcessPoolExecutor(max_workers=processes,
+                               initializer=_init_worker_process,
+                               initargs=(work_dir, ))
+
+
+def _job_result(future):
+    ''' Result of a job run in a :func:`_job_pool` worker: output
+    parameters, or exception (including worker failures)
+    '''
+    try:
+        return future.result()
+    except Exception as e:
+        return e
+
+
+def run_jobs(jobs, engine=None, processes=1):
+    ''' Run several jobs in the current interpreter, or in a pool of worker
+    processes.
+
+    Modules imported for a job, and the engine, are reused for the next ones,
+    which avoids paying the interpreter and capsul startup for each job.
+
+    Jobs may change the current directory and activate their configuration,
+    which are global to a process: this is why concurrent jobs are run in
+    separate processes rather than threads.
+
+    Parameters
+    ----------
+    jobs: list of dict
+        job descriptions: dicts with ``process`` (process identifier),
+        ``parameters`` and ``configuration_dict`` (optional) items.
+    engine: CapsulEngine (optional)
+        engine used to instantiate and run processes. Worker processes use a
+        copy of it when they are started by fork, and a default engine
+        otherwise.
+    processes: int (optional)
+        number of jobs run at the same time. If more than 1, jobs are run in
+        this number of worker processes.
+
+    Returns
+    -------
+    results: list
+        for each job, the dict of its output parameters, or the exception it
+        has raised.
+    '''
+    if processes > 1 and len(jobs) > 1:
+        with _job_pool(min(processes, len(jobs)), engine) as executor:
+            futures = [executor.submit(_run_job, job) for job in jobs]
+            return [_job_result(future) for future in futures]
+
+    if engine is None:
+        from capsul.engine import capsul_engine
+        engine = capsul_engine()
+    return [_run_job(job, engine) for job in jobs]
+
+
+def run_batch_from_commandline(processes=1):
+    ''' Run a batched job from a commandline call, as done by workflows
+    built with the ``batch_jobs`` option. Input parameters are read from the
+    file given in the ``SOMAWF_INPUT_PARAMS`` environment variable, like in
+    :meth:`~capsul.process.process.Process.run_from_commandline`.
+
+    The exit code is 1 if one job has failed, after all the other ones have
+    been run.
+    '''
+    import json
+    from soma.utils import json_utils
+
+    param_file = os.environ.get('SOMAWF_INPUT_PARAMS')
+    with open(param_file) as f:
+        params_conf = json_utils.from_json(json.load(f))
+    jobs = batch_jobs_descriptions(params_conf)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as temp_work_dir:
+        os.chdir(temp_work_dir)
+        results = run_jobs(jobs, processes=processes)
+        os.chdir(cwd)
+    failed = [job['process'] for job, result in zip(jobs, results)
+              if isinstance(result, Exception)]
+    if failed:
+        print('%d / %d batched jobs failed: %s'
+              % (len(failed), len(jobs), ', '.join(failed)), file=sys.stderr)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(1)
+    # no error, do a dirty exit, but avoid cleanup crashes after the
+    # processes have succeeded...
+    os._exit(0)
+
+
+def serve_job_queue(job_queue, result_queue=None, engine=None, processes=1):
+    ''' Worker loop: take job descriptions from a local queue and run them
+    until a ``None`` item is received.
+
+    Parameters
+    ----------
+    job_queue: queue.Queue
+        queue of job descriptions (see :func:`run_jobs`)
+    result_queue: queue.Queue (optional)
+        ``(job, result)`` tuples are put in it when jobs are done. ``result``
+        is the output parameters dict, or an exception.
+    engine: CapsulEngine (optional)
+    processes: int (optional)
+        number of jobs run at the same time. If more than 1, jobs are run in
+        worker processes, as in :func:`run_jobs`.
+    '''
+    def job_done(job, result):
+        if result_queue is not None:
+            result_queue.put((job, result))
+
+    if processes <= 1:
+        if engine is None:
+            from capsul.engine import capsul_engine
+            engine = capsul_engine()
+        while True:
+            job = job_queue.get()
+            if job is None:
+                break
+            job_done(job, _run_job(job, engine))
+        return
+
+    with _job_pool(processes, engine) as executor:
+        while True:
+            job = job_queue.get()
+            if job is None:
+                break
+            future = executor.submit(_run_job, job)
+            future.add_done_callback(
+                lambda future, job=job: job_done(job, _job_result(future)))
+
+
+def serve_spool(spool_dir, engine=None, processes=1, poll_interval=0.5,
+                idle_timeout=None):
+    ''' Worker loop on a file-based spool directory.
+
+    Job descriptions (see :func:`run_jobs`) are JSON files with a ``.json``
+    extension, which should be written under another name, then renamed, in
+    the spool directory. Several workers may share the same spool: jobs are
+    claimed by renaming them. When a job is done, its output parameters are
+    written in a ``.done`` JSON file, or the error in a ``.failed`` file.
+
+    Jobs are run in worker processes, each in its own temporary working
+    directory: the current process directory is not changed.
+
+    Parameters
+    ----------
+    spool_dir: str
+    engine: CapsulEngine (optional)
+        see :func:`run_jobs`
+    processes: int (optional)
+        number of worker processes, thus of jobs run at the same time.
+    poll_interval: float (optional)
+        delay between two scans of an empty spool (in seconds)
+    idle_timeout: float (optional)
+        the worker stops after this time without new jobs (in seconds). By
+        default it runs until it is interrupted.
+    '''
+    import json
+    import socket
+    import time
+    from soma.utils import json_utils
+
+    processes = max(processes, 1)
+    suffix = '.running-%s-%d' % (socket.gethostname(), os.getpid())
+    def claim_jobs(count):
+        jobs = []
+        for filename in sorted(os.listdir(spool_dir)):
+            if len(jobs) == count:
+                break
+            if not filename.endswith('.json'):
+                continue
+            job_file = os.path.join(spool_dir, filename)
+            try:
+                os.rename(job_file, job_file + suffix)
+            except OSError:
+                continue  # taken by another worker
+            try:
+                with open(job_file + suffix) as f:
+                    job = json_utils.from_json(json.load(f))
+            except Exception as e:
+                job = e
+            jobs.append((job_file, job))
+        return jobs
+
+    def job_done(job_file, result):
+        base = job_file[:-5]
+        if isinstance(result, Exception):
+            with open(base + '.failed', 'w') as f:
+                f.write(''.join(traceback.format_exception(
+                    type(result), result, result.__traceback__)))
+        else:
+            with open(base + '.done', 'w') as f:
+                json.dump(json_utils.to_json(result), f)
+        os.unlink(job_file + suffix)
+
+    with tempfile.TemporaryDirectory() as temp_work_dir, \
+            _job_pool(processes, engine, temp_work_dir) as executor:
+        last_job = time.time()
+        while True:
+            claimed = claim_jobs(processes)
+            if not claimed:
+                if idle_timeout is not None \
+                        and time.time() - last_job >= idle_timeout:
+                    break
+                time.sleep(poll_interval)
+                continue
+            futures = [(job_file, executor.submit(_run_job, job))
+                       for job_file, job in claimed
+                       if not isinstance(job, Exception)]
+            for job_file, job in claimed:
+                if isinstance(job, Exception):
+                    job_done(job_file, job)
+            for job_file, future in futures:
+                job_done(job_file, _job_result(future))
+            last_job = time.time()
+
+
 # main
 def main():
     ''' Run the :mod:`capsul.process.runprocess` module as a commandline
@@ -557,8 +898,31 @@ def main():
                       help='delete the workflow in the computing resource '
                       'database after execution, if it has failed. By default '
                       'it is kept.')
+    group2.add_option('--batch-jobs', dest='batch_jobs', type=int,
+                      default=None,
+                      help='group up to this number of small independent '
+                      'jobs into a single batched worker job in the '
+                      'workflow. 0 disables batching.')
     parser.add_option_group(group2)
 
+    group_worker = OptionGroup(
+        parser, 'Worker',
+        description='Batched worker mode: a long-lived process runs many '
+        'jobs, reusing imported modules')
+    group_worker.add_option(
+        '--worker-spool', dest='worker_spool', default=None,
+        help='run as a worker taking job descriptions (JSON files) from this '
+        'spool directory. No process should be given.')
+    group_worker.add_option(
+        '--worker-processes', dest='worker_processes', type=int, default=1,
+        help='number of jobs run at the same time by the worker, in '
+        'separate processes')
+    group_worker.add_option(
+        '--worker-idle-timeout', dest='worker_idle_timeout', type=float,
+        default=None,
+        help='stop the worker after this time without jobs (in seconds)')
+    parser.add_option_group(group_worker)
+
     group3 = OptionGroup(parser, 'Iteration',
                         description='Iteration')
     group3.add_option('-I', '--iterate', dest='iterate_on', action='append',
@@ -616,6 +980,11 @@ def main():
                 setattr(options, k, v)
         args += new_args
 
+    from capsul.api import StudyConfig
+    from capsul.api import capsul_engine
+    from capsul.attributes.completion_engine import ProcessCompletionEngine
+    from traits.api import Undefined, List
+
     engine = capsul_engine()
     engine.load_modules(['fom', 'axon', 'somaworkflow'])
     study_config = engine.study_config
@@ -709,6 +1078,12 @@ def main():
                 todel.append(arg)
     args = [arg for arg in args if arg not in todel]
 
+    if options.worker_spool:
+        serve_spool(options.worker_spool, engine=engine,
+                    processes=options.worker_processes,
+                    idle_timeout=options.worker_idle_timeout)
+        sys.exit(0)
+
     if not args:
         parser.print_usage()
         sys.exit(2)
@@ -807,7 +1182,8 @@ def main():
         queue=queue, input_file_processing=file_processing[0],
         output_file_processing=file_processing[1],
         write_workflow_only=options.write_workflow,
-        max_running_jobs=max_running_jobs, max_queued_jobs=max_queued_jobs)
+        max_running_jobs=max_running_jobs, max_queued_jobs=max_queued_jobs,
+        batch_jobs=options.batch_jobs)
 
     # if there was no exception, we assume the process has succeeded.
     # sys.exit(0)
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import os.path as osp
+import shutil
+import tempfile
+import unittest
+
+from traits.api import File, List, String
+
+from capsul.api import FileCopyProcess
+
+
+class CopyProcess(FileCopyProcess):
+    """ Records the staged inputs.
+    """
+    def __init__(self, **kwargs):
+        super(CopyProcess, self).__init__(inputs_to_copy=['image', 'images'],
+                                          inputs_to_symlink=['linked'],
+                                          **kwargs)
+        self.add_trait('image', File(output=False))
+        self.add_trait('images', List(File(), output=False))
+        self.add_trait('linked', File(output=False, optional=True))
+        self.add_trait('staged', String(output=True))
+
+    def _run_process(self):
+        self.staged = repr(self.copied_inputs)
+
+
+class TestFileCopyProcess(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='capsul_test_copy')
+        self.srcdir = osp.join(self.tmpdir, 'src')
+        self.dstdir = osp.join(self.tmpdir, 'dst')
+        os.mkdir(self.srcdir)
+        for name in ('sub[1].nii', 'sub[1].mat', 'sub[1]_other.nii',
+                     'sub2.nii', 'sub3.nii', 'sub3.json'):
+            with open(osp.join(self.srcdir, name), 'w') as f:
+                f.write(name)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def check_staging(self, process):
+        process.destination = self.dstdir
+        process.image = osp.join(self.srcdir, 'sub[1].nii')
+        process.images = [osp.join(self.srcdir, 'sub2.nii'),
+                          osp.join(self.srcdir, 'sub3.nii')]
+        process.linked = osp.join(self.srcdir, 'sub[1]_other.nii')
+        process._before_run_process()
+        self.assertEqual(process.image, osp.join(self.dstdir, 'sub[1].nii'))
+        self.assertEqual(process.images,
+                         [osp.join(self.dstdir, 'sub2.nii'),
+                          osp.join(self.dstdir, 'sub3.nii')])
+        self.assertEqual(
+            sorted(os.listdir(self.dstdir)),
+            ['sub2.nii', 'sub3.json', 'sub3.nii', 'sub[1].mat', 'sub[1].nii',
+             'sub[1]_other.nii'])
+        self.assertTrue(osp.islink(osp.join(self.dstdir,
+                                            'sub[1]_other.nii')))
+        self.assertEqual(sorted(process.copied_files['image']),
+                         [osp.join(self.dstdir, 'sub[1].mat'),
+                          osp.join(self.dstdir, 'sub[1].nii')])
+        for name in ('sub[1].nii', 'sub[1].mat', 'sub3.json'):
+            dst = osp.join(self.dstdir, name)
+            self.assertFalse(osp.islink(dst))
+            with open(dst) as f:
+                self.assertEqual(f.read(), name)
+        process._after_run_process(None)
+        # staged inputs are cleaned, and parameters restored
+        self.assertEqual(os.listdir(self.dstdir), [])
+        self.assertEqual(process.image, osp.join(self.srcdir, 'sub[1].nii'))
+
+    def test_copy(self):
+        self.check_staging(CopyProcess())
+        self.check_staging(CopyProcess(copy_workers=1))
+
+    def test_repeated_input(self):
+        # copies sharing a destination are done once, not concurrently
+        src = osp.join(self.srcdir, 'sub3.nii')
+        with open(src, 'w') as f:
+            f.write('sub3.nii' * 100000)
+        for i in range(10):
+            process = CopyProcess(copy_workers=4)
+            staged = []
+
+            def stage_file(src, dst, *args):
+                staged.append(dst)
+                return CopyProcess._stage_file(src, dst, *args)
+
+            process._stage_file = stage_file
+            process.destination = self.dstdir
+            process.image = osp.join(self.srcdir, 'sub[1].nii')
+            process.images = [src] * 8
+            process._before_run_process()
+            self.assertEqual(sorted(staged), sorted(set(staged)))
+            self.assertEqual(process.images,
+                             [osp.join(self.dstdir, 'sub3.nii')] * 8)
+            self.assertEqual(
+                sorted(os.listdir(self.dstdir)),
+                ['sub3.json', 'sub3.nii', 'sub[1].mat', 'sub[1].nii'])
+            process._after_run_process(None)
+            self.assertEqual(os.listdir(self.dstdir), [])
+
+    def test_hardlink(self):
+        process = CopyProcess(copy_mode='hardlink')
+        process.destination = self.dstdir
+        process.image = osp.join(self.srcdir, 'sub[1].nii')
+        process._before_run_process()
+        self.assertTrue(osp.samefile(osp.join(self.srcdir, 'sub[1].mat'),
+                                     osp.join(self.dstdir, 'sub[1].mat')))
+        process._after_run_process(None)
+        self.check_staging(CopyProcess(copy_mode='hardlink'))
+
+    def test_reflink(self):
+        # clones are made when possible, otherwise files are copied
+        self.check_staging(CopyProcess(copy_mode='reflink'))
+
+    def test_copy_mode(self):
+        self.assertRaises(ValueError, CopyProcess, copy_mode='move')
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestFileCopyProcess)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
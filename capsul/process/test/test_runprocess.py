@@ -2,9 +2,12 @@
 from __future__ import print_function
 
 from __future__ import absolute_import
+import json
 import os
+import shutil
 import subprocess
 import sys
+import tempfile
 import unittest
 
 from capsul.api import Process
@@ -19,6 +22,17 @@ class DummyProcess(Process):
         print("DummyProcess exec, f={0}".format(self.f))
 
 
+class DummyOutputProcess(Process):
+    """Process with a non-file output"""
+    f = Float(Undefined, output=False, optional=False)
+    g = Float(output=True)
+
+    def _run_process(self):
+        if self.f < 0:
+            raise ValueError('negative input')
+        self.g = self.f * 2
+
+
 class TestRunProcess(unittest.TestCase):
     """Test case for CAPSUL command-line usage."""
     def test_help(self):
@@ -79,6 +93,42 @@ class TestRunProcess(unittest.TestCase):
             ], stdout=f, stderr=f)
             self.assertNotEqual(ret, 0)
 
+    def test_run_jobs(self):
+        from capsul.process import runprocess
+        definition = 'capsul.process.test.test_runprocess.DummyOutputProcess'
+        jobs = [{'process': definition, 'parameters': {'f': float(i)}}
+                for i in range(4)]
+        results = runprocess.run_jobs(jobs, processes=2)
+        self.assertEqual([r['g'] for r in results], [0., 2., 4., 6.])
+
+        # parameters of a batched workflow job
+        params_conf = {'parameters': {'batch_jobs': [definition, definition],
+                                      '0:f': 1., '1:f': 3.}}
+        jobs = runprocess.batch_jobs_descriptions(params_conf)
+        self.assertEqual([job['parameters'] for job in jobs],
+                         [{'f': 1.}, {'f': 3.}])
+
+    def test_worker_spool(self):
+        from capsul.process import runprocess
+        spool = tempfile.mkdtemp(prefix='capsul_spool')
+        try:
+            definition \
+                = 'capsul.process.test.test_runprocess.DummyOutputProcess'
+            for i, f in enumerate([1., -1., 2.]):
+                with open(os.path.join(spool, 'job%d.json' % i), 'w') as fd:
+                    json.dump({'process': definition,
+                               'parameters': {'f': f}}, fd)
+            cwd = os.getcwd()
+            runprocess.serve_spool(spool, processes=2, poll_interval=0.1,
+                                   idle_timeout=0.2)
+            # jobs are run in worker processes, in their own directories
+            self.assertEqual(os.getcwd(), cwd)
+            self.assertEqual(sorted(os.listdir(spool)),
+                             ['job0.done', 'job1.failed', 'job2.done'])
+            with open(os.path.join(spool, 'job2.done')) as fd:
+                self.assertEqual(json.load(fd)['g'], 4.)
+        finally:
+            shutil.rmtree(spool)
 
 
 def test():
@@ -9,7 +9,7 @@ Classes
 '''
 
 from __future__ import absolute_import
-from traits.api import Bool, Undefined
+from traits.api import Bool, Enum, Int, Undefined
 from capsul.study_config.study_config import StudyConfigModule
 
 
@@ -23,5 +23,30 @@ class SmartCachingConfig(StudyConfigModule):
             output=False,
             desc='Use smart-caching during the execution',
             groups=['smartcaching']))
+        study_config.add_trait('smart_caching_fingerprint', Enum(
+            'stat', 'content',
+            output=False,
+            desc='How input files are identified by smart-caching: "stat" '
+            'uses their location, modification time and size, "content" '
+            'uses a digest of their contents',
+            groups=['smartcaching']))
+        study_config.add_trait('smart_caching_max_bytes', Int(
+            0,
+            output=False,
+            desc='Maximum total size of the smart-caching results, in bytes '
+            '(0: no limit)',
+            groups=['smartcaching']))
+        study_config.add_trait('smart_caching_max_entries', Int(
+            0,
+            output=False,
+            desc='Maximum number of smart-caching results (0: no limit)',
+            groups=['smartcaching']))
+        study_config.add_trait('smart_caching_eviction', Enum(
+            'lru', 'lfu',
+            output=False,
+            desc='Results removed first when smart-caching quotas are '
+            'exceeded: least recently used (lru) or least frequently used '
+            '(lfu)',
+            groups=['smartcaching']))
         self.study_config = study_config
         # self.study_config.on_trait_change(self._use_smart_caching_changed, 'use_smart_caching')
@@ -84,6 +84,7 @@ class SomaWorkflowConfig(StudyConfigModule):
     set_computing_resource_password
     get_workflow_controller
     connect_resource
+    new_workflow_controller
     disconnect_resource
     '''
     
@@ -227,13 +228,6 @@ class SomaWorkflowConfig(StudyConfigModule):
         -------
         :somaworkflow:`WorkflowController <client_API.html>` object
         '''
-        import soma_workflow.client as swclient
-
-        conf_file = self.study_config.somaworkflow_config_file
-        if conf_file in (None, Undefined):
-            conf_file \
-                = swclient.configuration.Configuration.search_config_path()
-
         resource_id = self.get_resource_id(resource_id, True)
 
         if force_reconnect:
@@ -247,6 +241,39 @@ class SomaWorkflowConfig(StudyConfigModule):
             if wc is not None:
                 return wc
 
+        wc = self.new_workflow_controller(resource_id)
+        r.workflow_controller = wc
+        return wc
+
+    def new_workflow_controller(self, resource_id=None):
+        ''' Connect a new
+        :somaworkflow:`WorkflowController <client_API.html>` to a computing
+        resource.
+
+        Unlike :meth:`connect_resource`, the controller is not recorded as
+        the controller of the resource: this is used to open several
+        connections to the same resource.
+
+        Parameters
+        ----------
+        resource_id: str (optional)
+            resource name, may be None or "localhost".
+
+        Returns
+        -------
+        :somaworkflow:`WorkflowController <client_API.html>` object
+        '''
+        import soma_workflow.client as swclient
+
+        conf_file = self.study_config.somaworkflow_config_file
+        if conf_file in (None, Undefined):
+            conf_file \
+                = swclient.configuration.Configuration.search_config_path()
+
+        resource_id = self.get_resource_id(resource_id)
+        r = self.study_config.modules_data.somaworkflow.setdefault(
+            resource_id, Controller())
+
         login = swclient.configuration.Configuration.get_logins(
             conf_file).get(resource_id)
         config = getattr(r, 'config', None)
@@ -256,14 +283,12 @@ class SomaWorkflowConfig(StudyConfigModule):
             r.config = config
         password = getattr(r, 'password', None)
         rsa_key_pass = getattr(r, 'rsa_key_password', None)
-        wc = swclient.WorkflowController(
+        return swclient.WorkflowController(
             resource_id=resource_id,
             login=login,
             password=password,
             rsa_key_pass=rsa_key_pass,
             config=config)
-        r.workflow_controller = wc
-        return wc
 
     def disconnect_resource(self, resource_id=None):
         ''' Disconnect a connected
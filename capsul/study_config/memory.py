@@ -8,6 +8,12 @@ Classes
 ---------------------------
 :class:`MemorizedProcess`
 -------------------------
+:class:`FingerprintIndex`
+-------------------------
+:class:`CacheIndex`
+-------------------
+:class:`FileLock`
+-----------------
 :class:`CapsulResultEncoder`
 ----------------------------
 :class:`Memory`
@@ -21,6 +27,10 @@ Functions
 ---------------------
 :func:`file_fingerprint`
 ------------------------
+:func:`file_digest`
+-------------------
+:func:`directory_size`
+----------------------
 '''
 
 # System import
@@ -28,13 +38,22 @@ from __future__ import with_statement
 from __future__ import absolute_import
 from __future__ import print_function
 import os
+import errno
+import stat
+import socket
 import hashlib
 import time
+import threading
 import shutil
 import json
 import logging
 import six
 import sys
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows: fallback to exclusive files creation
+    fcntl = None
 
 # CAPSUL import
 from capsul.process.process import Process, ProcessResult
@@ -194,7 +213,8 @@ class MemorizedProcess(object):
     structure. Methods are provided to inspect the cache or clean it.
     """
 
-    def __init__(self, process, cachedir, timestamp=None, verbose=1):
+    def __init__(self, process, cachedir, timestamp=None, verbose=1,
+                 fingerprint="stat", fingerprint_index=None, cache_index=None):
         """ Initialize the MemorizedProcess class.
 
         Parameters
@@ -211,6 +231,14 @@ class MemorizedProcess(object):
             is called.
         verbose: int
             if different from zero, print console messages.
+        fingerprint: str (optional, default "stat")
+            how input files are identified in the process hash: "stat"
+            uses the file location, mtime and size, "content" uses a digest
+            of the file contents (see :func:`file_fingerprint`).
+        fingerprint_index: FingerprintIndex (optional)
+            memoised content digests, used in "content" fingerprint mode.
+        cache_index: CacheIndex (optional)
+            cache entries usage accounting and eviction.
         """
         # Check the a process is passed
         self.process_class = process.__class__
@@ -239,6 +267,14 @@ class MemorizedProcess(object):
         # Store if some messages have to be displayed
         self.verbose = verbose
 
+        # Input files identification
+        if fingerprint not in ("stat", "content"):
+            raise ValueError(
+                "Unknown fingerprint mode '{0}'".format(fingerprint))
+        self.fingerprint = fingerprint
+        self.fingerprint_index = fingerprint_index
+        self.cache_index = cache_index
+
     def __call__(self, **kwargs):
         """ Call wrapped process and cache result, or read cache if
         available.
@@ -262,17 +298,51 @@ class MemorizedProcess(object):
         # process
         process_dir, process_hash, input_parameters = self._get_process_id()
 
-        # Execute the process
-        if not os.path.isdir(process_dir):
-
-            # Create the destination memory folder
-            os.makedirs(process_dir)
-
-            # Try to execute the process and if an error occurred remove the
-            # cache folder
+        # Entries are moved in place once complete. An existing one is read
+        # under a shared lock, so that it is not evicted meanwhile.
+        if os.path.isdir(process_dir):
+            with FileLock(process_dir + ".lock", shared=True):
+                if os.path.isdir(process_dir):
+                    return self._restore_process(process_dir,
+                                                 input_parameters)
+
+        # Only one worker computes a given entry, the others wait for it
+        lock = FileLock(process_dir + ".lock")
+        inflight_fname = process_dir + ".inflight"
+        if not lock.acquire(blocking=False):
+            if self.verbose != 0:
+                try:
+                    with open(inflight_fname) as open_file:
+                        inflight = json.load(open_file)
+                except (IOError, OSError, ValueError):
+                    inflight = {}
+                print("[Memory] Waiting for {0} computed by {1}:{2}...".format(
+                    self.process.id, inflight.get("host"),
+                    inflight.get("pid")))
+            lock.acquire()
+        try:
+            # The entry may have been computed while waiting
+            if os.path.isdir(process_dir):
+                return self._restore_process(process_dir, input_parameters)
+
+            # Mark the computation as in progress. A marker left by a
+            # crashed worker is just replaced.
+            with open(inflight_fname, "w") as open_file:
+                json.dump({"host": socket.gethostname(), "pid": os.getpid(),
+                           "start": time.time()}, open_file)
+
+            # Write the results in a temporary folder, and try to execute
+            # the process and if an error occurred remove the folder
+            tmp_dir = "{0}.tmp-{1}-{2}".format(
+                process_dir, socket.gethostname(), os.getpid())
+            if os.path.isdir(tmp_dir):
+                shutil.rmtree(tmp_dir)
+            os.makedirs(tmp_dir)
             try:
                 # Run
-                result = self._call_process(process_dir, input_parameters)
+                start_time = time.time()
+                result = self._call_process(tmp_dir, input_parameters)
+                duration = time.time() - start_time
 
                 # Save the result files in the memory with the corresponding
                 # mapping
@@ -282,39 +352,85 @@ class MemorizedProcess(object):
                     value = self.process.get_parameter(name)
                     output_parameters[name] = value
                 file_mapping = []
-                self._copy_files_to_memory(output_parameters, process_dir,
+                self._copy_files_to_memory(output_parameters, tmp_dir,
                                            file_mapping)
-                map_fname = os.path.join(process_dir, "file_mapping.json")
+                map_fname = os.path.join(tmp_dir, "file_mapping.json")
                 with open(map_fname, "w") as open_file:
                     open_file.write(json.dumps(file_mapping))
 
+                # Publish the complete entry
+                os.rename(tmp_dir, process_dir)
+
             except Exception as e:  # noqa: E722
                 print('error in MemorizedProcess.__call__:', e)
-                shutil.rmtree(process_dir)
+                shutil.rmtree(tmp_dir, ignore_errors=True)
                 raise
 
-        # Restore the process results from the cache folder
-        else:
-            # Restore the memorized files
-            map_fname = os.path.join(process_dir, "file_mapping.json")
-            with open(map_fname, "r") as json_data:
-                file_mapping = json.load(json_data)
+            finally:
+                os.unlink(inflight_fname)
+
+        finally:
+            # no entry, no lock file left behind
+            lock.release(remove=not os.path.isdir(process_dir))
+
+        if self.cache_index is not None:
+            self.cache_index.store(process_dir, duration)
+
+        return result
 
-            # Go through all mapping files
-            for workspace_file, memory_file in file_mapping:
+    def _restore_process(self, process_dir, input_parameters):
+        """ Restore the process results from the cache folder.
+
+        Parameters
+        ----------
+        process_dir: string
+            the directory where the cache has been written.
+        input_parameters: dict
+            the process input_parameters.
+
+        Returns
+        -------
+        result: ProcessResult
+            the process cached results.
+        """
+        # Restore the memorized files
+        map_fname = os.path.join(process_dir, "file_mapping.json")
+        with open(map_fname, "r") as json_data:
+            file_mapping = json.load(json_data)
 
-                # Determine if the workspace directory is writeable
-                if os.access(os.path.dirname(workspace_file), os.W_OK):
-                    shutil.copy2(memory_file, workspace_file)
-                else:
-                    logger.debug("Can't restore file '{0}', access rights are "
-                                 "not sufficients.".format(workspace_file))
+        # Go through all mapping files
+        for workspace_file, memory_file in file_mapping:
 
-            # Update the process output traits
-            result = self._load_process_result(process_dir, input_parameters)
+            # Memory files are relative to the cache folder (older entries
+            # used absolute paths)
+            memory_file = os.path.join(process_dir, memory_file)
+
+            # Determine if the workspace directory is writeable
+            if os.access(os.path.dirname(workspace_file), os.W_OK):
+                shutil.copy2(memory_file, workspace_file)
+            else:
+                logger.debug("Can't restore file '{0}', access rights are "
+                             "not sufficients.".format(workspace_file))
+
+        # Update the process output traits
+        result = self._load_process_result(process_dir, input_parameters)
+
+        if self.cache_index is not None:
+            self.cache_index.hit(process_dir)
 
         return result
 
+    def get_cache_entry(self):
+        """ Get the cache directory for the current process parameters.
+
+        Returns
+        -------
+        process_dir: string
+            the directory where the process results are (or would be)
+            cached.
+        """
+        return self._get_process_id()[0]
+
     def _copy_files_to_memory(self, python_object, process_dir, file_mapping):
         """ Copy file items inside the memory.
 
@@ -326,7 +442,8 @@ class MemorizedProcess(object):
             the process memory path.
         file_mapping: list of 2-uplet
             store in this structure the mapping between the workspace and the
-            memory (workspace_file, memory_file).
+            memory (workspace_file, memory_file), memory files being relative
+            to process_dir.
         """
         # Deal with dictionary
         if isinstance(python_object, dict):
@@ -348,7 +465,7 @@ class MemorizedProcess(object):
                 fname = os.path.basename(python_object)
                 out = os.path.join(process_dir, fname)
                 shutil.copy2(python_object, out)
-                file_mapping.append((python_object, out))
+                file_mapping.append((python_object, fname))
 
     def _call_process(self, process_dir, input_parameters):
         """ Call a process.
@@ -375,13 +492,10 @@ class MemorizedProcess(object):
         start_time = time.time()
 
         # Execute the process
+        # avoid recursion: the process is not cached again. The study config
+        # setting is left unchanged, other processes may run meanwhile.
         study_config = self.process.get_study_config()
-        caching = getattr(study_config, 'use_smart_caching', None)
-        # avoid recusrion
-        study_config.use_smart_caching = False
-
-        result = self.process()
-        study_config.use_smart_caching = caching
+        result = study_config.run(self.process, smart_caching=False)
         duration = time.time() - start_time
 
         # Save the result in json format
@@ -505,7 +619,9 @@ class MemorizedProcess(object):
         # Add the tool versions to check roughly if the running codes have
         # changed and add file path fingerprints
         process_parameters = input_parameters.copy()
-        process_parameters = self._add_fingerprints(process_parameters)
+        process_parameters = self._add_fingerprints(process_parameters, {})
+        if self.fingerprint_index is not None:
+            self.fingerprint_index.save()
         process_parameters["versions"] = self.process.versions
 
         # Generate the process hash
@@ -515,13 +631,15 @@ class MemorizedProcess(object):
 
         return process_hash, input_parameters
 
-    def _add_fingerprints(self, python_object):
+    def _add_fingerprints(self, python_object, fingerprints):
         """ Add file path fingerprints.
 
         Parameters
         ----------
         python_object: object
             a generic python object.
+        fingerprints: dict
+            fingerprints already computed in the current call {path: value}.
 
         Returns
         -------
@@ -533,24 +651,37 @@ class MemorizedProcess(object):
         if isinstance(python_object, dict):
             for key, val in six.iteritems(python_object):
                 if val is not Undefined:
-                    out[key] = self._add_fingerprints(val)
+                    out[key] = self._add_fingerprints(val, fingerprints)
 
         # Deal with tuple and list
         elif isinstance(python_object, (list, tuple)):
             out = []
             for val in python_object:
                 if val is not Undefined:
-                    out.append(self._add_fingerprints(val))
+                    out.append(self._add_fingerprints(val, fingerprints))
             if isinstance(python_object, tuple):
                 out = tuple(out)
 
-        # Otherwise start the deletion if the object is a file
+        # Otherwise replace the object by its fingerprint if it is a file
         else:
             out = python_object
             if (python_object is not Undefined and
                     isinstance(python_object, six.string_types) and
-                    os.path.isfile(python_object)):
-                out = file_fingerprint(python_object)
+                    python_object):
+                if python_object not in fingerprints:
+                    try:
+                        file_stat = os.stat(python_object)
+                    except (OSError, ValueError):
+                        file_stat = None
+                    if file_stat is not None \
+                            and stat.S_ISREG(file_stat.st_mode):
+                        fingerprints[python_object] = file_fingerprint(
+                            python_object, file_stat=file_stat,
+                            mode=self.fingerprint,
+                            index=self.fingerprint_index)
+                    else:
+                        fingerprints[python_object] = python_object
+                out = fingerprints[python_object]
 
         return out
 
@@ -570,7 +701,12 @@ class MemorizedProcess(object):
 
         # Guarantee the path exists on the disk
         if not os.path.exists(process_dir):
-            os.makedirs(process_dir)
+            try:
+                os.makedirs(process_dir)
+            except OSError:
+                # created meanwhile by a concurrent call
+                if not os.path.isdir(process_dir):
+                    raise
 
         return process_dir
 
@@ -684,34 +820,622 @@ def has_attribute(trait, attribute_name, attribute_value=None,
     return count > 0
 
 
-def file_fingerprint(a_file):
+def file_fingerprint(a_file, file_stat=None, mode="stat", index=None):
     """ Computes the file fingerprint.
 
-    Do not consider the file content, just the fingerprint (ie. the mtime,
-    the size and the file location).
+    In "stat" mode, do not consider the file content, just the fingerprint
+    (ie. the mtime, the size and the file location).
+
+    In "content" mode, use a digest of the file content and its size, so
+    that a copied or touched file gets the same fingerprint. Digests are
+    memoised in the given index.
 
     Parameters
     ----------
     a_file: string
         the file to process.
+    file_stat: stat_result (optional)
+        the file stat, if it has already been read.
+    mode: str (optional, default "stat")
+        "stat" or "content".
+    index: FingerprintIndex (optional)
+        memoised content digests.
 
     Returns
     -------
-    fingerprint: tuple
-        the file location, mtime and size.
+    fingerprint: dict
+        the file location, mtime and size, or the file digest and size.
     """
+    if file_stat is None:
+        try:
+            file_stat = os.stat(a_file)
+        except OSError:
+            file_stat = None
+        if file_stat is not None and not stat.S_ISREG(file_stat.st_mode):
+            file_stat = None
+    if mode == "content" and file_stat is not None:
+        if index is not None:
+            digest = index.digest(a_file, file_stat)
+        else:
+            digest = file_digest(a_file)
+        return {
+            "digest": digest,
+            "size": str(file_stat.st_size)
+        }
     fingerprint = {
         "name": a_file,
         "mtime": None,
         "size": None
     }
-    if os.path.isfile(a_file):
-        stat = os.stat(a_file)
-        fingerprint["size"] = str(stat.st_size)
-        fingerprint["mtime"] = str(stat.st_mtime)
+    if file_stat is not None:
+        fingerprint["size"] = str(file_stat.st_size)
+        fingerprint["mtime"] = str(file_stat.st_mtime)
     return fingerprint
 
 
+def file_digest(a_file, block_size=1 << 20):
+    """ Computes a digest of the file content.
+
+    The file is read by blocks, so that large images do not need to fit in
+    memory.
+
+    Parameters
+    ----------
+    a_file: string
+        the file to process.
+    block_size: int (optional)
+        size of the read blocks, in bytes.
+
+    Returns
+    -------
+    digest: str
+        the hash algorithm name and the hexadecimal digest, separated by a
+        colon.
+    """
+    if hasattr(hashlib, "blake2b"):
+        hasher = hashlib.blake2b(digest_size=20)
+    else:
+        hasher = hashlib.sha1()
+    with open(a_file, "rb") as f:
+        block = f.read(block_size)
+        while block:
+            hasher.update(block)
+            block = f.read(block_size)
+    return "{0}:{1}".format(hasher.name, hasher.hexdigest())
+
+
+class FileLock(object):
+    """ Advisory lock shared by processes and threads through a lock file.
+
+    ``fcntl.flock`` is used when available: the lock is released by the
+    system if its owner dies, and the lock file is kept unless its removal is
+    requested on release. Otherwise the lock is the exclusive creation of
+    the lock file, which is removed on release, and shared locks are
+    exclusive.
+
+    Methods
+    -------
+    acquire
+    release
+    """
+
+    def __init__(self, lock_file, poll_interval=0.1, shared=False):
+        """ Initialize the FileLock class.
+
+        Parameters
+        ----------
+        lock_file: string
+            the lock file name.
+        poll_interval: float (optional)
+            delay between two attempts when fcntl is not available, in
+            seconds.
+        shared: bool (optional, default False)
+            take a shared (read) lock instead of an exclusive one.
+        """
+        self.lock_file = lock_file
+        self.poll_interval = poll_interval
+        self.shared = shared
+        self._fd = None
+
+    def acquire(self, blocking=True):
+        """ Take the lock.
+
+        Parameters
+        ----------
+        blocking: bool (optional, default True)
+            if not set, return immediately when the lock is already taken.
+
+        Returns
+        -------
+        acquired: bool
+            True if the lock has been taken.
+        """
+        if fcntl is not None:
+            flags = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+            if not blocking:
+                flags |= fcntl.LOCK_NB
+            while True:
+                fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o666)
+                try:
+                    fcntl.flock(fd, flags)
+                except (IOError, OSError) as e:
+                    os.close(fd)
+                    if e.errno in (errno.EAGAIN, errno.EACCES):
+                        return False
+                    raise
+                # The lock file may have been removed by its previous owner
+                # while we were waiting: the lock is then taken again on the
+                # new file.
+                try:
+                    if os.stat(self.lock_file).st_ino \
+                            == os.fstat(fd).st_ino:
+                        self._fd = fd
+                        return True
+                except OSError as e:
+                    if e.errno != errno.ENOENT:
+                        os.close(fd)
+                        raise
+                os.close(fd)
+        while True:
+            try:
+                self._fd = os.open(self.lock_file,
+                                   os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o666)
+                return True
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+            if not blocking:
+                return False
+            time.sleep(self.poll_interval)
+
+    def release(self, remove=False):
+        """ Release the lock.
+
+        Parameters
+        ----------
+        remove: bool (optional, default False)
+            remove the lock file. Only an exclusive lock may do so.
+        """
+        fd = self._fd
+        self._fd = None
+        if fcntl is not None:
+            if remove and not self.shared:
+                os.unlink(self.lock_file)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        else:
+            os.close(fd)
+            os.unlink(self.lock_file)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class FingerprintIndex(object):
+    """ On-disk index of file content digests.
+
+    Digests are keyed by the file device, inode, modification time and
+    size, thus they are computed again only when a file changes. The index
+    is a json file, which is read on first use and written back by
+    :meth:`save` when new digests have been computed.
+
+    Methods
+    -------
+    digest
+    save
+    """
+
+    def __init__(self, index_file):
+        """ Initialize the FingerprintIndex class.
+
+        Parameters
+        ----------
+        index_file: string
+            the index json file name.
+        """
+        self.index_file = index_file
+        self._digests = None
+        self._new_digests = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _key(file_stat):
+        mtime = getattr(file_stat, "st_mtime_ns", None)
+        if mtime is None:
+            mtime = int(file_stat.st_mtime * 1e9)
+        return "{0}:{1}:{2}:{3}".format(file_stat.st_dev, file_stat.st_ino,
+                                        mtime, file_stat.st_size)
+
+    def _read(self):
+        try:
+            with open(self.index_file) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def digest(self, a_file, file_stat=None):
+        """ Get the content digest of a file, from the index if it is
+        already known.
+
+        Parameters
+        ----------
+        a_file: string
+            the file to process.
+        file_stat: stat_result (optional)
+            the file stat, if it has already been read.
+
+        Returns
+        -------
+        digest: str
+            see :func:`file_digest`
+        """
+        if file_stat is None:
+            file_stat = os.stat(a_file)
+        key = self._key(file_stat)
+        with self._lock:
+            if self._digests is None:
+                self._digests = self._read()
+            digest = self._digests.get(key)
+        if digest is None:
+            digest = file_digest(a_file)
+            with self._lock:
+                self._digests[key] = digest
+                self._new_digests[key] = digest
+        return digest
+
+    def save(self):
+        """ Write new digests in the index file.
+
+        Digests written meanwhile by other processes are kept.
+        """
+        with self._lock:
+            if not self._new_digests:
+                return
+            with FileLock(self.index_file + ".lock"):
+                digests = self._read()
+                digests.update(self._new_digests)
+                tmp_file = "{0}.{1}.{2}.tmp".format(
+                    self.index_file, os.getpid(),
+                    threading.current_thread().ident)
+                with open(tmp_file, "w") as f:
+                    json.dump(digests, f)
+                os.rename(tmp_file, self.index_file)
+            self._digests.update(digests)
+            self._new_digests = {}
+
+
+def directory_size(directory):
+    """ Computes the total size of the files in a directory tree.
+
+    Parameters
+    ----------
+    directory: string
+        the directory to process.
+
+    Returns
+    -------
+    size: int
+        the size in bytes.
+    """
+    size = 0
+    for root, dirs, files in os.walk(directory):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return size
+
+
+class CacheIndex(object):
+    """ Usage accounting and eviction of Memory cache entries.
+
+    Cache entries are the process results directories. For each of them the
+    index file records its size, creation and last access times, the number
+    of cache hits, the computation duration and whether it is pinned. Global
+    hits and misses counts, and bytes and time saved by cache hits are also
+    recorded.
+
+    Stores, hits and pins are appended to a journal file, which is merged
+    into the index file (compacted) on eviction, or when it grows over
+    :attr:`journal_max_bytes`: the whole index is not rewritten at each
+    access.
+
+    When an entry is stored, least recently used ("lru") or least frequently
+    used ("lfu") entries are removed until the cache fits in the bytes and
+    entries quotas. Pinned entries, and entries being read, are never
+    removed.
+
+    Methods
+    -------
+    store
+    hit
+    pin
+    evict
+    forget
+    stats
+    """
+
+    #: journal size (in bytes) over which it is merged into the index
+    journal_max_bytes = 1 << 20
+
+    def __init__(self, cachedir, max_bytes=None, max_entries=None,
+                 eviction="lru"):
+        """ Initialize the CacheIndex class.
+
+        Parameters
+        ----------
+        cachedir: string
+            the cache directory, in which the index file is stored.
+        max_bytes: int (optional)
+            maximum total size of the cache entries. None or 0 means no
+            limit.
+        max_entries: int (optional)
+            maximum number of cache entries. None or 0 means no limit.
+        eviction: string (optional, default "lru")
+            eviction policy: "lru" or "lfu".
+        """
+        if eviction not in ("lru", "lfu"):
+            raise ValueError(
+                "Unknown eviction policy '{0}'".format(eviction))
+        self.cachedir = cachedir
+        self.index_file = os.path.join(cachedir, "cache_index.json")
+        self.journal_file = os.path.join(cachedir, "cache_index.journal")
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.eviction = eviction
+        self._lock = threading.RLock()
+
+    def _file_lock(self):
+        return FileLock(self.index_file + ".lock")
+
+    def _key(self, process_dir):
+        return os.path.relpath(os.path.abspath(process_dir), self.cachedir)
+
+    def _read(self):
+        try:
+            with open(self.index_file) as f:
+                index = json.load(f)
+        except (IOError, OSError, ValueError):
+            index = {}
+        index.setdefault("entries", {})
+        stats = index.setdefault("stats", {})
+        for name in ("hits", "misses", "bytes_saved", "evictions"):
+            stats.setdefault(name, 0)
+        stats.setdefault("time_saved", 0.)
+        try:
+            with open(self.journal_file) as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        # interrupted write
+                        continue
+                    self._replay(index, event)
+        except (IOError, OSError):
+            pass
+        return index
+
+    def _replay(self, index, event):
+        key = event["key"]
+        entries = index["entries"]
+        entry = entries.get(key)
+        stats = index["stats"]
+        if event["op"] == "store":
+            entry = entry or {}
+            entry.update({
+                "size": event["size"],
+                "created": event["time"],
+                "accessed": event["time"],
+                "hits": 0,
+                "duration": event["duration"],
+                "pinned": entry.get("pinned", False)})
+            entries[key] = entry
+            stats["misses"] += 1
+            return
+        if entry is None:
+            process_dir = os.path.join(self.cachedir, key)
+            if not os.path.isdir(process_dir):
+                # removed meanwhile
+                return
+            # entry created before the index
+            entry = {"size": directory_size(process_dir),
+                     "created": event["time"], "accessed": event["time"],
+                     "hits": 0, "duration": 0., "pinned": False}
+            entries[key] = entry
+        if event["op"] == "hit":
+            entry["accessed"] = event["time"]
+            entry["hits"] += 1
+            stats["hits"] += 1
+            stats["bytes_saved"] += entry["size"]
+            stats["time_saved"] += entry["duration"]
+        elif event["op"] == "pin":
+            entry["pinned"] = event["pinned"]
+
+    def _append(self, event):
+        with self._lock, self._file_lock():
+            self._append_locked(event)
+
+    def _append_locked(self, event):
+        # the index file lock must be held
+        line = json.dumps(event) + "\n"
+        fd = os.open(self.journal_file,
+                     os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+        try:
+            os.write(fd, line.encode("utf-8"))
+            journal_size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if journal_size > self.journal_max_bytes:
+            self._compact(self._read())
+
+    def _compact(self, index):
+        # write the index including the journal events, and empty the
+        # journal. The index file lock must be held.
+        tmp_file = "{0}.{1}.{2}.tmp".format(
+            self.index_file, os.getpid(), threading.current_thread().ident)
+        with open(tmp_file, "w") as f:
+            json.dump(index, f)
+        os.rename(tmp_file, self.index_file)
+        try:
+            os.unlink(self.journal_file)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+    def store(self, process_dir, duration=0.):
+        """ Record a new cache entry (a cache miss), and evict other
+        entries if the quotas are exceeded.
+
+        Parameters
+        ----------
+        process_dir: string
+            the entry directory.
+        duration: float (optional)
+            the process computation time, in seconds.
+        """
+        key = self._key(process_dir)
+        self._append({"op": "store", "key": key,
+                      "size": directory_size(process_dir),
+                      "time": time.time(), "duration": duration})
+        if self.max_bytes or self.max_entries:
+            self.evict(keep=key)
+
+    def hit(self, process_dir):
+        """ Record an access to an existing cache entry.
+
+        Parameters
+        ----------
+        process_dir: string
+            the entry directory.
+        """
+        self._append({"op": "hit", "key": self._key(process_dir),
+                      "time": time.time()})
+
+    def pin(self, process_dir, pinned=True):
+        """ Protect (or unprotect) a cache entry from eviction.
+
+        Parameters
+        ----------
+        process_dir: string
+            the entry directory.
+        pinned: bool (optional, default True)
+            pin state.
+        """
+        key = self._key(process_dir)
+        with self._lock, self._file_lock():
+            if not os.path.isdir(process_dir) \
+                    and key not in self._read()["entries"]:
+                raise KeyError(
+                    "Non-existing cache entry {0}".format(process_dir))
+            self._append_locked({"op": "pin", "key": key,
+                                 "pinned": bool(pinned),
+                                 "time": time.time()})
+
+    def evict(self, keep=None):
+        """ Remove entries until the quotas are fulfilled.
+
+        Parameters
+        ----------
+        keep: string (optional)
+            key of an entry which must not be removed.
+
+        Returns
+        -------
+        removed: list
+            removed entries directories.
+        """
+        with self._lock, self._file_lock():
+            index = self._read()
+            removed = self._evict(index, keep=keep)
+            if removed:
+                self._compact(index)
+        return removed
+
+    def _evict(self, index, keep=None):
+        entries = index["entries"]
+        total_bytes = sum(entry["size"] for entry in entries.values())
+        count = len(entries)
+        if (not self.max_bytes or total_bytes <= self.max_bytes) \
+                and (not self.max_entries or count <= self.max_entries):
+            return []
+        if self.eviction == "lfu":
+            def order(key):
+                return (entries[key]["hits"], entries[key]["accessed"])
+        else:
+            def order(key):
+                return entries[key]["accessed"]
+        candidates = sorted((key for key, entry in six.iteritems(entries)
+                             if not entry.get("pinned") and key != keep),
+                            key=order)
+        removed = []
+        for key in candidates:
+            if (not self.max_bytes or total_bytes <= self.max_bytes) \
+                    and (not self.max_entries or count <= self.max_entries):
+                break
+            process_dir = os.path.join(self.cachedir, key)
+            # entries being read or written hold their lock: skip them
+            lock = FileLock(process_dir + ".lock")
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                shutil.rmtree(process_dir, ignore_errors=True)
+            finally:
+                lock.release(remove=True)
+            total_bytes -= entries.pop(key)["size"]
+            count -= 1
+            removed.append(process_dir)
+        index["stats"]["evictions"] += len(removed)
+        return removed
+
+    def forget(self, keep_existing=True):
+        """ Remove entries from the index.
+
+        Parameters
+        ----------
+        keep_existing: bool (optional, default True)
+            if set, only entries which directory does not exist anymore are
+            removed.
+        """
+        with self._lock, self._file_lock():
+            index = self._read()
+            for key in list(index["entries"]):
+                process_dir = os.path.join(self.cachedir, key)
+                if not keep_existing or not os.path.isdir(process_dir):
+                    del index["entries"][key]
+                    # remove the entry lock file, unless it is in use
+                    lock = FileLock(process_dir + ".lock")
+                    if lock.acquire(blocking=False):
+                        lock.release(remove=True)
+            self._compact(index)
+
+    def stats(self):
+        """ Get the cache usage statistics.
+
+        Returns
+        -------
+        stats: dict
+            entries, bytes and pinned entries counts, hits and misses counts,
+            hit_ratio, bytes_saved and time_saved by cache hits, and the
+            number of evictions.
+        """
+        with self._lock, self._file_lock():
+            index = self._read()
+        entries = index["entries"]
+        stats = dict(index["stats"])
+        stats["entries"] = len(entries)
+        stats["bytes"] = sum(entry["size"] for entry in entries.values())
+        stats["pinned"] = len([entry for entry in entries.values()
+                               if entry.get("pinned")])
+        calls = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = float(stats["hits"]) / calls if calls else 0.
+        return stats
+
+
 class CapsulResultEncoder(json.JSONEncoder):
     """ Deal with ProcessResult in json.
     """
@@ -810,6 +1534,10 @@ class CapsulResultDecoder(json.JSONDecoder):
 # be able to flush the disk
 ############################################################################
 
+_fingerprint_indexes = {}
+_fingerprint_indexes_lock = threading.Lock()
+
+
 class Memory(object):
     """ Memory context to provide caching for processes.
 
@@ -817,33 +1545,76 @@ class Memory(object):
     ----------
     `cachedir`: string
         the location for the caching. If None is given, no caching is done.
+    `fingerprint`: string
+        how input files are identified: "stat" or "content" (see
+        :func:`file_fingerprint`).
+    `fingerprint_index`: FingerprintIndex
+        memoised content digests, stored in the cache directory, used in
+        "content" fingerprint mode.
+    `cache_index`: CacheIndex
+        cache entries usage accounting and eviction.
 
     Methods
     -------
     cache
     clear
+    evict
+    pin
+    unpin
+    stats
     """
 
-    def __init__(self, cachedir):
+    def __init__(self, cachedir, fingerprint="stat", max_bytes=None,
+                 max_entries=None, eviction="lru"):
         """ Initialize the Memory class.
 
         Parameters
         ----------
         base_dir: string
             the directory name of the location for the caching.
+        fingerprint: string (optional, default "stat")
+            "stat" identifies input files by their location, mtime and
+            size, "content" by a digest of their contents.
+        max_bytes: int (optional)
+            maximum total size of the cached results. None or 0 means no
+            limit.
+        max_entries: int (optional)
+            maximum number of cached results. None or 0 means no limit.
+        eviction: string (optional, default "lru")
+            results removed first when quotas are exceeded: least recently
+            used ("lru") or least frequently used ("lfu").
         """
         # Build the capsul memory folder
         if cachedir is not None:
             cachedir = os.path.join(
                 os.path.abspath(cachedir), "capsul_memory")
             if not os.path.exists(cachedir):
-                os.makedirs(cachedir)
+                try:
+                    os.makedirs(cachedir)
+                except OSError:
+                    # created meanwhile by a concurrent Memory
+                    if not os.path.isdir(cachedir):
+                        raise
             elif not os.path.isdir(cachedir):
                 raise ValueError("'base_dir' should be a directory")
 
         # Define class parameters
         self.cachedir = cachedir
         self.timestamp = time.time()
+        self.fingerprint = fingerprint
+        self.fingerprint_index = None
+        self.cache_index = None
+        if cachedir is not None:
+            self.cache_index = CacheIndex(cachedir, max_bytes, max_entries,
+                                          eviction)
+        if cachedir is not None and fingerprint == "content":
+            # share the index between Memory instances of a same cachedir
+            index_file = os.path.join(cachedir, "fingerprints.json")
+            with _fingerprint_indexes_lock:
+                self.fingerprint_index = _fingerprint_indexes.get(index_file)
+                if self.fingerprint_index is None:
+                    self.fingerprint_index = FingerprintIndex(index_file)
+                    _fingerprint_indexes[index_file] = self.fingerprint_index
 
     def cache(self, process, verbose=1):
         """ Create a proxy of the given process in order to only execute
@@ -899,7 +1670,8 @@ class Memory(object):
         # Otherwise a proxy process is created
         else:
             return MemorizedProcess(process, self.cachedir, self.timestamp,
-                                    verbose)
+                                    verbose, self.fingerprint,
+                                    self.fingerprint_index, self.cache_index)
 
     def clear(self, skips=None):
         """ Remove all the cache apart from those given to the method
@@ -914,15 +1686,80 @@ class Memory(object):
         to_remove_folders = []
         skips = skips or []
         for root, dirs, files in os.walk(self.cachedir):
-            if "result.json" and files and dirs == [] and root not in skips:
+            if "result.json" and files and dirs == [] and root not in skips \
+                    and root != self.cachedir \
+                    and ".tmp-" not in os.path.basename(root):
                 to_remove_folders.append(root)
 
-        # Delete memory directories
+        # Delete memory directories and their lock files, under the lock
         for folder in to_remove_folders:
-            shutil.rmtree(folder)
+            lock = FileLock(folder + ".lock")
+            lock.acquire()
+            try:
+                shutil.rmtree(folder)
+            finally:
+                lock.release(remove=True)
+        if self.cache_index is not None:
+            self.cache_index.forget()
+
+    def evict(self):
+        """ Remove cached results until the quotas are fulfilled.
+
+        This is done automatically each time a new result is cached.
+
+        Returns
+        -------
+        removed: list
+            removed results directories.
+        """
+        if self.cache_index is None:
+            return []
+        return self.cache_index.evict()
+
+    def pin(self, entry):
+        """ Protect cached results from eviction. Nothing is done if there is no cache.
+
+        Parameters
+        ----------
+        entry: string or MemorizedProcess
+            the results directory, or a proxy process which current
+            parameters designate the results.
+        """
+        if self.cache_index is None:
+            return
+        if isinstance(entry, MemorizedProcess):
+            entry = entry.get_cache_entry()
+        self.cache_index.pin(entry)
+
+    def unpin(self, entry):
+        """ Allow the eviction of pinned cached results. Nothing is done if there is no cache.
+
+        Parameters
+        ----------
+        entry: string or MemorizedProcess
+            the results directory, or a proxy process which current
+            parameters designate the results.
+        """
+        if self.cache_index is None:
+            return
+        if isinstance(entry, MemorizedProcess):
+            entry = entry.get_cache_entry()
+        self.cache_index.pin(entry, False)
+
+    def stats(self):
+        """ Get the cache usage statistics.
+
+        Returns
+        -------
+        stats: dict
+            see :meth:`CacheIndex.stats`. Empty if there is no cache.
+        """
+        if self.cache_index is None:
+            return {}
+        return self.cache_index.stats()
 
     def __repr__(self):
         """ Memory class representation.
         """
-        return "{0}(cachedir={1})".format(self.__class__.__name__,
-                                          self.cachedir)
+        return "{0}(cachedir={1}, fingerprint={2})".format(
+            self.__class__.__name__, self.cachedir, self.fingerprint)
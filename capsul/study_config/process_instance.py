@@ -10,6 +10,10 @@ Functions
 ------------------------
 :func:`get_process_instance`
 ----------------------------
+:func:`get_process_factory`
+---------------------------
+:func:`clear_process_factories`
+-------------------------------
 :func:`get_node_class`
 ----------------------
 :func:`get_node_instance`
@@ -26,6 +30,7 @@ import re
 import six
 import os
 import inspect
+from functools import partial
 
 # Caspul import
 from capsul.process.process import Process
@@ -43,6 +48,10 @@ process_xml_re = re.compile(r'<process.*</process>', re.DOTALL)
 _interface = None
 _nipype_loaded = False
 
+# process factories cache: {process_id: (factory, source_files, mtimes, cwd)}
+_process_factories = {}
+process_factories_stats = {'hits': 0, 'misses': 0}
+
 def _get_interface_class():
     '''
     returns the nypype Interface type, or a custom type if it cannot be
@@ -189,7 +198,17 @@ def _load_module(filename, modname=None):
         sys.modules[modname] = mod
     return mod
 
-def _get_process_instance(process_or_id, study_config=None, **kwargs):
+def _find_process_factory(process_id):
+    ''' Find the class (or factory function) which builds processes from a
+    string identifier (see :func:`get_process_instance`).
+
+    Returns
+    -------
+    factory: callable or None
+        builds a new process instance
+    source_files: list or None
+        files the factory has been built from. None if it cannot be cached.
+    '''
 
     def _find_single_process(module_dict, filename):
         ''' Scan objects in module_dict and find out if a single one of them is
@@ -207,6 +226,214 @@ def _get_process_instance(process_or_id, study_config=None, **kwargs):
                 object_name = name
         return object_name
 
+    Interface = _get_interface_class()
+    factory = None
+    source_files = None
+    py_url = os.path.basename(process_id).split('#')
+    object_name = None
+    as_xml = False
+    as_py = False
+    module_dict = None
+    module = None
+    if len(py_url) >= 2 and py_url[-2].endswith('.py') \
+            or len(py_url) == 1 and py_url[0].endswith('.py'):
+        # python file + process name: something.py#ProcessName
+        # or just something.py if it contains only one process class
+        if len(py_url) >= 2:
+            filename = process_id[:-len(py_url[-1]) - 1]
+            object_name = py_url[-1]
+        else:
+            filename = process_id
+            object_name = None
+        module = _load_module(filename)
+        source_files = [filename]
+        module_name = module.__name__
+        module_dict = module.__dict__
+        if object_name is None:
+            object_name = _find_single_process(
+                module_dict, module_name)
+            if object_name is not None:
+                module_name = process_id
+                as_py = True
+        elif object_name in module_dict:
+            as_py = True
+    if object_name is None:
+        elements = process_id.rsplit('.', 1)
+        if len(elements) < 2:
+            module_name, object_name = '__main__', elements[0]
+        else:
+            module_name, object_name = elements
+        try:
+            module = importlib.import_module(module_name)
+            # update the Interface class since we may have loaded nipype
+            # during import
+            Interface = _get_interface_class()
+
+            if object_name not in module.__dict__ \
+                    or not is_process(getattr(module, object_name)):
+                # maybe a module with a single process in it
+                module = importlib.import_module(process_id)
+                module_dict = module.__dict__
+                # update the Interface class since we may have loaded
+                # nipype during import
+                Interface = _get_interface_class()
+                object_name = _find_single_process(
+                    module_dict, module_name)
+                if object_name is not None:
+                    module_name = process_id
+                    as_py = True
+            else:
+                as_py = True
+        except ImportError as e:
+            pass
+    if not as_py:
+        # maybe XML or JSON filename or URL
+        for ext in ('.xml', '.json'):
+            xml_url = process_id + ext
+            if osp.exists(xml_url):
+                object_name = None
+                as_xml = True
+            elif process_id.endswith(ext) and osp.exists(process_id):
+                xml_url = process_id
+                object_name = None
+                as_xml = True
+            else:
+                # maybe XML or JSON file with pipeline name in it
+                xml_url = module_name + ext
+                if not osp.exists(xml_url) and module_name.endswith(ext) \
+                        and osp.exists(module_name):
+                    xml_url = module_name
+                if not osp.exists(xml_url):
+                    # try XML file in a module directory + class name
+                    basename = None
+                    module_name2 = None
+                    if module_name in sys.modules:
+                        basename = object_name
+                        module_name2 = module_name
+                        object_name = None # to allow unmatching class / xml
+                        if basename.endswith(ext):
+                            basename = basename[:-4]
+                    else:
+                        elements = module_name.rsplit('.', 1)
+                        if len(elements) == 2:
+                            module_name2, basename = elements
+                    if module_name2 and basename:
+                        try:
+                            importlib.import_module(module_name2)
+                            mod_dirname = osp.dirname(
+                                sys.modules[module_name2].__file__)
+                            xml_url = osp.join(mod_dirname, basename + ext)
+                            if not osp.exists(xml_url):
+                                # if basename includes .xml extension
+                                xml_url = osp.join(mod_dirname, basename)
+                            as_xml = True
+                        except ImportError as e:
+                            raise ImportError('Cannot import %s: %s'
+                                              % (module_name, str(e)))
+            if as_xml:
+                break
+
+        if osp.exists(xml_url):
+            loaders = {'.xml': create_xml_pipeline,
+                       '.json': create_json_pipeline}
+            factory = loaders[ext](module_name, object_name, xml_url)
+            source_files = [xml_url]
+
+    if factory is None and not as_xml:
+        if module_dict is not None:
+            module_object = module_dict.get(object_name)
+        else:
+            module = sys.modules[module_name]
+            module_object = getattr(module, object_name, None)
+        if module_object is not None:
+            if (isinstance(module_object, type) and
+                issubclass(module_object, Process)):
+                factory = module_object
+            elif isinstance(module_object, Interface):
+                # If we have a Nipype interface, wrap this structure in a
+                # Process class
+                factory = partial(nipype_factory, module_object)
+            elif (isinstance(module_object, type) and
+                issubclass(module_object, Interface)):
+                factory = lambda: nipype_factory(module_object())
+            elif isinstance(module_object, types.FunctionType):
+                xml = getattr(module_object, 'capsul_xml', None)
+                if xml is None:
+                    # Check docstring
+                    if module_object.__doc__:
+                        match = process_xml_re.search(
+                            module_object.__doc__)
+                        if match:
+                            xml = match.group(0)
+                if xml:
+                    factory = create_xml_process(module_name, object_name,
+                                                 module_object, xml)
+        if factory is None and module is not None:
+            xml_file = osp.join(osp.dirname(module.__file__),
+                                object_name + '.xml')
+            if osp.exists(xml_file):
+                factory = create_xml_pipeline(module_name, None,
+                                              xml_file)
+                source_files = [xml_file]
+        if factory is not None and source_files is None \
+                and module_name != '__main__':
+            # imported modules are not imported again by python when they
+            # are modified: the factory is kept as long as the module is.
+            source_files = []
+    return factory, source_files
+
+
+def _files_times(source_files):
+    try:
+        return [os.stat(filename).st_mtime_ns for filename in source_files]
+    except OSError:
+        return None
+
+
+def get_process_factory(process_id):
+    ''' Get the class (or factory function) which builds processes from a
+    string identifier (see :func:`get_process_instance`), or None if it is
+    not found.
+
+    Factories are cached in a prototypes registry. Python files, and XML /
+    JSON pipeline definitions, are not read again as long as they are not
+    modified. Factories found in imported modules are kept until
+    :func:`clear_process_factories` is called, since python does not import
+    modified modules again.
+    '''
+    cached = _process_factories.get(process_id)
+    if cached is not None:
+        factory, source_files, times, cwd = cached
+        if (cwd is None or cwd == os.getcwd()) \
+                and _files_times(source_files) == times:
+            process_factories_stats['hits'] += 1
+            return factory
+    process_factories_stats['misses'] += 1
+    factory, source_files = _find_process_factory(process_id)
+    if factory is not None and source_files is not None:
+        times = _files_times(source_files)
+        if times is not None:
+            cwd = None
+            if not all(osp.isabs(filename) for filename in source_files):
+                # relative filenames depend on the current directory
+                cwd = os.getcwd()
+            _process_factories[process_id] = (factory, source_files, times,
+                                              cwd)
+    return factory
+
+
+def clear_process_factories():
+    ''' Empty the process factories cache used by
+    :func:`get_process_instance`
+
+    This is needed to take into account modules which have been reloaded
+    (using ``importlib.reload()``).
+    '''
+    _process_factories.clear()
+
+
+def _get_process_instance(process_or_id, study_config=None, **kwargs):
+
     result = None
     Interface = _get_interface_class()
     # If the function 'process_or_id' parameter is already a Process
@@ -250,149 +477,9 @@ def _get_process_instance(process_or_id, study_config=None, **kwargs):
     # description
     elif isinstance(process_or_id, six.string_types) \
             and not process_or_id.startswith('<pipeline'):
-        py_url = os.path.basename(process_or_id).split('#')
-        object_name = None
-        as_xml = False
-        as_py = False
-        module_dict = None
-        module = None
-        if len(py_url) >= 2 and py_url[-2].endswith('.py') \
-                or len(py_url) == 1 and py_url[0].endswith('.py'):
-            # python file + process name: something.py#ProcessName
-            # or just something.py if it contains only one process class
-            if len(py_url) >= 2:
-                filename = process_or_id[:-len(py_url[-1]) - 1]
-                object_name = py_url[-1]
-            else:
-                filename = process_or_id
-                object_name = None
-            module = _load_module(filename)
-            module_name = module.__name__
-            module_dict = module.__dict__
-            if object_name is None:
-                object_name = _find_single_process(
-                    module_dict, module_name)
-                if object_name is not None:
-                    module_name = process_or_id
-                    as_py = True
-            elif object_name in module_dict:
-                as_py = True
-        if object_name is None:
-            elements = process_or_id.rsplit('.', 1)
-            if len(elements) < 2:
-                module_name, object_name = '__main__', elements[0]
-            else:
-                module_name, object_name = elements
-            try:
-                module = importlib.import_module(module_name)
-                # update the Interface class since we may have loaded nipype
-                # during import
-                Interface = _get_interface_class()
-
-                if object_name not in module.__dict__ \
-                        or not is_process(getattr(module, object_name)):
-                    # maybe a module with a single process in it
-                    module = importlib.import_module(process_or_id)
-                    module_dict = module.__dict__
-                    # update the Interface class since we may have loaded
-                    # nipype during import
-                    Interface = _get_interface_class()
-                    object_name = _find_single_process(
-                        module_dict, module_name)
-                    if object_name is not None:
-                        module_name = process_or_id
-                        as_py = True
-                else:
-                    as_py = True
-            except ImportError as e:
-                pass
-        if not as_py:
-            # maybe XML or JSON filename or URL
-            for ext in ('.xml', '.json'):
-                xml_url = process_or_id + ext
-                if osp.exists(xml_url):
-                    object_name = None
-                    as_xml = True
-                elif process_or_id.endswith(ext) and osp.exists(process_or_id):
-                    xml_url = process_or_id
-                    object_name = None
-                    as_xml = True
-                else:
-                    # maybe XML or JSON file with pipeline name in it
-                    xml_url = module_name + ext
-                    if not osp.exists(xml_url) and module_name.endswith(ext) \
-                            and osp.exists(module_name):
-                        xml_url = module_name
-                    if not osp.exists(xml_url):
-                        # try XML file in a module directory + class name
-                        basename = None
-                        module_name2 = None
-                        if module_name in sys.modules:
-                            basename = object_name
-                            module_name2 = module_name
-                            object_name = None # to allow unmatching class / xml
-                            if basename.endswith(ext):
-                                basename = basename[:-4]
-                        else:
-                            elements = module_name.rsplit('.', 1)
-                            if len(elements) == 2:
-                                module_name2, basename = elements
-                        if module_name2 and basename:
-                            try:
-                                importlib.import_module(module_name2)
-                                mod_dirname = osp.dirname(
-                                    sys.modules[module_name2].__file__)
-                                xml_url = osp.join(mod_dirname, basename + ext)
-                                if not osp.exists(xml_url):
-                                    # if basename includes .xml extension
-                                    xml_url = osp.join(mod_dirname, basename)
-                                as_xml = True
-                            except ImportError as e:
-                                raise ImportError('Cannot import %s: %s'
-                                                  % (module_name, str(e)))
-                if as_xml:
-                    break
-
-            if osp.exists(xml_url):
-                loaders = {'.xml': create_xml_pipeline,
-                           '.json': create_json_pipeline}
-                result = loaders[ext](module_name, object_name, xml_url)()
-
-        if result is None and not as_xml:
-            if module_dict is not None:
-                module_object = module_dict.get(object_name)
-            else:
-                module = sys.modules[module_name]
-                module_object = getattr(module, object_name, None)
-            if module_object is not None:
-                if (isinstance(module_object, type) and
-                    issubclass(module_object, Process)):
-                    result = module_object()
-                elif isinstance(module_object, Interface):
-                    # If we have a Nipype interface, wrap this structure in a
-                    # Process class
-                    result = nipype_factory(result)
-                elif (isinstance(module_object, type) and
-                    issubclass(module_object, Interface)):
-                    result = nipype_factory(module_object())
-                elif isinstance(module_object, types.FunctionType):
-                    xml = getattr(module_object, 'capsul_xml', None)
-                    if xml is None:
-                        # Check docstring
-                        if module_object.__doc__:
-                            match = process_xml_re.search(
-                                module_object.__doc__)
-                            if match:
-                                xml = match.group(0)
-                    if xml:
-                        result = create_xml_process(module_name, object_name,
-                                                    module_object, xml)()
-            if result is None and module is not None:
-                xml_file = osp.join(osp.dirname(module.__file__),
-                                    object_name + '.xml')
-                if osp.exists(xml_file):
-                    result = create_xml_pipeline(module_name, None,
-                                                 xml_file)()
+        factory = get_process_factory(process_or_id)
+        if factory is not None:
+            result = factory()
     elif hasattr(process_or_id, 'read') \
             or (isinstance(process_or_id, bytes)
                 and process_or_id.startswith(b'<pipeline')) \
@@ -6,6 +6,13 @@ Functions
 =========
 :func:`run_process`
 -------------------
+:func:`run_process_graph`
+-------------------------
+
+Classes
+=======
+:class:`TemporaryFilesRelease`
+------------------------------
 '''
 
 # System import
@@ -14,11 +21,15 @@ from __future__ import print_function
 import errno
 import os
 import logging
+import sys
+import threading
+import time
 import six
 
 # CAPSUL import
 from capsul.study_config.memory import Memory
-from capsul.process.process import Process
+from capsul.process.process import Process, ProcessResult, NipypeProcess
+from capsul.utils.profiling import NodeProfiler
 
 # TRAIT import
 from traits.api import Undefined, File, Directory
@@ -26,11 +37,15 @@ from traits.api import Undefined, File, Directory
 # Define the logger
 logger = logging.getLogger(__name__)
 
+# Configuration activation and process counting act on global state, which is
+# shared by concurrent executions (see run_process_graph)
+_run_lock = threading.RLock()
+
 
 def run_process(output_dir, process_instance,
                 generate_logging=False, verbose=0, configuration_dict=None,
-                cachedir=None,
-                **kwargs):
+                cachedir=None, profile=None, ready_time=None,
+                smart_caching=None, **kwargs):
     """ Execute a capsul process in a specific directory.
 
     Parameters
@@ -48,6 +63,18 @@ def run_process(output_dir, process_instance,
         if different from zero, print console messages.
     configuration_dict: dict (optional)
         configuration dictionary
+    profile: ExecutionProfile (optional)
+        if given, the execution is profiled (see
+        :class:`~capsul.utils.profiling.NodeProfiler`) and its record is
+        added to the profile (with a ``'failed'`` status if the execution
+        raises an exception), and set as the ``profile`` attribute of the
+        returned ProcessResult.
+    ready_time: float (optional)
+        time at which the process was ready to run (its dependencies
+        completed), used to record its queue wait in the profile.
+    smart_caching: bool (optional)
+        if not None, overrides the ``use_smart_caching`` setting of the
+        study config for this execution.
 
     Returns
     -------
@@ -86,20 +113,29 @@ def run_process(output_dir, process_instance,
         configuration_dict = {}
     # clear activations for now.
     from capsul import engine
-    engine.activated_modules = set()
-    #print('activate config:', configuration_dict)
-    engine.activate_configuration(configuration_dict)
+    with _run_lock:
+        engine.activated_modules = set()
+        #print('activate config:', configuration_dict)
+        engine.activate_configuration(configuration_dict)
 
     # Run
-    if study_config.get_trait_value("use_smart_caching") in [None, False]:
+    if smart_caching is None:
+        smart_caching = study_config.get_trait_value("use_smart_caching")
+    if smart_caching in [None, False]:
         cachedir = None
     elif cachedir is None:
         cachedir = output_dir
 
+    # Reserve the process number, processes may run concurrently
+    with _run_lock:
+        process_counter = study_config.process_counter
+        study_config.process_counter += 1
+
     # Update the output directory folder if necessary
     if output_dir not in (None, Undefined) and output_dir:
         if study_config.process_output_directory:
-            output_dir = os.path.join(output_dir, '%s-%s' % (study_config.process_counter, process_instance.name))
+            output_dir = os.path.join(
+                output_dir, '%s-%s' % (process_counter, process_instance.name))
         # Guarantee that the output directory exists
         if not os.path.isdir(output_dir):
             os.makedirs(output_dir)
@@ -147,29 +183,298 @@ def run_process(output_dir, process_instance,
         print("{0}\n[Process] Calling {1}...\n{2}".format(
             80 * "_", process_instance.id,
             call_with_inputs))
-    if cachedir:
-        # Create a memory object
-        mem = Memory(cachedir)
-        proxy_instance = mem.cache(process_instance, verbose=verbose)
-
-        # Execute the proxy process
-        returncode = proxy_instance(**kwargs)
-    else:
-        for k, v in six.iteritems(kwargs):
-            setattr(process_instance, k, v)
-        missing = process_instance.get_missing_mandatory_parameters()
-        if len(missing) != 0:
-            raise ValueError('In process %s: missing mandatory parameters: %s'
-                             % (process_instance.name, ', '.join(missing)))
-        process_instance._before_run_process()
-        returncode = process_instance._run_process()
-        returncode = process_instance._after_run_process(returncode)
+    profiler = None
+    if profile is not None:
+        queue_wait = 0.
+        if ready_time is not None:
+            queue_wait = max(0., time.time() - ready_time)
+        # records are named after the node, not the process type
+        name = getattr(process_instance, 'context_name', None) \
+            or process_instance.name
+        profiler = NodeProfiler(name, process_instance, queue_wait)
+        profiler.__enter__()
+    exc_info = (None, None, None)
+    try:
+        if cachedir:
+            # Create a memory object
+            mem = Memory(cachedir,
+                         fingerprint=study_config.get_trait_value(
+                             "smart_caching_fingerprint") or "stat",
+                         max_bytes=study_config.get_trait_value(
+                             "smart_caching_max_bytes"),
+                         max_entries=study_config.get_trait_value(
+                             "smart_caching_max_entries"),
+                         eviction=study_config.get_trait_value(
+                             "smart_caching_eviction") or "lru")
+            proxy_instance = mem.cache(process_instance, verbose=verbose)
+
+            # Execute the proxy process
+            returncode = proxy_instance(**kwargs)
+        else:
+            for k, v in six.iteritems(kwargs):
+                setattr(process_instance, k, v)
+            missing = process_instance.get_missing_mandatory_parameters()
+            if len(missing) != 0:
+                raise ValueError(
+                    'In process %s: missing mandatory parameters: %s'
+                    % (process_instance.name, ', '.join(missing)))
+            process_instance._before_run_process()
+            returncode = process_instance._run_process()
+            returncode = process_instance._after_run_process(returncode)
+    except BaseException:
+        exc_info = sys.exc_info()
+        raise
+    finally:
+        if profiler is not None:
+            # failed executions are recorded too
+            profiler.__exit__(*exc_info)
+            profile.add(profiler.record)
+        # break the reference cycle through the traceback
+        exc_info = None
+    if profiler is not None and isinstance(returncode, ProcessResult):
+        returncode.profile = profiler.record
 
     # Save the process log
     if generate_logging:
         process_instance.save_log(returncode)
 
-    # Increment the number of executed process count
-    study_config.process_counter += 1
-
     return returncode, output_log_file
+
+
+def _runs_exclusively(process):
+    """ Processes changing the current directory of the Python process (nipype
+    interfaces) cannot run at the same time as other processes.
+    """
+    return isinstance(process, NipypeProcess)
+
+
+def run_process_graph(output_dir, processes, predecessors, workers=0,
+                      skip=(), interruption_check=None, may_start=None,
+                      on_completion=None, **kwargs):
+    """ Execute capsul processes concurrently, following their dependencies.
+
+    Processes are run by :func:`run_process` in a pool of threads: a process
+    is started as soon as all its predecessors have completed. Processes
+    are run in place, so their outputs are set on the given instances.
+
+    When a process fails, or when an interruption is requested, no new
+    process is started; running ones are waited for, then the error is
+    raised.
+
+    Nipype processes change the current directory of the Python process,
+    which is shared by all threads: they are run alone, once other running
+    processes have completed.
+
+    Parameters
+    ----------
+    output_dir: str (mandatory)
+        the folder where the processes will write results.
+    processes: list (mandatory)
+        the Process instances to execute, in a valid sequential order.
+    predecessors: list (mandatory)
+        for each process, the list of indices (in processes) of the
+        processes which must complete before it starts.
+    workers: int (optional, default 0)
+        maximum number of processes run at the same time. 0 means the number
+        of CPUs.
+    skip: sequence (optional)
+        indices of processes which are not run, but are considered as
+        completed to schedule their successors.
+    interruption_check: callable (optional)
+        called after each process completion; when it returns True, the
+        execution is interrupted and a RuntimeError is raised.
+    may_start: callable (optional)
+        called with the index of a ready process; when it returns False, the
+        process is delayed and other ready processes are started first. A
+        delayed process is started anyway when no process is running.
+    on_completion: callable (optional)
+        called with the index of each completed (or skipped) process.
+    kwargs: dict
+        other parameters passed to :func:`run_process` (generate_logging,
+        verbose, configuration_dict, profile...)
+
+    Returns
+    -------
+    results: list
+        for each process, the (ProcessResult, output_log_file) tuple returned
+        by :func:`run_process`, or None if it has not been run.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    if not workers:
+        workers = os.cpu_count() or 1
+    count = len(processes)
+    skip = set(skip)
+    successors = [[] for i in range(count)]
+    pending = [0] * count
+    for index, preds in enumerate(predecessors):
+        pending[index] = len(preds)
+        for pred in preds:
+            successors[pred].append(index)
+    results = [None] * count
+
+    def completed(index, ready):
+        if on_completion is not None:
+            on_completion(index)
+        for succ in successors[index]:
+            pending[succ] -= 1
+            if pending[succ] == 0:
+                ready.append(succ)
+                ready_times[succ] = time.time()
+
+    # take ready processes in the given order
+    ready = [index for index in range(count) if pending[index] == 0]
+    ready.reverse()
+    ready_times = dict((index, time.time()) for index in ready)
+    running = {}
+    error = None
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while ready or running:
+            while ready and error is None and len(running) < workers \
+                    and not any(_runs_exclusively(processes[i])
+                                for i in running.values()):
+                position = len(ready) - 1
+                if may_start is not None:
+                    while position >= 0 and ready[position] not in skip \
+                            and not may_start(ready[position]):
+                        position -= 1
+                    if position < 0:
+                        if running:
+                            break
+                        position = len(ready) - 1
+                index = ready.pop(position)
+                if index in skip:
+                    completed(index, ready)
+                    ready.sort(reverse=True)
+                    continue
+                if running and _runs_exclusively(processes[index]):
+                    # wait for running processes to complete
+                    ready.insert(position, index)
+                    break
+                future = executor.submit(run_process, output_dir,
+                                         processes[index],
+                                         ready_time=ready_times.get(index),
+                                         **kwargs)
+                running[future] = index
+            if not running:
+                break
+            done, not_done = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    if error is None:
+                        error = e
+                    continue
+                completed(index, ready)
+            ready.sort(reverse=True)
+            if error is None and interruption_check is not None \
+                    and interruption_check():
+                error = RuntimeError('Execution interruption requested')
+    if error is not None:
+        raise error
+    return results
+
+
+def _disk_usage(path):
+    """ Size in bytes of a file, or of the files in a directory tree.
+    """
+    if os.path.isdir(path):
+        size = 0
+        for root, dirs, files in os.walk(path):
+            for name in files:
+                try:
+                    size += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return size
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class TemporaryFilesRelease(object):
+    """ Delete the temporary files of a pipeline execution as soon as the
+    nodes using them have completed.
+
+    Temporary files are allocated before the execution by
+    :meth:`~capsul.pipeline.pipeline.Pipeline._check_temporary_files_for_node`.
+    Instead of keeping all of them until the end of the execution, each one
+    is deleted when the last node using it has completed (see
+    :meth:`completed`). Plug values are still restored at the end of the
+    execution by
+    :meth:`~capsul.pipeline.pipeline.Pipeline._free_temporary_files`.
+
+    When a budget is given, the size of existing temporary files is
+    recorded when their producer completes, and :meth:`may_start` delays the
+    nodes producing new temporary files while it exceeds the budget.
+
+    Parameters
+    ----------
+    pipeline: Pipeline
+        the executed pipeline
+    nodes: list
+        the executed nodes. Nodes are identified by their index in this list
+        in :meth:`completed` and :meth:`may_start`.
+    temp_files: list
+        temporary files, as allocated by the pipeline
+    budget: int (optional, default 0)
+        maximum size in bytes of existing temporary files before producers
+        of new ones are delayed. 0 means no limit.
+    """
+
+    def __init__(self, pipeline, nodes, temp_files, budget=0):
+        self.pipeline = pipeline
+        self.temp_files = temp_files
+        self.budget = budget
+        self.usage = 0
+        self.peak_usage = 0
+        users = pipeline._temporary_files_users(nodes, temp_files)
+        self._remaining = [len(node_indices) for node_indices in users]
+        self._uses = [[] for node in nodes]
+        for temp_index, node_indices in enumerate(users):
+            for node_index in node_indices:
+                self._uses[node_index].append(temp_index)
+        position = dict((id(node), index) for index, node in enumerate(nodes))
+        self._produced = [[] for node in nodes]
+        for temp_index, item in enumerate(temp_files):
+            node_index = position.get(id(item[0]))
+            if node_index is not None:
+                self._produced[node_index].append(temp_index)
+        self._sizes = {}
+        self.released = set()
+        for temp_index, count in enumerate(self._remaining):
+            if count == 0:
+                self._release(temp_index)
+
+    def _release(self, temp_index):
+        self.pipeline._delete_temporary_files(self.temp_files[temp_index][2])
+        self.usage -= self._sizes.pop(temp_index, 0)
+        self.released.add(temp_index)
+
+    def completed(self, index):
+        """ Record the completion of a node, and delete the temporary files
+        which are not used anymore.
+        """
+        for temp_index in self._produced[index]:
+            tmpfiles = self.temp_files[temp_index][2]
+            if not isinstance(tmpfiles, list):
+                tmpfiles = [tmpfiles]
+            size = sum(_disk_usage(tmpfile) for tmpfile in tmpfiles)
+            self._sizes[temp_index] = size
+            self.usage += size
+        self.peak_usage = max(self.peak_usage, self.usage)
+        for temp_index in self._uses[index]:
+            self._remaining[temp_index] -= 1
+            if self._remaining[temp_index] == 0:
+                self._release(temp_index)
+
+    def may_start(self, index):
+        """ Tell if a node may start without exceeding the budget: nodes
+        producing temporary files are delayed while the size of existing
+        ones reaches the budget.
+        """
+        return not self.budget or not self._produced[index] \
+            or self.usage < self.budget
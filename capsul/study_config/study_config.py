@@ -43,9 +43,11 @@ from soma.controller import Controller
 # Capsul import
 from capsul.pipeline.pipeline import Pipeline
 from capsul.process.process import Process
-from capsul.study_config.run import run_process
+from capsul.study_config.run import run_process, run_process_graph, \
+    TemporaryFilesRelease
 from capsul.pipeline.pipeline_nodes import Node
 from capsul.study_config.process_instance import get_process_instance
+from capsul.utils.profiling import ExecutionProfile
 
 
 class StudyConfig(Controller):
@@ -96,6 +98,28 @@ class StudyConfig(Controller):
         subdirectory to output_directory. This subdirectory is named 
         '<count>-<name>' where <count> if self.process_counter and <name> 
         is the name of the process.
+    local_workers : int (default 1)
+        Number of pipeline nodes executed at the same time in local
+        execution mode (without soma-workflow). 0 means the number of CPUs.
+        Nodes are run in threads of the current Python process: processes
+        relying on process-wide state must be thread-safe (nipype processes,
+        which change the current directory, are run alone).
+    temporary_directory : str (default Undefined)
+        Directory where temporary files are created in local execution
+        mode (for instance a tmpfs). If undefined, the system default
+        temporary directory is used.
+    temporary_files_budget : int (default 0)
+        Maximum size in bytes of temporary files in local execution mode:
+        nodes producing new temporary files are delayed while it is reached.
+        0 means no limit.
+    profile_execution : bool (default False)
+        Profile the execution of each node in local execution mode. The
+        profile of the last run is then available as
+        :attr:`execution_profile`. Runs nested in a node execution (cached
+        processes, iterations) are part of the node record.
+    execution_profile : ExecutionProfile
+        Profile of the last run (see :mod:`capsul.utils.profiling`), None if
+        it was not profiled.
 
     Methods
     -------
@@ -156,6 +180,33 @@ class StudyConfig(Controller):
              "<name> is the name of the process.",
         groups=['study'])
 
+    local_workers = Int(
+        1,
+        desc="Number of pipeline nodes executed at the same time in local "
+             "execution mode (without soma-workflow), following their "
+             "dependencies. 0 means the number of CPUs.",
+        groups=['study'])
+
+    temporary_directory = Directory(
+        Undefined,
+        desc="Directory where temporary files are created in local execution "
+             "mode (for instance a tmpfs). If undefined, the system default "
+             "temporary directory is used.",
+        groups=['study'])
+
+    temporary_files_budget = Int(
+        0,
+        desc="Maximum size in bytes of temporary files in local execution "
+             "mode: nodes producing new temporary files are delayed while it "
+             "is reached. 0 means no limit.",
+        groups=['study'])
+
+    profile_execution = Bool(
+        False,
+        desc="Profile the execution of each node (times, memory, I/O) in "
+             "local execution mode.",
+        groups=['study'])
+
     def __init__(self, study_name=None, init_config=None, modules=None,
                  engine=None, **override_config):
         """ Initialize the StudyConfig class
@@ -225,6 +276,10 @@ class StudyConfig(Controller):
             setattr(self, k, v)
         self.initialize_modules()
         self.run_lock = threading.RLock()
+        self.execution_profile = None
+        # number of run() calls in progress: only the outermost one is
+        # profiled
+        self._run_depth = 0
         self.run_interruption_request = False
 
     def initialize_modules(self):
@@ -294,7 +349,7 @@ class StudyConfig(Controller):
 
     def run(self, process_or_pipeline, output_directory=None,
             execute_qc_nodes=True, verbose=0, configuration_dict=None,
-            **kwargs):
+            smart_caching=None, **kwargs):
         """Method to execute a process or a pipeline in a study configuration
          environment.
 
@@ -322,6 +377,8 @@ class StudyConfig(Controller):
             if different from zero, print console messages.
         configuration_dict: dict (optional)
             configuration dictionary
+        smart_caching: bool (optional)
+            if not None, overrides :attr:`use_smart_caching` for this run
         """
 
         # Use soma workflow to execute the pipeline or process in parallel
@@ -380,13 +437,29 @@ class StudyConfig(Controller):
 
         # Temporary files can be generated for pipelines
         temporary_files = []
+        temporary_directory = self.temporary_directory
+        if temporary_directory in (None, Undefined, ''):
+            temporary_directory = None
+        elif not os.path.isdir(temporary_directory):
+            os.makedirs(temporary_directory)
+        release = None
         result = None
+        profile = None
+        with self.run_lock:
+            outermost = (self._run_depth == 0)
+            self._run_depth += 1
+        if outermost:
+            if self.profile_execution:
+                profile = ExecutionProfile()
+            self.execution_profile = profile
         try:
             # Generate ordered execution list
             execution_list = []
+            graph = None
             if isinstance(process_or_pipeline, Pipeline):
                 execution_list = \
                     process_or_pipeline.workflow_ordered_nodes()
+                graph = process_or_pipeline.compiled_workflow_graph()
                 # Filter process nodes if necessary
                 if not execute_qc_nodes:
                     execution_list = [node for node in execution_list
@@ -395,7 +468,7 @@ class StudyConfig(Controller):
                 for node in execution_list:
                     # check temporary outputs and allocate files
                     process_or_pipeline._check_temporary_files_for_node(
-                        node, temporary_files)
+                        node, temporary_files, temporary_directory)
             elif isinstance(process_or_pipeline, Process):
                 execution_list.append(process_or_pipeline)
             else:
@@ -422,32 +495,89 @@ class StudyConfig(Controller):
                 if qt_backend.headless:
                     qt_backend.set_headless(True, True)
 
-            # Execute each process node element
-            for process_node in execution_list:
-                # Execute the process instance contained in the node
-                if isinstance(process_node, Node):
-                    result, log_file = run_process(
-                        output_directory,
-                        process_node.process,
-                        generate_logging=self.generate_logging,
-                        verbose=verbose,
-                        configuration_dict=configuration_dict)
-
-                # Execute the process instance
-                else:
-                    result, log_file = run_process(
-                        output_directory,
-                        process_node,
-                        generate_logging=self.generate_logging,
-                        verbose=verbose,
-                        configuration_dict=configuration_dict)
-
-                with self.run_lock:
-                    if self.run_interruption_request:
-                        self.run_interruption_request = False
-                        raise RuntimeError('Execution interruption requested')
+            if (self.local_workers != 1 or self.temporary_files_budget) \
+                    and graph is not None and len(execution_list) > 1:
+                # Execute independent process nodes concurrently
+                def interruption_check():
+                    with self.run_lock:
+                        if self.run_interruption_request:
+                            self.run_interruption_request = False
+                            return True
+                    return False
+
+                nodes = graph.ordered_metas()
+                position = dict((graph.index[node], i)
+                                for i, node in enumerate(nodes))
+                predecessors = [
+                    [position[pred]
+                     for pred in graph.predecessors[graph.index[node]]]
+                    for node in nodes]
+                # filtered nodes are skipped but still carry dependencies
+                kept = set(execution_list)
+                skip = [i for i, node in enumerate(nodes)
+                        if node not in kept]
+                if temporary_files:
+                    # delete temporary files as soon as they are not used
+                    release = TemporaryFilesRelease(
+                        process_or_pipeline, nodes, temporary_files,
+                        budget=self.temporary_files_budget)
+                results = run_process_graph(
+                    output_directory,
+                    [node.process for node in nodes],
+                    predecessors,
+                    workers=self.local_workers,
+                    skip=skip,
+                    interruption_check=interruption_check,
+                    may_start=release and release.may_start,
+                    on_completion=release and release.completed,
+                    generate_logging=self.generate_logging,
+                    verbose=verbose,
+                    configuration_dict=configuration_dict,
+                    profile=profile,
+                    smart_caching=smart_caching)
+                ran = [r for r in results if r is not None]
+                if ran:
+                    result, log_file = ran[-1]
+            else:
+                if temporary_files:
+                    release = TemporaryFilesRelease(
+                        process_or_pipeline, execution_list, temporary_files)
+                # Execute each process node element
+                for index, process_node in enumerate(execution_list):
+                    # Execute the process instance contained in the node
+                    if isinstance(process_node, Node):
+                        result, log_file = run_process(
+                            output_directory,
+                            process_node.process,
+                            generate_logging=self.generate_logging,
+                            verbose=verbose,
+                            configuration_dict=configuration_dict,
+                            profile=profile,
+                            smart_caching=smart_caching)
+
+                    # Execute the process instance
+                    else:
+                        result, log_file = run_process(
+                            output_directory,
+                            process_node,
+                            generate_logging=self.generate_logging,
+                            verbose=verbose,
+                            configuration_dict=configuration_dict,
+                            profile=profile,
+                            smart_caching=smart_caching)
+
+                    if release is not None:
+                        release.completed(index)
+
+                    with self.run_lock:
+                        if self.run_interruption_request:
+                            self.run_interruption_request = False
+                            raise RuntimeError(
+                                'Execution interruption requested')
 
         finally:
+            with self.run_lock:
+                self._run_depth -= 1
             # Destroy temporary files
             if temporary_files:
                 # If temporary files have been created, we are sure that
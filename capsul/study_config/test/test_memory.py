@@ -7,12 +7,15 @@ import unittest
 import os
 import tempfile
 import shutil
+import threading
+import time
 
 # Capsul import
 from capsul.api import Process
 from capsul.api import FileCopyProcess
 from capsul.api import get_process_instance
-from capsul.study_config.memory import Memory
+from capsul.study_config.memory import Memory, file_fingerprint
+from capsul.study_config.memory import FileLock
 
 # Trait import
 from traits.api import Float, File, List, String
@@ -44,6 +47,33 @@ class DummyCopyProcess(FileCopyProcess):
         self.s = repr(self.copied_inputs)
 
 
+class DummyFileProcess(Process):
+    """ Dummy file reader.
+    """
+    i = File(output=False, optional=False, desc="a file")
+    size = Float(output=True, desc="the file size")
+
+    runs = 0
+
+    def _run_process(self):
+        DummyFileProcess.runs += 1
+        self.size = os.stat(self.i).st_size
+
+
+class SlowProcess(Process):
+    """ Slow dummy.
+    """
+    f = Float(output=False, optional=False, desc="float")
+    res = Float(output=True, desc="float")
+
+    runs = 0
+
+    def _run_process(self):
+        SlowProcess.runs += 1
+        time.sleep(0.5)
+        self.res = self.f * 2
+
+
 class TestMemory(unittest.TestCase):
     """ Execute a process using smart-caching functionalities.
     """
@@ -125,6 +155,143 @@ class TestMemory(unittest.TestCase):
             eval(proxy_process.s),
             {'i': copied_file, 'l': [copied_file], 'f': 2.5})
 
+    def test_content_fingerprint(self):
+        """ Test memory with content fingerprints.
+        """
+        self.cachedir = tempfile.mkdtemp()
+        mem = Memory(self.cachedir, fingerprint="content")
+        in_file = os.path.join(self.workspace_dir, "input.txt")
+        with open(in_file, "w") as f:
+            f.write("content\n")
+        copied_file = os.path.join(self.workspace_dir, "copy.txt")
+        shutil.copy(in_file, copied_file)
+        self.assertEqual(
+            file_fingerprint(in_file, mode="content"),
+            file_fingerprint(copied_file, mode="content"))
+        self.assertNotEqual(file_fingerprint(in_file),
+                            file_fingerprint(copied_file))
+
+        DummyFileProcess.runs = 0
+        proxy_process = mem.cache(DummyFileProcess(), verbose=0)
+        proxy_process(i=in_file)
+        self.assertEqual(proxy_process.size, 8)
+        index_file = os.path.join(mem.cachedir, "fingerprints.json")
+        self.assertTrue(os.path.exists(index_file))
+        # a copied input hits the cache
+        proxy_process = mem.cache(DummyFileProcess(), verbose=0)
+        proxy_process(i=copied_file)
+        self.assertEqual(proxy_process.size, 8)
+        self.assertEqual(DummyFileProcess.runs, 1)
+        # a modified input does not
+        with open(copied_file, "a") as f:
+            f.write("more\n")
+        proxy_process(i=copied_file)
+        self.assertEqual(proxy_process.size, 13)
+        self.assertEqual(DummyFileProcess.runs, 2)
+
+    def test_quotas(self):
+        """ Test memory eviction, pinning and statistics.
+        """
+        self.cachedir = tempfile.mkdtemp()
+        mem = Memory(self.cachedir, max_entries=2, eviction="lru")
+        proxy_process = mem.cache(DummyProcess(), verbose=0)
+        proxy_process(f=1., ff=1.)
+        mem.pin(proxy_process)
+        pinned = proxy_process.get_cache_entry()
+        proxy_process(f=2., ff=1.)
+        second = proxy_process.get_cache_entry()
+        proxy_process(f=2., ff=1.)
+        stats = mem.stats()
+        self.assertEqual(stats["entries"], 2)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 2)
+        self.assertEqual(stats["hit_ratio"], 1. / 3)
+        self.assertTrue(stats["bytes_saved"] > 0)
+        # the pinned entry is kept, the least recently used one goes
+        proxy_process(f=3., ff=1.)
+        self.assertTrue(os.path.isdir(pinned))
+        self.assertFalse(os.path.isdir(second))
+        self.assertFalse(os.path.exists(second + ".lock"))
+        stats = mem.stats()
+        self.assertEqual(stats["entries"], 2)
+        self.assertEqual(stats["pinned"], 1)
+        self.assertEqual(stats["evictions"], 1)
+        mem.unpin(pinned)
+        mem.clear()
+        # without cache, there is nothing to pin or evict
+        no_cache = Memory(None)
+        no_cache.pin(pinned)
+        no_cache.unpin(pinned)
+        self.assertEqual(no_cache.evict(), [])
+        self.assertEqual(no_cache.stats(), {})
+        self.assertEqual(mem.stats()["entries"], 0)
+        # no lock file is left behind
+        lock_files = [name for root, dirs, files in os.walk(self.cachedir)
+                      for name in files if name.endswith(".lock")
+                      and not name.startswith("cache_index")]
+        self.assertEqual(lock_files, [])
+
+    def test_journal_and_locked_entries(self):
+        """ Test that accesses are journaled and that entries in use are not
+        evicted.
+        """
+        self.cachedir = tempfile.mkdtemp()
+        mem = Memory(self.cachedir, max_entries=1)
+        proxy_process = mem.cache(DummyProcess(), verbose=0)
+        proxy_process(f=1., ff=1.)
+        first = proxy_process.get_cache_entry()
+        index_file = os.path.join(mem.cachedir, "cache_index.json")
+        journal_file = os.path.join(mem.cachedir, "cache_index.journal")
+        self.assertFalse(os.path.exists(index_file))
+        proxy_process(f=1., ff=1.)
+        with open(journal_file) as f:
+            self.assertEqual(len(f.readlines()), 2)
+        self.assertEqual(mem.stats()["hits"], 1)
+        # an entry being read is skipped by eviction
+        with FileLock(first + ".lock", shared=True):
+            proxy_process(f=2., ff=1.)
+        second = proxy_process.get_cache_entry()
+        self.assertTrue(os.path.isdir(first))
+        self.assertEqual(mem.stats()["entries"], 2)
+        # eviction compacts the journal into the index
+        self.assertEqual(mem.evict(), [first])
+        self.assertFalse(os.path.exists(journal_file))
+        self.assertTrue(os.path.exists(index_file))
+        stats = mem.stats()
+        self.assertEqual(stats["entries"], 1)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 2)
+        self.assertTrue(os.path.isdir(second))
+
+    def test_concurrent_calls(self):
+        """ Test that concurrent identical calls compute only once.
+        """
+        self.cachedir = tempfile.mkdtemp()
+        SlowProcess.runs = 0
+        results = []
+
+        def call():
+            proxy_process = Memory(self.cachedir).cache(SlowProcess(),
+                                                        verbose=0)
+            proxy_process(f=3.)
+            results.append(proxy_process.res)
+
+        threads = [threading.Thread(target=call) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [6.] * 4)
+        self.assertEqual(SlowProcess.runs, 1)
+        stats = Memory(self.cachedir).stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits"], 3)
+        for root, dirs, files in os.walk(self.cachedir):
+            for name in dirs + files:
+                self.assertFalse(name.endswith(".inflight"))
+                self.assertFalse(".tmp-" in name)
+
+
 def test():
     """ Function to execute unitest.
     """
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import absolute_import
+import unittest
+import tempfile
+import shutil
+import time
+import os
+import os.path as osp
+import sys
+import importlib
+
+from capsul.api import get_process_instance
+from capsul.study_config import process_instance
+from capsul.pipeline import pipeline_tools
+
+
+class TestProcessInstance(unittest.TestCase):
+
+    morphologist = \
+        'capsul.pipeline.test.fake_morphologist.morphologist.Morphologist'
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='capsul_process_instance')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_factories_cache(self):
+        stats = process_instance.process_factories_stats
+        filename = osp.join(self.tmpdir, 'pipeline.json')
+        pipeline_tools.save_pipeline(
+            get_process_instance(
+                'capsul.pipeline.test.test_pipeline.MyPipeline'), filename)
+        pipeline1 = get_process_instance(filename)
+        misses = stats['misses']
+        pipeline2 = get_process_instance(filename)
+        # sub-processes are also found in the cache
+        self.assertEqual(stats['misses'], misses)
+        # the parsed definition is shared, instances are not
+        self.assertTrue(type(pipeline1) is type(pipeline2))
+        self.assertTrue(pipeline1 is not pipeline2)
+        self.assertTrue(pipeline1.nodes['node1'] is not
+                        pipeline2.nodes['node1'])
+        pipeline1.nodes['node1'].process.other_input = 12.
+        self.assertTrue(pipeline2.nodes['node1'].process.other_input
+                        != 12.)
+        # modifying the file invalidates the cache
+        mtime = os.stat(filename).st_mtime_ns
+        os.utime(filename, ns=(mtime + 10**9, mtime + 10**9))
+        pipeline3 = get_process_instance(filename)
+        self.assertEqual(stats['misses'], misses + 1)
+        self.assertTrue(type(pipeline3) is not type(pipeline1))
+
+    def test_module_factories_cache(self):
+        stats = process_instance.process_factories_stats
+        module_file = osp.join(self.tmpdir, 'capsul_test_factories.py')
+        with open(module_file, 'w') as f:
+            f.write('from capsul.api import Process\n\n'
+                    'class FactoryProcess(Process):\n'
+                    '    pass\n')
+        sys.path.insert(0, self.tmpdir)
+        try:
+            process_id = 'capsul_test_factories.FactoryProcess'
+            factory = process_instance.get_process_factory(process_id)
+            misses = stats['misses']
+            # python does not import modified modules again: the factory is
+            # kept until the cache is cleared
+            mtime = os.stat(module_file).st_mtime_ns
+            os.utime(module_file, ns=(mtime + 10**9, mtime + 10**9))
+            self.assertTrue(
+                process_instance.get_process_factory(process_id) is factory)
+            self.assertEqual(stats['misses'], misses)
+            importlib.reload(sys.modules['capsul_test_factories'])
+            process_instance.clear_process_factories()
+            factory2 = process_instance.get_process_factory(process_id)
+            self.assertEqual(stats['misses'], misses + 1)
+            self.assertTrue(factory2 is not factory)
+        finally:
+            sys.path.remove(self.tmpdir)
+            sys.modules.pop('capsul_test_factories', None)
+
+    def test_instantiation_benchmark(self):
+        process_instance.clear_process_factories()
+        start = time.time()
+        pipeline = get_process_instance(self.morphologist)
+        first = time.time() - start
+        n = 5
+        start = time.time()
+        for i in range(n):
+            get_process_instance(self.morphologist)
+        duration = (time.time() - start) / n
+        print('Morphologist instantiation (%d nodes): first: %.3fs, then: '
+              '%.3fs' % (len(list(pipeline.all_nodes())), first, duration))
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestProcessInstance)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
@@ -6,13 +6,20 @@ import unittest
 import tempfile
 import shutil
 import os
+import time
+try:
+    from unittest import mock
+except ImportError:
+    import mock
 
 # Capsul import
-from capsul.api import Process, get_process_instance
+from capsul.api import Process, Pipeline, get_process_instance
 from capsul.study_config.study_config import StudyConfig
+from capsul.study_config import run
+from capsul.study_config.run import run_process_graph, TemporaryFilesRelease
 
 # Trait import
-from traits.api import Float, Directory
+from traits.api import Float, Directory, File
 
 
 class DummyProcess(Process):
@@ -28,6 +35,89 @@ class DummyProcess(Process):
         self.res = self.f1 * self.f2
 
 
+class SleepProcess(Process):
+    """ A process which waits and records its execution time.
+    """
+    f1 = Float(output=False, optional=False, desc="a float")
+    f2 = Float(0., output=False, optional=True, desc="a float")
+    res = Float(output=True, desc="a float")
+
+    executions = []
+
+    def _run_process(self):
+        start = time.time()
+        time.sleep(0.3)
+        self.res = self.f1 + self.f2
+        self.executions.append((self.name, start, time.time()))
+
+
+class SleepPipeline(Pipeline):
+    """ Two independent nodes followed by a node depending on both.
+    """
+    def pipeline_definition(self):
+        for name in ('node1', 'node2', 'node3'):
+            self.add_process(
+                name,
+                'capsul.study_config.test.test_run_in_study_config.'
+                'SleepProcess')
+            self.nodes[name].process.name = name
+        self.add_link('node1.res->node3.f1')
+        self.add_link('node2.res->node3.f2')
+        self.export_parameter('node1', 'f1', 'a')
+        self.export_parameter('node2', 'f1', 'b')
+        self.export_parameter('node3', 'res')
+
+
+class ScratchProcess(Process):
+    """ A process writing its output file, and recording the non-empty
+    files in the scratch directory when it starts.
+    """
+    input = File(output=False, optional=True, desc="a file")
+    output = File(output=True, desc="a file")
+
+    scratch_directory = None
+    executions = []
+
+    def _run_process(self):
+        files = [name for name in os.listdir(self.scratch_directory)
+                 if os.path.getsize(os.path.join(self.scratch_directory,
+                                                 name)) != 0]
+        self.executions.append((self.name, sorted(files)))
+        with open(self.output, 'w') as f:
+            f.write(self.name * 100)
+
+
+class ScratchChain(Pipeline):
+    """ Three nodes linked through two temporary files.
+    """
+    def pipeline_definition(self):
+        for name in ('node1', 'node2', 'node3'):
+            self.add_process(
+                name,
+                'capsul.study_config.test.test_run_in_study_config.'
+                'ScratchProcess')
+            self.nodes[name].process.name = name
+        self.add_link('node1.output->node2.input')
+        self.add_link('node2.output->node3.input')
+        self.export_parameter('node3', 'output')
+
+
+class ScratchBranches(Pipeline):
+    """ Two independent branches, each one using a temporary file.
+    """
+    def pipeline_definition(self):
+        for name in ('a1', 'b1', 'a2', 'b2'):
+            self.add_process(
+                name,
+                'capsul.study_config.test.test_run_in_study_config.'
+                'ScratchProcess')
+            self.nodes[name].process.name = name
+        self.add_link('a1.output->b1.input')
+        self.add_link('a2.output->b2.input')
+        self.export_parameter('b1', 'output', 'output1')
+        self.export_parameter('b2', 'output', 'output2')
+
+
 class TestRunProcess(unittest.TestCase):
     """ Execute a process.
     """
@@ -79,10 +169,144 @@ class TestRunProcess(unittest.TestCase):
                 self.output_directory)
 
 
+class TestParallelRun(unittest.TestCase):
+    """ Execute a pipeline with several local workers.
+    """
+    def setUp(self):
+        self.output_directory = tempfile.mkdtemp()
+        self.study_config = StudyConfig(
+            modules=[], output_directory=self.output_directory,
+            local_workers=2)
+        SleepProcess.executions = []
+
+    def tearDown(self):
+        shutil.rmtree(self.output_directory)
+
+    def test_dependencies(self):
+        pipeline = self.study_config.get_process_instance(SleepPipeline)
+        self.study_config.run(pipeline, a=1., b=2.)
+        self.assertEqual(pipeline.res, 3.)
+        executions = dict((name, (start, end))
+                          for name, start, end in SleepProcess.executions)
+        self.assertEqual(sorted(executions), ['node1', 'node2', 'node3'])
+        # independent nodes overlap, the last one waits for both
+        self.assertTrue(executions['node1'][0] < executions['node2'][1])
+        self.assertTrue(executions['node2'][0] < executions['node1'][1])
+        self.assertTrue(executions['node3'][0] >= executions['node1'][1])
+        self.assertTrue(executions['node3'][0] >= executions['node2'][1])
+
+    def test_output_directories(self):
+        self.study_config.process_output_directory = True
+        pipeline = self.study_config.get_process_instance(SleepPipeline)
+        self.study_config.run(pipeline, a=1., b=2.)
+        # each process gets its own number, even when run concurrently
+        directories = sorted(os.listdir(self.output_directory))
+        self.assertEqual([d.split('-')[0] for d in directories],
+                         ['1', '2', '3'])
+        self.assertEqual(sorted(d.split('-')[1] for d in directories),
+                         ['node1', 'node2', 'node3'])
+        self.assertEqual(self.study_config.process_counter, 4)
+
+    def test_exclusive_process(self):
+        pipeline = self.study_config.get_process_instance(SleepPipeline)
+        # node1 changes the current directory, as nipype processes do
+        with mock.patch.object(run, '_runs_exclusively',
+                               lambda process: process.name == 'node1'):
+            self.study_config.run(pipeline, a=1., b=2.)
+        executions = dict((name, (start, end))
+                          for name, start, end in SleepProcess.executions)
+        self.assertTrue(executions['node1'][1] <= executions['node2'][0]
+                        or executions['node2'][1] <= executions['node1'][0])
+
+    def test_interruption(self):
+        pipeline = self.study_config.get_process_instance(SleepPipeline)
+
+        def interrupt(obj, name, old, new):
+            self.study_config.run_interruption_request = True
+
+        # request an interruption while node1 runs
+        pipeline.nodes['node1'].process.on_trait_change(interrupt, 'res')
+        self.assertRaises(RuntimeError, self.study_config.run, pipeline,
+                          a=1., b=2.)
+        self.assertFalse('node3' in [execution[0] for execution
+                                     in SleepProcess.executions])
+
+
+class TestTemporaryFiles(unittest.TestCase):
+    """ Release temporary files as soon as they are not used anymore.
+    """
+    def setUp(self):
+        self.output_directory = tempfile.mkdtemp()
+        self.scratch = os.path.join(self.output_directory, 'scratch')
+        self.study_config = StudyConfig(
+            modules=[], output_directory=self.output_directory,
+            temporary_directory=self.scratch)
+        ScratchProcess.scratch_directory = self.scratch
+        ScratchProcess.executions = []
+
+    def tearDown(self):
+        shutil.rmtree(self.output_directory)
+
+    def test_early_release(self):
+        pipeline = self.study_config.get_process_instance(ScratchChain)
+        output = os.path.join(self.output_directory, 'output.txt')
+        self.study_config.run(pipeline, output=output)
+        executions = ScratchProcess.executions
+        self.assertEqual([execution[0] for execution in executions],
+                         ['node1', 'node2', 'node3'])
+        # when node3 starts, the output of node1 has been deleted
+        self.assertEqual(len(executions[1][1]), 1)
+        self.assertEqual(len(executions[2][1]), 1)
+        self.assertNotEqual(executions[1][1], executions[2][1])
+        self.assertEqual(os.listdir(self.scratch), [])
+        self.assertTrue(os.path.exists(output))
+        self.assertEqual(pipeline.nodes['node2'].process.input, '')
+
+    def test_budget(self):
+        pipeline = self.study_config.get_process_instance(ScratchBranches)
+        pipeline.output1 = os.path.join(self.output_directory, 'o1.txt')
+        pipeline.output2 = os.path.join(self.output_directory, 'o2.txt')
+        nodes = [pipeline.nodes[name] for name in ('a1', 'a2', 'b1', 'b2')]
+        temp_files = []
+        os.mkdir(self.scratch)
+        for node in nodes:
+            pipeline._check_temporary_files_for_node(node, temp_files,
+                                                     self.scratch)
+        release = TemporaryFilesRelease(pipeline, nodes, temp_files,
+                                        budget=1)
+        try:
+            run_process_graph(self.output_directory,
+                              [node.process for node in nodes],
+                              [[], [], [0], [1]], workers=1,
+                              may_start=release.may_start,
+                              on_completion=release.completed)
+        finally:
+            pipeline._free_temporary_files(temp_files)
+        # a2 is delayed until the temporary file of a1 is deleted
+        self.assertEqual([execution[0]
+                          for execution in ScratchProcess.executions],
+                         ['a1', 'b1', 'a2', 'b2'])
+        self.assertEqual(release.peak_usage, 200)
+        self.assertEqual(release.usage, 0)
+        self.assertEqual(os.listdir(self.scratch), [])
+
+        # through StudyConfig.run()
+        ScratchProcess.executions = []
+        self.study_config.temporary_files_budget = 1
+        self.study_config.run(pipeline)
+        self.assertEqual(len(ScratchProcess.executions), 4)
+        for name, files in ScratchProcess.executions:
+            self.assertTrue(len(files) <= 1)
+        self.assertEqual(os.listdir(self.scratch), [])
+
 def test():
     """ Function to execute unitest.
     """
     suite = unittest.TestLoader().loadTestsFromTestCase(TestRunProcess)
+    suite.addTests(
+        unittest.TestLoader().loadTestsFromTestCase(TestParallelRun))
+    suite.addTests(
+        unittest.TestLoader().loadTestsFromTestCase(TestTemporaryFiles))
     runtime = unittest.TextTestRunner(verbosity=2).run(suite)
     return runtime.wasSuccessful()
 
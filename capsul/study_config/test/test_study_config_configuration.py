@@ -33,10 +33,17 @@ tests_no_files = [
         "generate_logging": False,
         'use_matlab': False,
         'use_smart_caching': False,
+        'smart_caching_fingerprint': 'stat',
+        'smart_caching_max_bytes': 0,
+        'smart_caching_max_entries': 0,
+        'smart_caching_eviction': 'lru',
         'use_soma_workflow': False,
         'create_output_directories': True,
         'process_output_directory': False,
         'user_level': 0,
+        'local_workers': 1,
+        'temporary_files_budget': 0,
+        'profile_execution': False,
     },
     ['AFNIConfig', 'ANTSConfig', 'FSLConfig', 'MRTRIXConfig', 'MatlabConfig',
         'SPMConfig', 'SmartCachingConfig', 'SomaWorkflowConfig'],
@@ -52,10 +59,17 @@ tests_no_files = [
         "generate_logging": False,
         'use_matlab': False,
         'use_smart_caching': False,
+        'smart_caching_fingerprint': 'stat',
+        'smart_caching_max_bytes': 0,
+        'smart_caching_max_entries': 0,
+        'smart_caching_eviction': 'lru',
         'use_soma_workflow': False,
         'create_output_directories': True,
         'process_output_directory': False,
         'user_level': 0,
+        'local_workers': 1,
+        'temporary_files_budget': 0,
+        'profile_execution': False,
     },
     ['AFNIConfig', 'ANTSConfig', 'FSLConfig', 'MRTRIXConfig', 'MatlabConfig',
         'SPMConfig', 'SmartCachingConfig', 'SomaWorkflowConfig'],
@@ -71,10 +85,17 @@ tests_no_files = [
         "generate_logging": False,
         'use_matlab': False,
         'use_smart_caching': False,
+        'smart_caching_fingerprint': 'stat',
+        'smart_caching_max_bytes': 0,
+        'smart_caching_max_entries': 0,
+        'smart_caching_eviction': 'lru',
         'use_soma_workflow': False,
         'create_output_directories': True,
         'process_output_directory': False,
         'user_level': 0,
+        'local_workers': 1,
+        'temporary_files_budget': 0,
+        'profile_execution': False,
     },
     ['AFNIConfig', 'ANTSConfig', 'FSLConfig', 'MRTRIXConfig', 'MatlabConfig',
         'SPMConfig', 'SmartCachingConfig', 'SomaWorkflowConfig'],
@@ -99,6 +120,9 @@ tests_no_files = [
         'create_output_directories': True,
         'process_output_directory': False,
         'user_level': 0,
+        'local_workers': 1,
+        'temporary_files_budget': 0,
+        'profile_execution': False,
     },
     ['SomaWorkflowConfig'], None, None]],
 
@@ -114,10 +138,17 @@ tests_no_files = [
         "use_freesurfer": False,
         "shared_directory": soma.config.BRAINVISA_SHARE,
         'use_smart_caching': False,
+        'smart_caching_fingerprint': 'stat',
+        'smart_caching_max_bytes': 0,
+        'smart_caching_max_entries': 0,
+        'smart_caching_eviction': 'lru',
         'use_soma_workflow': False,
         'create_output_directories': True,
         'process_output_directory': False,
         'user_level': 0,
+        'local_workers': 1,
+        'temporary_files_budget': 0,
+        'profile_execution': False,
     },
     ['AFNIConfig', 'ANTSConfig', 'BrainVISAConfig', 'FSLConfig',
      'FreeSurferConfig', 'MRTRIXConfig', 'MatlabConfig', 'SPMConfig',
@@ -142,10 +173,17 @@ tests_standard_files = [
         "generate_logging": False,
         'use_matlab': False,
         'use_smart_caching': False,
+        'smart_caching_fingerprint': 'stat',
+        'smart_caching_max_bytes': 0,
+        'smart_caching_max_entries': 0,
+        'smart_caching_eviction': 'lru',
         'use_soma_workflow': False,
         'create_output_directories': True,
         'process_output_directory': False,
         'user_level': 0,
+        'local_workers': 1,
+        'temporary_files_budget': 0,
+        'profile_execution': False,
     },
     ['AFNIConfig', 'ANTSConfig', 'FSLConfig', 'MRTRIXConfig', 'MatlabConfig',
         'SPMConfig', 'SmartCachingConfig', 'SomaWorkflowConfig'],
@@ -174,6 +212,9 @@ tests_standard_files = [
         'process_completion': 'builtin',
         'process_output_directory': False,
         'user_level': 0,
+        'local_workers': 1,
+        'temporary_files_budget': 0,
+        'profile_execution': False,
     },
     ['AttributesConfig', 'BrainVISAConfig', 'FomConfig', 'MatlabConfig', 'SPMConfig', 'SomaWorkflowConfig'],
     'config.json',
@@ -188,10 +229,17 @@ tests_standard_files = [
         "generate_logging": False,
         'use_matlab': False,
         'use_smart_caching': False,
+        'smart_caching_fingerprint': 'stat',
+        'smart_caching_max_bytes': 0,
+        'smart_caching_max_entries': 0,
+        'smart_caching_eviction': 'lru',
         'use_soma_workflow': False,
         'create_output_directories': True,
         'process_output_directory': False,
         'user_level': 0,
+        'local_workers': 1,
+        'temporary_files_budget': 0,
+        'profile_execution': False,
     },
     ['AFNIConfig', 'ANTSConfig', 'FSLConfig', 'MRTRIXConfig', 'MatlabConfig',
         'SPMConfig', 'SmartCachingConfig', 'SomaWorkflowConfig'],
@@ -205,6 +253,9 @@ tests_standard_files = [
         'create_output_directories': True,
         'process_output_directory': False,
         'user_level': 0,
+        'local_workers': 1,
+        'temporary_files_budget': 0,
+        'profile_execution': False,
     },
     [],
     None,
@@ -221,6 +272,9 @@ tests_standard_files = [
         'create_output_directories': True,
         'process_output_directory': False,
         'user_level': 0,
+        'local_workers': 1,
+        'temporary_files_budget': 0,
+        'profile_execution': False,
     },
     ['SomaWorkflowConfig'],
     'config.json',
@@ -240,10 +294,17 @@ tests_custom_files = [
         "generate_logging": False,
         'use_matlab': False,
         'use_smart_caching': False,
+        'smart_caching_fingerprint': 'stat',
+        'smart_caching_max_bytes': 0,
+        'smart_caching_max_entries': 0,
+        'smart_caching_eviction': 'lru',
         'use_soma_workflow': False,
         'create_output_directories': True,
         'process_output_directory': False,
         'user_level': 0,
+        'local_workers': 1,
+        'temporary_files_budget': 0,
+        'profile_execution': False,
     },
     ['AFNIConfig', 'ANTSConfig', 'FSLConfig', 'MRTRIXConfig', 'MatlabConfig',
         'SPMConfig', 'SmartCachingConfig', 'SomaWorkflowConfig'],
@@ -272,6 +333,9 @@ tests_custom_files = [
         'process_completion': 'builtin',
         'process_output_directory': False,
         'user_level': 0,
+        'local_workers': 1,
+        'temporary_files_budget': 0,
+        'profile_execution': False,
     },
     ['AttributesConfig', 'BrainVISAConfig', 'FomConfig', 'MatlabConfig', 'SPMConfig', 'SomaWorkflowConfig'],
     os.path.join('somewhere', 'config.json'),
@@ -286,10 +350,17 @@ tests_custom_files = [
         "generate_logging": False,
         'use_matlab': False,
         'use_smart_caching': False,
+        'smart_caching_fingerprint': 'stat',
+        'smart_caching_max_bytes': 0,
+        'smart_caching_max_entries': 0,
+        'smart_caching_eviction': 'lru',
         'use_soma_workflow': False,
         'create_output_directories': True,
         'process_output_directory': False,
         'user_level': 0,
+        'local_workers': 1,
+        'temporary_files_budget': 0,
+        'profile_execution': False,
     },
     ['AFNIConfig', 'ANTSConfig', 'FSLConfig', 'MRTRIXConfig', 'MatlabConfig',
         'SPMConfig', 'SmartCachingConfig', 'SomaWorkflowConfig'],
@@ -303,6 +374,9 @@ tests_custom_files = [
         'create_output_directories': True,
         'process_output_directory': False,
         'user_level': 0,
+        'local_workers': 1,
+        'temporary_files_budget': 0,
+        'profile_execution': False,
     },
     [],
     None,
@@ -319,6 +393,9 @@ tests_custom_files = [
         'create_output_directories': True,
         'process_output_directory': False,
         'user_level': 0,
+        'local_workers': 1,
+        'temporary_files_budget': 0,
+        'profile_execution': False,
     },
     ['SomaWorkflowConfig'],
     os.path.join('somewhere', 'config.json'),
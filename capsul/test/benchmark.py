@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*-
+'''
+Scalability benchmarks of Capsul pipelines handling: instantiation,
+activation, parameters completion, soma-workflow workflow build, and JSON /
+XML save and load. They run on generated pipelines of increasing size, on
+the fake Morphologist pipeline (see
+:mod:`capsul.pipeline.test.fake_morphologist`), and on iterations of it
+over an increasing number of subjects.
+
+Each operation is timed, and the peak of memory allocated during a run is
+measured with :mod:`tracemalloc`. Times are also expressed relative to a
+calibration run (a fixed pure Python workload, see :func:`calibrate`), so
+that baselines made on one machine can be used on another one. Results may
+be compared to baselines (by default the ones stored in
+``benchmark_baselines.json`` next to this module) to detect regressions:
+only relative times and memory peaks are stored in baselines.
+
+Commandline usage::
+
+    python -m capsul.test.benchmark --sizes 10,100,1000,10000 \\
+        --iterations 10,100,1000,10000
+
+Classes
+=======
+:class:`BenchmarkStep`
+----------------------
+:class:`GeneratedPipeline`
+--------------------------
+:class:`BenchmarkRunner`
+------------------------
+
+Functions
+=========
+:func:`calibrate`
+-----------------
+:func:`generated_pipeline_class`
+--------------------------------
+:func:`generated_benchmarks`
+----------------------------
+:func:`morphologist_benchmarks`
+-------------------------------
+:func:`run_benchmarks`
+----------------------
+:func:`load_baselines`
+----------------------
+:func:`save_baselines`
+----------------------
+:func:`compare_to_baselines`
+----------------------------
+'''
+
+from __future__ import print_function
+from __future__ import absolute_import
+import json
+import os
+import os.path as osp
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from optparse import OptionParser
+
+from traits.api import File
+
+from capsul.api import Process, Pipeline, get_process_instance
+from capsul.attributes.completion_engine import ProcessCompletionEngine
+from capsul.pipeline import pipeline_tools
+from capsul.pipeline.pipeline_workflow import workflow_from_pipeline
+from capsul.study_config.process_instance import clear_process_factories
+from capsul.study_config.study_config import StudyConfig
+
+
+#: default baselines file
+BASELINES_FILE = osp.join(osp.dirname(osp.abspath(__file__)),
+                          'benchmark_baselines.json')
+
+MORPHOLOGIST = \
+    'capsul.pipeline.test.fake_morphologist.morphologist.Morphologist'
+
+
+def _calibration_workload():
+    # pure Python work of the kind pipelines handling does: building and
+    # sorting strings, filling dicts and lists
+    items = {}
+    for i in range(100000):
+        key = 'node%d.plug%d' % (i % 1000, i)
+        items[key] = [key, i]
+    return sorted(items)
+
+
+def calibrate(repeat=5):
+    '''
+    Time a fixed pure Python workload, independent of Capsul, to calibrate
+    benchmark times on the current machine.
+
+    Returns
+    -------
+    time: float
+        shortest time (seconds) of ``repeat`` runs of the workload
+    '''
+    durations = []
+    for i in range(max(1, repeat)):
+        start = time.perf_counter()
+        _calibration_workload()
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+class BenchmarkStep(Process):
+    """ A process reading a file and writing another one.
+    """
+    input = File(output=False, desc="a file")
+    output = File(output=True, desc="a file")
+
+    def _run_process(self):
+        with open(self.output, 'w') as f:
+            f.write(self.name)
+
+
+class GeneratedPipeline(Pipeline):
+    """ Independent chains of 10 :class:`BenchmarkStep` nodes, with
+    :attr:`size` nodes in total. Use :func:`generated_pipeline_class` to
+    get the class of a given size.
+    """
+    size = 10
+
+    def pipeline_definition(self):
+        for i in range(self.size):
+            name = 'step%d' % i
+            self.add_process(name, BenchmarkStep())
+            if i % 10 == 0:
+                self.export_parameter(name, 'input', 'input%d' % (i // 10))
+            else:
+                self.add_link('step%d.output->%s.input' % (i - 1, name))
+            if i % 10 == 9 or i == self.size - 1:
+                self.export_parameter(name, 'output', 'output%d' % (i // 10))
+
+
+def generated_pipeline_class(size):
+    '''
+    :class:`GeneratedPipeline` subclass with the given number of nodes.
+    '''
+    return type('GeneratedPipeline%d' % size, (GeneratedPipeline, ),
+                {'size': size, '__module__': __name__})
+
+
+class BenchmarkRunner(object):
+    '''
+    Measures operations and records the results.
+
+    Parameters
+    ----------
+    repeat: int
+        number of timed runs of each operation: the recorded time is the
+        shortest one.
+    memory: bool
+        if True, each operation is run once more with :mod:`tracemalloc`
+        enabled, to record the peak of memory allocated during the run
+        (timed runs are not traced, since tracing slows them down).
+    verbose: bool
+        print results as they are measured.
+    calibration: float
+        calibration time of the machine (see :func:`calibrate`). Measured
+        if not given.
+
+    Attributes
+    ----------
+    results: list of dict
+        one dict per measure, with keys ``operation``, ``pipeline``,
+        ``size``, ``time`` (seconds), ``relative_time`` (time divided by the
+        calibration time) and ``peak_memory`` (bytes, or None)
+    '''
+
+    def __init__(self, repeat=1, memory=True, verbose=False,
+                 calibration=None):
+        self.repeat = repeat
+        self.memory = memory
+        self.verbose = verbose
+        if calibration is None:
+            calibration = calibrate()
+        self.calibration = calibration
+        self.results = []
+        if verbose:
+            print('calibration: %.4fs' % calibration)
+
+    def measure(self, operation, pipeline, size, func, setup=None):
+        '''
+        Time ``func()``, calling ``setup()`` before each run, and record the
+        result.
+
+        Returns
+        -------
+        value:
+            the value returned by the last call to func
+        '''
+        durations = []
+        for i in range(max(1, self.repeat)):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            value = func()
+            durations.append(time.perf_counter() - start)
+        peak = None
+        if self.memory:
+            if setup is not None:
+                setup()
+            tracemalloc.start()
+            try:
+                value = func()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        result = {'operation': operation, 'pipeline': pipeline,
+                  'size': size, 'time': min(durations),
+                  'relative_time': min(durations) / self.calibration,
+                  'peak_memory': peak}
+        self.results.append(result)
+        if self.verbose:
+            print(format_result(result))
+            sys.stdout.flush()
+        return value
+
+
+def result_key(result):
+    '''
+    Key identifying a measure in baselines: "operation pipeline size".
+    '''
+    return '%s %s %s' % (result['operation'], result['pipeline'],
+                         result['size'])
+
+
+def format_result(result):
+    '''
+    One line description of a measure.
+    '''
+    text = '%-35s %-13s %6s: %9.4fs (%8.2f)' % (
+        result['operation'], result['pipeline'], result['size'],
+        result['time'], result['relative_time'])
+    if result['peak_memory'] is not None:
+        text += ', %9.1f MB' % (result['peak_memory'] / 1e6)
+    return text
+
+
+def _io_benchmarks(runner, pipeline, name, size, tmpdir):
+    for format in ('json', 'xml'):
+        filename = osp.join(tmpdir, '%s_%s.%s' % (name, size, format))
+        runner.measure('save_%s' % format, name, size,
+                       lambda: pipeline_tools.save_pipeline(pipeline,
+                                                            filename))
+        # the factories cache would make later loads immediate
+        runner.measure('load_%s' % format, name, size,
+                       lambda: get_process_instance(filename),
+                       setup=clear_process_factories)
+
+
+def _pipeline_benchmarks(runner, factory, name, size, study_config, tmpdir):
+    pipeline = runner.measure(
+        'get_process_instance', name, size,
+        lambda: get_process_instance(factory, study_config=study_config),
+        setup=clear_process_factories)
+    for param, trait in pipeline.user_traits().items():
+        if isinstance(trait.trait_type, File):
+            setattr(pipeline, param,
+                    osp.join(tmpdir, 'output' if trait.output else 'input',
+                             '%s.nii' % param))
+    runner.measure('update_nodes_and_plugs_activation', name, size,
+                   pipeline.update_nodes_and_plugs_activation)
+    runner.measure('workflow_from_pipeline', name, size,
+                   lambda: workflow_from_pipeline(
+                       pipeline, study_config=study_config,
+                       create_directories=False))
+    _io_benchmarks(runner, pipeline, name, size, tmpdir)
+    return pipeline
+
+
+def generated_benchmarks(runner, sizes, tmpdir):
+    '''
+    Benchmark pipelines of :class:`GeneratedPipeline` with the given numbers
+    of nodes.
+    '''
+    study_config = StudyConfig(modules=[])
+    for size in sizes:
+        _pipeline_benchmarks(runner, generated_pipeline_class(size),
+                             'generated', size, study_config, tmpdir)
+
+
+def _fom_study_config(tmpdir):
+    foms = osp.join(osp.dirname(osp.dirname(osp.abspath(__file__))),
+                    'pipeline', 'test', 'fake_morphologist', 'foms')
+    study_config = StudyConfig('capsul_benchmark', modules=['FomConfig'],
+                               init_config={})
+    study_config.input_directory = osp.join(tmpdir, 'input')
+    study_config.output_directory = osp.join(tmpdir, 'output')
+    study_config.fom_path = [foms]
+    study_config.input_fom = 'morphologist-auto-1.0'
+    study_config.output_fom = 'morphologist-auto-1.0'
+    study_config.shared_fom = 'shared-brainvisa-1.0'
+    return study_config
+
+
+def morphologist_benchmarks(runner, iterations, tmpdir):
+    '''
+    Benchmark the fake Morphologist pipeline, then its iteration over the
+    given numbers of subjects: parameters completion through the FOM
+    completion engine, and workflow build.
+    '''
+    study_config = _fom_study_config(tmpdir)
+    _pipeline_benchmarks(runner, MORPHOLOGIST, 'morphologist', 1,
+                         study_config, tmpdir)
+    for size in iterations:
+        pipeline = study_config.get_iteration_pipeline(
+            'iteration', 'morphologist', MORPHOLOGIST, ['t1mri'])
+        completion_engine = ProcessCompletionEngine.get_completion_engine(
+            pipeline)
+        attributes = completion_engine.get_attribute_values()
+        attributes.center = ['center']
+        attributes.subject = ['subject%d' % i for i in range(size)]
+        runner.measure('complete_parameters', 'iteration', size,
+                       completion_engine.complete_parameters)
+        runner.measure('workflow_from_pipeline', 'iteration', size,
+                       lambda: workflow_from_pipeline(
+                           pipeline, study_config=study_config,
+                           create_directories=False))
+
+
+def run_benchmarks(sizes=(10, 100, 1000), iterations=(10, 100), repeat=1,
+                   memory=True, verbose=False):
+    '''
+    Run all benchmarks.
+
+    Parameters
+    ----------
+    sizes: sequence of int
+        numbers of nodes of the generated pipelines
+    iterations: sequence of int
+        numbers of subjects of the Morphologist iterations
+    repeat, memory, verbose:
+        see :class:`BenchmarkRunner`
+
+    Returns
+    -------
+    results: list of dict
+        see :attr:`BenchmarkRunner.results`
+    '''
+    runner = BenchmarkRunner(repeat=repeat, memory=memory, verbose=verbose)
+    tmpdir = tempfile.mkdtemp(prefix='capsul_benchmark')
+    try:
+        generated_benchmarks(runner, sizes, tmpdir)
+        morphologist_benchmarks(runner, iterations, tmpdir)
+    finally:
+        shutil.rmtree(tmpdir)
+    return runner.results
+
+
+def load_baselines(filename=BASELINES_FILE):
+    '''
+    Read baselines saved by :func:`save_baselines`: a dict
+    ``{key: result}``, see :func:`result_key`.
+    '''
+    with open(filename) as f:
+        return json.load(f)
+
+
+def save_baselines(results, filename=BASELINES_FILE):
+    '''
+    Save results as baselines. Existing baselines for other measures are
+    kept. Absolute times are machine dependent, thus not stored: only
+    relative times and memory peaks are.
+    '''
+    baselines = {}
+    if osp.exists(filename):
+        baselines = load_baselines(filename)
+    for result in results:
+        baselines[result_key(result)] = dict(
+            (key, result[key])
+            for key in ('operation', 'pipeline', 'size', 'relative_time',
+                        'peak_memory'))
+    with open(filename, 'w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare_to_baselines(results, baselines, tolerance=1.5,
+                         min_time=0.01):
+    '''
+    Find regressions: measures whose relative time or peak memory exceeds
+    the baseline by more than the tolerance factor. Measures which took less
+    than ``min_time`` seconds are not compared for time, since they are
+    mostly noise.
+
+    Returns
+    -------
+    regressions: list of tuple
+        ``(key, quantity, value, baseline_value)`` tuples, ``quantity``
+        being ``'relative_time'`` or ``'peak_memory'``.
+    '''
+    regressions = []
+    for result in results:
+        key = result_key(result)
+        baseline = baselines.get(key)
+        if baseline is None:
+            continue
+        for quantity in ('relative_time', 'peak_memory'):
+            value = result.get(quantity)
+            reference = baseline.get(quantity)
+            if value is None or reference is None:
+                continue
+            if quantity == 'relative_time' and result['time'] < min_time:
+                continue
+            if value > reference * tolerance:
+                regressions.append((key, quantity, value, reference))
+    return regressions
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def main(argv=None):
+    parser = OptionParser(
+        description='Run Capsul scalability benchmarks, and compare them to '
+        'baselines.')
+    parser.add_option('--sizes', default='10,100,1000',
+                      help='comma-separated numbers of nodes of generated '
+                      'pipelines (default: %default)')
+    parser.add_option('--iterations', default='10,100',
+                      help='comma-separated numbers of subjects of '
+                      'Morphologist iterations (default: %default)')
+    parser.add_option('--repeat', type='int', default=1,
+                      help='number of timed runs of each operation '
+                      '(default: %default)')
+    parser.add_option('--no-memory', dest='memory', action='store_false',
+                      default=True, help='do not measure memory')
+    parser.add_option('--baselines', default=BASELINES_FILE,
+                      help='baselines file (default: %default)')
+    parser.add_option('--save-baselines', action='store_true',
+                      help='store results as the new baselines instead of '
+                      'comparing them')
+    parser.add_option('--tolerance', type='float', default=1.5,
+                      help='slowdown or memory growth factor considered as '
+                      'a regression (default: %default)')
+    parser.add_option('-o', '--output',
+                      help='write results in this JSON file')
+    options, args = parser.parse_args(argv)
+
+    results = run_benchmarks(_int_list(options.sizes),
+                             _int_list(options.iterations),
+                             repeat=options.repeat, memory=options.memory,
+                             verbose=True)
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if options.save_baselines:
+        save_baselines(results, options.baselines)
+        return 0
+    if not osp.exists(options.baselines):
+        print('no baselines file:', options.baselines)
+        return 0
+    regressions = compare_to_baselines(results,
+                                       load_baselines(options.baselines),
+                                       options.tolerance)
+    for key, quantity, value, reference in regressions:
+        print('REGRESSION: %s %s: %g (baseline: %g)'
+              % (key, quantity, value, reference))
+    if regressions:
+        return 1
+    print('no regression')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
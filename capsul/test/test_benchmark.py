@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import unittest
+
+from capsul.test import benchmark
+
+
+class TestBenchmark(unittest.TestCase):
+    ''' Run the scalability benchmarks on small sizes, and check regressions
+    detection.
+    '''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='capsul_test_benchmark')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_generated_pipeline(self):
+        runner = benchmark.BenchmarkRunner()
+        benchmark.generated_benchmarks(runner, [15], self.tmpdir)
+        operations = [result['operation'] for result in runner.results]
+        self.assertEqual(operations,
+                         ['get_process_instance',
+                          'update_nodes_and_plugs_activation',
+                          'workflow_from_pipeline', 'save_json', 'load_json',
+                          'save_xml', 'load_xml'])
+        for result in runner.results:
+            self.assertEqual(result['size'], 15)
+            self.assertTrue(result['time'] >= 0)
+            self.assertAlmostEqual(result['relative_time'],
+                                   result['time'] / runner.calibration)
+            self.assertTrue(result['peak_memory'] > 0)
+        pipeline = benchmark.get_process_instance(
+            os.path.join(self.tmpdir, 'generated_15.json'))
+        self.assertEqual(len(pipeline.nodes), 16)
+        self.assertEqual(sorted(name for name in pipeline.user_traits()
+                                if name != 'nodes_activation'),
+                         ['input0', 'input1', 'output0', 'output1'])
+
+    def test_all_benchmarks(self):
+        results = benchmark.run_benchmarks(sizes=[10], iterations=[2],
+                                           memory=False)
+        keys = [benchmark.result_key(result) for result in results]
+        self.assertTrue('complete_parameters iteration 2' in keys)
+        self.assertTrue('load_json morphologist 1' in keys)
+        for result in results:
+            self.assertTrue(result['peak_memory'] is None)
+        # stored baselines cover the default benchmarks
+        baselines = benchmark.load_baselines()
+        for key in keys:
+            if not key.endswith(' 2'):
+                self.assertTrue(key in baselines, key)
+
+    def test_compare_to_baselines(self):
+        results = [
+            {'operation': 'load_json', 'pipeline': 'generated', 'size': 10,
+             'time': 0.5, 'relative_time': 5., 'peak_memory': 1000},
+            {'operation': 'save_json', 'pipeline': 'generated', 'size': 10,
+             'time': 0.004, 'relative_time': 0.04, 'peak_memory': 1000},
+            {'operation': 'save_xml', 'pipeline': 'generated', 'size': 10,
+             'time': 0.1, 'relative_time': 1., 'peak_memory': 3000}]
+        filename = os.path.join(self.tmpdir, 'baselines.json')
+        benchmark.save_baselines(results, filename)
+        baselines = benchmark.load_baselines(filename)
+        # absolute times are not stored
+        self.assertTrue('time' not in baselines['load_json generated 10'])
+        self.assertEqual(benchmark.compare_to_baselines(results, baselines),
+                         [])
+        # same absolute times on a 2 times faster machine
+        slower = [dict(result, relative_time=result['relative_time'] * 2)
+                  for result in results]
+        slower[2]['peak_memory'] = 5000
+        regressions = benchmark.compare_to_baselines(slower, baselines)
+        # too short times are not compared
+        self.assertEqual(sorted(regressions),
+                         [('load_json generated 10', 'relative_time', 10.,
+                           5.),
+                          ('save_xml generated 10', 'peak_memory', 5000,
+                           3000),
+                          ('save_xml generated 10', 'relative_time', 2., 1.)])
+        self.assertEqual(
+            benchmark.compare_to_baselines(slower, baselines, tolerance=2.5),
+            [])
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestBenchmark)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
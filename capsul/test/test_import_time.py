@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+import unittest
+import subprocess
+import sys
+import json
+import time
+
+
+def imported_modules(code, modules, args=()):
+    ''' Run the given code in a new interpreter and tell which of the given
+    modules have been imported, and how long it took.
+    '''
+    script = '''
+import sys, json
+sys.argv = ['capsul'] + %r
+try:
+    %s
+except SystemExit:
+    pass
+sys.__stdout__.write('\\n' + json.dumps(
+    [m for m in %r if m in sys.modules]))
+''' % (list(args), code, list(modules))
+    start = time.time()
+    output = subprocess.check_output([sys.executable, '-c', script])
+    duration = time.time() - start
+    return json.loads(output.decode().strip().split('\n')[-1]), duration
+
+
+class TestImportTime(unittest.TestCase):
+    ''' Guard the startup time of capsul commandline jobs: heavy modules
+    should only be imported when they are actually used.
+    '''
+
+    heavy_modules = ['traits.api', 'populse_db', 'soma_workflow.client',
+                     'nipype', 'capsul.pipeline.pipeline',
+                     'capsul.engine.database_populse']
+
+    def test_api_import(self):
+        modules, duration = imported_modules('import capsul.api',
+                                             self.heavy_modules)
+        print('import capsul.api: %.3fs' % duration)
+        self.assertEqual(modules, [])
+
+    def test_api_process_import(self):
+        modules, duration = imported_modules(
+            'from capsul.api import Process', self.heavy_modules)
+        print('from capsul.api import Process: %.3fs' % duration)
+        self.assertEqual(modules, ['traits.api'])
+
+    def test_runprocess_help(self):
+        modules, duration = imported_modules(
+            'import runpy; runpy.run_module("capsul", run_name="__main__")',
+            self.heavy_modules, ['--help'])
+        print('python -m capsul --help: %.3fs' % duration)
+        self.assertEqual(modules, [])
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestImportTime)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
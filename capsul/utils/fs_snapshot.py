@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+'''
+In-memory snapshot of the filesystem, to check many files at once.
+
+Classes
+=======
+:class:`FileSystemSnapshot`
+---------------------------
+'''
+
+from __future__ import absolute_import
+import bisect
+import os
+import os.path as osp
+import threading
+import six
+
+
+class FileSystemSnapshot(object):
+    '''
+    Snapshot of the contents of a set of directories.
+
+    Directories containing the given paths are listed in bulk (using
+    ``os.scandir()``, in a pool of threads), then existence, modification
+    time and size queries are answered from memory. On network filesystems
+    this is much faster than calling ``os.path.exists()`` for each file.
+
+    Directories which have not been listed yet are listed when a path they
+    contain is queried. The snapshot is not updated when the filesystem
+    changes: call :meth:`clear` (or use a new snapshot) to forget it.
+
+    Parameters
+    ----------
+    paths: sequence of str (optional)
+        paths which will be queried: their directories are listed.
+    workers: int (optional)
+        number of directories listed at the same time.
+    '''
+
+    def __init__(self, paths=(), workers=8):
+        self.workers = workers
+        # directory -> {name: DirEntry}, or None if it cannot be listed
+        self._directories = {}
+        # directory -> sorted entries names, built by listdir()
+        self._sorted_names = {}
+        self._lock = threading.Lock()
+        self.add_paths(paths)
+
+    @staticmethod
+    def _split(path):
+        path = osp.normpath(osp.abspath(path))
+        return osp.dirname(path), osp.basename(path)
+
+    @staticmethod
+    def _list_directory(directory):
+        try:
+            with os.scandir(directory) as entries:
+                return dict((entry.name, entry) for entry in entries)
+        except OSError:
+            return None
+
+    def add_paths(self, paths):
+        '''
+        List the directories containing the given paths, if they have not
+        been listed yet.
+        '''
+        directories = set()
+        for path in paths:
+            if isinstance(path, six.string_types) and path:
+                directories.add(self._split(path)[0])
+        with self._lock:
+            directories = [directory for directory in directories
+                           if directory not in self._directories]
+        if not directories:
+            return
+        if len(directories) == 1 or self.workers <= 1:
+            contents = [self._list_directory(directory)
+                        for directory in directories]
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(
+                    max_workers=min(self.workers,
+                                    len(directories))) as executor:
+                contents = list(executor.map(self._list_directory,
+                                             directories))
+        with self._lock:
+            self._directories.update(zip(directories, contents))
+
+    def clear(self):
+        '''
+        Forget all listed directories.
+        '''
+        with self._lock:
+            self._directories = {}
+            self._sorted_names = {}
+
+    def _entry(self, path):
+        if not path:
+            return None
+        directory, name = self._split(path)
+        with self._lock:
+            contents = self._directories.get(directory, False)
+        if contents is False:
+            self.add_paths([path])
+            with self._lock:
+                contents = self._directories.get(directory)
+        if not contents:
+            return None
+        return contents.get(name)
+
+    def stat(self, path):
+        '''
+        os.stat() result for the given path (following symbolic links), or
+        None if it does not exist.
+        '''
+        entry = self._entry(path)
+        if entry is None:
+            return None
+        try:
+            # DirEntry caches its stat result
+            return entry.stat()
+        except OSError:
+            # broken symbolic link
+            return None
+
+    def exists(self, path):
+        '''
+        Same as os.path.exists(), from the snapshot.
+        '''
+        entry = self._entry(path)
+        if entry is None:
+            return False
+        if entry.is_symlink():
+            return self.stat(path) is not None
+        return True
+
+    def isdir(self, path):
+        '''
+        Same as os.path.isdir(), from the snapshot.
+        '''
+        entry = self._entry(path)
+        if entry is None:
+            return False
+        try:
+            return entry.is_dir()
+        except OSError:
+            return False
+
+    def isfile(self, path):
+        '''
+        Same as os.path.isfile(), from the snapshot.
+        '''
+        entry = self._entry(path)
+        if entry is None:
+            return False
+        try:
+            return entry.is_file()
+        except OSError:
+            return False
+
+    def listdir(self, directory, prefix=''):
+        '''
+        Sorted names of the entries of a directory, or an empty list if it
+        cannot be listed. If prefix is given, only names starting with it are
+        returned.
+        '''
+        directory = osp.normpath(osp.abspath(directory))
+        with self._lock:
+            contents = self._directories.get(directory, False)
+            names = self._sorted_names.get(directory)
+        if contents is False:
+            contents = self._list_directory(directory)
+            with self._lock:
+                self._directories[directory] = contents
+        if names is None:
+            names = sorted(contents or ())
+            with self._lock:
+                self._sorted_names[directory] = names
+        if not prefix:
+            return list(names)
+        start = bisect.bisect_left(names, prefix)
+        end = start
+        while end < len(names) and names[end].startswith(prefix):
+            end += 1
+        return names[start:end]
+
+    def getmtime(self, path):
+        '''
+        Modification time of the given path, or None if it does not exist.
+        '''
+        stat = self.stat(path)
+        if stat is not None:
+            return stat.st_mtime
+
+    def getsize(self, path):
+        '''
+        Size of the given path, or None if it does not exist.
+        '''
+        stat = self.stat(path)
+        if stat is not None:
+            return stat.st_size
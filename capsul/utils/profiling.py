@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+'''
+Profiling of process executions: timings and resources used by each node of
+a pipeline, aggregated and exported as a
+`Chrome trace <https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU>`_
+(to be loaded in ``chrome://tracing`` or https://ui.perfetto.dev) or as a
+CSV table.
+
+Classes
+=======
+:class:`NodeProfiler`
+---------------------
+:class:`ExecutionProfile`
+-------------------------
+
+Functions
+=========
+:func:`workflow_profile`
+------------------------
+'''
+
+from __future__ import absolute_import
+import csv
+import io
+import json
+import os
+import sys
+import threading
+import time
+import six
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+
+#: fields of a node profile record
+PROFILE_FIELDS = ('name', 'process', 'status', 'start', 'wall_time',
+                  'cpu_time', 'peak_rss', 'read_bytes', 'write_bytes',
+                  'read_chars', 'write_chars', 'staging_time', 'queue_wait',
+                  'worker')
+
+
+def _read_proc_io():
+    try:
+        with open('/proc/self/io') as f:
+            counters = dict(line.split(':') for line in f if ':' in line)
+        return dict((name, int(value)) for name, value in counters.items())
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _children_cpu_time():
+    if resource is None:
+        return 0.
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _reset_peak_rss():
+    # resets VmHWM (Linux >= 4.0)
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def _read_peak_rss():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+
+def _children_peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if sys.platform != 'darwin':
+        # kilobytes
+        peak *= 1024
+    return peak
+
+
+# peak memory measurement state shared by the profilers of concurrent nodes:
+# number of running profilers, and whether the peak has been reset when the
+# first of them started
+_peak_rss_lock = threading.Lock()
+_peak_rss_state = {'running': 0, 'reset': False}
+
+
+class NodeProfiler(object):
+    '''
+    Context manager measuring the execution of a node. On exit,
+    :attr:`record` is a dictionary with the :data:`PROFILE_FIELDS` keys:
+
+    name, process:
+        node name and process identifier
+    start, wall_time:
+        start time (seconds since epoch) and duration in seconds
+    cpu_time:
+        CPU time of the executing thread, plus the CPU time of the
+        sub-processes (commands) which have completed meanwhile
+    status:
+        ``'done'``, or ``'failed'`` if the execution raised an exception
+    peak_rss:
+        peak resident memory (bytes) during the node execution: the
+        largest of the Python process peak, sampled from ``/proc/self/status``
+        after a reset through ``/proc/self/clear_refs``, and of the peak of
+        the sub-processes which have completed meanwhile, when it exceeds
+        the one of former sub-processes. None if the peak could not be reset
+        (non-Linux systems).
+    read_bytes, write_bytes, read_chars, write_chars:
+        storage I/O and read / write system calls volumes (bytes), from
+        ``/proc/self/io`` (None when it is not available)
+    staging_time:
+        time spent copying input files by a
+        :class:`~capsul.process.process.FileCopyProcess` (None for other
+        processes)
+    queue_wait:
+        time the node has waited for a worker after its dependencies were
+        completed
+    worker:
+        identifier of the executing thread
+
+    Process-wide counters (sub-processes CPU time and I/O) include the
+    activity of other nodes run at the same time in other threads. The
+    memory peak is reset only when no other node is being profiled, thus for
+    nodes run at the same time it is the peak since the start of the
+    earliest of them: it may be overestimated, but not missed.
+    '''
+
+    def __init__(self, name, process=None, queue_wait=0.):
+        self.name = name
+        self.process = process
+        self.queue_wait = queue_wait
+        self.record = None
+
+    def __enter__(self):
+        self._start = time.time()
+        self._counter = time.perf_counter()
+        self._thread_time = time.thread_time()
+        self._children_time = _children_cpu_time()
+        self._io = _read_proc_io()
+        with _peak_rss_lock:
+            if _peak_rss_state['running'] == 0:
+                _peak_rss_state['reset'] = _reset_peak_rss()
+            _peak_rss_state['running'] += 1
+            self._peak_rss_reset = _peak_rss_state['reset']
+        self._children_peak_rss = _children_peak_rss()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall_time = time.perf_counter() - self._counter
+        cpu_time = time.thread_time() - self._thread_time \
+            + _children_cpu_time() - self._children_time
+        io_end = _read_proc_io()
+        peak_rss = None
+        if self._peak_rss_reset:
+            peak_rss = _read_peak_rss()
+            children_peak = _children_peak_rss()
+            if peak_rss is not None and children_peak is not None \
+                    and children_peak > self._children_peak_rss:
+                peak_rss = max(peak_rss, children_peak)
+        with _peak_rss_lock:
+            _peak_rss_state['running'] -= 1
+        io_delta = {}
+        for name in ('read_bytes', 'write_bytes', 'rchar', 'wchar'):
+            if self._io is not None and io_end is not None:
+                io_delta[name] = io_end.get(name, 0) - self._io.get(name, 0)
+            else:
+                io_delta[name] = None
+        process = self.process
+        self.record = {
+            'name': self.name,
+            'process': getattr(process, 'id', None),
+            'status': 'done' if exc_type is None else 'failed',
+            'start': self._start,
+            'wall_time': wall_time,
+            'cpu_time': cpu_time,
+            'peak_rss': peak_rss,
+            'read_bytes': io_delta['read_bytes'],
+            'write_bytes': io_delta['write_bytes'],
+            'read_chars': io_delta['rchar'],
+            'write_chars': io_delta['wchar'],
+            'staging_time': getattr(process, '_staging_time', None),
+            'queue_wait': self.queue_wait,
+            'worker': threading.current_thread().ident,
+        }
+        return False
+
+
+class ExecutionProfile(object):
+    '''
+    Profile records of the nodes of one or several executions (a pipeline
+    run over a cohort, for instance).
+
+    Records are dictionaries with (at least) the :data:`PROFILE_FIELDS`
+    keys, as produced by :class:`NodeProfiler` or :func:`workflow_profile`.
+    Records may be added from several threads.
+    '''
+
+    def __init__(self, records=()):
+        self.records = list(records)
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        '''
+        Add a node record.
+        '''
+        with self._lock:
+            self.records.append(record)
+
+    def extend(self, profile):
+        '''
+        Add the records of another profile.
+        '''
+        with self._lock:
+            self.records.extend(profile.records)
+
+    def summary(self):
+        '''
+        Statistics per process (or node name when the process is not
+        known), sorted by decreasing total wall time: the slowest steps
+        come first.
+
+        Returns
+        -------
+        summary: list of dict
+            with keys ``process``, ``count``, ``total_wall_time``,
+            ``mean_wall_time``, ``max_wall_time``, ``total_cpu_time``,
+            ``total_staging_time``, ``total_queue_wait``,
+            ``total_read_bytes``, ``total_write_bytes``, ``max_peak_rss``
+        '''
+        stats = {}
+        for record in self.records:
+            key = record.get('process') or record.get('name')
+            item = stats.get(key)
+            if item is None:
+                item = {'process': key, 'count': 0, 'total_wall_time': 0.,
+                        'max_wall_time': 0., 'total_cpu_time': 0.,
+                        'total_staging_time': 0., 'total_queue_wait': 0.,
+                        'total_read_bytes': 0, 'total_write_bytes': 0,
+                        'max_peak_rss': None}
+                stats[key] = item
+            item['count'] += 1
+            wall_time = record.get('wall_time') or 0.
+            item['total_wall_time'] += wall_time
+            item['max_wall_time'] = max(item['max_wall_time'], wall_time)
+            item['total_cpu_time'] += record.get('cpu_time') or 0.
+            item['total_staging_time'] += record.get('staging_time') or 0.
+            item['total_queue_wait'] += record.get('queue_wait') or 0.
+            item['total_read_bytes'] += record.get('read_bytes') or 0
+            item['total_write_bytes'] += record.get('write_bytes') or 0
+            peak = record.get('peak_rss')
+            if peak is not None:
+                item['max_peak_rss'] = max(item['max_peak_rss'] or 0, peak)
+        summary = sorted(stats.values(),
+                         key=lambda item: item['total_wall_time'],
+                         reverse=True)
+        for item in summary:
+            item['mean_wall_time'] = item['total_wall_time'] / item['count']
+        return summary
+
+    def chrome_trace(self):
+        '''
+        Profile as a Chrome trace-event dictionary: one complete event per
+        node execution (and one per queue wait), one row per worker.
+        '''
+        events = []
+        if not self.records:
+            return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+        origin = min(record['start'] - (record.get('queue_wait') or 0.)
+                     for record in self.records)
+        workers = {}
+        pid = os.getpid()
+        for record in sorted(self.records, key=lambda r: r['start']):
+            tid = workers.setdefault(record.get('worker'), len(workers) + 1)
+            start = (record['start'] - origin) * 1e6
+            args = dict((name, value) for name, value in record.items()
+                        if name not in ('name', 'start', 'worker'))
+            events.append({'name': record['name'], 'cat': 'process',
+                           'ph': 'X', 'ts': start,
+                           'dur': (record.get('wall_time') or 0.) * 1e6,
+                           'pid': pid, 'tid': tid, 'args': args})
+            queue_wait = record.get('queue_wait')
+            if queue_wait:
+                events.append({'name': '%s (queued)' % record['name'],
+                               'cat': 'queue', 'ph': 'X',
+                               'ts': start - queue_wait * 1e6,
+                               'dur': queue_wait * 1e6, 'pid': pid,
+                               'tid': tid})
+        for worker, tid in workers.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid,
+                           'tid': tid,
+                           'args': {'name': 'worker %d' % tid}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def to_chrome_trace(self, filename):
+        '''
+        Write the profile as a Chrome trace-event JSON file.
+        '''
+        with open(filename, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+    def to_csv(self, filename=None):
+        '''
+        Write the node records as a CSV table, one line per node
+        execution. If filename is None, the CSV text is returned.
+        '''
+        fields = list(PROFILE_FIELDS)
+        for record in self.records:
+            for name in record:
+                if name not in fields:
+                    fields.append(name)
+        if filename is None:
+            stream = io.StringIO()
+        else:
+            stream = open(filename, 'w', newline='')
+        try:
+            writer = csv.DictWriter(stream, fields, restval='')
+            writer.writeheader()
+            for record in sorted(self.records, key=lambda r: r['start']):
+                writer.writerow(record)
+            if filename is None:
+                return stream.getvalue()
+        finally:
+            stream.close()
+
+
+def _parse_resource_usage(usage):
+    # soma-workflow resource usage: "key=value key=value ..."
+    values = {}
+    if isinstance(usage, six.string_types):
+        for item in usage.split():
+            if '=' in item:
+                name, value = item.split('=', 1)
+                values[name] = value
+    return values
+
+
+def workflow_profile(controller, workflow_id):
+    '''
+    Profile of the jobs of a soma-workflow workflow, from the dates recorded
+    by soma-workflow: submission, execution start and end of each job.
+    ``queue_wait`` is then the time between the submission and the start
+    of a job, and the resource usage reported by the scheduler (if any) is
+    added to the records.
+
+    Parameters
+    ----------
+    controller: WorkflowController
+    workflow_id: int
+
+    Returns
+    -------
+    profile: ExecutionProfile
+    '''
+    elements = controller.workflow_elements_status(workflow_id)
+    job_ids = [element[0] for element in elements[0]]
+    jobs_info = controller.jobs(job_ids) if job_ids else {}
+
+    def timestamp(date):
+        if date is None:
+            return None
+        return time.mktime(date.timetuple()) + date.microsecond * 1e-6
+
+    profile = ExecutionProfile()
+    for element in elements[0]:
+        job_id, status, exit_info, dates = (element[0], element[1],
+                                            element[3], element[4])
+        submission, execution, ending = [timestamp(date)
+                                         for date in dates[:3]]
+        if execution is None:
+            # not run
+            continue
+        record = dict((name, None) for name in PROFILE_FIELDS)
+        record.update({
+            'name': jobs_info.get(job_id, ('job %s' % job_id, ))[0],
+            'job_id': job_id,
+            'status': status,
+            'start': execution,
+            'wall_time': None if ending is None else ending - execution,
+            'queue_wait': None if submission is None
+                          else max(0., execution - submission),
+            'worker': 0,
+        })
+        if exit_info:
+            record.update(_parse_resource_usage(exit_info[3]))
+        profile.add(record)
+    return profile
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import os.path as osp
+import shutil
+import tempfile
+import unittest
+
+from traits.api import File
+
+from capsul.api import Process, Pipeline
+from capsul.pipeline import pipeline_tools
+from capsul.utils.fs_snapshot import FileSystemSnapshot
+
+
+class Copy(Process):
+
+    def __init__(self):
+        super(Copy, self).__init__()
+        self.add_trait('input', File(output=False))
+        self.add_trait('output', File(output=True))
+
+    def _run_process(self):
+        shutil.copyfile(self.input, self.output)
+
+
+class TwoCopies(Pipeline):
+
+    def pipeline_definition(self):
+        self.add_process('copy1', Copy())
+        self.add_process('copy2', Copy())
+        self.export_parameter('copy1', 'input')
+        self.add_link('copy1.output->copy2.input')
+        self.export_parameter('copy2', 'output')
+
+
+class TestFileSystemSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='capsul_test_snapshot')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_queries(self):
+        existing = osp.join(self.tmpdir, 'existing.txt')
+        with open(existing, 'w') as f:
+            f.write('12345')
+        subdir = osp.join(self.tmpdir, 'subdir')
+        os.mkdir(subdir)
+        missing = osp.join(self.tmpdir, 'missing.txt')
+        snapshot = FileSystemSnapshot([existing, missing, subdir])
+        self.assertTrue(snapshot.exists(existing))
+        self.assertFalse(snapshot.exists(missing))
+        self.assertFalse(snapshot.exists(''))
+        self.assertTrue(snapshot.isdir(subdir))
+        self.assertFalse(snapshot.isdir(existing))
+        self.assertEqual(snapshot.getsize(existing), 5)
+        self.assertEqual(snapshot.getmtime(existing),
+                         os.stat(existing).st_mtime)
+        self.assertEqual(snapshot.getsize(missing), None)
+        self.assertFalse(snapshot.exists(
+            osp.join(self.tmpdir, 'nodir', 'file.txt')))
+        # files are checked from the snapshot, not from the filesystem
+        with open(missing, 'w') as f:
+            f.write('')
+        self.assertFalse(snapshot.exists(missing))
+        snapshot.clear()
+        self.assertTrue(snapshot.exists(missing))
+        # directories which were not listed yet are listed on demand
+        in_subdir = osp.join(subdir, 'file.txt')
+        with open(in_subdir, 'w') as f:
+            f.write('')
+        self.assertTrue(snapshot.exists(in_subdir))
+        if hasattr(os, 'symlink'):
+            broken = osp.join(self.tmpdir, 'broken')
+            os.symlink(osp.join(self.tmpdir, 'nothing'), broken)
+            snapshot.clear()
+            self.assertFalse(snapshot.exists(broken))
+
+    def test_pipeline_tools(self):
+        pipeline = TwoCopies()
+        pipeline.input = osp.join(self.tmpdir, 'input.txt')
+        pipeline.nodes['copy1'].process.output = osp.join(self.tmpdir,
+                                                          'inter.txt')
+        pipeline.output = osp.join(self.tmpdir, 'out', 'output.txt')
+        os.mkdir(osp.join(self.tmpdir, 'out'))
+
+        snapshot = pipeline_tools.filesystem_snapshot(pipeline)
+        missing = pipeline_tools.nodes_with_missing_inputs(
+            pipeline, snapshot=snapshot)
+        self.assertEqual(sorted(missing), ['copy1'])
+        self.assertEqual(
+            pipeline_tools.nodes_with_existing_outputs(pipeline,
+                                                       snapshot=snapshot),
+            {})
+
+        for name in ('input.txt', 'inter.txt'):
+            with open(osp.join(self.tmpdir, name), 'w') as f:
+                f.write('')
+        # the shared snapshot still reflects the former state
+        self.assertEqual(
+            sorted(pipeline_tools.nodes_with_missing_inputs(
+                pipeline, snapshot=snapshot)), ['copy1'])
+        # a new snapshot is built when none is given
+        self.assertEqual(
+            pipeline_tools.nodes_with_missing_inputs(pipeline), {})
+        snapshot = pipeline_tools.filesystem_snapshot(pipeline)
+        existing = pipeline_tools.nodes_with_existing_outputs(
+            pipeline, snapshot=snapshot)
+        self.assertEqual(
+            existing, {'copy1': [('output', osp.join(self.tmpdir,
+                                                     'inter.txt'))]})
+        pipeline_tools.disable_runtime_steps_with_existing_outputs(
+            pipeline, snapshot=snapshot)
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(
+        TestFileSystemSnapshot)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
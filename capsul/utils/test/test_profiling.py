@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import csv
+import datetime
+import gc
+import io
+import json
+import os
+import os.path as osp
+import shutil
+import tempfile
+import unittest
+
+from traits.api import File, Float
+
+from capsul.api import Process, Pipeline, FileCopyProcess
+from capsul.study_config.study_config import StudyConfig
+from capsul.study_config.run import run_process
+from capsul.study_config.test.test_run_in_study_config import SleepPipeline
+from capsul.utils.profiling import ExecutionProfile, PROFILE_FIELDS, \
+    workflow_profile
+
+
+class WriteProcess(Process):
+    """ Writes 1 MB in its output file.
+    """
+    output = File(output=True)
+
+    def _run_process(self):
+        with open(self.output, 'wb') as f:
+            f.write(b'\0' * 1000000)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class FailingProcess(Process):
+    """ Allocates 50 MB, then fails.
+    """
+    output = File(output=True)
+
+    def _run_process(self):
+        data = b'\1' * 50000000
+        raise RuntimeError('failed after allocating %d bytes' % len(data))
+
+
+class StagingProcess(FileCopyProcess):
+
+    def __init__(self):
+        super(StagingProcess, self).__init__(inputs_to_copy=['input'])
+        self.add_trait('input', File(output=False))
+        self.add_trait('res', Float(output=True))
+
+    def _run_process(self):
+        self.res = osp.getsize(self.input)
+
+
+class SameTypePipeline(Pipeline):
+    """ Two independent nodes of the same type.
+    """
+    def pipeline_definition(self):
+        for name in ('node1', 'node2'):
+            self.add_process(
+                name,
+                'capsul.study_config.test.test_run_in_study_config.'
+                'SleepProcess')
+        self.export_parameter('node1', 'f1', 'a')
+        self.export_parameter('node2', 'f1', 'b')
+        self.export_parameter('node1', 'res', 'res1')
+        self.export_parameter('node2', 'res', 'res2')
+
+
+class JobsController(object):
+    """ soma-workflow controller of a completed workflow.
+    """
+    def workflow_elements_status(self, workflow_id):
+        date = datetime.datetime(2020, 1, 1, 12)
+        second = datetime.timedelta(seconds=1)
+        jobs = [(1, 'done', 'queue', ('finished_regularly', 0, None,
+                                      'cpu=2.5 mem=100M'),
+                 (date, date + second, date + 3 * second, None)),
+                (2, 'done', 'queue', ('finished_regularly', 0, None, None),
+                 (date, date + 4 * second, date + 5 * second, None)),
+                (3, 'not_submitted', 'queue', None, (None, None, None, None))]
+        return (jobs, [], [])
+
+    def jobs(self, job_ids):
+        return dict((job_id, ('job%d' % job_id, ['cmd'], None))
+                    for job_id in job_ids)
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='capsul_test_profiling')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_pipeline_profile(self):
+        study_config = StudyConfig(modules=[], output_directory=self.tmpdir,
+                                   local_workers=2, profile_execution=True)
+        pipeline = study_config.get_process_instance(SleepPipeline)
+        study_config.run(pipeline, a=1., b=2.)
+        profile = study_config.execution_profile
+        # records are named after the nodes context names
+        records = dict((record['name'].rsplit('.', 1)[-1], record)
+                       for record in profile.records)
+        self.assertEqual(sorted(record['name'] for record in profile.records),
+                         ['SleepPipeline.node1', 'SleepPipeline.node2',
+                          'SleepPipeline.node3'])
+        for record in records.values():
+            self.assertEqual(sorted(record), sorted(PROFILE_FIELDS))
+            self.assertTrue(record['wall_time'] >= 0.3)
+            self.assertTrue(record['cpu_time'] < 0.3)
+            self.assertTrue(record['queue_wait'] < 0.3)
+            self.assertTrue(record['staging_time'] is None)
+            self.assertEqual(record['status'], 'done')
+        # node1 and node2 run on two workers
+        self.assertNotEqual(records['node1']['worker'],
+                            records['node2']['worker'])
+        self.assertTrue(records['node3']['start']
+                        >= records['node1']['start']
+                        + records['node1']['wall_time'])
+
+        trace = profile.chrome_trace()
+        json.dumps(trace)
+        events = [event for event in trace['traceEvents']
+                  if event['ph'] == 'X' and event['cat'] == 'process']
+        self.assertEqual(sorted(event['name'] for event in events),
+                         ['SleepPipeline.node1', 'SleepPipeline.node2',
+                          'SleepPipeline.node3'])
+        self.assertEqual(len(set(event['tid'] for event in events)), 2)
+        for event in events:
+            self.assertTrue(event['dur'] >= 300000)
+        trace_file = osp.join(self.tmpdir, 'trace.json')
+        profile.to_chrome_trace(trace_file)
+        with open(trace_file) as f:
+            self.assertEqual(len(json.load(f)['traceEvents']),
+                             len(trace['traceEvents']))
+
+        rows = list(csv.DictReader(io.StringIO(profile.to_csv())))
+        self.assertEqual([row['name'] for row in rows][-1],
+                         'SleepPipeline.node3')
+        self.assertEqual(list(rows[0]), list(PROFILE_FIELDS))
+
+        summary = profile.summary()
+        self.assertEqual(len(summary), 1)
+        self.assertEqual(summary[0]['count'], 3)
+        self.assertTrue(summary[0]['mean_wall_time'] >= 0.3)
+
+        # not profiled
+        study_config.profile_execution = False
+        study_config.run(pipeline, a=1., b=2.)
+        self.assertTrue(study_config.execution_profile is None)
+
+    def test_cached_pipeline_profile(self):
+        # runs nested by smart caching do not replace the pipeline profile
+        study_config = StudyConfig(modules=['SmartCachingConfig'],
+                                   output_directory=self.tmpdir,
+                                   use_smart_caching=True,
+                                   profile_execution=True)
+        pipeline = study_config.get_process_instance(SameTypePipeline)
+        study_config.run(pipeline, a=1., b=2.)
+        profile = study_config.execution_profile
+        self.assertEqual(sorted(record['name'] for record in profile.records),
+                         ['SameTypePipeline.node1', 'SameTypePipeline.node2'])
+        # results restored from the cache are recorded too
+        study_config.run(pipeline, a=1., b=2.)
+        self.assertTrue(study_config.execution_profile is not profile)
+        self.assertEqual(len(study_config.execution_profile.records), 2)
+
+    def test_node_profile(self):
+        profile = ExecutionProfile()
+        process = WriteProcess()
+        process.output = osp.join(self.tmpdir, 'output')
+        run_process(self.tmpdir, process, profile=profile)
+        record = profile.records[0]
+        if record['write_chars'] is not None:
+            # /proc/self/io is available
+            self.assertTrue(record['write_chars'] >= 1000000)
+        self.assertEqual(record['status'], 'done')
+        if record['peak_rss'] is not None:
+            self.assertTrue(record['peak_rss'] > 1000000)
+
+        src = osp.join(self.tmpdir, 'input')
+        with open(src, 'wb') as f:
+            f.write(b'\0' * 1000)
+        process = StagingProcess()
+        process.destination = osp.join(self.tmpdir, 'staging')
+        process.input = src
+        run_process(self.tmpdir, process, profile=profile)
+        self.assertEqual(process.res, 1000)
+        record = profile.records[1]
+        self.assertTrue(record['staging_time'] > 0)
+        self.assertTrue(record['staging_time'] <= record['wall_time'])
+
+        cohort = ExecutionProfile()
+        cohort.extend(profile)
+        cohort.extend(profile)
+        summary = dict((item['process'], item) for item in cohort.summary())
+        self.assertEqual(summary[process.id]['count'], 2)
+        self.assertEqual(summary[process.id]['total_staging_time'],
+                         2 * record['staging_time'])
+
+    def test_failed_node_profile(self):
+        profile = ExecutionProfile()
+        process = FailingProcess()
+        process.output = osp.join(self.tmpdir, 'output')
+        self.assertRaises(RuntimeError, run_process, self.tmpdir, process,
+                          profile=profile)
+        self.assertEqual(len(profile.records), 1)
+        failed = profile.records[0]
+        self.assertEqual(failed['status'], 'failed')
+        self.assertTrue(failed['wall_time'] >= 0)
+        # the peak memory is measured per node: a later node which does not
+        # allocate much has a lower peak
+        gc.collect()
+        process = WriteProcess()
+        process.output = osp.join(self.tmpdir, 'output')
+        run_process(self.tmpdir, process, profile=profile)
+        record = profile.records[1]
+        if failed['peak_rss'] is not None:
+            self.assertTrue(failed['peak_rss'] > 50000000)
+            self.assertTrue(record['peak_rss'] < failed['peak_rss'] - 40000000)
+
+    def test_workflow_profile(self):
+        profile = workflow_profile(JobsController(), 1)
+        self.assertEqual([record['name'] for record in profile.records],
+                         ['job1', 'job2'])
+        job1, job2 = profile.records
+        self.assertAlmostEqual(job1['queue_wait'], 1.)
+        self.assertAlmostEqual(job1['wall_time'], 2.)
+        self.assertAlmostEqual(job2['queue_wait'], 4.)
+        self.assertEqual(job1['cpu'], '2.5')
+        self.assertEqual(job1['mem'], '100M')
+        rows = list(csv.DictReader(io.StringIO(profile.to_csv())))
+        self.assertEqual(rows[0]['mem'], '100M')
+        self.assertEqual(rows[1]['mem'], '')
+
+
+def test():
+    """ Function to execute unitest
+    """
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestProfiling)
+    runtime = unittest.TextTestRunner(verbosity=2).run(suite)
+    return runtime.wasSuccessful()
+
+
+if __name__ == "__main__":
+    print("RETURNCODE: ", test())
@@ -11,7 +11,8 @@ pkgdata = {
         ["*.ui", "*.png", "*.gif", "*.qrc", "*.txt"],
     "capsul.utils.test": ["*.xml"],
     "capsul.process.test": ["*.xml"],
-    "capsul.pipeline.test": ["*.json"]
+    "capsul.pipeline.test": ["*.json"],
+    "capsul.test": ["*.json"]
 }
 
 release_info = {}